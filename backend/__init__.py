@@ -26,6 +26,8 @@ from utils.auth import (
     get_current_user, 
     verify_password, 
     get_password_hash, 
+    verify_password_async,
+    get_password_hash_async,
     create_access_token,
     security
 )
@@ -36,6 +38,8 @@ __all__ = [
     'get_current_user',
     'verify_password',
     'get_password_hash',
+    'verify_password_async',
+    'get_password_hash_async',
     'create_access_token',
     'security'
 ]
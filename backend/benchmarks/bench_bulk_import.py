@@ -0,0 +1,109 @@
+"""Rows per second for patient bulk uploads.
+
+Inserts ``--rows`` generated patients into a scratch database twice: once
+with the old per-row ``find_one`` + ``insert_one`` loop and once through
+``bulk_import.insert_rows``. A fraction of the rows reuse an existing
+patient_id so the duplicate path is exercised too. Needs a running MongoDB
+(``MONGO_URL``); the scratch database is dropped afterwards.
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_bulk_import.py --rows 20000
+"""
+import sys
+import os
+import time
+import uuid
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from utils import bulk_import, patient_search
+
+
+def make_rows(count: int, duplicate_every: int):
+    rows = []
+    for i in range(count):
+        # Every Nth row repeats an earlier patient_id
+        number = i - 1 if duplicate_every and i and i % duplicate_every == 0 else i
+        patient = {
+            "id": str(uuid.uuid4()),
+            "patient_id": f"PT-{number:06d}",
+            "name": f"Patient {number} Kumar",
+            "phone": f"9{number:09d}",
+            "gender": "F" if i % 2 else "M",
+            "address": "",
+            "created_at": "2025-01-01T00:00:00+00:00",
+        }
+        patient["search"] = patient_search.search_fields(patient)
+        rows.append((i + 1, patient))
+    return rows
+
+
+async def per_row(collection, rows):
+    created, errors = 0, []
+    for row, doc in rows:
+        if await collection.find_one({"patient_id": doc["patient_id"]}):
+            errors.append({"row": row, "patient_id": doc["patient_id"], "error": "Patient ID already exists"})
+            continue
+        await collection.insert_one(doc)
+        created += 1
+    return {"created": created, "errors": errors}
+
+
+async def batched(collection, rows, chunk_size):
+    return await bulk_import.insert_rows(
+        collection, rows, unique_field="patient_id", label_field="patient_id",
+        duplicate_error="Patient ID already exists", chunk_size=chunk_size
+    )
+
+
+async def run(mongo_url: str, count: int, chunk_size: int, duplicate_every: int):
+    client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=3000)
+    try:
+        await client.admin.command("ping")
+    except Exception:
+        client.close()
+        return None
+    db = client[f"bench_bulk_import_{uuid.uuid4().hex[:8]}"]
+    try:
+        results = []
+        for mode in ("per_row", "batched"):
+            collection = db[f"patients_{mode}"]
+            await collection.create_index("patient_id", name="patient_id_idx")
+            rows = [(row, dict(doc)) for row, doc in make_rows(count, duplicate_every)]
+            started = time.perf_counter()
+            if mode == "per_row":
+                result = await per_row(collection, rows)
+            else:
+                result = await batched(collection, rows, chunk_size)
+            elapsed = time.perf_counter() - started
+            results.append((mode, elapsed, result))
+        return results
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000, help="Rows in the simulated upload")
+    parser.add_argument("--chunk-size", type=int, default=bulk_import.CHUNK_SIZE, help="Rows per insert_many")
+    parser.add_argument("--duplicate-every", type=int, default=50, help="Every Nth row repeats a patient_id (0 = none)")
+    args = parser.parse_args()
+
+    mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+    print(f"{args.rows} rows, chunk size {args.chunk_size}, MongoDB at {mongo_url}")
+    results = asyncio.run(run(mongo_url, args.rows, args.chunk_size, args.duplicate_every))
+    if results is None:
+        print("MongoDB not reachable: nothing measured")
+        return 2
+    for mode, elapsed, result in results:
+        print(f"  {mode:>8}: {elapsed:.2f}s, {args.rows / elapsed:,.0f} rows/s "
+              f"(created {result['created']}, errors {len(result['errors'])})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Event-loop latency during a login burst.
+
+Simulates a shift start: ``--logins`` concurrent password checks while a
+steady stream of cheap "other requests" (an ``asyncio.sleep(0)`` round trip)
+keeps running. Reports how long those other requests waited for the loop,
+once with bcrypt called inline (the old behaviour) and once through the
+bounded bcrypt thread pool.
+
+    python benchmarks/bench_login_burst.py --logins 20 --rounds 12
+"""
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bcrypt
+from utils import auth
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    idx = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+async def probe(stop: asyncio.Event, interval: float, lags: list):
+    """A cheap request every ``interval`` seconds; records how late it ran."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected) * 1000)
+
+
+async def run(mode: str, logins: int, hashed: str, password: str, interval: float):
+    lags = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(stop, interval, lags))
+    await asyncio.sleep(interval * 5)  # warm up the probe
+
+    async def login_inline(plain, stored):
+        return auth.verify_password(plain, stored)
+
+    login = auth.verify_password_async if mode == "pool" else login_inline
+    started = time.perf_counter()
+    results = await asyncio.gather(*(login(password, hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    assert all(results)
+
+    stop.set()
+    await probe_task
+    return {
+        "mode": mode,
+        "burst_seconds": round(elapsed, 3),
+        "probes": len(lags),
+        "lag_p50_ms": round(percentile(lags, 50), 2),
+        "lag_p99_ms": round(percentile(lags, 99), 2),
+        "lag_max_ms": round(max(lags) if lags else 0.0, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=20, help="Concurrent logins in the burst")
+    parser.add_argument("--rounds", type=int, default=auth.BCRYPT_ROUNDS, help="bcrypt cost factor of the stored hash")
+    parser.add_argument("--interval-ms", type=float, default=5, help="Gap between probe requests")
+    args = parser.parse_args()
+
+    password = "shift-start-password"
+    hashed = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=args.rounds)).decode("utf-8")
+    print(f"{args.logins} concurrent logins, bcrypt rounds={args.rounds}, pool workers={auth.BCRYPT_MAX_WORKERS}")
+
+    for mode in ("inline", "pool"):
+        result = asyncio.run(run(mode, args.logins, hashed, password, args.interval_ms / 1000))
+        print(f"  {result['mode']:>6}: burst {result['burst_seconds']}s, "
+              f"loop lag p50={result['lag_p50_ms']}ms p99={result['lag_p99_ms']}ms max={result['lag_max_ms']}ms "
+              f"({result['probes']} probes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Pharmacy sale latency with and without multi-document transactions.
+
+Runs the suite's ``pharmacy_sale_burst`` scenario against the seeded
+benchmark database (``run_suite.py seed``) twice: once with the sale's
+writes done one by one (``MONGO_TRANSACTIONS=off``) and once inside a
+transaction through ``unit_of_work.run``. Exits 1 when the transactional
+p95 is more than ``--threshold`` above the plain one. Transactions need a
+replica set; on a standalone server only the plain run is reported.
+
+    MONGO_URL=mongodb://localhost:27017/?replicaSet=rs0 python benchmarks/bench_sale_transactions.py
+
+Sales consume stock, so re-seed before comparing runs across commits.
+"""
+import sys
+import os
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.environ.get("BENCH_DB_NAME", "clinic_bench"))
+    parser.add_argument("--iterations-scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed p95 increase (0.25 = 25%%)")
+    return parser.parse_args()
+
+
+async def main(args) -> int:
+    os.environ["DB_NAME"] = args.db
+    import server
+    from benchmarks.run_suite import load_context, mint_tokens
+    from benchmarks.suite.client import AsgiClient
+    from benchmarks.suite.scenarios import SCENARIOS, run_scenario
+    from utils import unit_of_work
+
+    ctx = await load_context(server, args.db)
+    if ctx is None:
+        server.client.close()
+        return 2
+    scenario = next(s for s in SCENARIOS if s.name == "pharmacy_sale_burst")
+    hello = await server.client.admin.command("hello")
+    modes = ["off", "on"] if hello.get("setName") or hello.get("msg") == "isdbgrid" else ["off"]
+
+    await server.startup_db_client()
+    results = {}
+    try:
+        await mint_tokens(server, ctx)
+        client = AsgiClient(server.app)
+        print(f"{'transactions':<14}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+        for mode in modes:
+            unit_of_work.TRANSACTIONS_MODE = mode
+            result = await run_scenario(scenario, client, ctx, args.seed, args.iterations_scale)
+            results[mode] = result
+            print(f"{mode:<14}{result['requests']:>9}{result['errors']:>8}{result['p50_ms']:>10}"
+                  f"{result['p95_ms']:>10}{result['p99_ms']:>10}{result['throughput_rps']:>10}")
+    finally:
+        await server.shutdown_db_client()
+
+    if "on" not in results:
+        print("\nStandalone server: transactions unavailable, only the plain path was measured")
+        return 0
+    print(f"\nTransaction retries: {unit_of_work.stats['retries']}, aborted: {unit_of_work.stats['aborted']}")
+    change = results["on"]["p95_ms"] / results["off"]["p95_ms"] - 1 if results["off"]["p95_ms"] else 0.0
+    print(f"p95 change with transactions: {change:+.1%}")
+    if change > args.threshold:
+        print(f"Regression: above the {args.threshold:.0%} threshold")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
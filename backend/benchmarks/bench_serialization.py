@@ -0,0 +1,176 @@
+"""Serialization cost of large list responses, per route and per path.
+
+Builds synthetic pages shaped like the seeded benchmark data (1,000 sales
+with 1-4 items each and their FEFO deductions, 1,000 bills, 1,000
+patients, purchase entries with 8 items...) and times how each becomes a
+response body:
+
+- ``fastapi``: what FastAPI does for ``response_model=List[Model]``:
+  validation, ``jsonable_encoder`` and the stdlib ``json`` encoder.
+- ``orjson``: the same validation with ``FastJSONResponse`` as the
+  default response class (``FAST_JSON=on`` on untrusted routes).
+- ``trusted``: ``fast_json.trusted`` (``FAST_JSON=on`` on trusted routes).
+- ``summary``: the ``view=summary`` columns of routes that have one
+  (``utils/projection.py``); MongoDB does the projection in production.
+
+Wall time (``perf_counter``) and CPU time (``process_time``) are the
+median over ``--repeat`` runs. No database is needed:
+
+    python benchmarks/bench_serialization.py --rows 1000 --repeat 20
+
+Exits 1 when the trusted path is less than ``--min-speedup`` times faster
+than the FastAPI path on any route.
+"""
+import sys
+import os
+import asyncio
+import argparse
+import random
+import statistics
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# server.py reads these at import; no connection is made
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "clinic_bench")
+
+PAYMENT_MODES = ["cash", "cash", "cash", "upi", "card"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="rows per response (the list endpoints' default page)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-speedup", type=float, default=1.5)
+    return parser.parse_args()
+
+
+def stamp(rng: random.Random) -> str:
+    return f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(8, 20):02d}:{rng.randint(0, 59):02d}:00+00:00"
+
+
+def sale(rng: random.Random, i: int) -> dict:
+    items = []
+    for _ in range(rng.randint(1, 4)):
+        name, qty, price = f"Medicine {rng.randint(1, 2000):04d}", rng.randint(1, 10), round(rng.uniform(5, 500), 2)
+        # As written by the sale endpoint: the FEFO batches each line was taken from
+        deductions = [{"batch_number": f"B{rng.randint(1, 50000):06d}", "expiry_date": "2027-03-31", "mrp": price,
+                       "quantity": qty, "medicine_id": f"batch-{rng.randint(1, 50000)}"} for _ in range(rng.randint(1, 2))]
+        items.append({"medicine_name": name, "name": name, "quantity": qty, "unit_price": price,
+                      "total": round(qty * price, 2), "deductions": deductions})
+    total = round(sum(item["total"] for item in items), 2)
+    return {"id": f"sale-{i}", "patient_id": f"patient-{rng.randint(1, 10000)}", "patient_name": "Meera Iyer",
+            "items": items, "subtotal": total, "gst_amount": 0, "discount": 0, "total_amount": total,
+            "paid_amount": total, "balance_amount": 0, "payment_mode": rng.choice(PAYMENT_MODES),
+            "upi_id": None, "transaction_ref": None, "branch_id": "branch-1", "branch_name": "Main",
+            "created_by": "user-1", "created_at": stamp(rng)}
+
+
+def bill(rng: random.Random, i: int) -> dict:
+    amount = float(rng.choice([300, 500, 800, 1200, 2500, 4000]))
+    return {"id": f"bill-{i}", "bill_number": f"BL{i:08d}", "patient_id": f"patient-{rng.randint(1, 10000)}",
+            "patient_name": "Rohan Nair", "services": [{"name": "Consultation", "quantity": 1, "rate": amount, "total": amount}],
+            "subtotal": amount, "gst_amount": 0, "discount": 0, "total_amount": amount, "paid_amount": amount,
+            "balance_amount": 0, "payment_mode": rng.choice(PAYMENT_MODES), "payment_status": "paid",
+            "branch_id": "branch-1", "branch_name": "Main", "doctor_id": "doctor-1", "doctor_name": "Dr. Rao",
+            "is_temporary": False, "created_by": "user-1", "created_at": stamp(rng)}
+
+
+def patient(rng: random.Random, i: int) -> dict:
+    return {"id": f"patient-{i}", "patient_id": f"P{i:07d}", "prefix": None, "name": "Ananya Sharma",
+            "phone": f"9{rng.randint(0, 999_999_999):09d}", "gender": rng.choice(["Male", "Female"]),
+            "age": rng.randint(1, 90), "address": "", "branch_id": "branch-1", "created_at": stamp(rng)}
+
+
+def purchase_entry(rng: random.Random, i: int) -> dict:
+    items = [{"item_name": f"Medicine {rng.randint(1, 2000):04d}", "batch_number": f"PB{i:05d}{n}",
+              "quantity": rng.randint(10, 200), "free_quantity": 0, "mrp": 120.0, "purchase_price": 84.0,
+              "expiry_date": "2027-03-31", "gst_percentage": 12, "total": 840.0} for n in range(8)]
+    return {"id": f"purchase-{i}", "supplier_id": "supplier-1", "supplier_name": "Bench Supplier",
+            "invoice_number": f"INV{i:06d}", "invoice_date": stamp(rng)[:10], "items_received_date": None,
+            "total_amount": 6720.0, "paid_amount": 6720.0, "pending_amount": 0, "payment_status": "paid",
+            "payment_mode": "cash", "items": items, "branch_id": None, "godown_id": "godown-1",
+            "created_by": "user-1", "created_at": stamp(rng)}
+
+
+def expense(rng: random.Random, i: int) -> dict:
+    created = stamp(rng)
+    return {"id": f"expense-{i}", "category": rng.choice(["Rent", "Salary", "Supplies"]), "description": "Synthetic expense",
+            "amount": float(rng.randint(100, 20000)), "date": created[:10], "branch_id": "branch-1",
+            "payment_mode": "cash", "created_by": "user-1", "created_at": created}
+
+
+def measure(fn, repeat: int) -> dict:
+    walls, cpus = [], []
+    for _ in range(repeat):
+        wall, cpu = time.perf_counter(), time.process_time()
+        body = fn()
+        walls.append(time.perf_counter() - wall)
+        cpus.append(time.process_time() - cpu)
+    return {"wall_ms": statistics.median(walls) * 1000, "cpu_ms": statistics.median(cpus) * 1000, "bytes": len(body)}
+
+
+def main(args) -> int:
+    import server
+    from fastapi import Response
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+    from utils import fast_json, projection
+
+    if fast_json.orjson is None:
+        print("orjson is not installed: only the FastAPI path is available")
+        return 2
+    fast_json.ENABLED = True
+
+    routes = [
+        ("/pharmacy-sales", server.PharmacySale, sale, "pharmacy_sales"),
+        ("/bills", server.Bill, bill, "bills"),
+        ("/patients", server.Patient, patient, None),
+        ("/purchase-entries", server.PurchaseEntry, purchase_entry, "purchase_entries"),
+        ("/expenses", server.Expense, expense, None),
+    ]
+    rng = random.Random(args.seed)
+    loop = asyncio.new_event_loop()
+    failed: List[str] = []
+
+    print(f"{'route':<20}{'path':<10}{'wall ms':>10}{'cpu ms':>10}{'KiB':>9}{'speedup':>9}")
+    for path, model, make, collection in routes:
+        rows = [make(rng, i) for i in range(args.rows)]
+        field = create_response_field(name=f"Response_{model.__name__}", type_=List[model])
+
+        def validated(response_class):
+            content = loop.run_until_complete(serialize_response(field=field, response_content=rows))
+            return response_class(content).body
+
+        paths = {
+            "fastapi": lambda: validated(JSONResponse),
+            "orjson": lambda: validated(fast_json.FastJSONResponse),
+            "trusted": lambda: fast_json.trusted(rows, Response(), model).body,
+        }
+        if collection:
+            columns = projection.SUMMARY_VIEWS[collection]
+            summaries = [{name: row[name] for name in columns if name in row} for row in rows]
+            paths["summary"] = lambda: fast_json.send(summaries, Response()).body
+        results = {name: measure(fn, args.repeat) for name, fn in paths.items()}
+        base = results["fastapi"]["wall_ms"]
+        for name, result in results.items():
+            speedup = base / result["wall_ms"] if result["wall_ms"] else 0.0
+            print(f"{path:<20}{name:<10}{result['wall_ms']:>10.2f}{result['cpu_ms']:>10.2f}"
+                  f"{result['bytes'] / 1024:>9.1f}{speedup:>8.1f}x")
+        if base / results["trusted"]["wall_ms"] < args.min_speedup:
+            failed.append(path)
+    loop.close()
+
+    if failed:
+        print(f"\nTrusted path below {args.min_speedup}x on: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -0,0 +1,160 @@
+"""Reproducible end-to-end benchmark suite.
+
+Seeds a synthetic multi-branch clinic (``suite/datagen.py``) into a
+dedicated database, then drives the real FastAPI app in-process over ASGI
+through a fixed set of scenarios (``suite/scenarios.py``) and reports p50/
+p95/p99 latency and throughput per scenario. With ``--check`` the results
+are compared with a stored baseline and the script exits 1 when any
+scenario regressed by more than ``--threshold``.
+
+    # once per dataset (same --seed/--scale/--anchor-date => same documents)
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/run_suite.py seed --scale 1.0
+    # record a baseline on the reference machine
+    MONGO_URL=... python benchmarks/run_suite.py run --save-baseline
+    # later runs
+    MONGO_URL=... python benchmarks/run_suite.py run --check
+
+Write scenarios (sales, transfers) change stock, so re-seed before
+recording a baseline and before each comparison run. The database name must
+contain "bench" unless ``--force`` is given, because seeding drops it.
+"""
+import sys
+import os
+import json
+import asyncio
+import argparse
+from datetime import date
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+CONTEXT_META_ID = "bench_context"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["seed", "run", "all"])
+    parser.add_argument("--db", default=os.environ.get("BENCH_DB_NAME", "clinic_bench"))
+    parser.add_argument("--force", action="store_true", help="allow a database name without 'bench'")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scale", type=float, default=1.0, help="dataset size multiplier (1.0 = 100k patients, 1M bills)")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--anchor-date", help="last day of generated activity (YYYY-MM-DD, default today UTC)")
+    parser.add_argument("--iterations-scale", type=float, default=1.0, help="multiplier for scenario iteration counts")
+    parser.add_argument("--only", help="comma-separated scenario names")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="exit 1 on regression against --baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed p95/throughput change (0.25 = 25%%)")
+    parser.add_argument("--output", type=Path, help="write results JSON here")
+    return parser.parse_args()
+
+
+async def seed_database(server, args) -> dict:
+    from benchmarks.suite import datagen
+
+    anchor = date.fromisoformat(args.anchor_date) if args.anchor_date else None
+    print(f"Dropping and seeding '{args.db}' (seed={args.seed}, scale={args.scale})...")
+    await server.client.drop_database(args.db)
+    ctx = await datagen.seed(server.db, seed=args.seed, scale=args.scale, days=args.days, anchor=anchor)
+    # Kept in the database so `run` needs no flags repeated
+    await server.db.system_meta.replace_one({"id": CONTEXT_META_ID}, {"id": CONTEXT_META_ID, "context": ctx}, upsert=True)
+    print(f"Seeded: {json.dumps(ctx['counts'])}")
+    return ctx
+
+
+async def load_context(server, db_name: str):
+    """The context stored by ``seed``, or None when the database was never seeded."""
+    meta = await server.db.system_meta.find_one({"id": CONTEXT_META_ID})
+    if not meta:
+        print(f"'{db_name}' has not been seeded; run the 'seed' command first")
+        return None
+    return meta["context"]
+
+
+async def mint_tokens(server, ctx: dict):
+    admin = await server.db.users.find_one({"email": "bench-admin@clinic.test"}, {"_id": 0, "id": 1})
+    receptionists = [await server.db.users.find_one({"email": email}, {"_id": 0, "id": 1}) for email in ctx["reception_emails"]]
+    # Tokens are minted directly; login cost (bcrypt) has its own benchmark
+    ctx["tokens"] = {
+        "admin": server.create_access_token({"sub": admin["id"]}),
+        "reception": [server.create_access_token({"sub": user["id"]}) for user in receptionists],
+    }
+
+
+async def run_scenarios(server, args, ctx: dict) -> list:
+    from benchmarks.suite.client import AsgiClient
+    from benchmarks.suite.scenarios import SCENARIOS, run_scenario
+
+    await mint_tokens(server, ctx)
+    wanted = set(args.only.split(",")) if args.only else None
+    client = AsgiClient(server.app)
+    results = []
+    print(f"\n{'scenario':<22}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for scenario in SCENARIOS:
+        if wanted and scenario.name not in wanted:
+            continue
+        result = await run_scenario(scenario, client, ctx, args.seed, args.iterations_scale)
+        results.append(result)
+        print(f"{result['scenario']:<22}{result['requests']:>9}{result['errors']:>8}{result['p50_ms']:>10}"
+              f"{result['p95_ms']:>10}{result['p99_ms']:>10}{result['throughput_rps']:>10}")
+    return results
+
+
+async def main(args) -> int:
+    if "bench" not in args.db and not args.force:
+        print(f"Refusing to use database '{args.db}': name must contain 'bench' (or pass --force)")
+        return 2
+    # server reads DB_NAME at import time
+    os.environ["DB_NAME"] = args.db
+    import server
+    from benchmarks.suite.stats import load_baseline, regressions, save_baseline
+
+    ctx = None
+    if args.command in ("seed", "all"):
+        ctx = await seed_database(server, args)
+        if args.command == "seed":
+            server.client.close()
+            return 0
+
+    if ctx is None:
+        ctx = await load_context(server, args.db)
+        if ctx is None:
+            server.client.close()
+            return 2
+
+    await server.startup_db_client()
+    try:
+        results = await run_scenarios(server, args, ctx)
+    finally:
+        await server.shutdown_db_client()
+
+    meta = {"seed": ctx["seed"], "scale": ctx["scale"], "anchor": ctx["anchor"], "counts": ctx["counts"],
+            "iterations_scale": args.iterations_scale}
+    if args.output:
+        args.output.write_text(json.dumps({"meta": meta, "results": results}, indent=2) + "\n")
+    if args.save_baseline:
+        save_baseline(args.baseline, results, meta)
+        print(f"\nBaseline written to {args.baseline}")
+
+    if args.check:
+        baseline = load_baseline(args.baseline)
+        if baseline is None:
+            print(f"\nNo baseline at {args.baseline}; run with --save-baseline first")
+            return 2
+        if baseline["meta"].get("scale") != ctx["scale"] or baseline["meta"].get("seed") != ctx["seed"]:
+            print("\nWarning: baseline was recorded on a different dataset (seed/scale)")
+        problems = regressions(results, baseline, args.threshold)
+        if problems:
+            print(f"\nRegressions (threshold {args.threshold:.0%}):")
+            for problem in problems:
+                print(f"  {problem}")
+            return 1
+        print(f"\nNo regressions against {args.baseline} (threshold {args.threshold:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
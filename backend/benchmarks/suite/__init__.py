@@ -0,0 +1,4 @@
+"""Reproducible benchmark suite: synthetic clinic dataset, scenarios, baseline checks.
+
+Run ``python benchmarks/run_suite.py --help`` from the backend directory.
+"""
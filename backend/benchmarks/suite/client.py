@@ -0,0 +1,58 @@
+"""Minimal in-process ASGI client.
+
+Requests go through the full FastAPI stack (middleware, auth, validation,
+serialization) without a network hop, so results measure the server and
+MongoDB rather than an HTTP client.
+"""
+import json
+import time
+from typing import Optional, Tuple
+from urllib.parse import urlencode
+
+
+class AsgiClient:
+    def __init__(self, app, token: Optional[str] = None):
+        self.app = app
+        self.token = token
+
+    def with_token(self, token: str) -> "AsgiClient":
+        return AsgiClient(self.app, token)
+
+    async def request(self, method: str, path: str, params: Optional[dict] = None, json_body=None) -> Tuple[int, bytes, float]:
+        """(status, body, elapsed milliseconds)."""
+        body = json.dumps(json_body).encode() if json_body is not None else b""
+        headers = [(b"host", b"bench"), (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        if self.token:
+            headers.append((b"authorization", f"Bearer {self.token}".encode()))
+        query = urlencode({k: v for k, v in (params or {}).items() if v is not None}).encode()
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+            "root_path": "", "query_string": query, "headers": headers,
+            "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+        }
+        sent = {"body": False}
+        response = {"status": 0, "chunks": []}
+
+        async def receive():
+            if not sent["body"]:
+                sent["body"] = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["chunks"].append(message.get("body", b""))
+
+        started = time.perf_counter()
+        await self.app(scope, receive, send)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        return response["status"], b"".join(response["chunks"]), elapsed_ms
+
+    async def get(self, path: str, **params):
+        return await self.request("GET", path, params=params)
+
+    async def post(self, path: str, json_body):
+        return await self.request("POST", path, json_body=json_body)
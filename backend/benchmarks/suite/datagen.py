@@ -0,0 +1,270 @@
+"""Seeded synthetic dataset for a multi-branch clinic.
+
+``seed`` fills an (empty or dropped) database with branches, godowns,
+users, patients, item master rows, medicine batches, purchase entries,
+bills, pharmacy sales, expenses and today's walk-in queue. Every value comes
+from ``random.Random(seed)``, so the same seed, scale and anchor date always
+produce the same documents. Dates are spread over ``days`` days ending on
+the anchor date, with a slice of activity on the anchor day itself so the
+"today" screens have data.
+
+Derived collections (indexes, stock ledger, patient balances, rollups,
+patient search fields) are built afterwards with the regular utils, exactly
+as an operator would after a migration.
+"""
+import random
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Callable, Dict, List
+
+from utils import indexes, patient_balances, patient_search, rollups, stock_ledger
+from utils.auth import get_password_hash
+
+# Document counts at scale 1.0
+SIZES = {
+    "branches": 5,
+    "godowns": 2,
+    "patients": 100_000,
+    "bills": 1_000_000,
+    "pharmacy_sales": 1_000_000,
+    "item_names": 2_000,
+    "medicine_batches": 50_000,
+    "purchase_entries": 5_000,
+    "expenses": 20_000,
+    "walkins_per_branch": 40,
+}
+PURCHASE_ITEMS = 8
+# Share of bills/sales/expenses dated on the anchor day
+TODAY_SHARE = 0.002
+
+ADMIN_EMAIL = "bench-admin@clinic.test"
+RECEPTION_EMAIL = "bench-reception-{n}@clinic.test"
+PASSWORD = "bench-password"
+
+PAYMENT_MODES = ["cash", "cash", "cash", "upi", "card"]
+FIRST_NAMES = ["Aarav", "Diya", "Ishaan", "Meera", "Rohan", "Sneha", "Vikram", "Ananya", "Kiran", "Lakshmi", "Arjun", "Priya"]
+LAST_NAMES = ["Sharma", "Reddy", "Iyer", "Nair", "Patel", "Rao", "Gupta", "Menon", "Das", "Kumar"]
+
+
+def scaled(scale: float) -> Dict[str, int]:
+    return {k: max(1, int(v * scale)) if k not in ("branches", "godowns") else v for k, v in SIZES.items()}
+
+
+class Generator:
+    def __init__(self, seed: int, anchor: date, days: int):
+        self.rng = random.Random(seed)
+        self.anchor = anchor
+        self.days = days
+
+    def uid(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def timestamp(self) -> str:
+        if self.rng.random() < TODAY_SHARE:
+            day = self.anchor
+        else:
+            day = self.anchor - timedelta(days=self.rng.randint(1, self.days))
+        moment = datetime.combine(day, time(hour=self.rng.randint(8, 20), minute=self.rng.randint(0, 59),
+                                            second=self.rng.randint(0, 59)), tzinfo=timezone.utc)
+        return moment.isoformat()
+
+    def name(self) -> str:
+        return f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+
+
+async def _insert_stream(collection, docs, chunk_size: int) -> int:
+    batch, total = [], 0
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= chunk_size:
+            await collection.insert_many(batch, ordered=False)
+            total += len(batch)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+        total += len(batch)
+    return total
+
+
+async def seed(db, seed: int = 42, scale: float = 1.0, days: int = 365, anchor: date = None,
+               chunk_size: int = 5000, log: Callable[[str], None] = print) -> dict:
+    """Populate ``db`` and build derived collections; returns ids the scenarios need."""
+    anchor = anchor or datetime.now(timezone.utc).date()
+    sizes = scaled(scale)
+    gen = Generator(seed, anchor, days)
+    rng = gen.rng
+    created_at = datetime.combine(anchor - timedelta(days=days + 1), time(), tzinfo=timezone.utc).isoformat()
+    counts = {}
+
+    branches = [{"id": gen.uid(), "name": f"Branch {i + 1}", "address": "", "location": "", "phone": "",
+                 "is_active": True, "created_at": created_at} for i in range(sizes["branches"])]
+    godowns = [{"id": gen.uid(), "name": f"Godown {i + 1}", "address": "", "created_at": created_at}
+               for i in range(sizes["godowns"])]
+    await db.branches.insert_many([dict(b) for b in branches])
+    await db.godowns.insert_many([dict(g) for g in godowns])
+
+    hashed = get_password_hash(PASSWORD)
+    users = [{"id": gen.uid(), "email": ADMIN_EMAIL, "full_name": "Bench Admin", "role": "admin",
+              "branch_id": None, "is_active": True, "hashed_password": hashed, "created_at": created_at}]
+    for n, branch in enumerate(branches, start=1):
+        users.append({"id": gen.uid(), "email": RECEPTION_EMAIL.format(n=n), "full_name": f"Reception {n}",
+                      "role": "receptionist", "branch_id": branch["id"], "is_active": True,
+                      "hashed_password": hashed, "created_at": created_at})
+    await db.users.insert_many([dict(u) for u in users])
+    log(f"  {len(branches)} branches, {len(godowns)} godowns, {len(users)} users")
+
+    # Patients
+    patient_ids: List[str] = []
+
+    def patients():
+        for i in range(sizes["patients"]):
+            doc = {"id": gen.uid(), "patient_id": f"P{i + 1:07d}", "prefix": None, "name": gen.name(),
+                   "phone": f"9{rng.randint(0, 999_999_999):09d}", "gender": rng.choice(["Male", "Female"]),
+                   "age": rng.randint(1, 90), "address": "", "branch_id": rng.choice(branches)["id"],
+                   "created_at": gen.timestamp()}
+            doc["search"] = patient_search.search_fields(doc)
+            patient_ids.append(doc["id"])
+            yield doc
+
+    counts["patients"] = await _insert_stream(db.patients, patients(), chunk_size)
+    log(f"  {counts['patients']} patients")
+
+    # Item master and medicine batches
+    item_names = [f"Medicine {i + 1:04d}" for i in range(sizes["item_names"])]
+    prices = {name: round(rng.uniform(5, 500), 2) for name in item_names}
+    item_master = [{"id": gen.uid(), "name": name, "purpose": "for_sale", "item_status": "ACTIVE", "mrp": prices[name],
+                    "gst_percentage": 12, "low_stock_warning_enabled": rng.random() < 0.3,
+                    "low_stock_threshold": rng.choice([5, 10, 20]), "min_stock_level": 10, "created_at": created_at}
+                   for name in item_names]
+    await db.item_master.insert_many(item_master)
+
+    locations = [("branch", b["id"]) for b in branches] + [("godown", g["id"]) for g in godowns]
+
+    def batches():
+        for i in range(sizes["medicine_batches"]):
+            name = item_names[i % len(item_names)]
+            # Each pass over the item names stocks the next location, so every
+            # location carries every item once batches >= items x locations
+            kind, location_id = locations[(i // len(item_names)) % len(locations)]
+            mrp = prices[name]
+            expiry = anchor + timedelta(days=rng.randint(30, 900))
+            yield {"id": gen.uid(), "name": name, "category": "General", "batch_number": f"B{i + 1:06d}",
+                   "expiry_date": expiry.isoformat(), "purchase_price": round(mrp * 0.7, 2), "mrp": mrp,
+                   "sales_price": mrp, "unit_price": mrp, "discount_percentage": 0,
+                   "stock_quantity": rng.randint(0, 500), "min_stock_level": 10,
+                   "branch_id": location_id if kind == "branch" else None,
+                   "godown_id": location_id if kind == "godown" else None,
+                   "purpose": "for_sale", "gst_percentage": 12.0, "item_status": "ACTIVE", "created_at": created_at}
+
+    counts["medicines"] = await _insert_stream(db.medicines, batches(), chunk_size)
+    log(f"  {len(item_names)} items, {counts['medicines']} medicine batches")
+
+    supplier_id = gen.uid()
+    await db.suppliers.insert_one({"id": supplier_id, "name": "Bench Supplier", "created_at": created_at})
+
+    def purchase_entries():
+        for i in range(sizes["purchase_entries"]):
+            godown = rng.choice(godowns)
+            items = []
+            for _ in range(PURCHASE_ITEMS):
+                name = rng.choice(item_names)
+                qty = rng.randint(10, 200)
+                items.append({"item_name": name, "batch_number": f"PB{i + 1:05d}{len(items)}", "quantity": qty,
+                              "free_quantity": 0, "mrp": prices[name], "purchase_price": round(prices[name] * 0.7, 2),
+                              "expiry_date": (anchor + timedelta(days=rng.randint(60, 900))).isoformat(),
+                              "gst_percentage": 12, "total": round(qty * prices[name] * 0.7, 2)})
+            total = round(sum(item["total"] for item in items), 2)
+            stamp = gen.timestamp()
+            yield {"id": gen.uid(), "supplier_id": supplier_id, "supplier_name": "Bench Supplier",
+                   "invoice_number": f"INV{i + 1:06d}", "invoice_date": stamp[:10],
+                   "items_received_date": None if rng.random() < 0.05 else stamp[:10],
+                   "total_amount": total, "paid_amount": total, "pending_amount": 0, "payment_status": "paid",
+                   "payment_mode": "cash", "items": items, "branch_id": None, "godown_id": godown["id"],
+                   "created_by": users[0]["id"], "created_at": stamp}
+
+    counts["purchase_entries"] = await _insert_stream(db.purchase_entries, purchase_entries(), chunk_size)
+    log(f"  {counts['purchase_entries']} purchase entries")
+
+    doctors = [{"id": gen.uid(), "name": f"Dr. {gen.name()}", "branch_id": b["id"], "created_at": created_at} for b in branches]
+    await db.doctors.insert_many([dict(d) for d in doctors])
+
+    def bills():
+        for i in range(sizes["bills"]):
+            branch = rng.choice(branches)
+            doctor = rng.choice(doctors)
+            amount = float(rng.choice([300, 500, 800, 1200, 2500, 4000]))
+            paid = amount if rng.random() < 0.9 else round(amount * rng.choice([0, 0.5]), 2)
+            yield {"id": gen.uid(), "bill_number": f"BL{i + 1:08d}", "patient_id": rng.choice(patient_ids),
+                   "patient_name": gen.name(), "services": [{"name": "Consultation", "quantity": 1, "rate": amount, "total": amount}],
+                   "subtotal": amount, "gst_amount": 0, "discount": 0, "total_amount": amount, "paid_amount": paid,
+                   "balance_amount": round(amount - paid, 2), "payment_mode": rng.choice(PAYMENT_MODES),
+                   "payment_status": "paid" if paid >= amount else "partial", "branch_id": branch["id"],
+                   "branch_name": branch["name"], "doctor_id": doctor["id"], "doctor_name": doctor["name"],
+                   "is_temporary": False, "created_by": users[0]["id"], "created_at": gen.timestamp()}
+
+    counts["bills"] = await _insert_stream(db.bills, bills(), chunk_size)
+    log(f"  {counts['bills']} bills")
+
+    def sales():
+        for i in range(sizes["pharmacy_sales"]):
+            branch = rng.choice(branches)
+            items = []
+            for _ in range(rng.randint(1, 4)):
+                name = rng.choice(item_names)
+                qty = rng.randint(1, 10)
+                items.append({"medicine_name": name, "name": name, "quantity": qty, "unit_price": prices[name],
+                              "total": round(qty * prices[name], 2)})
+            total = round(sum(item["total"] for item in items), 2)
+            yield {"id": gen.uid(), "patient_id": rng.choice(patient_ids) if rng.random() < 0.7 else None,
+                   "patient_name": gen.name(), "items": items, "subtotal": total, "gst_amount": 0, "discount": 0,
+                   "total_amount": total, "paid_amount": total, "balance_amount": 0,
+                   "payment_mode": rng.choice(PAYMENT_MODES), "branch_id": branch["id"], "branch_name": branch["name"],
+                   "created_by": users[0]["id"], "created_at": gen.timestamp()}
+
+    counts["pharmacy_sales"] = await _insert_stream(db.pharmacy_sales, sales(), chunk_size)
+    log(f"  {counts['pharmacy_sales']} pharmacy sales")
+
+    def expenses():
+        for _ in range(sizes["expenses"]):
+            stamp = gen.timestamp()
+            yield {"id": gen.uid(), "category": rng.choice(["Rent", "Salary", "Supplies", "Utilities", "Other"]),
+                   "description": "Synthetic expense", "amount": float(rng.randint(100, 20000)),
+                   "date": stamp[:10], "branch_id": rng.choice(branches)["id"], "payment_mode": "cash",
+                   "created_by": users[0]["id"], "created_at": stamp}
+
+    counts["expenses"] = await _insert_stream(db.expenses, expenses(), chunk_size)
+    log(f"  {counts['expenses']} expenses")
+
+    walkins = []
+    today_start = datetime.combine(anchor, time(hour=9), tzinfo=timezone.utc)
+    for branch in branches:
+        for n in range(sizes["walkins_per_branch"]):
+            check_in = (today_start + timedelta(minutes=5 * n)).isoformat()
+            walkins.append({"id": gen.uid(), "patient_id": rng.choice(patient_ids), "patient_name": gen.name(),
+                            "patient_phone": f"9{rng.randint(0, 999_999_999):09d}", "branch_id": branch["id"],
+                            "branch_name": branch["name"], "check_in_time": check_in,
+                            "status": rng.choice(["waiting", "with_doctor", "ready_for_billing", "completed"]),
+                            "paid_amount": 0, "created_at": check_in})
+    await db.walkins.insert_many(walkins)
+    counts["walkins"] = len(walkins)
+
+    log("  building indexes and derived collections...")
+    await indexes.ensure_indexes(db)
+    await stock_ledger.rebuild(db)
+    await patient_balances.rebuild(db)
+    await rollups.backfill(db)
+    await patient_search.backfill(db)
+
+    return {
+        "seed": seed,
+        "scale": scale,
+        "anchor": anchor.isoformat(),
+        "counts": counts,
+        "branch_ids": [b["id"] for b in branches],
+        "branch_names": {b["id"]: b["name"] for b in branches},
+        "godown_ids": [g["id"] for g in godowns],
+        "godown_names": {g["id"]: g["name"] for g in godowns},
+        "item_names": item_names,
+        "patient_ids": patient_ids[:1000],
+        "reception_emails": [RECEPTION_EMAIL.format(n=n) for n in range(1, len(branches) + 1)],
+    }
@@ -0,0 +1,128 @@
+"""Benchmark scenarios.
+
+Each scenario is an async callable ``(client, ctx, rng) -> (status, elapsed_ms)``
+making one request; ``run_scenario`` runs it ``iterations`` times with
+``concurrency`` requests in flight. ``ctx`` is the dict returned by
+``datagen.seed`` plus the tokens logged in by ``run_suite``.
+"""
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from benchmarks.suite.client import AsgiClient
+from benchmarks.suite.stats import summarize
+
+
+@dataclass
+class Scenario:
+    name: str
+    call: Callable[[AsgiClient, dict, random.Random], Awaitable[Tuple[int, float]]]
+    concurrency: int
+    iterations: int
+    # Token key in ctx: "admin" or "reception"
+    role: str = "admin"
+
+
+def _client(client: AsgiClient, ctx: dict, role: str, rng: random.Random) -> Tuple[AsgiClient, str]:
+    """Client for a role plus the branch it works in."""
+    if role == "reception":
+        index = rng.randrange(len(ctx["branch_ids"]))
+        return client.with_token(ctx["tokens"]["reception"][index]), ctx["branch_ids"][index]
+    return client.with_token(ctx["tokens"]["admin"]), rng.choice(ctx["branch_ids"])
+
+
+async def walkin_queue(client, ctx, rng):
+    client, branch_id = _client(client, ctx, "reception", rng)
+    status, _, elapsed = await client.get("/api/walkins", branch_id=branch_id)
+    return status, elapsed
+
+
+async def pharmacy_sale(client, ctx, rng):
+    client, branch_id = _client(client, ctx, "reception", rng)
+    items = [{"medicine_name": name, "quantity": 1} for name in rng.sample(ctx["item_names"], 2)]
+    status, _, elapsed = await client.post("/api/pharmacy-sales", {
+        "patient_name": "Bench Walk-in", "items": items, "subtotal": 0, "total_amount": 0,
+        "payment_mode": "cash", "branch_id": branch_id,
+    })
+    return status, elapsed
+
+
+async def stock_transfer(client, ctx, rng):
+    client, branch_id = _client(client, ctx, "admin", rng)
+    godown_id = rng.choice(ctx["godown_ids"])
+    items = [{"item_name": name, "quantity": 1} for name in rng.sample(ctx["item_names"], 3)]
+    status, _, elapsed = await client.post("/api/stock-transfers", {
+        "transfer_date": ctx["anchor"], "transfer_type": "godown_to_branch", "items": items,
+        "from_type": "godown", "from_id": godown_id, "from_name": ctx["godown_names"][godown_id],
+        "to_type": "branch", "to_id": branch_id, "to_name": ctx["branch_names"][branch_id],
+    })
+    return status, elapsed
+
+
+async def daily_report(client, ctx, rng):
+    client, branch_id = _client(client, ctx, "admin", rng)
+    status, _, elapsed = await client.get("/api/daily-report", date=ctx["anchor"], branch_ids=branch_id)
+    return status, elapsed
+
+
+async def comprehensive_report(client, ctx, rng):
+    client, _ = _client(client, ctx, "admin", rng)
+    end = date.fromisoformat(ctx["anchor"])
+    start = end - timedelta(days=30)
+    status, _, elapsed = await client.get("/api/reports/comprehensive", start_date=start.isoformat(), end_date=end.isoformat())
+    return status, elapsed
+
+
+async def low_stock_summary(client, ctx, rng):
+    client, _ = _client(client, ctx, "admin", rng)
+    status, _, elapsed = await client.get("/api/reports/low-stock-summary")
+    return status, elapsed
+
+
+async def patient_search(client, ctx, rng):
+    client, _ = _client(client, ctx, "reception", rng)
+    status, _, elapsed = await client.get("/api/patients/search", q=rng.choice(["Sharma", "Meera R", "P00012", "98"]))
+    return status, elapsed
+
+
+async def patient_search_typo(client, ctx, rng):
+    # Misspelt names find no prefix hit and take the trigram fallback
+    client, _ = _client(client, ctx, "reception", rng)
+    status, _, elapsed = await client.get("/api/patients/search", q=rng.choice(["Sharmma", "Meeraa Iyre", "Vikrm Nayr", "Lakshmy"]))
+    return status, elapsed
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario("walkin_queue", walkin_queue, concurrency=20, iterations=400),
+    Scenario("patient_search", patient_search, concurrency=10, iterations=300),
+    Scenario("patient_search_typo", patient_search_typo, concurrency=10, iterations=200),
+    Scenario("pharmacy_sale_burst", pharmacy_sale, concurrency=20, iterations=400),
+    Scenario("stock_transfer", stock_transfer, concurrency=4, iterations=100),
+    Scenario("daily_report", daily_report, concurrency=4, iterations=60),
+    Scenario("comprehensive_report", comprehensive_report, concurrency=2, iterations=20),
+    Scenario("low_stock_summary", low_stock_summary, concurrency=4, iterations=40),
+]
+
+
+async def run_scenario(scenario: Scenario, client: AsgiClient, ctx: dict, seed: int, scale: float = 1.0) -> Dict:
+    """Run one scenario; ``scale`` multiplies its iteration count."""
+    rng = random.Random(f"{seed}:{scenario.name}")
+    iterations = max(1, int(scenario.iterations * scale))
+    latencies: List[float] = []
+    errors = 0
+    remaining = iter(range(iterations))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            status, elapsed = await scenario.call(client, ctx, rng)
+            latencies.append(elapsed)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(scenario.concurrency)))
+    return summarize(scenario.name, latencies, time.perf_counter() - started, errors)
@@ -0,0 +1,52 @@
+"""Latency percentiles and baseline comparison."""
+import json
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def percentile(values: List[float], pct: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    idx = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+def summarize(name: str, latencies_ms: List[float], elapsed_s: float, errors: int) -> dict:
+    return {
+        "scenario": name,
+        "requests": len(latencies_ms),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+        "max_ms": round(max(latencies_ms) if latencies_ms else 0.0, 2),
+        "throughput_rps": round(len(latencies_ms) / elapsed_s, 2) if elapsed_s else 0.0,
+    }
+
+
+def load_baseline(path: Path) -> Optional[Dict[str, dict]]:
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def save_baseline(path: Path, results: List[dict], meta: dict):
+    data = {"meta": meta, "scenarios": {r["scenario"]: r for r in results}}
+    path.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n")
+
+
+def regressions(results: List[dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Scenarios whose p95 grew or throughput fell by more than ``threshold`` (0.25 = 25%)."""
+    problems = []
+    for result in results:
+        base = baseline.get("scenarios", {}).get(result["scenario"])
+        if not base:
+            continue
+        if result["errors"] > base.get("errors", 0):
+            problems.append(f"{result['scenario']}: {result['errors']} errors (baseline {base.get('errors', 0)})")
+        if base["p95_ms"] and result["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            problems.append(f"{result['scenario']}: p95 {result['p95_ms']}ms vs baseline {base['p95_ms']}ms")
+        if base["throughput_rps"] and result["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            problems.append(f"{result['scenario']}: {result['throughput_rps']} req/s vs baseline {base['throughput_rps']} req/s")
+    return problems
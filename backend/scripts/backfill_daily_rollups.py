@@ -0,0 +1,29 @@
+import sys
+import asyncio
+from pathlib import Path
+
+# Allow importing server.py and utils/ from the backend directory
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import server
+from utils import rollups
+
+
+async def main():
+    print("Backfilling daily_rollups from bills, pharmacy sales and expenses...")
+    summary = await rollups.backfill(server.db)
+    print(f"Wrote {summary['rows']} daily rollups")
+    print("Verifying against bills, pharmacy sales and expenses...")
+    try:
+        report = await rollups.check_backfill(server.db)
+        print(f"  OK ({report['days']} branch-days)")
+    except rollups.RollupDriftError as e:
+        print(f"  MISMATCH: {e}")
+        return 1
+    finally:
+        server.client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
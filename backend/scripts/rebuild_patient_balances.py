@@ -0,0 +1,30 @@
+import sys
+import asyncio
+from pathlib import Path
+
+# Allow importing server.py and utils/ from the backend directory
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import server
+from utils import patient_balances
+
+
+async def main():
+    print("Rebuilding patient_balances from bills and pharmacy sales...")
+    summary = await patient_balances.rebuild(server.db)
+    print(f"Rebuilt {summary['rows']} patient balances from {summary['sources']['bills']} bills "
+          f"and {summary['sources']['pharmacy_sales']} pharmacy sales")
+    print("Verifying against bills and pharmacy sales...")
+    try:
+        report = await patient_balances.check_rebuild(server.db)
+        print(f"  OK ({report['patients']} patients)")
+    except patient_balances.BalanceDriftError as e:
+        print(f"  MISMATCH: {e}")
+        return 1
+    finally:
+        server.client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,41 @@
+import sys
+import asyncio
+import argparse
+from pathlib import Path
+
+# Allow importing server.py and utils/ from the backend directory
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import server
+from utils import stock_ledger
+
+
+async def main(verify_only: bool):
+    if not verify_only:
+        print("Rebuilding stock_levels from medicines and pending purchase entries...")
+        summary = await stock_ledger.rebuild(server.db)
+        print(f"Rebuilt {summary['rows']} rows from {summary['sources']['medicines']} medicines "
+              f"and {summary['sources']['purchase_entries']} pending purchase entries")
+
+    print("Verifying stock_levels against a full rescan...")
+    report = await server.verify_stock_levels()
+    for view, result in report["views"].items():
+        status = "OK" if result["matches"] else "MISMATCH"
+        print(f"  {view}: {status} (scan={result['expected_entries']}, ledger={result['actual_entries']}, "
+              f"missing={result['missing_count']}, extra={result['extra_count']}, qty_diff={result['mismatched_count']})")
+        for m in result["mismatched"][:10]:
+            print(f"    {m['key']}: scan={m['expected']} ledger={m['actual']}")
+
+    if not verify_only and not report["matches"]:
+        # Writes landed during the rebuild: stop serving reads from the ledger
+        await stock_ledger.mark_stale(server.db, stock_ledger.drift_counts(report["views"]))
+        print("Ledger marked stale; stock reads use the rescan until the next rebuild")
+    server.client.close()
+    return 0 if report["matches"] else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild and verify the stock_levels ledger")
+    parser.add_argument("--verify-only", action="store_true", help="Only compare the ledger with a full rescan")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.verify_only)))
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Query, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
@@ -10,31 +10,43 @@ import logging
 import uuid
 import shutil
 import base64
-import bcrypt
+import re
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional, Union
 from datetime import datetime, timezone, timedelta
 from jose import JWTError, jwt
+from pymongo import ReturnDocument
 
 ROOT_DIR = Path(__file__).parent
 UPLOAD_DIR = ROOT_DIR / "uploads"
 UPLOAD_DIR.mkdir(exist_ok=True)
 load_dotenv(ROOT_DIR / '.env')
 
+# Imported after load_dotenv so modules can read their settings from .env
+from utils import stock_ledger, fefo, indexes, patient_balances, reports, rollups, patient_search, bulk_import, maintenance, report_cache, unit_of_work, sequences, conditional, change_log, fast_json, projection
+from utils.jobs import job_runner
+from utils.metrics import MetricsMiddleware, MongoCommandListener, registry as metrics_registry
+from utils import profiler
+from utils.pagination import PageParams, page_params, paginate, encode_cursor, decode_cursor, NEXT_CURSOR_HEADER, MAX_PAGE_SIZE
+from utils.projection import FieldSelection, field_params
+from utils.user_cache import user_cache
+from utils.catalog import catalog
+from utils.auth import verify_password_async, get_password_hash_async, shutdown_password_executor
+
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandListener(), profiler.ProfileCommandListener()])
 db = client[os.environ['DB_NAME']]
 
-app = FastAPI()
+app = FastAPI(default_response_class=fast_json.response_class())
 
 @app.on_event("startup")
 async def startup_db_client():
-    await db.patients.create_index("phone", name="patient_phone_idx")
-    await db.patients.create_index("patient_id", name="patient_id_idx")
-    await db.walkins.create_index("id", unique=True)
-    await db.walkins.create_index([("branch_id", 1), ("status", 1)])
-    await db.walkins.create_index([("patient_id", 1), ("status", 1)])
+    summary = await indexes.ensure_indexes(db)
+    if summary["created"]:
+        logger.info(f"Created indexes: {', '.join(summary['created'])}")
+    await profiler.ensure_collection(db)
+    await job_runner.start(db)
 
 # CORS - Must be added before routes
 app.add_middleware(
@@ -43,7 +55,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Last-Modified", conditional.TOTAL_COUNT_HEADER],
 )
+app.add_middleware(profiler.ProfilingMiddleware, db=db)
+# Outermost, so latency includes CORS handling and every response is counted
+app.add_middleware(MetricsMiddleware)
 
 api_router = APIRouter(prefix="/api")
 
@@ -56,14 +72,6 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 1440
 
 security = HTTPBearer()
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against a hash using bcrypt directly."""
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
-
-def get_password_hash(password: str) -> str:
-    """Hash a password using bcrypt directly."""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -78,7 +86,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid authentication")
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
+        user = await user_cache.get(db, user_id)
         if user is None:
             raise HTTPException(status_code=401, detail="User not found")
         return user
@@ -591,6 +599,7 @@ class BankTransaction(BaseModel):
     invoice_number: Optional[str] = None
     is_manual: bool = False  # True if manually added by admin
     purpose_type: Optional[str] = "professional"  # professional or personal - affects P&L
+    branch_id: Optional[str] = None  # Branch of the bill/sale/purchase, for branch reports
     created_at: str
 
 class BankTransactionCreate(BaseModel):
@@ -610,6 +619,7 @@ class BankTransactionCreate(BaseModel):
     invoice_number: Optional[str] = None
     is_manual: bool = False
     purpose_type: Optional[str] = "professional"  # professional or personal
+    branch_id: Optional[str] = None
 
 # Dental Lab Models
 class DentalLab(BaseModel):
@@ -1095,7 +1105,7 @@ async def register(user_data: UserCreate):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     user_id = str(uuid.uuid4())
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     
     user_dict = {
         "id": user_id,
@@ -1121,7 +1131,7 @@ async def register(user_data: UserCreate):
 @api_router.post("/auth/login", response_model=LoginResponse)
 async def login(login_data: LoginRequest):
     user = await db.users.find_one({"email": login_data.email})
-    if not user or not verify_password(login_data.password, user["hashed_password"]):
+    if not user or not await verify_password_async(login_data.password, user["hashed_password"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     access_token = create_access_token(data={"sub": user["id"]})
@@ -1157,13 +1167,14 @@ async def update_user(user_id: str, user_data: UserUpdate, current_user: dict =
     
     # Hash password if provided
     if "password" in update_dict and update_dict["password"]:
-        update_dict["hashed_password"] = get_password_hash(update_dict["password"])
+        update_dict["hashed_password"] = await get_password_hash_async(update_dict["password"])
         del update_dict["password"]
     
     if not update_dict:
         raise HTTPException(status_code=400, detail="No fields to update")
     
     await db.users.update_one({"id": user_id}, {"$set": update_dict})
+    await user_cache.invalidate(db, user_id)
     user = await db.users.find_one({"id": user_id}, {"_id": 0, "hashed_password": 0})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -1180,6 +1191,7 @@ async def toggle_user_status(user_id: str, current_user: dict = Depends(get_curr
     
     new_status = not user.get("is_active", True)
     await db.users.update_one({"id": user_id}, {"$set": {"is_active": new_status}})
+    await user_cache.invalidate(db, user_id)
     
     return {"message": f"User {'activated' if new_status else 'deactivated'} successfully", "is_active": new_status}
 
@@ -1194,6 +1206,7 @@ async def delete_user(user_id: str, current_user: dict = Depends(get_current_use
     result = await db.users.delete_one({"id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    await user_cache.invalidate(db, user_id)
     return {"message": "User deleted successfully"}
 
 # Direct Stock Addition endpoint
@@ -1235,6 +1248,7 @@ async def add_direct_stock(stock_data: DirectStockEntry, current_user: dict = De
     }
     
     await db.medicines.insert_one(medicine_dict)
+    await stock_ledger.apply_deltas(db, [stock_ledger.medicine_delta(medicine_dict, stock_data.stock_quantity)])
     
     # Also add to item master
     existing_item = await db.item_master.find_one({"name": stock_data.name})
@@ -1247,9 +1261,38 @@ async def add_direct_stock(stock_data: DirectStockEntry, current_user: dict = De
             "created_at": datetime.now(timezone.utc).isoformat()
         }
         await db.item_master.insert_one(item_master_dict)
+        await catalog.bump(db, "item_master")
     
     return {"message": "Stock added successfully", "medicine_id": medicine_id}
 
+async def conditional_get(request: Request, response: Response, current_user: dict, *collections: str) -> Optional[Response]:
+    """Set ETag/Last-Modified for a master list; a bodyless 304 when the client's copy is current."""
+    await catalog.sync(db)
+    etag = catalog.etag(*collections, vary=f"{current_user['id']}?{request.url.query}")
+    modified = catalog.last_modified(*collections)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if modified:
+        headers["Last-Modified"] = conditional.http_date(modified)
+    response.headers.update(headers)
+    if conditional.is_fresh(request.headers, etag, modified):
+        return Response(status_code=304, headers=headers)
+    return None
+
+def since_param(since: Optional[str] = Query(None, description="ISO timestamp; only rows created or updated after it")) -> Optional[datetime]:
+    if since is None:
+        return None
+    parsed = conditional.parse_timestamp(since)
+    if parsed is None:
+        raise HTTPException(status_code=400, detail="Invalid since timestamp")
+    return parsed
+
+def changed_rows(rows: List[dict], since: Optional[datetime], response: Response) -> List[dict]:
+    """``rows`` or, with ``since``, the ones changed after it (X-Total-Count has the full size)."""
+    if since is None:
+        return rows
+    response.headers[conditional.TOTAL_COUNT_HEADER] = str(len(rows))
+    return [row for row in rows if conditional.changed_since(row, since)]
+
 @api_router.post("/branches", response_model=Branch)
 async def create_branch(branch_data: BranchCreate, current_user: dict = Depends(get_current_user)):
     if current_user["role"] not in ["admin"]:
@@ -1263,10 +1306,14 @@ async def create_branch(branch_data: BranchCreate, current_user: dict = Depends(
     }
     
     await db.branches.insert_one(branch_dict)
+    await catalog.bump(db, "branches")
     return Branch(**branch_dict)
 
 @api_router.get("/branches", response_model=List[Branch])
-async def get_branches(current_user: dict = Depends(get_current_user)):
+async def get_branches(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    not_modified = await conditional_get(request, response, current_user, "branches")
+    if not_modified is not None:
+        return not_modified
     branches = await db.branches.find({}, {"_id": 0}).to_list(1000)
     return branches
 
@@ -1280,6 +1327,7 @@ async def update_branch(branch_id: str, branch_data: BranchCreate, current_user:
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
     
     await db.branches.update_one({"id": branch_id}, {"$set": update_data})
+    await catalog.bump(db, "branches")
     updated = await db.branches.find_one({"id": branch_id}, {"_id": 0})
     return Branch(**updated)
 
@@ -1290,8 +1338,32 @@ async def delete_branch(branch_id: str, current_user: dict = Depends(get_current
         raise HTTPException(status_code=404, detail="Branch not found")
     
     await db.branches.delete_one({"id": branch_id})
+    await catalog.bump(db, "branches")
     return {"message": "Branch deleted successfully"}
 
+@api_router.get("/sync")
+async def sync_changes(
+    cursor: Optional[str] = Query(None, description="Cursor from the previous /sync response"),
+    collections: Optional[str] = Query(None, description="Comma-separated synced collections (default: all)"),
+    branch_id: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=change_log.MAX_PAGE_SIZE),
+    current_user: dict = Depends(get_current_user)
+):
+    """Documents created/updated and ids deleted since ``cursor``, per collection.
+
+    Without a cursor, returns a starting cursor with ``resync: true``: take it,
+    load the full lists, then pull with it. Repeat while ``has_more``.
+    """
+    names = [name.strip() for name in collections.split(",") if name.strip()] if collections else list(change_log.SYNCED)
+    unknown = [name for name in names if name not in change_log.SYNCED]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Not synced: {', '.join(unknown)}")
+    if not branch_id and current_user["role"] == "branch_manager" and current_user.get("branch_id"):
+        branch_id = current_user["branch_id"]
+    if not cursor:
+        return {"cursor": change_log.start_cursor(), "has_more": False, "resync": True, "changes": {}}
+    return await change_log.changes(db, cursor, names, limit, branch_id)
+
 @api_router.post("/patients", response_model=Patient)
 async def create_patient(patient_data: PatientCreate, current_user: dict = Depends(get_current_user)):
     # Check if patient_id already exists
@@ -1305,23 +1377,44 @@ async def create_patient(patient_data: PatientCreate, current_user: dict = Depen
         **patient_data.model_dump(),
         "created_at": datetime.now(timezone.utc).isoformat()
     }
+    patient_dict["search"] = patient_search.search_fields(patient_dict)
     
     await db.patients.insert_one(patient_dict)
+    await change_log.record(db, "patients", change_log.CREATED, [internal_id])
     return Patient(**patient_dict)
 
 @api_router.get("/patients", response_model=List[Patient])
-async def get_patients(branch_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+async def get_patients(response: Response, page: PageParams = Depends(page_params), branch_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
     query = {}
     if branch_id:
         query["branch_id"] = branch_id
     # All users can view all patients - no branch restriction
     
-    patients = await db.patients.find(query, {"_id": 0}).to_list(1000)
+    docs = await paginate(db.patients, query, "created_at", 1, page, response, default_limit=1000, projection=patient_search.PROJECTION)
+    return fast_json.trusted(docs, response, Patient)
+
+# Declared before /patients/{patient_id} so "search" is not captured as an id
+@api_router.get("/patients/search", response_model=List[Patient])
+async def search_patients(q: str, limit: int = Query(100, ge=1, le=100), current_user: dict = Depends(get_current_user)):
+    # Search across all patients by name, phone, or patient_id
+    if await patient_search.is_ready(db):
+        return await patient_search.search(db, q, limit=limit)
+
+    # Search fields not backfilled yet: unindexed regex scan
+    pattern = re.escape(q)
+    query = {
+        "$or": [
+            {"name": {"$regex": pattern, "$options": "i"}},
+            {"phone": {"$regex": pattern}},
+            {"patient_id": {"$regex": pattern, "$options": "i"}}
+        ]
+    }
+    patients = await db.patients.find(query, patient_search.PROJECTION).to_list(limit)
     return patients
 
 @api_router.get("/patients/{patient_id}")
 async def get_patient(patient_id: str, current_user: dict = Depends(get_current_user)):
-    patient = await db.patients.find_one({"id": patient_id}, {"_id": 0})
+    patient = await db.patients.find_one({"id": patient_id}, patient_search.PROJECTION)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     return patient
@@ -1338,11 +1431,15 @@ async def update_patient(patient_id: str, patient_data: PatientUpdate, current_u
         if existing:
             raise HTTPException(status_code=400, detail="Patient ID already exists")
     
-    result = await db.patients.update_one({"id": patient_id}, {"$set": update_dict})
-    if result.matched_count == 0:
+    updated = await db.patients.find_one_and_update(
+        {"id": patient_id}, {"$set": update_dict}, projection=patient_search.PROJECTION, return_document=ReturnDocument.AFTER
+    )
+    if not updated:
         raise HTTPException(status_code=404, detail="Patient not found")
     
-    updated = await db.patients.find_one({"id": patient_id}, {"_id": 0})
+    # Keep search fields in step with name/phone/patient_id changes
+    await db.patients.update_one({"id": patient_id}, {"$set": {"search": patient_search.search_fields(updated)}})
+    await change_log.record(db, "patients", change_log.UPDATED, [patient_id])
     return updated
 
 @api_router.delete("/patients/{patient_id}")
@@ -1353,23 +1450,26 @@ async def delete_patient(patient_id: str, current_user: dict = Depends(get_curre
     result = await db.patients.delete_one({"id": patient_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Patient not found")
+    await change_log.record(db, "patients", change_log.DELETED, [patient_id])
     return {"message": "Patient deleted successfully"}
 
-@api_router.get("/patients/search", response_model=List[Patient])
-async def search_patients(q: str, current_user: dict = Depends(get_current_user)):
-    # Search across all patients by name, phone, or patient_id
-    query = {
-        "$or": [
-            {"name": {"$regex": q, "$options": "i"}},
-            {"phone": {"$regex": q}},
-            {"patient_id": {"$regex": q, "$options": "i"}}
-        ]
-    }
-    patients = await db.patients.find(query, {"_id": 0}).to_list(100)
-    return patients
+async def sync_billing_side_effects(collection: str, before: Optional[dict], after: Optional[dict], uow: Optional[unit_of_work.UnitOfWork] = None):
+    """
+    Keep derived billing data in step with a bill, pharmacy sale or expense write.
+    `before`/`after` are the document before and after the write (None for create/delete).
+    Inside a unit of work the derived writes join its transaction.
+    """
+    session = uow.session if uow else None
+    await patient_balances.apply_change(db, collection, before, after, session=session)
+    await rollups.apply_change(db, collection, before, after, session=session)
+    await unit_of_work.defer(uow, report_cache.invalidate, db, collection, before, after)
 
 async def get_patient_financial_snapshot(patient_id: str, external_id: Optional[str] = None):
     """Calculate pending fees and previous balances for a patient."""
+    if await patient_balances.is_ready(db):
+        docs = await patient_balances.load(db, [patient_id, external_id])
+        return patient_balances.snapshot(docs.values())
+
     today = datetime.now(timezone.utc).date()
     
     # Query all bills and pharmacy sales for this patient using both internal and external IDs
@@ -1503,7 +1603,7 @@ async def get_walkins(
     
     # Enhance with financial snapshot - Optimized Bulk Approach
     patient_ids_uuid = list(set(w["patient_id"] for w in walkins))
-    patients = await db.patients.find({"id": {"$in": patient_ids_uuid}}).to_list(len(patient_ids_uuid) + 10)
+    patients = await db.patients.find({"id": {"$in": patient_ids_uuid}}, {"_id": 0, "id": 1, "patient_id": 1}).to_list(len(patient_ids_uuid) + 10)
     id_map = {p["id"]: p.get("patient_id") for p in patients}
     
     # Collect all IDs to search for bills (UUIDs and external IDs)
@@ -1511,6 +1611,17 @@ async def get_walkins(
     for ext_id in id_map.values():
         if ext_id:
             search_ids.add(ext_id)
+
+    # Precomputed balances: one indexed lookup for the whole queue
+    if await patient_balances.is_ready(db):
+        balances = await patient_balances.load(db, search_ids)
+        today_str = datetime.now(timezone.utc).date().isoformat()
+        enhanced_walkins = []
+        for w in walkins:
+            active_ids = {w["patient_id"], id_map.get(w["patient_id"])}
+            docs = [balances[i] for i in active_ids if i in balances]
+            enhanced_walkins.append({**w, **patient_balances.snapshot(docs, today_str)})
+        return enhanced_walkins
             
     # Bulk fetch all relevant bills and sales
     all_bills = await db.bills.find({"patient_id": {"$in": list(search_ids)}}).to_list(5000)
@@ -1609,32 +1720,28 @@ async def checkout_walkin(walkin_id: str, checkout_data: dict, current_user: dic
     await db.walkins.update_one({"id": walkin_id}, {"$set": update_dict})
     return {"message": "Checkout completed successfully"}
 
+async def import_patients(patients: List[PatientCreate], progress=None) -> dict:
+    now = datetime.now(timezone.utc).isoformat()
+    rows = []
+    for idx, patient_data in enumerate(patients):
+        patient_dict = {"id": str(uuid.uuid4()), **patient_data.model_dump(), "created_at": now}
+        patient_dict["search"] = patient_search.search_fields(patient_dict)
+        rows.append((idx + 1, patient_dict))
+    async def log_created(docs):
+        await change_log.record(db, "patients", change_log.CREATED, [doc["id"] for doc in docs])
+
+    return await bulk_import.insert_rows(
+        db.patients, rows,
+        unique_field="patient_id", label_field="patient_id", duplicate_error="Patient ID already exists",
+        after_chunk=log_created, progress=progress
+    )
+
 @api_router.post("/patients/bulk-upload")
-async def bulk_upload_patients(patients: List[PatientCreate], current_user: dict = Depends(get_current_user)):
+async def bulk_upload_patients(patients: List[PatientCreate], background: bool = False, current_user: dict = Depends(get_current_user)):
     # All users can add patients
-    created = []
-    errors = []
-    
-    for idx, patient_data in enumerate(patients):
-        try:
-            # Check if patient_id already exists
-            existing = await db.patients.find_one({"patient_id": patient_data.patient_id})
-            if existing:
-                errors.append({"row": idx + 1, "patient_id": patient_data.patient_id, "error": "Patient ID already exists"})
-                continue
-            
-            internal_id = str(uuid.uuid4())
-            patient_dict = {
-                "id": internal_id,
-                **patient_data.model_dump(),
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-            await db.patients.insert_one(patient_dict)
-            created.append(patient_dict)
-        except Exception as e:
-            errors.append({"row": idx + 1, "patient_id": patient_data.patient_id, "error": str(e)})
-    
-    return {"created": len(created), "errors": errors}
+    if background:
+        return await job_runner.submit("bulk_import.patients", {"rows": len(patients)}, current_user["id"], payload=patients)
+    return await import_patients(patients)
 
 @api_router.post("/medicines", response_model=Medicine)
 async def create_medicine(medicine_data: MedicineCreate, current_user: dict = Depends(get_current_user)):
@@ -1646,6 +1753,7 @@ async def create_medicine(medicine_data: MedicineCreate, current_user: dict = De
     }
     
     await db.medicines.insert_one(medicine_dict)
+    await stock_ledger.apply_deltas(db, [stock_ledger.medicine_delta(medicine_dict, medicine_dict["stock_quantity"])])
     return Medicine(**medicine_dict)
 
 @api_router.get("/medicines", response_model=List[Medicine])
@@ -1662,33 +1770,37 @@ async def get_medicines(branch_id: Optional[str] = None, current_user: dict = De
 @api_router.put("/medicines/{medicine_id}", response_model=Medicine)
 async def update_medicine(medicine_id: str, medicine_data: MedicineCreate, current_user: dict = Depends(get_current_user)):
     medicine_dict = medicine_data.model_dump()
-    await db.medicines.update_one({"id": medicine_id}, {"$set": medicine_dict})
+    previous = await db.medicines.find_one_and_update(
+        {"id": medicine_id}, {"$set": medicine_dict}, projection={"_id": 0}
+    )
     
     updated_medicine = await db.medicines.find_one({"id": medicine_id}, {"_id": 0})
     if not updated_medicine:
         raise HTTPException(status_code=404, detail="Medicine not found")
+    await stock_ledger.apply_deltas(db, [
+        stock_ledger.medicine_delta(previous, -stock_ledger.safe_int(previous.get("stock_quantity"))),
+        stock_ledger.medicine_delta(updated_medicine, updated_medicine.get("stock_quantity"))
+    ])
     return Medicine(**updated_medicine)
 
+async def import_medicines(medicines: List[MedicineCreate], progress=None) -> dict:
+    now = datetime.now(timezone.utc).isoformat()
+    rows = [
+        (idx + 1, {"id": str(uuid.uuid4()), **medicine_data.model_dump(), "created_at": now})
+        for idx, medicine_data in enumerate(medicines)
+    ]
+
+    async def update_ledger(inserted):
+        await stock_ledger.apply_deltas(db, [stock_ledger.medicine_delta(m, m["stock_quantity"]) for m in inserted])
+
+    return await bulk_import.insert_rows(db.medicines, rows, label_field="name", after_chunk=update_ledger, progress=progress)
+
 @api_router.post("/medicines/bulk-upload")
-async def bulk_upload_medicines(medicines: List[MedicineCreate], current_user: dict = Depends(get_current_user)):
+async def bulk_upload_medicines(medicines: List[MedicineCreate], background: bool = False, current_user: dict = Depends(get_current_user)):
     """Bulk upload inventory/medicine items from CSV/Excel"""
-    created = []
-    errors = []
-    
-    for idx, medicine_data in enumerate(medicines):
-        try:
-            medicine_id = str(uuid.uuid4())
-            medicine_dict = {
-                "id": medicine_id,
-                **medicine_data.model_dump(),
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-            await db.medicines.insert_one(medicine_dict)
-            created.append(medicine_dict)
-        except Exception as e:
-            errors.append({"row": idx + 1, "name": medicine_data.name, "error": str(e)})
-    
-    return {"created": len(created), "errors": errors}
+    if background:
+        return await job_runner.submit("bulk_import.medicines", {"rows": len(medicines)}, current_user["id"], payload=medicines)
+    return await import_medicines(medicines)
 
 @api_router.post("/suppliers", response_model=Supplier)
 async def create_supplier(supplier_data: SupplierCreate, current_user: dict = Depends(get_current_user)):
@@ -1700,18 +1812,23 @@ async def create_supplier(supplier_data: SupplierCreate, current_user: dict = De
     }
     
     await db.suppliers.insert_one(supplier_dict)
+    await catalog.bump(db, "suppliers")
     return Supplier(**supplier_dict)
 
 @api_router.get("/suppliers", response_model=List[Supplier])
-async def get_suppliers(current_user: dict = Depends(get_current_user)):
+async def get_suppliers(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    not_modified = await conditional_get(request, response, current_user, "suppliers")
+    if not_modified is not None:
+        return not_modified
     suppliers = await db.suppliers.find({}, {"_id": 0}).to_list(1000)
     return suppliers
 
 @api_router.put("/suppliers/{supplier_id}", response_model=Supplier)
 async def update_supplier(supplier_id: str, supplier_data: SupplierCreate, current_user: dict = Depends(get_current_user)):
-    result = await db.suppliers.update_one({"id": supplier_id}, {"$set": supplier_data.model_dump()})
+    result = await db.suppliers.update_one({"id": supplier_id}, {"$set": {**supplier_data.model_dump(), "updated_at": datetime.now(timezone.utc).isoformat()}})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Supplier not found")
+    await catalog.bump(db, "suppliers")
     supplier = await db.suppliers.find_one({"id": supplier_id}, {"_id": 0})
     return Supplier(**supplier)
 
@@ -1720,175 +1837,135 @@ async def delete_supplier(supplier_id: str, current_user: dict = Depends(get_cur
     result = await db.suppliers.delete_one({"id": supplier_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Supplier not found")
+    await catalog.bump(db, "suppliers")
     return {"message": "Supplier deleted successfully"}
 
+async def allocate_stock_fefo(lines: List[dict], branch_id: Optional[str] = None, godown_id: Optional[str] = None, ref: Optional[str] = None, session=None):
+    """
+    Deduct stock for several lines at once using FEFO (First Expiry First Out) logic.
+    Each line is a dict with name, quantity and an optional batch_number.
+    All candidate batches are fetched in one query and all decrements are applied
+    in one guarded bulk write, re-planned a few times if a concurrent sale wins
+    the race. Returns one list of deducted batch details per line.
+    """
+    try:
+        plan, batches = await fefo.allocate(db, ref or str(uuid.uuid4()), lines, branch_id=branch_id, godown_id=godown_id, session=session)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except fefo.InsufficientStockError as e:
+        if e.available <= 0:
+            raise HTTPException(status_code=400, detail=f"No stock available for {e.name} at this location")
+        raise HTTPException(status_code=400, detail=str(e))
+    except fefo.StockConflictError:
+        raise HTTPException(status_code=409, detail="Stock changed while processing this request. Please retry.")
+
+    batches_by_id = {b["id"]: b for b in batches}
+    await stock_ledger.apply_deltas(db, [
+        stock_ledger.medicine_delta(batches_by_id[d["medicine_id"]], -d["quantity"])
+        for deductions in plan for d in deductions
+    ], session=session)
+    return plan
+
 async def deduct_stock_fefo(item_name: str, quantity: float, branch_id: Optional[str] = None, godown_id: Optional[str] = None, batch_number: Optional[str] = None):
     """
     Deduct stock from the medicines collection using FEFO (First Expiry First Out) logic.
     If batch_number is provided, it only deducts from that specific batch.
     Returns a list of deducted batch details.
     """
-    # Build query for physical stock
-    query = {"name": item_name, "stock_quantity": {"$gt": 0}, "purpose": "for_sale"}
-    if batch_number:
-        query["batch_number"] = batch_number
-    if branch_id:
-        query["branch_id"] = branch_id
-    elif godown_id:
-        query["godown_id"] = godown_id
-    else:
-        raise HTTPException(status_code=400, detail="Location ID (branch or godown) is required for stock deduction")
-
-    # Find available batches
-    # MongoDB ASC sort puts NULLs first. To follow "expiry missing -> oldest purchase", 
-    # we ideally want NULLs last. For simplicity and robustness, we'll fetch all and sort in Python
-    # if the list is small (which it should be per item per location).
-    batches = await db.medicines.find(query).to_list(100)
-    
-    if not batches:
-        raise HTTPException(status_code=400, detail=f"No stock available for {item_name} at this location")
-
-    # FEFO Sort: 
-    # 1. Items with expiry_date ASC (earliest first)
-    # 2. Items without expiry_date (NULLs) come after
-    # 3. Fallback to created_at ASC
-    def sort_key(b):
-        expiry = b.get("expiry_date")
-        # Use a far future date for NULL expiries to put them at the end
-        expiry_val = expiry if expiry and expiry.strip() else "9999-12-31"
-        return (expiry_val, b.get("created_at", ""))
-
-    batches.sort(key=sort_key)
-
-    total_available = sum(b.get("stock_quantity", 0) for b in batches)
-    if total_available < quantity:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Insufficient stock for {item_name}. Requested: {quantity}, Available: {total_available}"
-        )
-
-    remaining_to_deduct = quantity
-    deductions = []
-
-    for batch in batches:
-        if remaining_to_deduct <= 0:
-            break
-        
-        batch_qty = batch.get("stock_quantity", 0)
-        deduct_now = min(batch_qty, remaining_to_deduct)
-        
-        await db.medicines.update_one(
-            {"id": batch["id"]},
-            {"$inc": {"stock_quantity": -deduct_now}}
-        )
-        
-        deductions.append({
-            "batch_number": batch.get("batch_number"),
-            "expiry_date": batch.get("expiry_date"),
-            "mrp": batch.get("mrp"),
-            "quantity": deduct_now,
-            "medicine_id": batch["id"]
-        })
-        
-        remaining_to_deduct -= deduct_now
-
-    return deductions
+    plan = await allocate_stock_fefo(
+        [{"name": item_name, "quantity": quantity, "batch_number": batch_number}],
+        branch_id=branch_id,
+        godown_id=godown_id
+    )
+    return plan[0]
 
 @api_router.post("/pharmacy-sales", response_model=PharmacySale)
 async def create_pharmacy_sale(sale_data: PharmacySaleCreate, current_user: dict = Depends(get_current_user)):
     sale_id = str(uuid.uuid4())
-    
-    # Pre-verification: Ensure all items have enough total stock before starting any deductions
-    # (To avoid partial deductions if one item fails later)
-    for item in sale_data.items:
-        name = item.get("medicine_name") or item.get("name")
-        qty = item["quantity"]
-        
-        check_query = {"name": name, "stock_quantity": {"$gt": 0}, "purpose": "for_sale"}
-        if sale_data.branch_id:
-            check_query["branch_id"] = sale_data.branch_id
-        
-        available_batches = await db.medicines.find(check_query).to_list(100)
-        total_avail = sum(b.get("stock_quantity", 0) for b in available_batches)
-        if total_avail < qty:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Insufficient stock for {name}. Total available at this branch: {total_avail}"
-            )
 
-    # Perform FEFO deductions and record batch info in sale items
-    enriched_items = []
-    for item in sale_data.items:
-        name = item.get("medicine_name") or item.get("name")
-        qty = item["quantity"]
+    # Verify and deduct every line in one pass so a failing line leaves stock untouched
+    lines = [
+        {"name": item.get("medicine_name") or item.get("name"), "quantity": item["quantity"]}
+        for item in sale_data.items
+    ]
+
+    async def write(uow):
+        # Stock deduction, sale, derived balances and bank log commit or roll back together
+        plan = await allocate_stock_fefo(lines, branch_id=sale_data.branch_id, ref=sale_id, session=uow.session)
+
+        # Record batch info in sale items
+        enriched_items = []
+        for item, deductions in zip(sale_data.items, plan):
+            # If the sale item represented a single batch in UI, we now split it if FEFO took from multiple
+            # or just record the batch info. For simplicity in existing UI, we'll keep the item 
+            # but maybe store the batch details inside it for history.
+            item_copy = dict(item)
+            item_copy["deductions"] = deductions
+            # Update the main batch/expiry fields if there's only one deduction for clarity
+            if len(deductions) == 1:
+                item_copy["batch_number"] = deductions[0]["batch_number"]
+                item_copy["expiry_date"] = deductions[0]["expiry_date"]
+                
+            enriched_items.append(item_copy)
+
+        sale_dict = {
+            "id": sale_id,
+            **sale_data.model_dump(),
+            "items": enriched_items,
+            "created_by": current_user["id"],
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
         
-        # Deduct using FEFO
-        deductions = await deduct_stock_fefo(name, qty, branch_id=sale_data.branch_id)
+        await db.pharmacy_sales.insert_one(sale_dict, session=uow.session)
+        await sync_billing_side_effects("pharmacy_sales", None, sale_dict, uow)
         
-        # If the sale item represented a single batch in UI, we now split it if FEFO took from multiple
-        # or just record the batch info. For simplicity in existing UI, we'll keep the item 
-        # but maybe store the batch details inside it for history.
-        item_copy = dict(item)
-        item_copy["deductions"] = deductions
-        # Update the main batch/expiry fields if there's only one deduction for clarity
-        if len(deductions) == 1:
-            item_copy["batch_number"] = deductions[0]["batch_number"]
-            item_copy["expiry_date"] = deductions[0]["expiry_date"]
-            
-        enriched_items.append(item_copy)
+        # Auto-log bank transaction for non-cash payments
+        if sale_data.payment_mode != "cash":
+            await log_bank_transaction(
+                amount=sale_data.total_amount,
+                payment_mode=sale_data.payment_mode,
+                transaction_type="credit",
+                reference_type="pharmacy_sale",
+                reference_id=sale_id,
+                reference_number=sale_data.transaction_ref or sale_id[:8],
+                description=f"Pharmacy Sale - {sale_data.patient_name}",
+                transaction_date=datetime.now(timezone.utc).isoformat()[:10],
+                upi_id=sale_data.upi_id,
+                party_name=sale_data.patient_name,
+                party_id=sale_data.patient_id,
+                branch_id=sale_data.branch_id,
+                uow=uow
+            )
+        return sale_dict
 
-    sale_dict = {
-        "id": sale_id,
-        **sale_data.model_dump(),
-        "items": enriched_items,
-        "created_by": current_user["id"],
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    
-    await db.pharmacy_sales.insert_one(sale_dict)
-    
-    # Auto-log bank transaction for non-cash payments
-    if sale_data.payment_mode != "cash":
-        await log_bank_transaction(
-            amount=sale_data.total_amount,
-            payment_mode=sale_data.payment_mode,
-            transaction_type="credit",
-            reference_type="pharmacy_sale",
-            reference_id=sale_id,
-            reference_number=sale_data.transaction_ref or sale_id[:8],
-            description=f"Pharmacy Sale - {sale_data.patient_name}",
-            transaction_date=datetime.now(timezone.utc).isoformat()[:10],
-            upi_id=sale_data.upi_id,
-            party_name=sale_data.patient_name,
-            party_id=sale_data.patient_id
-        )
-    
+    sale_dict = await unit_of_work.run(client, write)
     return PharmacySale(**sale_dict)
 
 @api_router.get("/pharmacy-sales", response_model=List[PharmacySale])
-async def get_pharmacy_sales(branch_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+async def get_pharmacy_sales(response: Response, page: PageParams = Depends(page_params), select: FieldSelection = Depends(field_params), branch_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    fields = select.resolve("pharmacy_sales", PharmacySale, "id", "created_at")
     query = {}
     if branch_id:
         query["branch_id"] = branch_id
     elif current_user["role"] == "branch_manager" and current_user.get("branch_id"):
         query["branch_id"] = current_user["branch_id"]
     
-    sales = await db.pharmacy_sales.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    return sales
+    docs = await paginate(db.pharmacy_sales, query, "created_at", -1, page, response, default_limit=1000, projection=projection.mongo_projection(fields))
+    return projection.respond(docs, response, PharmacySale, fields)
 
 @api_router.put("/pharmacy-sales/{sale_id}", response_model=PharmacySale)
 async def update_pharmacy_sale(sale_id: str, sale_data: dict, current_user: dict = Depends(get_current_user)):
-    existing = await db.pharmacy_sales.find_one({"id": sale_id})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Pharmacy sale not found")
-    
     # Remove fields that shouldn't be updated
     update_data = {k: v for k, v in sale_data.items() if k not in ["id", "_id", "created_at", "created_by"]}
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
     
-    await db.pharmacy_sales.update_one({"id": sale_id}, {"$set": update_data})
-    
-    updated = await db.pharmacy_sales.find_one({"id": sale_id}, {"_id": 0})
+    before = await db.pharmacy_sales.find_one_and_update(
+        {"id": sale_id}, {"$set": update_data}, projection={"_id": 0}, return_document=ReturnDocument.BEFORE
+    )
+    if not before:
+        raise HTTPException(status_code=404, detail="Pharmacy sale not found")
+    updated = {**before, **update_data}
+    await sync_billing_side_effects("pharmacy_sales", before, updated)
     return PharmacySale(**updated)
 
 @api_router.post("/bills", response_model=Bill)
@@ -1901,24 +1978,29 @@ async def create_bill(bill_data: BillCreate, current_user: dict = Depends(get_cu
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.bills.insert_one(bill_dict)
-    
-    # Auto-log bank transaction for non-cash payments
-    if bill_data.payment_mode != "cash":
-        await log_bank_transaction(
-            amount=bill_data.total_amount,
-            payment_mode=bill_data.payment_mode,
-            transaction_type="credit",
-            reference_type="bill",
-            reference_id=bill_id,
-            reference_number=bill_data.transaction_ref or bill_id[:8],
-            description=f"Treatment Bill - {bill_data.patient_name}",
-            transaction_date=datetime.now(timezone.utc).isoformat()[:10],
-            upi_id=bill_data.upi_id,
-            party_name=bill_data.patient_name,
-            party_id=bill_data.patient_id
-        )
+    async def write(uow):
+        await db.bills.insert_one(bill_dict, session=uow.session)
+        await sync_billing_side_effects("bills", None, bill_dict, uow)
+        
+        # Auto-log bank transaction for non-cash payments
+        if bill_data.payment_mode != "cash":
+            await log_bank_transaction(
+                amount=bill_data.total_amount,
+                payment_mode=bill_data.payment_mode,
+                transaction_type="credit",
+                reference_type="bill",
+                reference_id=bill_id,
+                reference_number=bill_data.transaction_ref or bill_id[:8],
+                description=f"Treatment Bill - {bill_data.patient_name}",
+                transaction_date=datetime.now(timezone.utc).isoformat()[:10],
+                upi_id=bill_data.upi_id,
+                party_name=bill_data.patient_name,
+                party_id=bill_data.patient_id,
+                branch_id=bill_data.branch_id,
+                uow=uow
+            )
     
+    await unit_of_work.run(client, write)
     return Bill(**bill_dict)
 
 @api_router.get("/daily-report")
@@ -1964,174 +2046,41 @@ async def get_daily_report(
             # If user has no branch assigned, show only their own created records
             base_query["created_by"] = current_user["id"]
     
-    # Query for bills, pharmacy sales, expenses
-    bills = await db.bills.find(base_query, {"_id": 0}).to_list(1000)
-    pharmacy_sales = await db.pharmacy_sales.find(base_query, {"_id": 0}).to_list(1000)
-    expenses = await db.expenses.find(base_query, {"_id": 0}).to_list(1000)
-    
-    # Query for bank transactions (collections today)
-    bank_query = base_query.copy() # Uses created_at for bank txns
-    bank_transactions = await db.bank_transactions.find(bank_query, {"_id": 0}).to_list(1000)
-    
-    # Query for walkins (to find cash collections today)
-    walkin_query = base_query.copy()
-    if "created_at" in walkin_query:
-        walkin_query["paid_at"] = walkin_query.pop("created_at")
-    walkin_query["status"] = "completed"
-    walkins = await db.walkins.find(walkin_query, {"_id": 0}).to_list(1000)
-    
-    # Build patient-wise report
-    patient_report = {}
-    
-    def get_or_init_patient(p_id, p_name="Walk-in Patient"):
-        if p_id not in patient_report:
-            patient_report[p_id] = {
-                "patient_id": p_id,
-                "patient_name": p_name,
-                "treatment_amount": 0,
-                "pharmacy_amount": 0,
-                "total_amount": 0,
-                "paid_amount": 0,
-                "balance_amount": 0,
-                "collections": [],
-                "cash": 0,
-                "upi": 0,
-                "card": 0,
-                "netbanking": 0,
-                "other": 0
-            }
-        return patient_report[p_id]
-
-    # Process work done today (treatments) & Cash Collections from Bills
-    for bill in bills:
-        p_id = bill.get("patient_id", "walk-in")
-        p = get_or_init_patient(p_id, bill.get("patient_name"))
-        bill_total = bill.get("total_amount", 0)
-        p["treatment_amount"] += bill_total
-        p["total_amount"] += bill_total
-
-        # Capture Cash Payment if made via Billing
-        payment_mode = bill.get("payment_mode", "cash").lower()
-        paid_amount = bill.get("paid_amount", 0)
-        
-        if payment_mode == "cash" and paid_amount > 0:
-            p["paid_amount"] += paid_amount
-            p["cash"] += paid_amount
-            p["collections"].append({
-                "type": "Treatment",
-                "bill_id": bill.get("id"),
-                "amount": paid_amount,
-                "payment_mode": "cash",
-                "description": "Cash payment at billing"
-            })
-
-    # Process work done today (pharmacy) & Cash Collections from Sales
-    for sale in pharmacy_sales:
-        p_id = sale.get("patient_id") or "walk-in"
-        p = get_or_init_patient(p_id, sale.get("patient_name"))
-        sale_total = sale.get("total_amount", 0)
-        p["pharmacy_amount"] += sale_total
-        p["total_amount"] += sale_total
-
-        # Capture Cash Payment if made via Pharmacy Billing
-        payment_mode = sale.get("payment_mode", "cash").lower()
-        paid_amount = sale.get("paid_amount", 0)
-        
-        if payment_mode == "cash" and paid_amount > 0:
-            p["paid_amount"] += paid_amount
-            p["cash"] += paid_amount
-            p["collections"].append({
-                "type": "Pharmacy",
-                "sale_id": sale.get("id"),
-                "amount": paid_amount,
-                "payment_mode": "cash",
-                "description": "Cash payment at pharmacy"
-            })
-
-    # Record Collections - Bank Transactions (UPI, Card, Net Banking)
-    for txn in bank_transactions:
-        # Only process credits (collections) for the patient report
-        if txn.get("transaction_type") != "credit":
-            continue
-            
-        p_id = txn.get("party_id") or "walk-in"
-        p = get_or_init_patient(p_id, txn.get("party_name"))
-        
-        amount = txn.get("amount", 0)
-        mode = (txn.get("payment_mode") or "other").lower()
-        
-        p["paid_amount"] += amount
-        if mode in ["cash", "upi", "card", "netbanking"]:
-            p[mode] += amount
-        else:
-            p["other"] += amount
-            
-        p["collections"].append({
-            "type": txn.get("reference_type") or "Collection",
-            "amount": amount,
-            "payment_mode": mode,
-            "upi_id": txn.get("upi_id"),
-            "bank_name": txn.get("bank_name"),
-            "reference_number": txn.get("reference_number"),
-            "description": txn.get("description")
-        })
-
-    # Record Collections - Cash from Walkins
-    # Note: bank_transactions are usually non-cash, so we look at walkins for cash
-    for walkin in walkins:
-        if walkin.get("payment_mode") == "cash":
-            p_id = walkin.get("patient_id") or "walk-in"
-            p = get_or_init_patient(p_id, walkin.get("name"))
-            
-            amount = walkin.get("paid_amount", 0)
-            p["paid_amount"] += amount
-            p["cash"] += amount
-            
-            p["collections"].append({
-                "type": "Treatment",
-                "amount": amount,
-                "payment_mode": "cash",
-                "description": "Cash payment at checkout"
-            })
-
-    # Calculate balance for each patient
-    # Balance = Total Work Today - Total Paid Today (simplified for Daily Report)
-    for p in patient_report.values():
-        p["balance_amount"] = p["total_amount"] - p["paid_amount"]
-
-    # Calculate overall summary
-    payment_summary = {"cash": 0, "card": 0, "upi": 0, "netbanking": 0, "other": 0}
-    for p in patient_report.values():
-        payment_summary["cash"] += p["cash"]
-        payment_summary["card"] += p["card"]
-        payment_summary["upi"] += p[ "upi"]
-        payment_summary["netbanking"] += p["netbanking"]
-        payment_summary["other"] += p["other"]
-
-    total_treatment = sum(p["treatment_amount"] for p in patient_report.values())
-    total_pharmacy = sum(p["pharmacy_amount"] for p in patient_report.values())
-    total_collected = sum(p["paid_amount"] for p in patient_report.values())
-    total_balance = sum(p["balance_amount"] for p in patient_report.values())
-    total_expenses = sum(e.get("amount", 0) for e in expenses)
-    
+    # Past days are served from the report cache; the scope is the branch/user restriction above
+    report = await report_cache.cached(
+        db, "daily_report",
+        filters={"date": target_date.isoformat()},
+        scope={k: v for k, v in base_query.items() if k != "created_at"},
+        date_from=target_date.isoformat(),
+        date_to=target_date.isoformat(),
+        collections=DAILY_REPORT_COLLECTIONS,
+        branch_ids=(selected_branches or None) if is_admin else ([user_branch_id] if user_branch_id else None),
+        compute=lambda: build_daily_report(target_date, base_query),
+    )
     return {
-        "date": target_date.isoformat(),
+        "date": report["date"],
         "user_id": current_user["id"],
         "branches": selected_branches if selected_branches else ([user_branch_id] if user_branch_id else []),
-        "summary": {
-            "total_treatment_amount": total_treatment,
-            "total_pharmacy_amount": total_pharmacy,
-            "total_amount": total_treatment + total_pharmacy,
-            "total_collected": total_collected,
-            "total_balance": total_balance,
-            "total_expenses": total_expenses,
-            "net_collection": total_collected - total_expenses,
-            "payment_modes": payment_summary
-        },
-        "patients": list(patient_report.values()),
-        "expenses": expenses
+        "summary": report["summary"],
+        "patients": report["patients"],
+        "expenses": report["expenses"]
     }
 
+DAILY_REPORT_COLLECTIONS = ("bills", "pharmacy_sales", "expenses", "bank_transactions", "walkins")
+
+async def build_daily_report(target_date, base_query: dict) -> dict:
+    """Patient-wise totals and collections for one day, for the documents matching base_query."""
+    report = await reports.daily_report(db, base_query, completed_walkin_query(base_query))
+    return {"date": target_date.isoformat(), **report}
+
+def completed_walkin_query(query: dict) -> dict:
+    """Walk-ins checked out (paid) within the created_at window of a report query."""
+    walkin_query = query.copy()
+    if "created_at" in walkin_query:
+        walkin_query["paid_at"] = walkin_query.pop("created_at")
+    walkin_query["status"] = "completed"
+    return walkin_query
+
 # Shift/Handover endpoints
 @api_router.post("/shifts/start", response_model=Shift)
 async def start_shift(shift_data: ShiftStart, current_user: dict = Depends(get_current_user)):
@@ -2245,6 +2194,32 @@ async def get_shift_history(
     shifts = await db.shifts.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
     return shifts
 
+@api_router.get("/shifts/{shift_id}/report")
+async def get_shift_report(shift_id: str, current_user: dict = Depends(get_current_user)):
+    """Handover report for exactly the shift window (start to end, or now while active) at its branch."""
+    shift = await db.shifts.find_one({"id": shift_id}, {"_id": 0})
+    if not shift:
+        raise HTTPException(status_code=404, detail="Shift not found")
+    if current_user["role"] not in ["admin", "branch_manager"] and shift["user_id"] != current_user["id"]:
+        raise HTTPException(status_code=403, detail="Not authorized to view this shift")
+    
+    start_time = shift["start_time"]
+    end_time = shift.get("end_time") or datetime.now(timezone.utc).isoformat()
+    query = {"created_at": {"$gte": start_time, "$lt": end_time}, "branch_id": shift["branch_id"]}
+    
+    # Completed shifts from earlier days are served from the report cache
+    report = await report_cache.cached(
+        db, "shift_report",
+        filters={"shift_id": shift_id, "start_time": start_time, "end_time": shift.get("end_time")},
+        scope={"branch_id": shift["branch_id"]},
+        date_from=start_time[:10],
+        date_to=shift["end_time"][:10] if shift.get("end_time") else None,
+        collections=DAILY_REPORT_COLLECTIONS,
+        branch_ids=[shift["branch_id"]],
+        compute=lambda: reports.daily_report(db, query, completed_walkin_query(query)),
+    )
+    return {"shift": shift, "start_time": start_time, "end_time": end_time, **report}
+
 @api_router.get("/shifts/post-handover-transactions")
 async def get_post_handover_transactions(
     user_id: str,
@@ -2278,37 +2253,39 @@ async def get_post_handover_transactions(
     }
 
 @api_router.get("/bills", response_model=List[Bill])
-async def get_bills(branch_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+async def get_bills(response: Response, page: PageParams = Depends(page_params), select: FieldSelection = Depends(field_params), branch_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    fields = select.resolve("bills", Bill, "id", "created_at")
     query = {}
     if branch_id:
         query["branch_id"] = branch_id
     elif current_user["role"] == "branch_manager" and current_user.get("branch_id"):
         query["branch_id"] = current_user["branch_id"]
     
-    bills = await db.bills.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    return bills
+    docs = await paginate(db.bills, query, "created_at", -1, page, response, default_limit=1000, projection=projection.mongo_projection(fields))
+    return projection.respond(docs, response, Bill, fields)
 
 @api_router.put("/bills/{bill_id}", response_model=Bill)
 async def update_bill(bill_id: str, bill_data: dict, current_user: dict = Depends(get_current_user)):
-    existing = await db.bills.find_one({"id": bill_id})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Bill not found")
-    
     # Remove fields that shouldn't be updated
     update_data = {k: v for k, v in bill_data.items() if k not in ["id", "_id", "created_at", "created_by"]}
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
     
-    await db.bills.update_one({"id": bill_id}, {"$set": update_data})
-    
-    updated = await db.bills.find_one({"id": bill_id}, {"_id": 0})
+    before = await db.bills.find_one_and_update(
+        {"id": bill_id}, {"$set": update_data}, projection={"_id": 0}, return_document=ReturnDocument.BEFORE
+    )
+    if not before:
+        raise HTTPException(status_code=404, detail="Bill not found")
+    updated = {**before, **update_data}
+    await sync_billing_side_effects("bills", before, updated)
     return Bill(**updated)
 
 @api_router.delete("/bills/{bill_id}")
 async def delete_bill(bill_id: str, current_user: dict = Depends(get_current_user)):
     """Delete a bill (typically a pending/temporary one)."""
-    result = await db.bills.delete_one({"id": bill_id})
-    if result.deleted_count == 0:
+    deleted = await db.bills.find_one_and_delete({"id": bill_id}, projection={"_id": 0})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Bill not found")
+    await sync_billing_side_effects("bills", deleted, None)
     
     return {"message": "Bill deleted successfully"}
 
@@ -2323,18 +2300,19 @@ async def create_expense(expense_data: ExpenseCreate, current_user: dict = Depen
     }
     
     await db.expenses.insert_one(expense_dict)
+    await sync_billing_side_effects("expenses", None, expense_dict)
     return Expense(**expense_dict)
 
 @api_router.get("/expenses", response_model=List[Expense])
-async def get_expenses(branch_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+async def get_expenses(response: Response, page: PageParams = Depends(page_params), branch_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
     query = {}
     if branch_id:
         query["branch_id"] = branch_id
     elif current_user["role"] == "branch_manager" and current_user.get("branch_id"):
         query["branch_id"] = current_user["branch_id"]
     
-    expenses = await db.expenses.find(query, {"_id": 0}).sort("date", -1).to_list(1000)
-    return expenses
+    docs = await paginate(db.expenses, query, "date", -1, page, response, default_limit=1000)
+    return fast_json.trusted(docs, response, Expense)
 
 @api_router.post("/appointments", response_model=Appointment)
 async def create_appointment(appointment_data: AppointmentCreate, current_user: dict = Depends(get_current_user)):
@@ -2346,10 +2324,11 @@ async def create_appointment(appointment_data: AppointmentCreate, current_user:
     }
     
     await db.appointments.insert_one(appointment_dict)
+    await report_cache.invalidate(db, "appointments", None, appointment_dict)
     return Appointment(**appointment_dict)
 
 @api_router.get("/appointments", response_model=List[Appointment])
-async def get_appointments(branch_id: Optional[str] = None, date: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+async def get_appointments(response: Response, page: PageParams = Depends(page_params), branch_id: Optional[str] = None, date: Optional[str] = None, current_user: dict = Depends(get_current_user)):
     query = {}
     if branch_id:
         query["branch_id"] = branch_id
@@ -2359,8 +2338,8 @@ async def get_appointments(branch_id: Optional[str] = None, date: Optional[str]
     if date:
         query["appointment_date"] = date
     
-    appointments = await db.appointments.find(query, {"_id": 0}).sort("appointment_date", -1).to_list(1000)
-    return appointments
+    docs = await paginate(db.appointments, query, "appointment_date", -1, page, response, default_limit=1000)
+    return fast_json.trusted(docs, response, Appointment)
 
 @api_router.get("/reports/dashboard")
 async def get_dashboard_stats(branch_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
@@ -2372,25 +2351,37 @@ async def get_dashboard_stats(branch_id: Optional[str] = None, current_user: dic
     
     today = datetime.now(timezone.utc).date().isoformat()
     
-    total_revenue_bills = await db.bills.aggregate([
-        {"$match": query},
-        {"$group": {"_id": None, "total": {"$sum": "$total_amount"}}}
-    ]).to_list(1)
-    
-    total_revenue_pharmacy = await db.pharmacy_sales.aggregate([
-        {"$match": query},
-        {"$group": {"_id": None, "total": {"$sum": "$total_amount"}}}
-    ]).to_list(1)
-    
-    total_expenses = await db.expenses.aggregate([
-        {"$match": query},
-        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-    ]).to_list(1)
+    if await rollups.is_ready(db):
+        # Sum the per-day rollups instead of scanning every bill, sale and expense
+        totals = await rollups.summarize(db, query)
+        bills_revenue = totals["treatment_revenue"]
+        pharmacy_revenue = totals["pharmacy_revenue"]
+        expenses = totals["expenses"]
+        bills_today = (await rollups.summarize(db, {**query, "date": today}))["bills_count"]
+    else:
+        total_revenue_bills = await db.bills.aggregate([
+            {"$match": query},
+            {"$group": {"_id": None, "total": {"$sum": "$total_amount"}}}
+        ]).to_list(1)
+        
+        total_revenue_pharmacy = await db.pharmacy_sales.aggregate([
+            {"$match": query},
+            {"$group": {"_id": None, "total": {"$sum": "$total_amount"}}}
+        ]).to_list(1)
+        
+        total_expenses = await db.expenses.aggregate([
+            {"$match": query},
+            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
+        ]).to_list(1)
+        
+        bills_revenue = total_revenue_bills[0]["total"] if total_revenue_bills else 0
+        pharmacy_revenue = total_revenue_pharmacy[0]["total"] if total_revenue_pharmacy else 0
+        expenses = total_expenses[0]["total"] if total_expenses else 0
+        
+        # Count bills created today
+        bills_today = await db.bills.count_documents({**query, "created_at": {"$gte": today}})
     
-    bills_revenue = total_revenue_bills[0]["total"] if total_revenue_bills else 0
-    pharmacy_revenue = total_revenue_pharmacy[0]["total"] if total_revenue_pharmacy else 0
     total_revenue = bills_revenue + pharmacy_revenue
-    expenses = total_expenses[0]["total"] if total_expenses else 0
     
     today_query = {**query, "appointment_date": today}
     appointments_today = await db.appointments.count_documents(today_query)
@@ -2401,10 +2392,6 @@ async def get_dashboard_stats(branch_id: Optional[str] = None, current_user: dic
     
     total_patients = await db.patients.count_documents(query)
     
-    # Count bills created today
-    bills_today_query = {**query}
-    bills_today = await db.bills.count_documents(bills_today_query)
-    
     settings = await db.settings.find_one({}, {"_id": 0}) or {}
     expiry_alert_days = settings.get("expiry_alert_days", 90)
     
@@ -2791,6 +2778,7 @@ async def create_treatment_category(category_data: TreatmentCategoryCreate, curr
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.categories.insert_one(category_dict)
+    await catalog.bump(db, "categories")
     return TreatmentCategory(**category_dict)
 
 @api_router.get("/treatment-categories", response_model=List[TreatmentCategory])
@@ -2806,6 +2794,7 @@ async def update_treatment_category(category_id: str, category_data: TreatmentCa
     result = await db.categories.update_one({"id": category_id}, {"$set": update_dict})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    await catalog.bump(db, "categories")
     updated = await db.categories.find_one({"id": category_id}, {"_id": 0})
     return updated
 
@@ -2818,6 +2807,7 @@ async def delete_treatment_category(category_id: str, current_user: dict = Depen
     result = await db.categories.delete_one({"id": category_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    await catalog.bump(db, "categories")
     return {"message": "Category deleted successfully"}
 
 # Treatment SubCategories
@@ -2830,6 +2820,7 @@ async def create_treatment_subcategory(subcategory_data: TreatmentSubCategoryCre
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.subcategories.insert_one(subcategory_dict)
+    await catalog.bump(db, "subcategories")
     return TreatmentSubCategory(**subcategory_dict)
 
 @api_router.get("/treatment-subcategories", response_model=List[TreatmentSubCategory])
@@ -2885,25 +2876,28 @@ async def create_treatment(treatment_data: TreatmentCreate, current_user: dict =
         "item_status": "ACTIVE" # Default status for new treatments
     }
     await db.item_master.insert_one(treatment_dict)
+    await catalog.bump(db, "item_master")
     return Treatment(**treatment_dict)
 
 @api_router.get("/treatments", response_model=List[Treatment])
-async def get_treatments(category_id: Optional[str] = None, subcategory_id: Optional[str] = None, status: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+async def get_treatments(request: Request, response: Response, category_id: Optional[str] = None, subcategory_id: Optional[str] = None, status: Optional[str] = None, since: Optional[datetime] = Depends(since_param), current_user: dict = Depends(get_current_user)):
+    not_modified = await conditional_get(request, response, current_user, "item_master")
+    if not_modified is not None:
+        return not_modified
     item_type = await db.item_types.find_one({"name": "Treatment"})
     item_type_id = item_type["id"] if item_type else "treatment_type"
     
-    query = {"item_type_id": item_type_id}
-    if category_id:
-        query["category_id"] = category_id
-    if subcategory_id:
-        query["subcategory_id"] = subcategory_id
-    if status:
-        query["item_status"] = status
-    else:
-        query["item_status"] = {"$ne": "INACTIVE"} # Default to not inactive
-        
-    treatments_data = await db.item_master.find(query, {"_id": 0}).to_list(1000)
-    return treatments_data
+    # Treatments are item_master rows; filter the cached table
+    table = await catalog.table(db, "item_master")
+    treatments_data = [
+        row for row in table.rows
+        if row.get("item_type_id") == item_type_id
+        and (not category_id or row.get("category_id") == category_id)
+        and (not subcategory_id or row.get("subcategory_id") == subcategory_id)
+        # Default to not inactive
+        and (row.get("item_status") == status if status else row.get("item_status") != "INACTIVE")
+    ]
+    return changed_rows(treatments_data, since, response)[:1000]
 
 @api_router.put("/treatments/{treatment_id}")
 async def update_treatment(treatment_id: str, treatment_data: TreatmentCreate, current_user: dict = Depends(get_current_user)):
@@ -2912,9 +2906,11 @@ async def update_treatment(treatment_id: str, treatment_data: TreatmentCreate, c
     if "charges" in update_dict:
         update_dict["mrp"] = update_dict["charges"]
         
+    update_dict["updated_at"] = datetime.now(timezone.utc).isoformat()
     result = await db.item_master.update_one({"id": treatment_id}, {"$set": update_dict})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Treatment not found")
+    await catalog.bump(db, "item_master")
     updated = await db.item_master.find_one({"id": treatment_id}, {"_id": 0})
     return updated
 
@@ -2927,79 +2923,12 @@ async def delete_treatment(treatment_id: str, current_user: dict = Depends(get_c
 
 # Migration Endpoint
 @api_router.post("/migrate-treatments")
-async def migrate_treatments(current_user: dict = Depends(get_current_user)):
+async def migrate_treatments(background: bool = False, current_user: dict = Depends(get_current_user)):
     if current_user.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Only admins can perform migration")
-    
-    # 1. Ensure "Treatment" Item Type exists
-    item_type = await db.item_types.find_one({"name": "Treatment"})
-    if not item_type:
-        item_type_id = "treatment_type" # Fixed ID for convenience
-        item_type = {
-            "id": item_type_id,
-            "name": "Treatment",
-            "description": "Clinical treatments and procedures",
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.item_types.insert_one(item_type)
-    else:
-        item_type_id = item_type["id"]
-
-    # 2. Migrate Treatment Categories
-    old_categories = await db.treatment_categories.find({}, {"_id": 0}).to_list(1000)
-    migrated_count = 0
-    for old_cat in old_categories:
-        # Check if already migrated
-        exists = await db.categories.find_one({"name": old_cat["name"], "item_type_id": item_type_id})
-        if not exists:
-            new_cat = {
-                "id": old_cat["id"], # Keep ID to maintain subcategory links
-                "name": old_cat["name"],
-                "description": old_cat.get("description"),
-                "item_type_id": item_type_id,
-                "created_at": old_cat.get("created_at") or datetime.now(timezone.utc).isoformat()
-            }
-            await db.categories.insert_one(new_cat)
-            migrated_count += 1
-
-    # 3. Migrate Treatment Subcategories
-    old_subcategories = await db.treatment_subcategories.find({}, {"_id": 0}).to_list(1000)
-    for old_sub in old_subcategories:
-        exists = await db.subcategories.find_one({"name": old_sub["name"], "category_id": old_sub["category_id"]})
-        if not exists:
-            new_sub = {
-                "id": old_sub["id"],
-                "category_id": old_sub["category_id"],
-                "name": old_sub["name"],
-                "description": old_sub.get("description"),
-                "created_at": old_sub.get("created_at") or datetime.now(timezone.utc).isoformat()
-            }
-            await db.subcategories.insert_one(new_sub)
-
-    # 4. Migrate Treatments to Item Master
-    old_treatments = await db.treatments.find({}, {"_id": 0}).to_list(1000)
-    for old_t in old_treatments:
-        exists = await db.item_master.find_one({"name": old_t["name"], "item_type_id": item_type_id})
-        if not exists:
-            new_item = {
-                "id": old_t["id"],
-                "name": old_t["name"],
-                "item_type_id": item_type_id,
-                "category_id": old_t.get("category_id"),
-                "subcategory_id": old_t.get("subcategory_id"),
-                "charges": old_t.get("charges", 0),
-                "mrp": old_t.get("charges", 0), # Mirror charges to MRP
-                "duration_minutes": old_t.get("duration_minutes"),
-                "gst_applicable": old_t.get("gst_applicable", False),
-                "gst_percentage": old_t.get("gst_percentage", 0),
-                "description": old_t.get("description"),
-                "created_at": old_t.get("created_at") or datetime.now(timezone.utc).isoformat(),
-                "purpose": "for_sale",
-                "item_status": "ACTIVE" # Default status for migrated treatments
-            }
-            await db.item_master.insert_one(new_item)
-
-    return {"message": "Migration completed successfully", "categories_migrated": migrated_count}
+    if background:
+        return await job_runner.submit("maintenance.migrate_treatments", user_id=current_user["id"])
+    return await maintenance.migrate_treatments(db)
 
 @api_router.delete("/treatments/{treatment_id}")
 async def delete_treatment(treatment_id: str, current_user: dict = Depends(get_current_user)):
@@ -3018,10 +2947,14 @@ async def create_doctor(doctor_data: DoctorCreate, current_user: dict = Depends(
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.doctors.insert_one(doctor_dict)
+    await catalog.bump(db, "doctors")
     return Doctor(**doctor_dict)
 
 @api_router.get("/doctors", response_model=List[Doctor])
-async def get_doctors(branch_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+async def get_doctors(request: Request, response: Response, branch_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    not_modified = await conditional_get(request, response, current_user, "doctors")
+    if not_modified is not None:
+        return not_modified
     query = {}
     if branch_id:
         query["branch_id"] = branch_id
@@ -3040,6 +2973,7 @@ async def update_doctor(doctor_id: str, doctor_data: DoctorCreate, current_user:
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
     
     await db.doctors.update_one({"id": doctor_id}, {"$set": update_data})
+    await catalog.bump(db, "doctors")
     updated = await db.doctors.find_one({"id": doctor_id}, {"_id": 0})
     return Doctor(**updated)
 
@@ -3050,6 +2984,7 @@ async def delete_doctor(doctor_id: str, current_user: dict = Depends(get_current
         raise HTTPException(status_code=404, detail="Doctor not found")
     
     await db.doctors.delete_one({"id": doctor_id})
+    await catalog.bump(db, "doctors")
     return {"message": "Doctor deleted successfully"}
 
 # Advanced Reports
@@ -3071,6 +3006,48 @@ async def get_advanced_reports(
     if start_date and end_date:
         query["created_at"] = {"$gte": start_date, "$lte": end_date}
     
+    return await report_cache.cached(
+        db, "advanced",
+        filters={"start_date": start_date, "end_date": end_date, "report_type": report_type},
+        scope={"branch_id": query.get("branch_id")},
+        date_from=start_date,
+        date_to=end_date,
+        collections=("bills", "pharmacy_sales"),
+        branch_ids=[query["branch_id"]] if query.get("branch_id") else None,
+        compute=lambda: build_advanced_report(query, start_date, end_date, report_type),
+    )
+
+async def build_advanced_report(query: dict, start_date: Optional[str], end_date: Optional[str], report_type: str) -> dict:
+    # Rollups hold whole days; use them when the range is given as plain dates
+    whole_days = not (start_date and end_date) or (len(start_date) == 10 and len(end_date) == 10)
+    if whole_days and await rollups.is_ready(db):
+        rollup_query = {k: v for k, v in query.items() if k != "created_at"}
+        if start_date and end_date:
+            # created_at <= "YYYY-MM-DD" never matches a timestamp on end_date itself
+            rollup_query["date"] = {"$gte": start_date, "$lt": end_date}
+        totals = await rollups.summarize(db, rollup_query)
+        include_treatment = report_type in ["all", "treatment"]
+        include_pharmacy = report_type in ["all", "pharmacy"]
+        treatment_by_payment = totals["treatment_by_payment"] if include_treatment else {}
+        pharmacy_by_payment = totals["pharmacy_by_payment"] if include_pharmacy else {}
+        treatment_revenue = totals["treatment_revenue"] if include_treatment else 0
+        pharmacy_revenue = totals["pharmacy_revenue"] if include_pharmacy else 0
+        all_payment_modes = dict(treatment_by_payment)
+        for mode, amount in pharmacy_by_payment.items():
+            all_payment_modes[mode] = all_payment_modes.get(mode, 0) + amount
+        return {
+            "start_date": start_date,
+            "end_date": end_date,
+            "treatment_revenue": treatment_revenue,
+            "treatment_by_payment_mode": treatment_by_payment,
+            "pharmacy_revenue": pharmacy_revenue,
+            "pharmacy_by_payment_mode": pharmacy_by_payment,
+            "total_revenue": treatment_revenue + pharmacy_revenue,
+            "total_by_payment_mode": all_payment_modes,
+            "bills_count": totals["bills_count"] if include_treatment else 0,
+            "sales_count": totals["sales_count"] if include_pharmacy else 0
+        }
+    
     # Treatment charges report
     treatment_revenue = 0
     treatment_by_payment = {}
@@ -3210,21 +3187,18 @@ async def get_comprehensive_reports(
         bill_query["services.name"] = regex_name
         sale_query["items.name"] = regex_name
         
-    # Fetch all data
-    bills = await db.bills.find(bill_query, {"_id": 0}).to_list(10000)
-    sales = await db.pharmacy_sales.find(sale_query, {"_id": 0}).to_list(10000)
-    expenses = await db.expenses.find(expense_query, {"_id": 0}).to_list(10000)
-    purchases = await db.purchase_entries.find(purchase_query, {"_id": 0}).to_list(10000)
-    bank_transactions = await db.bank_transactions.find(bank_query, {"_id": 0}).to_list(10000)
-    appointments = await db.appointments.find(appointment_query, {"_id": 0}).to_list(10000)
-
-    # Filter by item_type if requested
-    if item_type == "treatment":
-        # Only keep treatments (bills usually represent treatments)
-        sales = [] # In treatment mode, pharmacy sales are excluded
-    elif item_type == "medicine":
-        # Only keep medicines (sales usually represent medicines)
-        bills = [] # In medicine mode, treatment bills are excluded
+    # Category/subcategory: keep documents with at least one matching line
+    if category or subcategory:
+        service_match = {}
+        item_match = {}
+        if category:
+            service_match["category_id"] = category
+            item_match["category"] = category
+        if subcategory:
+            service_match["subcategory_id"] = subcategory
+            item_match["subcategory"] = subcategory
+        bill_query["services"] = {"$elemMatch": service_match}
+        sale_query["items"] = {"$elemMatch": item_match}
 
     # Handle Stock Status filter (requires fetching from medicines collection)
     medicines = []
@@ -3243,74 +3217,29 @@ async def get_comprehensive_reports(
             
         medicines = await db.medicines.find(med_query, {"_id": 0}).to_list(1000)
 
-    # Filter by category if provided
-    if category or subcategory:
-        filtered_bills = []
-        for bill in bills:
-            match = False
-            for service in bill.get("services", []):
-                if category and service.get("category_id") != category: continue
-                if subcategory and service.get("subcategory_id") != subcategory: continue
-                match = True
-                break
-            if match: filtered_bills.append(bill)
-        bills = filtered_bills
-
-        filtered_sales = []
-        for sale in sales:
-            match = False
-            for item in sale.get("items", []):
-                if category and item.get("category") != category: continue
-                if subcategory and item.get("subcategory") != subcategory: continue
-                match = True
-                break
-            if match: filtered_sales.append(sale)
-        sales = filtered_sales
-
-    # Calculate revenue
-    treatment_revenue = sum(bill.get("total_amount", 0) for bill in bills)
-    pharmacy_revenue = sum(sale.get("total_amount", 0) for sale in sales)
-    total_expenses = sum(exp.get("amount", 0) for exp in expenses)
-    total_purchases = sum(p.get("total_amount", 0) for p in purchases)
-    
-    # Payment mode breakdown
-    payment_breakdown = {}
-    for bill in bills:
-        mode = bill.get("payment_mode", "cash")
-        payment_breakdown[mode] = payment_breakdown.get(mode, 0) + bill.get("total_amount", 0)
-    for sale in sales:
-        mode = sale.get("payment_mode", "cash")
-        payment_breakdown[mode] = payment_breakdown.get(mode, 0) + sale.get("total_amount", 0)
-    
-    # Daily breakdown for charts
-    daily_revenue = {}
-    for bill in bills:
-        date = bill.get("created_at", "")[:10]
-        if not date: continue
-        daily_revenue[date] = daily_revenue.get(date, {"treatment": 0, "pharmacy": 0})
-        daily_revenue[date]["treatment"] += bill.get("total_amount", 0)
-    for sale in sales:
-        date = sale.get("created_at", "")[:10]
-        if not date: continue
-        daily_revenue[date] = daily_revenue.get(date, {"treatment": 0, "pharmacy": 0})
-        daily_revenue[date]["pharmacy"] += sale.get("total_amount", 0)
-    
-    # Category breakdown for expenses
-    expense_by_category = {}
-    for exp in expenses:
-        cat = exp.get("category", "Other")
-        expense_by_category[cat] = expense_by_category.get(cat, 0) + exp.get("amount", 0)
-    
-    # Top selling items
-    item_sales = {}
-    for sale in sales:
-        for item in sale.get("items", []):
-            name = item.get("name", "Unknown")
-            item_sales[name] = item_sales.get(name, {"quantity": 0, "revenue": 0})
-            item_sales[name]["quantity"] += item.get("quantity", 0)
-            item_sales[name]["revenue"] += item.get("total", 0)
-    
-    top_items = sorted(item_sales.items(), key=lambda x: x[1]["revenue"], reverse=True)[:10]
+    # Totals, breakdowns and the last 100 of each list are computed by MongoDB.
+    # In treatment mode pharmacy sales are excluded, in medicine mode treatment bills.
+    # Closed ranges are served from the report cache (stock status above is always live)
+    report = await report_cache.cached(
+        db, "comprehensive",
+        filters={"queries": [bill_query, sale_query, expense_query, purchase_query, bank_query, appointment_query],
+                 "item_type": item_type},
+        scope={"branch_id": branch_id},
+        date_from=start_date,
+        date_to=end_date,
+        collections=("bills", "pharmacy_sales", "expenses", "purchase_entries", "bank_transactions", "appointments"),
+        branch_ids=[branch_id] if branch_id else None,
+        # Purchases and bank transactions are totalled across branches
+        all_branches=("purchase_entries", "bank_transactions"),
+        compute=lambda: reports.comprehensive_report(
+            db, bill_query, sale_query, expense_query, purchase_query, bank_query, appointment_query,
+            include_bills=item_type != "medicine",
+            include_sales=item_type != "treatment"
+        ),
+    )
+    treatment_revenue = report["treatment_revenue"]
+    pharmacy_revenue = report["pharmacy_revenue"]
+    total_expenses = report["total_expenses"]
     
     return {
         "filters": {
@@ -3331,25 +3260,25 @@ async def get_comprehensive_reports(
             "pharmacy_revenue": pharmacy_revenue,
             "total_revenue": treatment_revenue + pharmacy_revenue,
             "total_expenses": total_expenses,
-            "total_purchases": total_purchases,
+            "total_purchases": report["total_purchases"],
             "net_profit": treatment_revenue + pharmacy_revenue - total_expenses,
-            "bills_count": len(bills),
-            "sales_count": len(sales),
-            "expenses_count": len(expenses),
-            "purchases_count": len(purchases),
-            "appointments_count": len(appointments),
-            "bank_transactions_count": len(bank_transactions),
+            "bills_count": report["bills_count"],
+            "sales_count": report["sales_count"],
+            "expenses_count": report["expenses_count"],
+            "purchases_count": report["purchases_count"],
+            "appointments_count": report["appointments_count"],
+            "bank_transactions_count": report["bank_transactions_count"],
             "stock_count": len(medicines)
         },
-        "payment_breakdown": payment_breakdown,
-        "expense_by_category": expense_by_category,
-        "daily_revenue": daily_revenue,
-        "top_selling_items": [{"name": name, **data} for name, data in top_items],
-        "bills": bills[-100:],  # Last 100 bills
-        "sales": sales[-100:],  # Last 100 sales
-        "expenses": expenses[-100:],  # Last 100 expenses
-        "bank_transactions": bank_transactions[-100:], # Last 100 transactions
-        "appointments": appointments[-100:], # Last 100 appointments
+        "payment_breakdown": report["payment_breakdown"],
+        "expense_by_category": report["expense_by_category"],
+        "daily_revenue": report["daily_revenue"],
+        "top_selling_items": report["top_selling_items"],
+        "bills": report["bills"],  # Last 100 bills
+        "sales": report["sales"],  # Last 100 sales
+        "expenses": report["expenses"],  # Last 100 expenses
+        "bank_transactions": report["bank_transactions"], # Last 100 transactions
+        "appointments": report["appointments"], # Last 100 appointments
         "medicines": medicines  # Medicines matching stock status
     }
 
@@ -3363,10 +3292,14 @@ async def create_godown(godown_data: GodownCreate, current_user: dict = Depends(
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.godowns.insert_one(godown_dict)
+    await catalog.bump(db, "godowns")
     return Godown(**godown_dict)
 
 @api_router.get("/godowns", response_model=List[Godown])
-async def get_godowns(branch_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+async def get_godowns(request: Request, response: Response, branch_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    not_modified = await conditional_get(request, response, current_user, "godowns")
+    if not_modified is not None:
+        return not_modified
     query = {}
     if branch_id:
         query["branch_id"] = branch_id
@@ -3385,6 +3318,7 @@ async def update_godown(godown_id: str, godown_data: GodownCreate, current_user:
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
     
     await db.godowns.update_one({"id": godown_id}, {"$set": update_data})
+    await catalog.bump(db, "godowns")
     updated = await db.godowns.find_one({"id": godown_id}, {"_id": 0})
     return Godown(**updated)
 
@@ -3395,6 +3329,7 @@ async def delete_godown(godown_id: str, current_user: dict = Depends(get_current
         raise HTTPException(status_code=404, detail="Godown not found")
     
     await db.godowns.delete_one({"id": godown_id})
+    await catalog.bump(db, "godowns")
     return {"message": "Godown deleted successfully"}
 
 # Credit Sales Management
@@ -3419,7 +3354,7 @@ async def create_credit_sale(credit_data: CreditSaleCreate, current_user: dict =
     return CreditSale(**credit_dict)
 
 @api_router.get("/credit-sales", response_model=List[CreditSale])
-async def get_credit_sales(status: Optional[str] = None, branch_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+async def get_credit_sales(response: Response, page: PageParams = Depends(page_params), status: Optional[str] = None, branch_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
     query = {}
     if status:
         query["status"] = status
@@ -3428,8 +3363,8 @@ async def get_credit_sales(status: Optional[str] = None, branch_id: Optional[str
     elif current_user["role"] == "branch_manager" and current_user.get("branch_id"):
         query["branch_id"] = current_user["branch_id"]
     
-    credit_sales = await db.credit_sales.find(query, {"_id": 0}).sort("due_date", 1).to_list(1000)
-    return credit_sales
+    docs = await paginate(db.credit_sales, query, "due_date", 1, page, response, default_limit=1000)
+    return fast_json.trusted(docs, response, CreditSale)
 
 @api_router.post("/credit-payments", response_model=CreditPayment)
 async def create_credit_payment(payment_data: CreditPaymentCreate, current_user: dict = Depends(get_current_user)):
@@ -3471,7 +3406,10 @@ async def get_credit_payments(credit_sale_id: Optional[str] = None, current_user
 
 # Settings Management
 @api_router.get("/settings")
-async def get_settings(current_user: dict = Depends(get_current_user)):
+async def get_settings(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    not_modified = await conditional_get(request, response, current_user, "settings")
+    if not_modified is not None:
+        return not_modified
     settings = await db.settings.find_one({}, {"_id": 0})
     if not settings:
         # Create default settings
@@ -3486,6 +3424,7 @@ async def get_settings(current_user: dict = Depends(get_current_user)):
         }
         await db.settings.insert_one(settings)
         settings.pop("_id", None)
+        await catalog.bump(db, "settings")
     return settings
 
 @api_router.put("/settings")
@@ -3503,6 +3442,7 @@ async def update_settings(settings_data: SettingsUpdate, current_user: dict = De
         settings_id = str(uuid.uuid4())
         update_dict["id"] = settings_id
         await db.settings.insert_one(update_dict)
+    await catalog.bump(db, "settings")
     
     updated_settings = await db.settings.find_one({}, {"_id": 0})
     return updated_settings
@@ -3544,6 +3484,7 @@ async def upload_logo(file: UploadFile = File(...), current_user: dict = Depends
             "logo_url": logo_url,
             "updated_at": datetime.now(timezone.utc).isoformat()
         })
+    await catalog.bump(db, "settings")
     
     return {"logo_url": logo_url, "message": "Logo uploaded successfully"}
 
@@ -3562,82 +3503,95 @@ async def create_purchase_entry(purchase_data: PurchaseEntryCreate, current_user
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.purchase_entries.insert_one(purchase_dict)
-    
-    # Auto-log bank transaction for non-cash payments
-    if purchase_data.paid_amount > 0 and purchase_data.payment_mode != "cash":
-        await log_bank_transaction(
-            amount=purchase_data.paid_amount,
-            payment_mode=purchase_data.payment_mode,
-            transaction_type="debit",
-            reference_type="purchase_entry",
-            reference_id=purchase_id,
-            reference_number=purchase_data.invoice_number,
-            description=f"Purchase - {purchase_data.supplier_name} - Inv: {purchase_data.invoice_number}",
-            transaction_date=purchase_data.invoice_date,
-            party_name=purchase_data.supplier_name,
-            party_id=purchase_data.supplier_id,
-            invoice_number=purchase_data.invoice_number,
-            bank_account_id=purchase_data.bank_id
-        )
+    async def write(uow):
+        # Entry, bank log, expense and stock changes commit or roll back together
+        await db.purchase_entries.insert_one(purchase_dict, session=uow.session)
     
-    # Auto-log as expense if there's a paid amount
-    if purchase_data.paid_amount > 0:
-        expense_id = str(uuid.uuid4())
-        expense_dict = {
-            "id": expense_id,
-            "category": "supplies",
-            "description": f"Purchase - {purchase_data.supplier_name} - Inv: {purchase_data.invoice_number}",
-            "amount": purchase_data.paid_amount,
-            "date": purchase_data.invoice_date,
-            "branch_id": purchase_data.branch_id or "default",
-            "reference_id": purchase_id,
-            "reference_type": "purchase_entry",
-            "payment_mode": purchase_data.payment_mode,
-            "payment_status": "paid",
-            "created_by": current_user["id"],
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.expenses.insert_one(expense_dict)
+        # Auto-log bank transaction for non-cash payments
+        if purchase_data.paid_amount > 0 and purchase_data.payment_mode != "cash":
+            await log_bank_transaction(
+                amount=purchase_data.paid_amount,
+                payment_mode=purchase_data.payment_mode,
+                transaction_type="debit",
+                reference_type="purchase_entry",
+                reference_id=purchase_id,
+                reference_number=purchase_data.invoice_number,
+                description=f"Purchase - {purchase_data.supplier_name} - Inv: {purchase_data.invoice_number}",
+                transaction_date=purchase_data.invoice_date,
+                party_name=purchase_data.supplier_name,
+                party_id=purchase_data.supplier_id,
+                invoice_number=purchase_data.invoice_number,
+                bank_account_id=purchase_data.bank_id,
+                branch_id=purchase_data.branch_id,
+                uow=uow
+            )
     
-    # Update medicine stock if items received
-    if purchase_data.items_received_date:
-        for item in purchase_data.items:
-            medicine_id = item.get("medicine_id")
-            if medicine_id:
-                # Update existing medicine stock
-                await db.medicines.update_one(
-                    {"id": medicine_id},
-                    {"$inc": {"stock_quantity": item["quantity"]}}
-                )
-            else:
-                # Create new medicine entry
-                medicine_id = str(uuid.uuid4())
-                medicine_dict = {
-                    "id": medicine_id,
-                    "name": item["medicine_name"],
-                    "description": item.get("description", ""),
-                    "manufacturer": item.get("manufacturer", ""),
-                    "category": item.get("category", "General"),
-                    "subcategory": item.get("subcategory", ""),
-                    "batch_number": item["batch_number"],
-                    "expiry_date": item["expiry_date"],
-                    "purchase_price": item["purchase_price"],
-                    "mrp": item.get("mrp", 0),
-                    "sales_price": item.get("sales_price", item.get("mrp", 0)),
-                    "unit_price": item.get("sales_price", item.get("mrp", 0)),
-                    "discount_percentage": item.get("discount_percentage", 0),
-                    "stock_quantity": item["quantity"],
-                    "min_stock_level": 10,
-                    "supplier_id": purchase_data.supplier_id,
-                    "branch_id": purchase_data.branch_id,
-                    "godown_id": purchase_data.godown_id,
-                    "gst_percentage": item.get("gst_percentage", 12.0),
-                    "created_at": datetime.now(timezone.utc).isoformat(),
-                    "item_status": "ACTIVE" # Default status for new medicines
-                }
-                await db.medicines.insert_one(medicine_dict)
+        # Auto-log as expense if there's a paid amount
+        if purchase_data.paid_amount > 0:
+            expense_id = str(uuid.uuid4())
+            expense_dict = {
+                "id": expense_id,
+                "category": "supplies",
+                "description": f"Purchase - {purchase_data.supplier_name} - Inv: {purchase_data.invoice_number}",
+                "amount": purchase_data.paid_amount,
+                "date": purchase_data.invoice_date,
+                "branch_id": purchase_data.branch_id or "default",
+                "reference_id": purchase_id,
+                "reference_type": "purchase_entry",
+                "payment_mode": purchase_data.payment_mode,
+                "payment_status": "paid",
+                "created_by": current_user["id"],
+                "created_at": datetime.now(timezone.utc).isoformat()
+            }
+            await db.expenses.insert_one(expense_dict, session=uow.session)
+            await sync_billing_side_effects("expenses", None, expense_dict, uow)
+    
+        # Update medicine stock if items received
+        ledger_deltas = stock_ledger.purchase_pending_deltas(purchase_dict)
+        if purchase_data.items_received_date:
+            for item in purchase_data.items:
+                medicine_id = item.get("medicine_id")
+                if medicine_id:
+                    # Update existing medicine stock
+                    medicine = await db.medicines.find_one_and_update(
+                        {"id": medicine_id},
+                        {"$inc": {"stock_quantity": item["quantity"]}},
+                        projection={"_id": 0},
+                        session=uow.session
+                    )
+                    ledger_deltas.append(stock_ledger.medicine_delta(medicine, item["quantity"]))
+                else:
+                    # Create new medicine entry
+                    medicine_id = str(uuid.uuid4())
+                    medicine_dict = {
+                        "id": medicine_id,
+                        "name": item["medicine_name"],
+                        "description": item.get("description", ""),
+                        "manufacturer": item.get("manufacturer", ""),
+                        "category": item.get("category", "General"),
+                        "subcategory": item.get("subcategory", ""),
+                        "batch_number": item["batch_number"],
+                        "expiry_date": item["expiry_date"],
+                        "purchase_price": item["purchase_price"],
+                        "mrp": item.get("mrp", 0),
+                        "sales_price": item.get("sales_price", item.get("mrp", 0)),
+                        "unit_price": item.get("sales_price", item.get("mrp", 0)),
+                        "discount_percentage": item.get("discount_percentage", 0),
+                        "stock_quantity": item["quantity"],
+                        "min_stock_level": 10,
+                        "supplier_id": purchase_data.supplier_id,
+                        "branch_id": purchase_data.branch_id,
+                        "godown_id": purchase_data.godown_id,
+                        "gst_percentage": item.get("gst_percentage", 12.0),
+                        "created_at": datetime.now(timezone.utc).isoformat(),
+                        "item_status": "ACTIVE" # Default status for new medicines
+                    }
+                    await db.medicines.insert_one(medicine_dict, session=uow.session)
+                    ledger_deltas.append(stock_ledger.medicine_delta(medicine_dict, item["quantity"]))
+        
+        await stock_ledger.apply_deltas(db, ledger_deltas, session=uow.session)
     
+    await unit_of_work.run(client, write)
     return PurchaseEntry(**purchase_dict)
 
 @api_router.get("/medicines", response_model=List[Medicine])
@@ -3679,12 +3633,15 @@ async def get_medicines(
 
 @api_router.get("/purchase-entries", response_model=List[PurchaseEntry])
 async def get_purchase_entries(
+    response: Response,
+    select: FieldSelection = Depends(field_params),
     branch_id: Optional[str] = None,
     supplier_id: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
+    fields = select.resolve("purchase_entries", PurchaseEntry, "id", "invoice_date")
     query = {}
     if branch_id:
         query["branch_id"] = branch_id
@@ -3697,17 +3654,25 @@ async def get_purchase_entries(
     if start_date and end_date:
         query["invoice_date"] = {"$gte": start_date, "$lte": end_date}
     
-    purchases = await db.purchase_entries.find(query, {"_id": 0}).sort("invoice_date", -1).to_list(1000)
-    return purchases
+    purchases = await db.purchase_entries.find(query, projection.mongo_projection(fields)).sort("invoice_date", -1).to_list(1000)
+    return projection.respond(purchases, response, PurchaseEntry, fields)
 
 async def get_consolidated_stock_internal(
     branch_id: Optional[Union[str, List[str]]] = None, 
     godown_id: Optional[Union[str, List[str]]] = None, 
     consolidate_batches=False,
-    include_pending: bool = True
+    include_pending: bool = True,
+    source: str = "auto",
+    uncapped: bool = False
 ):
-    """Aggregate stock from purchase entries and medicines collection, optionally filtering by location."""
+    """Aggregate stock from purchase entries and medicines collection, optionally filtering by location.
+
+    With ``source="auto"`` the materialized ``stock_levels`` ledger is used once it
+    has been built; ``source="scan"`` forces the full rescan of the raw collections.
+    """
     try:
+        use_ledger = source == "ledger" or (source == "auto" and await stock_ledger.is_ready(db))
+
         pe_query = {"items_received_date": None}
         med_query = {"purpose": {"$in": ["for_sale", None, ""]}}
         
@@ -3744,36 +3709,38 @@ async def get_consolidated_stock_internal(
             except (ValueError, TypeError):
                 return default
         
-        # 0. Pre-fetch units for name resolution
-        unit_map = {}
-        all_units = await db.item_units.find({}, {"id": 1, "name": 1, "_id": 0}).to_list(1000)
-        for u in all_units:
-            if u.get("id"):
-                unit_map[u["id"]] = u.get("name")
+        # 0. Item statuses, min levels and unit names from the catalog cache,
+        # rebuilt only when item_master or item_units changed
+        items_table = await catalog.table(db, "item_master")
+        units_table = await catalog.table(db, "item_units")
+        unit_map = units_table.memo.get("names")
+        if unit_map is None:
+            unit_map = units_table.memo["names"] = {uid: u.get("name") for uid, u in units_table.by_id.items()}
+        memo_key = ("stock_info", units_table.version, units_table.loaded_at)
+        item_master_map = items_table.memo.get(memo_key)
+        if item_master_map is None:
+            item_master_map = {}
+            for i in items_table.rows[:10000]:
+                if i.get("name"):
+                    uid = i.get("unit_id")
+                    unit_name = unit_map.get(uid, "") if uid else ""
+                    item_master_map[i["name"].strip()] = {
+                        "status": i.get("item_status", "ACTIVE"),
+                        "reason": i.get("discontinued_reason"),
+                        "min_stock_level": safe_int(i.get("low_stock_threshold") or i.get("min_stock_level"), 0),
+                        "low_stock_warning_enabled": bool(i.get("low_stock_warning_enabled", False)),
+                        "expiry_tracking_enabled": bool(i.get("expiry_tracking_enabled", False)),
+                        "unit": unit_name
+                    }
+            items_table.memo = {memo_key: item_master_map}
 
         # 1. First pass: Collect all known batch info (expiry, manufacturer) for fallback
         batch_metadata_map = {}
 
-        # 0. Pre-fetch Item Statuses and Min Levels for efficiency
-        item_master_map = {}
-        all_items = await db.item_master.find({}, {"name": 1, "item_status": 1, "discontinued_reason": 1, "min_stock_level": 1, "low_stock_threshold": 1, "low_stock_warning_enabled": 1, "unit_id": 1, "expiry_tracking_enabled": 1, "_id": 0}).to_list(10000)
-        for i in all_items:
-            if i.get("name"):
-                uid = i.get("unit_id")
-                unit_name = unit_map.get(uid, "") if uid else ""
-                item_master_map[i["name"].strip()] = {
-                    "status": i.get("item_status", "ACTIVE"),
-                    "reason": i.get("discontinued_reason"),
-                    "min_stock_level": safe_int(i.get("low_stock_threshold") or i.get("min_stock_level"), 0),
-                    "low_stock_warning_enabled": bool(i.get("low_stock_warning_enabled", False)),
-                    "expiry_tracking_enabled": bool(i.get("expiry_tracking_enabled", False)),
-                    "unit": unit_name
-                }
-
         # Aggregate items by name + batch + mrp (unique combinations)
         stock_map = {}
-        if include_pending:
-            purchases = await db.purchase_entries.find(pe_query, {"_id": 0}).to_list(1000)
+        if include_pending and not use_ledger:
+            purchases = await db.purchase_entries.find(pe_query, {"_id": 0}).to_list(None if uncapped else 1000)
             for purchase in purchases:
                 for item in purchase.get("items", []):
                     purpose = item.get("item_purpose") or item.get("purpose") or "for_sale"
@@ -3822,7 +3789,11 @@ async def get_consolidated_stock_internal(
                     stock_map[key]["quantity"] = stock_map[key]["stock_quantity"]
         
         # 2. ALSO include items from medicines collection
-        medicines_data = await db.medicines.find(med_query, {"_id": 0}).to_list(10000)
+        # (ledger rows already fold pending purchase quantity into stock_quantity)
+        if use_ledger:
+            medicines_data = await stock_ledger.load_levels(db, branch_id=branch_id, godown_id=godown_id, include_pending=include_pending)
+        else:
+            medicines_data = await db.medicines.find(med_query, {"_id": 0}).to_list(None if uncapped else 10000)
 
         # Pre-fill metadata map from medicines too
         for med in medicines_data:
@@ -3908,12 +3879,7 @@ async def get_consolidated_stock_internal(
                 if data["neg_total"] <= 0 or not data["pos"]:
                     continue
                 
-                def fefo_sort(b):
-                    exp = b.get("expiry_date")
-                    exp_val = exp if exp and exp.strip() else "9999-12-31"
-                    return (exp_val, b.get("created_at", ""))
-                
-                data["pos"].sort(key=fefo_sort)
+                data["pos"].sort(key=fefo.fefo_sort_key)
                 
                 rem = data["neg_total"]
                 for b in data["pos"]:
@@ -3949,6 +3915,347 @@ async def get_pharmacy_stock(
     
     return stock_list
 
+@api_router.get("/stock-levels")
+async def get_stock_levels(
+    response: Response,
+    branch_id: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Value of the X-Next-Cursor header from the previous page"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Raw stock ledger rows in ``key`` order: the full list ``/sync`` deltas apply to.
+
+    Like ``/sync``, a branch also gets the rows without a branch (godown stock).
+    """
+    if not await stock_ledger.is_ready(db):
+        raise HTTPException(status_code=409, detail="Stock ledger has not been built")
+    if not branch_id and current_user["role"] == "branch_manager" and current_user.get("branch_id"):
+        branch_id = current_user["branch_id"]
+    query = {"branch_id": {"$in": [branch_id, None]}} if branch_id else {}
+    if cursor:
+        # Keys are unique, so the key alone is the keyset
+        query["key"] = {"$gt": decode_cursor(cursor)["v"]}
+    rows = await db.stock_levels.find(query, {"_id": 0}).sort("key", 1).limit(limit + 1).to_list(limit + 1)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1], "key")
+    return rows
+
+async def verify_stock_levels():
+    """Compare the stock_levels ledger against a full rescan for every view the endpoints use."""
+    results = {}
+    for consolidate in (False, True):
+        for include_pending in (False, True):
+            scanned = await get_consolidated_stock_internal(consolidate_batches=consolidate, include_pending=include_pending, source="scan", uncapped=True)
+            ledger = await get_consolidated_stock_internal(consolidate_batches=consolidate, include_pending=include_pending, source="ledger")
+            view = f"{'consolidated' if consolidate else 'batch'}{'_with_pending' if include_pending else ''}"
+            results[view] = stock_ledger.diff_stock_maps(scanned, ledger)
+    return {"matches": all(r["matches"] for r in results.values()), "views": results}
+
+async def check_rebuilt_stock_levels() -> dict:
+    """Verify a fresh ledger rebuild.
+
+    Stock writes landing while the rebuild read the raw collections can be
+    missing from it. On any drift the ledger is marked stale (stock reads use
+    the rescan until the next rebuild) and ``LedgerDriftError`` is raised.
+    """
+    verification = await verify_stock_levels()
+    if not verification["matches"]:
+        drift = stock_ledger.drift_counts(verification["views"])
+        await stock_ledger.mark_stale(db, drift)
+        raise stock_ledger.LedgerDriftError(
+            f"Rebuilt stock ledger differs from the rescan (entries per view: {drift}); "
+            "stock reads use the rescan until it is rebuilt again"
+        )
+    return verification
+
+@api_router.post("/admin/stock-levels/rebuild")
+async def rebuild_stock_levels(background: bool = False, current_user: dict = Depends(get_current_user)):
+    """Rebuild the materialized stock ledger from medicines and pending purchase entries, then verify it."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can rebuild stock levels")
+    if background:
+        return await job_runner.submit("stock_levels.rebuild", user_id=current_user["id"])
+    
+    summary = await stock_ledger.rebuild(db)
+    try:
+        summary["verification"] = await check_rebuilt_stock_levels()
+    except stock_ledger.LedgerDriftError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return summary
+
+@api_router.get("/admin/stock-levels/verify")
+async def get_stock_levels_verification(current_user: dict = Depends(get_current_user)):
+    """Check that the stock ledger matches a full recomputation of stock."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can verify stock levels")
+    return await verify_stock_levels()
+
+@api_router.post("/admin/patient-balances/rebuild")
+async def rebuild_patient_balances(background: bool = False, current_user: dict = Depends(get_current_user)):
+    """Recompute patient_balances from all bills and pharmacy sales."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can rebuild patient balances")
+    if background:
+        return await job_runner.submit("patient_balances.rebuild", user_id=current_user["id"])
+    summary = await patient_balances.rebuild(db)
+    try:
+        verification = await patient_balances.check_rebuild(db)
+    except patient_balances.BalanceDriftError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    summary["verification"] = {"matches": verification["matches"], "patients": verification["patients"]}
+    return summary
+
+@api_router.get("/admin/patient-balances/verify")
+async def get_patient_balances_verification(current_user: dict = Depends(get_current_user)):
+    """Check that patient_balances matches a recomputation from bills and pharmacy sales."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can verify patient balances")
+    return await patient_balances.verify(db)
+
+@api_router.post("/admin/daily-rollups/backfill")
+async def backfill_daily_rollups(background: bool = False, current_user: dict = Depends(get_current_user)):
+    """Recompute daily_rollups from bills, pharmacy sales and expenses."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can backfill rollups")
+    if background:
+        return await job_runner.submit("daily_rollups.backfill", user_id=current_user["id"])
+    summary = await rollups.backfill(db)
+    try:
+        verification = await rollups.check_backfill(db)
+    except rollups.RollupDriftError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    summary["verification"] = {"matches": verification["matches"], "days": verification["days"]}
+    return summary
+
+@api_router.get("/admin/daily-rollups/verify")
+async def get_daily_rollups_verification(current_user: dict = Depends(get_current_user)):
+    """Check that daily_rollups matches a re-aggregation of bills, pharmacy sales and expenses."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can verify rollups")
+    return await rollups.verify(db)
+
+@api_router.get("/admin/report-cache")
+async def get_report_cache_stats(current_user: dict = Depends(get_current_user)):
+    """Cached report entries per report, plus this worker's hit/miss counters."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can view the report cache")
+    return {"entries": await report_cache.entry_counts(db), "pid": os.getpid(), "stats": report_cache.get_stats()}
+
+@api_router.delete("/admin/report-cache")
+async def clear_report_cache(report: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """Drop cached report results (all reports, or one by name)."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can clear the report cache")
+    return {"deleted": await report_cache.clear(db, report)}
+
+@api_router.post("/admin/patient-search/backfill")
+async def backfill_patient_search(only_missing: bool = False, background: bool = False, current_user: dict = Depends(get_current_user)):
+    """Compute search fields for existing patients and switch search to the index."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can backfill patient search")
+    if background:
+        return await job_runner.submit("patient_search.backfill", {"only_missing": only_missing}, current_user["id"])
+    return await patient_search.backfill(db, only_missing=only_missing)
+
+# ============ BACKGROUND JOBS ============
+
+@job_runner.handler("bulk_import.patients", concurrency=2, payload=True)
+async def run_patient_import_job(ctx):
+    total = len(ctx.payload)
+
+    async def progress(processed, created, error_count):
+        await ctx.progress(processed, total, message=f"{created} created, {error_count} errors")
+
+    return bulk_import.job_result(await import_patients(ctx.payload, progress))
+
+@job_runner.handler("bulk_import.medicines", concurrency=2, payload=True)
+async def run_medicine_import_job(ctx):
+    total = len(ctx.payload)
+
+    async def progress(processed, created, error_count):
+        await ctx.progress(processed, total, message=f"{created} created, {error_count} errors")
+
+    return bulk_import.job_result(await import_medicines(ctx.payload, progress))
+
+@job_runner.handler("maintenance.migrate_treatments")
+async def run_treatment_migration_job(ctx):
+    return await maintenance.migrate_treatments(db, ctx.progress)
+
+@job_runner.handler("maintenance.deduplicate_items")
+async def run_item_dedupe_job(ctx):
+    return await maintenance.deduplicate_items(db, ctx.progress)
+
+@job_runner.handler("maintenance.backfill_bank_branches")
+async def run_bank_branch_backfill_job(ctx):
+    return await maintenance.backfill_bank_branches(db, ctx.progress)
+
+@job_runner.handler("stock_levels.rebuild")
+async def run_stock_rebuild_job(ctx):
+    summary = await stock_ledger.rebuild(db, progress=ctx.progress)
+    # Fails the job on drift
+    verification = await check_rebuilt_stock_levels()
+    summary["verification"] = {"matches": verification["matches"]}
+    return summary
+
+@job_runner.handler("patient_balances.rebuild")
+async def run_patient_balance_rebuild_job(ctx):
+    summary = await patient_balances.rebuild(db, progress=ctx.progress)
+    # Fails the job on drift
+    verification = await patient_balances.check_rebuild(db)
+    summary["verification"] = {"matches": verification["matches"], "patients": verification["patients"]}
+    return summary
+
+@job_runner.handler("daily_rollups.backfill")
+async def run_rollup_backfill_job(ctx):
+    summary = await rollups.backfill(db, progress=ctx.progress)
+    # Fails the job on drift
+    verification = await rollups.check_backfill(db)
+    summary["verification"] = {"matches": verification["matches"], "days": verification["days"]}
+    return summary
+
+@job_runner.handler("patient_search.backfill")
+async def run_patient_search_backfill_job(ctx):
+    # Resumes after the last patient id checkpointed by a previous attempt
+    return await patient_search.backfill(db, only_missing=ctx.params.get("only_missing", False),
+                                         after_id=ctx.checkpoint, progress=ctx.progress)
+
+class JobCreate(BaseModel):
+    kind: str
+    params: dict = {}
+
+def _job_access_query(current_user: dict) -> dict:
+    # Non-admins only see jobs they started
+    return {} if current_user["role"] == "admin" else {"created_by": current_user["id"]}
+
+@api_router.post("/jobs")
+async def create_job(job_data: JobCreate, current_user: dict = Depends(get_current_user)):
+    """Queue a maintenance job; returns immediately with the job document."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can start jobs")
+    try:
+        return await job_runner.submit(job_data.kind, job_data.params, current_user["id"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.get("/jobs")
+async def list_jobs(status: Optional[str] = None, kind: Optional[str] = None, limit: int = Query(100, ge=1, le=1000), current_user: dict = Depends(get_current_user)):
+    query = _job_access_query(current_user)
+    if status:
+        query["status"] = status
+    if kind:
+        query["kind"] = kind
+    return await job_runner.list(query, limit)
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Status, progress and result of a background job"""
+    job = await job_runner.get(job_id)
+    if not job or (current_user["role"] != "admin" and job.get("created_by") != current_user["id"]):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    job = await get_job(job_id, current_user)
+    if job["status"] not in ("queued", "running"):
+        raise HTTPException(status_code=400, detail=f"Job is already {job['status']}")
+    return await job_runner.cancel(job_id)
+
+@api_router.post("/jobs/{job_id}/resume")
+async def resume_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Re-queue a failed or cancelled job from its last checkpoint."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can resume jobs")
+    job = await get_job(job_id, current_user)
+    if job["status"] not in ("failed", "cancelled") or not job.get("resumable"):
+        raise HTTPException(status_code=400, detail="Only failed or cancelled resumable jobs can be resumed")
+    return await job_runner.resume(job_id)
+
+@api_router.get("/admin/indexes")
+async def get_index_report(explain: bool = True, current_user: dict = Depends(get_current_user)):
+    """Missing/unregistered/unused indexes and hot queries that fall back to COLLSCAN."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can view index status")
+    report = await indexes.index_report(db)
+    if explain:
+        plans = await indexes.check_query_plans(db)
+        report["collscans"] = [p for p in plans if p["collscan"]]
+        report["plans"] = plans
+    return report
+
+@api_router.post("/admin/indexes/reconcile")
+async def reconcile_indexes(current_user: dict = Depends(get_current_user)):
+    """Create any registry indexes that are missing."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can manage indexes")
+    return await indexes.ensure_indexes(db)
+
+@api_router.get("/metrics")
+async def get_metrics(format: str = Query("prometheus", pattern="^(prometheus|json)$"), current_user: dict = Depends(get_current_user)):
+    """Per-route latency/size histograms and Mongo command usage (this worker only)."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can view metrics")
+    if format == "json":
+        return {"pid": os.getpid(), "routes": metrics_registry.summary()}
+    return Response(content=metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+class ProfilingSettingsUpdate(BaseModel):
+    enabled: Optional[bool] = None
+    threshold_ms: Optional[int] = Field(None, ge=0)
+    allow_header: Optional[bool] = None
+
+@api_router.get("/admin/profiling")
+async def get_profiling_settings(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can view profiling settings")
+    return await profiler.get_settings(db)
+
+@api_router.put("/admin/profiling")
+async def update_profiling_settings(settings: ProfilingSettingsUpdate, current_user: dict = Depends(get_current_user)):
+    """Turn slow-request profiling on/off, set its threshold, allow X-Profile opt-in."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can change profiling settings")
+    changes = {k: v for k, v in settings.model_dump().items() if v is not None}
+    return await profiler.update_settings(db, changes)
+
+@api_router.get("/admin/profiles")
+async def list_request_profiles(route: Optional[str] = None, limit: int = Query(50, ge=1, le=500), current_user: dict = Depends(get_current_user)):
+    """Most recent saved profiles (summaries; fetch one by id for the trace and query plans)."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can view profiles")
+    query = {"route": route} if route else {}
+    return await profiler.list_profiles(db, query, limit)
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def get_request_profile(profile_id: str, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can view profiles")
+    profile = await profiler.get_profile(db, profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+@api_router.get("/admin/runtime-stats")
+async def get_runtime_stats(current_user: dict = Depends(get_current_user)):
+    """Per-process counters for caches and contention (each worker reports its own)."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can view runtime stats")
+    return {
+        "pid": os.getpid(),
+        "stock_deduction": fefo.get_stats(),
+        "user_cache": user_cache.get_stats(),
+        "jobs": job_runner.get_stats(),
+        "profiler": profiler.get_stats(),
+        "report_cache": report_cache.get_stats(),
+        "transactions": unit_of_work.get_stats(),
+        "sequences": sequences.get_stats(),
+        "catalog": catalog.get_stats(),
+        "change_log": change_log.get_stats(),
+        "patient_search": patient_search.get_stats(),
+        "fast_json": fast_json.get_stats()
+    }
+
 @api_router.get("/purchase-entries/{purchase_id}", response_model=PurchaseEntry)
 async def get_purchase_entry(purchase_id: str, current_user: dict = Depends(get_current_user)):
     purchase = await db.purchase_entries.find_one({"id": purchase_id}, {"_id": 0})
@@ -3972,14 +4279,19 @@ async def mark_items_received(
         {"$set": {"items_received_date": received_date}}
     )
     
+    # Pending quantity moves out of the ledger as the received stock moves in
+    ledger_deltas = stock_ledger.purchase_pending_deltas(purchase, sign=-1)
+    
     # Update medicine stock
     for item in purchase["items"]:
         medicine_id = item.get("medicine_id")
         if medicine_id:
-            await db.medicines.update_one(
+            medicine = await db.medicines.find_one_and_update(
                 {"id": medicine_id},
-                {"$inc": {"stock_quantity": item["quantity"]}}
+                {"$inc": {"stock_quantity": item["quantity"]}},
+                projection={"_id": 0}
             )
+            ledger_deltas.append(stock_ledger.medicine_delta(medicine, item["quantity"]))
         else:
             # Create new medicine if doesn't exist
             medicine_id = str(uuid.uuid4())
@@ -4006,7 +4318,9 @@ async def mark_items_received(
                 "created_at": datetime.now(timezone.utc).isoformat()
             }
             await db.medicines.insert_one(medicine_dict)
+            ledger_deltas.append(stock_ledger.medicine_delta(medicine_dict, item["quantity"]))
     
+    await stock_ledger.apply_deltas(db, ledger_deltas)
     return {"message": "Items received and stock updated successfully"}
 
 @api_router.put("/purchase-entries/{purchase_id}", response_model=PurchaseEntry)
@@ -4023,6 +4337,11 @@ async def update_purchase_entry(purchase_id: str, data: PurchaseEntryCreate, cur
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
     
     await db.purchase_entries.update_one({"id": purchase_id}, {"$set": update_data})
+    await report_cache.invalidate(db, "purchase_entries", existing, {**existing, **update_data})
+    await stock_ledger.apply_deltas(db, [
+        *stock_ledger.purchase_pending_deltas(existing, sign=-1),
+        *stock_ledger.purchase_pending_deltas(update_data)
+    ])
     
     # Log addition if paid amount increased
     if new_paid > old_paid:
@@ -4042,7 +4361,8 @@ async def update_purchase_entry(purchase_id: str, data: PurchaseEntryCreate, cur
                 party_name=data.supplier_name,
                 party_id=data.supplier_id,
                 invoice_number=data.invoice_number,
-                bank_account_id=data.bank_id
+                bank_account_id=data.bank_id,
+                branch_id=data.branch_id
             )
         
         # Log as Expense
@@ -4062,6 +4382,7 @@ async def update_purchase_entry(purchase_id: str, data: PurchaseEntryCreate, cur
             "created_at": datetime.now(timezone.utc).isoformat()
         }
         await db.expenses.insert_one(expense_dict)
+        await sync_billing_side_effects("expenses", None, expense_dict)
 
     updated = await db.purchase_entries.find_one({"id": purchase_id}, {"_id": 0})
     return PurchaseEntry(**updated)
@@ -4075,6 +4396,8 @@ async def delete_purchase_entry(purchase_id: str, current_user: dict = Depends(g
     result = await db.purchase_entries.delete_one({"id": purchase_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Purchase entry not found")
+    await stock_ledger.apply_deltas(db, stock_ledger.purchase_pending_deltas(existing, sign=-1))
+    await report_cache.invalidate(db, "purchase_entries", existing, None)
     return {"message": "Purchase entry deleted successfully"}
 
 # ============ MASTER DATA ENDPOINTS ============
@@ -4094,19 +4417,36 @@ async def create_item_master(item_data: ItemMasterCreate, current_user: dict = D
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.item_master.insert_one(item_dict)
+    await catalog.bump(db, "item_master")
     return ItemMaster(**item_dict)
 
+def catalog_page(rows: List[dict], limit: int, response: Response) -> List[dict]:
+    """First page of cached catalog rows, with the cursor header paginate() would set."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1], "created_at")
+    return rows
+
 @api_router.get("/item-master", response_model=List[ItemMaster])
-async def get_item_master(status: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+async def get_item_master(request: Request, response: Response, page: PageParams = Depends(page_params), status: Optional[str] = None, since: Optional[datetime] = Depends(since_param), current_user: dict = Depends(get_current_user)):
     query = {}
     if status:
         query["item_status"] = status
-    items = await db.item_master.find(query, {"_id": 0}).to_list(10000)
-    return items
+    if page.cursor or page.format != "json":
+        docs = await paginate(db.item_master, query, "created_at", 1, page, response, default_limit=10000)
+        return fast_json.trusted(docs, response, ItemMaster)
+    not_modified = await conditional_get(request, response, current_user, "item_master")
+    if not_modified is not None:
+        return not_modified
+    table = await catalog.table(db, "item_master")
+    rows = [row for row in table.rows if row.get("item_status") == status] if status else table.rows
+    docs = catalog_page(changed_rows(rows, since, response), page.limit or 10000, response)
+    return fast_json.trusted(docs, response, ItemMaster)
 
 @api_router.put("/item-master/{item_id}", response_model=ItemMaster)
 async def update_item_master(item_id: str, item_data: ItemMasterCreate, current_user: dict = Depends(get_current_user)):
-    await db.item_master.update_one({"id": item_id}, {"$set": item_data.model_dump()})
+    await db.item_master.update_one({"id": item_id}, {"$set": {**item_data.model_dump(), "updated_at": datetime.now(timezone.utc).isoformat()}})
+    await catalog.bump(db, "item_master")
     item = await db.item_master.find_one({"id": item_id}, {"_id": 0})
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
@@ -4117,6 +4457,7 @@ async def delete_item_master(item_id: str, current_user: dict = Depends(get_curr
     result = await db.item_master.delete_one({"id": item_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Item not found")
+    await catalog.bump(db, "item_master")
     return {"message": "Item deleted successfully"}
 
 # Item Type endpoints
@@ -4177,16 +4518,21 @@ async def create_category(category_data: CategoryCreate, current_user: dict = De
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.categories.insert_one(category_dict)
+    await catalog.bump(db, "categories")
     return Category(**category_dict)
 
 @api_router.get("/categories", response_model=List[Category])
-async def get_categories(current_user: dict = Depends(get_current_user)):
-    categories = await db.categories.find({}, {"_id": 0}).to_list(1000)
-    return categories
+async def get_categories(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    not_modified = await conditional_get(request, response, current_user, "categories")
+    if not_modified is not None:
+        return not_modified
+    table = await catalog.table(db, "categories")
+    return table.rows[:1000]
 
 @api_router.put("/categories/{category_id}", response_model=Category)
 async def update_category(category_id: str, category_data: CategoryCreate, current_user: dict = Depends(get_current_user)):
     await db.categories.update_one({"id": category_id}, {"$set": category_data.model_dump()})
+    await catalog.bump(db, "categories")
     category = await db.categories.find_one({"id": category_id}, {"_id": 0})
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
@@ -4197,6 +4543,7 @@ async def delete_category(category_id: str, current_user: dict = Depends(get_cur
     result = await db.categories.delete_one({"id": category_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    await catalog.bump(db, "categories")
     return {"message": "Category deleted successfully"}
 
 # Subcategory endpoints
@@ -4209,19 +4556,22 @@ async def create_subcategory(subcategory_data: SubcategoryCreate, current_user:
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.subcategories.insert_one(subcategory_dict)
+    await catalog.bump(db, "subcategories")
     return Subcategory(**subcategory_dict)
 
 @api_router.get("/subcategories", response_model=List[Subcategory])
-async def get_subcategories(category_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
-    query = {}
-    if category_id:
-        query["category_id"] = category_id
-    subcategories = await db.subcategories.find(query, {"_id": 0}).to_list(1000)
-    return subcategories
+async def get_subcategories(request: Request, response: Response, category_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    not_modified = await conditional_get(request, response, current_user, "subcategories")
+    if not_modified is not None:
+        return not_modified
+    table = await catalog.table(db, "subcategories")
+    rows = [row for row in table.rows if row.get("category_id") == category_id] if category_id else table.rows
+    return rows[:1000]
 
 @api_router.put("/subcategories/{subcategory_id}", response_model=Subcategory)
 async def update_subcategory(subcategory_id: str, subcategory_data: SubcategoryCreate, current_user: dict = Depends(get_current_user)):
     await db.subcategories.update_one({"id": subcategory_id}, {"$set": subcategory_data.model_dump()})
+    await catalog.bump(db, "subcategories")
     subcategory = await db.subcategories.find_one({"id": subcategory_id}, {"_id": 0})
     if not subcategory:
         raise HTTPException(status_code=404, detail="Subcategory not found")
@@ -4309,6 +4659,7 @@ async def delete_subcategory(subcategory_id: str, current_user: dict = Depends(g
     result = await db.subcategories.delete_one({"id": subcategory_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Subcategory not found")
+    await catalog.bump(db, "subcategories")
     return {"message": "Subcategory deleted successfully"}
 
 # GST Slabs endpoints
@@ -4321,17 +4672,22 @@ async def create_gst_slab(gst_data: GSTSlabCreate, current_user: dict = Depends(
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.gst_slabs.insert_one(gst_dict)
+    await catalog.bump(db, "gst_slabs")
     return GSTSlab(**gst_dict)
 
 @api_router.get("/gst-slabs", response_model=List[GSTSlab])
-async def get_gst_slabs(current_user: dict = Depends(get_current_user)):
-    slabs = await db.gst_slabs.find({}, {"_id": 0}).to_list(100)
-    return slabs
+async def get_gst_slabs(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    not_modified = await conditional_get(request, response, current_user, "gst_slabs")
+    if not_modified is not None:
+        return not_modified
+    table = await catalog.table(db, "gst_slabs")
+    return table.rows[:100]
 
 @api_router.put("/gst-slabs/{gst_id}", response_model=GSTSlab)
 async def update_gst_slab(gst_id: str, gst_data: GSTSlabUpdate, current_user: dict = Depends(get_current_user)):
     update_dict = {k: v for k, v in gst_data.model_dump().items() if v is not None}
     await db.gst_slabs.update_one({"id": gst_id}, {"$set": update_dict})
+    await catalog.bump(db, "gst_slabs")
     slab = await db.gst_slabs.find_one({"id": gst_id}, {"_id": 0})
     if not slab:
         raise HTTPException(status_code=404, detail="GST Slab not found")
@@ -4342,6 +4698,7 @@ async def delete_gst_slab(gst_id: str, current_user: dict = Depends(get_current_
     result = await db.gst_slabs.delete_one({"id": gst_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="GST Slab not found")
+    await catalog.bump(db, "gst_slabs")
     return {"message": "GST Slab deleted successfully"}
 
 # Item Units endpoints
@@ -4354,16 +4711,21 @@ async def create_item_unit(unit_data: ItemUnitCreate, current_user: dict = Depen
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.item_units.insert_one(unit_dict)
+    await catalog.bump(db, "item_units")
     return ItemUnit(**unit_dict)
 
 @api_router.get("/item-units", response_model=List[ItemUnit])
-async def get_item_units(current_user: dict = Depends(get_current_user)):
-    units = await db.item_units.find({}, {"_id": 0}).to_list(100)
-    return units
+async def get_item_units(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    not_modified = await conditional_get(request, response, current_user, "item_units")
+    if not_modified is not None:
+        return not_modified
+    table = await catalog.table(db, "item_units")
+    return table.rows[:100]
 
 @api_router.put("/item-units/{unit_id}", response_model=ItemUnit)
 async def update_item_unit(unit_id: str, unit_data: ItemUnitCreate, current_user: dict = Depends(get_current_user)):
     await db.item_units.update_one({"id": unit_id}, {"$set": unit_data.model_dump()})
+    await catalog.bump(db, "item_units")
     unit = await db.item_units.find_one({"id": unit_id}, {"_id": 0})
     if not unit:
         raise HTTPException(status_code=404, detail="Unit not found")
@@ -4374,6 +4736,7 @@ async def delete_item_unit(unit_id: str, current_user: dict = Depends(get_curren
     result = await db.item_units.delete_one({"id": unit_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Unit not found")
+    await catalog.bump(db, "item_units")
     return {"message": "Unit deleted successfully"}
 
 # Dental Lab endpoints
@@ -4475,9 +4838,10 @@ async def delete_lab_material(mat_id: str, current_user: dict = Depends(get_curr
 # Lab Order endpoints
 @api_router.post("/lab-orders", response_model=LabOrder)
 async def create_lab_order(order_data: LabOrderCreate, current_user: dict = Depends(get_current_user)):
-    # Generate order number
-    count = await db.lab_orders.count_documents({})
-    order_number = f"LAB-{str(count + 1).zfill(5)}"
+    # Numbered per financial year: LAB-2526-00001
+    fy = sequences.financial_year()
+    number = await sequences.next_number(db, "lab_order", fy=fy)
+    order_number = f"LAB-{sequences.financial_year_code(fy)}-{str(number).zfill(5)}"
     
     # Get lab name if not provided
     lab_name = order_data.lab_name
@@ -4505,14 +4869,14 @@ async def create_lab_order(order_data: LabOrderCreate, current_user: dict = Depe
     return LabOrder(**order_dict)
 
 @api_router.get("/lab-orders", response_model=List[LabOrder])
-async def get_lab_orders(status: Optional[str] = None, lab_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+async def get_lab_orders(response: Response, page: PageParams = Depends(page_params), status: Optional[str] = None, lab_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
     query = {}
     if status:
         query["status"] = status
     if lab_id:
         query["lab_id"] = lab_id
-    orders = await db.lab_orders.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    return orders
+    docs = await paginate(db.lab_orders, query, "created_at", -1, page, response, default_limit=1000)
+    return fast_json.trusted(docs, response, LabOrder)
 
 @api_router.put("/lab-orders/{order_id}", response_model=LabOrder)
 async def update_lab_order(order_id: str, order_data: LabOrderCreate, current_user: dict = Depends(get_current_user)):
@@ -4632,12 +4996,7 @@ async def delete_serial_number(serial_id: str, current_user: dict = Depends(get_
 
 @api_router.get("/serial-numbers/next/{branch_id}/{document_type}")
 async def get_next_serial(branch_id: str, document_type: str, current_user: dict = Depends(get_current_user)):
-    # Get current financial year
-    now = datetime.now()
-    if now.month < 4:
-        fy = f"{now.year - 1}-{now.year}"
-    else:
-        fy = f"{now.year}-{now.year + 1}"
+    fy = sequences.financial_year()
     
     serial = await db.serial_numbers.find_one({
         "branch_id": branch_id,
@@ -4656,12 +5015,7 @@ async def get_next_serial(branch_id: str, document_type: str, current_user: dict
 
 @api_router.post("/serial-numbers/increment/{branch_id}/{document_type}")
 async def increment_serial(branch_id: str, document_type: str, current_user: dict = Depends(get_current_user)):
-    # Get current financial year
-    now = datetime.now()
-    if now.month < 4:
-        fy = f"{now.year - 1}-{now.year}"
-    else:
-        fy = f"{now.year}-{now.year + 1}"
+    fy = sequences.financial_year()
     
     result = await db.serial_numbers.find_one_and_update(
         {
@@ -4678,23 +5032,27 @@ async def increment_serial(branch_id: str, document_type: str, current_user: dic
     return {"message": "Serial incremented", "new_number": result["current_number"]}
 
 # Stock Transfer endpoints
+async def next_transfer_number(reserve: bool = True) -> str:
+    """TRF + yymmdd + the financial year's transfer sequence, e.g. TRF2510180042."""
+    today = datetime.now(timezone.utc)
+    fy = sequences.financial_year(today)
+
+    async def start():
+        # First transfer of the year continues after those numbered by daily count
+        since = datetime.combine(sequences.financial_year_start(fy), datetime.min.time(), timezone.utc)
+        return await db.stock_transfers.count_documents({"created_at": {"$gte": since.isoformat()}}) + 1
+
+    take = sequences.next_number if reserve else sequences.peek
+    number = await take(db, "transfer", fy=fy, start=start)
+    return f"TRF{today.strftime('%y%m%d')}{str(number).zfill(4)}"
+
 @api_router.post("/stock-transfers", response_model=StockTransfer)
 async def create_stock_transfer(transfer_data: StockTransferCreate, current_user: dict = Depends(get_current_user)):
     """Create a stock transfer between locations.
     Moves stock using FEFO logic at the source and accurately updates the destination.
     """
     
-    # Generate transfer number
-    today = datetime.now(timezone.utc)
-    prefix = "TRF"
-    year_suffix = today.strftime("%y")
-    
-    # Get count of transfers today for sequential numbering
-    start_of_day = today.replace(hour=0, minute=0, second=0, microsecond=0)
-    count = await db.stock_transfers.count_documents({
-        "created_at": {"$gte": start_of_day.isoformat()}
-    })
-    transfer_number = f"{prefix}{year_suffix}{today.strftime('%m%d')}{str(count + 1).zfill(4)}"
+    transfer_number = await next_transfer_number()
     
     enriched_items = []
     # Process each item in the transfer
@@ -4749,6 +5107,7 @@ async def create_stock_transfer(transfer_data: StockTransferCreate, current_user
                 if not dest_item.get("expiry_date") and exp_date:
                     update_fields["$set"] = {"expiry_date": exp_date}
                 await db.medicines.update_one({"id": dest_item["id"]}, update_fields)
+                await stock_ledger.apply_deltas(db, [stock_ledger.medicine_delta(dest_item, deduct_qty)])
             else:
                 new_dest_item = {
                     "id": str(uuid.uuid4()),
@@ -4765,6 +5124,7 @@ async def create_stock_transfer(transfer_data: StockTransferCreate, current_user
                     "created_at": datetime.now(timezone.utc).isoformat()
                 }
                 await db.medicines.insert_one(new_dest_item)
+                await stock_ledger.apply_deltas(db, [stock_ledger.medicine_delta(new_dest_item, deduct_qty)])
                 
         # Record the actual movement details
         item_copy = dict(item_data)
@@ -4787,11 +5147,15 @@ async def create_stock_transfer(transfer_data: StockTransferCreate, current_user
 
 @api_router.get("/stock-transfers", response_model=List[StockTransfer])
 async def get_stock_transfers(
+    response: Response,
+    page: PageParams = Depends(page_params),
+    select: FieldSelection = Depends(field_params),
     from_id: Optional[str] = None,
     to_id: Optional[str] = None,
     transfer_type: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
+    fields = select.resolve("stock_transfers", StockTransfer, "id", "created_at")
     query = {}
     if from_id:
         query["from_id"] = from_id
@@ -4799,8 +5163,8 @@ async def get_stock_transfers(
         query["to_id"] = to_id
     if transfer_type:
         query["transfer_type"] = transfer_type
-    transfers = await db.stock_transfers.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    return transfers
+    docs = await paginate(db.stock_transfers, query, "created_at", -1, page, response, default_limit=1000, projection=projection.mongo_projection(fields))
+    return projection.respond(docs, response, StockTransfer, fields)
 
 @api_router.delete("/stock-transfers/{transfer_id}")
 async def delete_stock_transfer(transfer_id: str, current_user: dict = Depends(get_current_user)):
@@ -4832,7 +5196,8 @@ async def delete_stock_transfer(transfer_id: str, current_user: dict = Depends(g
             dest_query["branch_id"] = transfer.get("to_id")
             dest_query["godown_id"] = None
             
-        await db.medicines.update_one(dest_query, {"$inc": {"stock_quantity": -quantity}})
+        dest_item = await db.medicines.find_one_and_update(dest_query, {"$inc": {"stock_quantity": -quantity}}, projection={"_id": 0})
+        await stock_ledger.apply_deltas(db, [stock_ledger.medicine_delta(dest_item, -quantity)])
             
         # Add back to source
         src_query = {
@@ -4851,6 +5216,7 @@ async def delete_stock_transfer(transfer_id: str, current_user: dict = Depends(g
         src_item = await db.medicines.find_one(src_query)
         if src_item:
             await db.medicines.update_one({"id": src_item["id"]}, {"$inc": {"stock_quantity": quantity}})
+            await stock_ledger.apply_deltas(db, [stock_ledger.medicine_delta(src_item, quantity)])
         else:
             # Create new record in source if it was deleted
             new_src_item = {
@@ -4866,6 +5232,7 @@ async def delete_stock_transfer(transfer_id: str, current_user: dict = Depends(g
                 "created_at": datetime.now(timezone.utc).isoformat()
             }
             await db.medicines.insert_one(new_src_item)
+            await stock_ledger.apply_deltas(db, [stock_ledger.medicine_delta(new_src_item, quantity)])
             
     await db.stock_transfers.delete_one({"id": transfer_id})
     return {"message": "Transfer deleted and stock reversed"}
@@ -4899,7 +5266,8 @@ async def update_stock_transfer(transfer_id: str, transfer_data: StockTransferCr
         else:
             dest_query["branch_id"] = old_transfer.get("to_id")
             dest_query["godown_id"] = None
-        await db.medicines.update_one(dest_query, {"$inc": {"stock_quantity": -quantity}})
+        dest_item = await db.medicines.find_one_and_update(dest_query, {"$inc": {"stock_quantity": -quantity}}, projection={"_id": 0})
+        await stock_ledger.apply_deltas(db, [stock_ledger.medicine_delta(dest_item, -quantity)])
         
         # Add back to source
         src_query = {
@@ -4918,6 +5286,7 @@ async def update_stock_transfer(transfer_id: str, transfer_data: StockTransferCr
         src_item = await db.medicines.find_one(src_query)
         if src_item:
             await db.medicines.update_one({"id": src_item["id"]}, {"$inc": {"stock_quantity": quantity}})
+            await stock_ledger.apply_deltas(db, [stock_ledger.medicine_delta(src_item, quantity)])
         else:
             # Recreate source item if deleted
             new_src_item = {
@@ -4933,6 +5302,7 @@ async def update_stock_transfer(transfer_id: str, transfer_data: StockTransferCr
                 "created_at": datetime.now(timezone.utc).isoformat()
             }
             await db.medicines.insert_one(new_src_item)
+            await stock_ledger.apply_deltas(db, [stock_ledger.medicine_delta(new_src_item, quantity)])
 
     # 2. Apply new movements (logic similar to create_stock_transfer)
     for item_data in transfer_data.items:
@@ -4989,6 +5359,7 @@ async def update_stock_transfer(transfer_id: str, transfer_data: StockTransferCr
         src_item = await db.medicines.find_one(source_query)
         if src_item:
             await db.medicines.update_one({"id": src_item["id"]}, {"$inc": {"stock_quantity": -quantity}})
+            await stock_ledger.apply_deltas(db, [stock_ledger.medicine_delta(src_item, -quantity)])
         else:
             new_src_item = {
                 "id": str(uuid.uuid4()),
@@ -5003,6 +5374,7 @@ async def update_stock_transfer(transfer_id: str, transfer_data: StockTransferCr
                 "created_at": datetime.now(timezone.utc).isoformat()
             }
             await db.medicines.insert_one(new_src_item)
+            await stock_ledger.apply_deltas(db, [stock_ledger.medicine_delta(new_src_item, -quantity)])
         
         # 3. Add to destination
         dest_query = {
@@ -5021,6 +5393,7 @@ async def update_stock_transfer(transfer_id: str, transfer_data: StockTransferCr
         dest_item = await db.medicines.find_one(dest_query)
         if dest_item:
             await db.medicines.update_one({"id": dest_item["id"]}, {"$inc": {"stock_quantity": quantity}})
+            await stock_ledger.apply_deltas(db, [stock_ledger.medicine_delta(dest_item, quantity)])
         else:
             new_dest_item = {
                 "id": str(uuid.uuid4()),
@@ -5036,6 +5409,7 @@ async def update_stock_transfer(transfer_id: str, transfer_data: StockTransferCr
                 "created_at": datetime.now(timezone.utc).isoformat()
             }
             await db.medicines.insert_one(new_dest_item)
+            await stock_ledger.apply_deltas(db, [stock_ledger.medicine_delta(new_dest_item, quantity)])
 
     # 3. Update the record
     updated_dict = {
@@ -5051,16 +5425,7 @@ async def update_stock_transfer(transfer_id: str, transfer_data: StockTransferCr
 @api_router.get("/stock-transfers/next-number")
 async def get_next_transfer_number(current_user: dict = Depends(get_current_user)):
     """Get the next transfer number for display purposes."""
-    today = datetime.now(timezone.utc)
-    prefix = "TRF"
-    year_suffix = today.strftime("%y")
-    
-    start_of_day = today.replace(hour=0, minute=0, second=0, microsecond=0)
-    count = await db.stock_transfers.count_documents({
-        "created_at": {"$gte": start_of_day.isoformat()}
-    })
-    transfer_number = f"{prefix}{year_suffix}{today.strftime('%m%d')}{str(count + 1).zfill(4)}"
-    return {"transfer_number": transfer_number}
+    return {"transfer_number": await next_transfer_number(reserve=False)}
 
 # Role Permissions endpoints
 @api_router.post("/role-permissions", response_model=RolePermission)
@@ -5131,6 +5496,7 @@ async def init_default_gst_slabs(current_user: dict = Depends(get_current_user))
             "created_at": datetime.now(timezone.utc).isoformat()
         }
         await db.gst_slabs.insert_one(slab_dict)
+    await catalog.bump(db, "gst_slabs")
     
     return {"message": "Default GST slabs initialized"}
 
@@ -5162,6 +5528,7 @@ async def init_default_item_units(current_user: dict = Depends(get_current_user)
             "created_at": datetime.now(timezone.utc).isoformat()
         }
         await db.item_units.insert_one(unit_dict)
+    await catalog.bump(db, "item_units")
     
     return {"message": "Default item units initialized"}
 
@@ -5189,6 +5556,7 @@ async def init_default_categories(current_user: dict = Depends(get_current_user)
             "created_at": datetime.now(timezone.utc).isoformat()
         }
         await db.categories.insert_one(cat_dict)
+    await catalog.bump(db, "categories")
     
     return {"message": "Default categories initialized"}
 
@@ -5208,10 +5576,14 @@ async def create_bank_account(bank_data: BankAccountCreate, current_user: dict =
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.bank_accounts.insert_one(bank_dict)
+    await catalog.bump(db, "bank_accounts")
     return BankAccount(**bank_dict)
 
 @api_router.get("/bank-accounts", response_model=List[BankAccount])
-async def get_bank_accounts(current_user: dict = Depends(get_current_user)):
+async def get_bank_accounts(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    not_modified = await conditional_get(request, response, current_user, "bank_accounts")
+    if not_modified is not None:
+        return not_modified
     accounts = await db.bank_accounts.find({}, {"_id": 0}).to_list(100)
     return accounts
 
@@ -5232,6 +5604,7 @@ async def update_bank_account(bank_id: str, bank_data: BankAccountUpdate, curren
         raise HTTPException(status_code=400, detail="No fields to update")
     
     await db.bank_accounts.update_one({"id": bank_id}, {"$set": update_dict})
+    await catalog.bump(db, "bank_accounts")
     account = await db.bank_accounts.find_one({"id": bank_id}, {"_id": 0})
     if not account:
         raise HTTPException(status_code=404, detail="Bank account not found")
@@ -5245,12 +5618,15 @@ async def delete_bank_account(bank_id: str, current_user: dict = Depends(get_cur
     result = await db.bank_accounts.delete_one({"id": bank_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Bank account not found")
+    await catalog.bump(db, "bank_accounts")
     return {"message": "Bank account deleted successfully"}
 
 # ============ BANK TRANSACTION ENDPOINTS ============
 
 @api_router.get("/bank-transactions")
 async def get_bank_transactions(
+    response: Response,
+    page: PageParams = Depends(page_params),
     bank_account_id: Optional[str] = None,
     transaction_type: Optional[str] = None,
     start_date: Optional[str] = None,
@@ -5265,8 +5641,7 @@ async def get_bank_transactions(
     if start_date and end_date:
         query["transaction_date"] = {"$gte": start_date, "$lte": end_date}
     
-    transactions = await db.bank_transactions.find(query, {"_id": 0}).sort("created_at", -1).to_list(10000)
-    return transactions
+    return await paginate(db.bank_transactions, query, "created_at", -1, page, response, default_limit=10000)
 
 @api_router.post("/bank-transactions")
 async def create_bank_transaction(txn_data: BankTransactionCreate, current_user: dict = Depends(get_current_user)):
@@ -5274,21 +5649,26 @@ async def create_bank_transaction(txn_data: BankTransactionCreate, current_user:
     txn_dict = {
         "id": txn_id,
         **txn_data.model_dump(),
+        # Collections recorded at a branch count in its daily and shift reports
+        "branch_id": txn_data.branch_id or current_user.get("branch_id"),
         "is_manual": True,  # Mark as manually added
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.bank_transactions.insert_one(txn_dict)
+    balance_change = txn_data.amount if txn_data.transaction_type == "credit" else -txn_data.amount
     
-    # Update bank balance
-    bank = await db.bank_accounts.find_one({"id": txn_data.bank_account_id})
-    if bank:
-        balance_change = txn_data.amount if txn_data.transaction_type == "credit" else -txn_data.amount
-        new_balance = bank.get("current_balance", 0) + balance_change
+    async def write(uow):
+        await db.bank_transactions.insert_one(txn_dict, session=uow.session)
+        # Update bank balance (no-op if the account doesn't exist)
         await db.bank_accounts.update_one(
             {"id": txn_data.bank_account_id},
-            {"$set": {"current_balance": new_balance}}
+            {"$inc": {"current_balance": balance_change}},
+            session=uow.session
         )
+        uow.after_commit(report_cache.invalidate, db, "bank_transactions", None, txn_dict)
+        # current_balance moved
+        uow.after_commit(catalog.bump, db, "bank_accounts")
     
+    await unit_of_work.run(client, write)
     return {"message": "Transaction recorded", "id": txn_id}
 
 @api_router.get("/bank-transactions/summary")
@@ -5301,6 +5681,17 @@ async def get_bank_summary(
     if start_date and end_date:
         query["transaction_date"] = {"$gte": start_date, "$lte": end_date}
     
+    return await report_cache.cached(
+        db, "bank_summary",
+        filters={"start_date": start_date, "end_date": end_date},
+        scope={},
+        date_from=start_date,
+        date_to=end_date,
+        collections=("bank_transactions",),
+        compute=lambda: build_bank_summary(query),
+    )
+
+async def build_bank_summary(query: dict) -> dict:
     transactions = await db.bank_transactions.find(query, {"_id": 0}).to_list(10000)
     
     total_credit = sum(t["amount"] for t in transactions if t["transaction_type"] == "credit")
@@ -5351,22 +5742,25 @@ async def log_bank_transaction(
     upi_id: Optional[str] = None,
     party_name: Optional[str] = None,
     party_id: Optional[str] = None,
-    invoice_number: Optional[str] = None
+    invoice_number: Optional[str] = None,
+    branch_id: Optional[str] = None,
+    uow: Optional[unit_of_work.UnitOfWork] = None
 ):
-    """Auto-log non-cash transactions to banking"""
+    """Auto-log non-cash transactions to banking (inside the caller's unit of work, if any)"""
     if payment_mode == "cash":
         return None
+    session = uow.session if uow else None
     
     # Find appropriate bank account
     bank = None
     if bank_account_id:
-        bank = await db.bank_accounts.find_one({"id": bank_account_id, "is_active": True})
+        bank = await db.bank_accounts.find_one({"id": bank_account_id, "is_active": True}, session=session)
     elif upi_id:
-        bank = await db.bank_accounts.find_one({"upi_ids": upi_id, "is_active": True})
+        bank = await db.bank_accounts.find_one({"upi_ids": upi_id, "is_active": True}, session=session)
     
     if not bank:
         # Use first active bank account as default
-        bank = await db.bank_accounts.find_one({"is_active": True})
+        bank = await db.bank_accounts.find_one({"is_active": True}, session=session)
     
     if not bank:
         return None
@@ -5389,17 +5783,20 @@ async def log_bank_transaction(
         "party_id": party_id,
         "invoice_number": invoice_number,
         "is_manual": False,
+        "branch_id": branch_id,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.bank_transactions.insert_one(txn_dict)
+    await db.bank_transactions.insert_one(txn_dict, session=session)
     
-    # Update bank balance
+    # Update bank balance ($inc so concurrent postings don't overwrite each other)
     balance_change = amount if transaction_type == "credit" else -amount
-    new_balance = bank.get("current_balance", 0) + balance_change
     await db.bank_accounts.update_one(
         {"id": bank["id"]},
-        {"$set": {"current_balance": new_balance}}
+        {"$inc": {"current_balance": balance_change}},
+        session=session
     )
+    await unit_of_work.defer(uow, report_cache.invalidate, db, "bank_transactions", None, txn_dict)
+    await unit_of_work.defer(uow, catalog.bump, db, "bank_accounts")
     
     return txn_id
 
@@ -5459,4 +5856,6 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await job_runner.stop()
     client.close()
+    shutdown_password_executor()
@@ -0,0 +1,33 @@
+"""
+Test cases for the benchmark suite's dataset determinism and regression check (no database needed)
+"""
+import sys
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.suite.datagen import Generator
+from benchmarks.suite.stats import regressions, summarize
+
+
+class TestDatagen:
+    """Test that the generator is reproducible"""
+
+    def test_same_seed_same_values(self):
+        a, b = Generator(7, date(2026, 1, 31), 30), Generator(7, date(2026, 1, 31), 30)
+        assert [a.uid() for _ in range(3)] == [b.uid() for _ in range(3)]
+        assert [a.timestamp() for _ in range(50)] == [b.timestamp() for _ in range(50)]
+        assert Generator(8, date(2026, 1, 31), 30).uid() != Generator(7, date(2026, 1, 31), 30).uid()
+
+
+class TestRegressions:
+    """Test baseline comparison thresholds"""
+
+    def test_p95_throughput_and_errors_flagged(self):
+        baseline = {"scenarios": {"daily_report": summarize("daily_report", [10.0] * 100, 1.0, 0)}}
+        assert regressions([summarize("daily_report", [12.0] * 100, 1.1, 0)], baseline, 0.25) == []
+
+        slow = regressions([summarize("daily_report", [20.0] * 100, 2.0, 1)], baseline, 0.25)
+        assert len(slow) == 3
+        assert regressions([summarize("new_scenario", [99.0], 1.0, 0)], baseline, 0.25) == []
@@ -0,0 +1,72 @@
+"""
+Test cases for chunked bulk inserts and row error mapping (no database needed)
+"""
+import sys
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pymongo.errors import BulkWriteError
+from utils.bulk_import import insert_rows
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeCollection:
+    """Just enough of a Motor collection; rejects documents named "bad"."""
+
+    def __init__(self, existing=()):
+        self.docs = [dict(d) for d in existing]
+        self.inserts = 0
+
+    def find(self, query, projection):
+        (field, condition), = query.items()
+        return FakeCursor([d for d in self.docs if d.get(field) in condition["$in"]])
+
+    async def insert_many(self, docs, ordered=True):
+        self.inserts += 1
+        errors = []
+        for i, doc in enumerate(docs):
+            if doc.get("name") == "bad":
+                errors.append({"index": i, "errmsg": "rejected"})
+            else:
+                self.docs.append(doc)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+def rows(*patient_ids):
+    return [(i + 1, {"patient_id": pid, "name": pid}) for i, pid in enumerate(patient_ids)]
+
+
+class TestInsertRows:
+    """Test dedupe, chunking and row numbers of reported errors"""
+
+    def test_duplicates_in_db_and_upload(self):
+        """Existing ids and repeats within the upload are reported, not inserted"""
+        collection = FakeCollection(existing=[{"patient_id": "P1"}])
+        result = asyncio.run(insert_rows(collection, rows("P1", "P2", "P2", "P3"),
+                                         unique_field="patient_id", label_field="patient_id", chunk_size=2))
+        assert result["created"] == 2
+        assert [(e["row"], e["patient_id"]) for e in result["errors"]] == [(1, "P1"), (3, "P2")]
+        assert collection.inserts == 2
+
+    def test_write_errors_map_to_rows(self):
+        """A rejected document in a chunk keeps its upload row number"""
+        collection = FakeCollection()
+        inserted = []
+
+        async def after_chunk(docs):
+            inserted.extend(docs)
+
+        result = asyncio.run(insert_rows(collection, rows("ok1", "bad", "ok2"), label_field="name", after_chunk=after_chunk))
+        assert result["created"] == 2
+        assert result["errors"] == [{"row": 2, "name": "bad", "error": "rejected"}]
+        assert [d["name"] for d in inserted] == ["ok1", "ok2"]
@@ -0,0 +1,100 @@
+"""
+Test cases for the versioned master-data cache (no database needed)
+"""
+import sys
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import catalog as catalog_module
+from utils.catalog import Catalog
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def to_list(self, length):
+        return [dict(row) for row in self.rows]
+
+
+class FakeCollection:
+    def __init__(self, rows=None):
+        self.rows = rows or []
+        self.finds = 0
+
+    def find(self, query, projection=None):
+        self.finds += 1
+        return FakeCursor(self.rows)
+
+
+class FakeMeta:
+    def __init__(self):
+        self.versions = {}
+        self.modified = {}
+
+    async def find_one(self, query, projection=None):
+        return {"versions": dict(self.versions), "modified": dict(self.modified)} if self.versions else None
+
+    async def find_one_and_update(self, query, update, **kwargs):
+        for field, step in update["$inc"].items():
+            name = field.split(".", 1)[1]
+            self.versions[name] = self.versions.get(name, 0) + step
+        for field, value in update["$set"].items():
+            self.modified[field.split(".", 1)[1]] = value
+        return {"versions": dict(self.versions), "modified": dict(self.modified)}
+
+
+class FakeDatabase:
+    def __init__(self, meta=None):
+        self.system_meta = meta or FakeMeta()
+        self.item_units = FakeCollection([
+            {"id": "u2", "name": "Strips", "created_at": "2024-02-01"},
+            {"id": "u1", "name": " tablets ", "created_at": "2024-01-01"},
+        ])
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+
+class TestCatalog:
+    """Test indexing, reuse between writes and cross-worker refresh"""
+
+    def test_indexes_and_order(self):
+        table = asyncio.run(Catalog().table(FakeDatabase(), "item_units"))
+        assert [row["id"] for row in table.rows] == ["u1", "u2"]
+        assert table.by_id["u2"]["name"] == "Strips"
+        assert table.by_name["tablets"]["id"] == "u1"
+
+    def test_reused_until_bumped(self, monkeypatch):
+        monkeypatch.setattr(catalog_module, "POLL_SECONDS", 0)
+        db, cache = FakeDatabase(), Catalog()
+        before = cache.etag("item_units")
+
+        async def flow():
+            await cache.table(db, "item_units")
+            await cache.table(db, "item_units")
+            assert db.item_units.finds == 1
+            await cache.bump(db, "item_units")
+            await cache.table(db, "item_units")
+
+        asyncio.run(flow())
+        assert db.item_units.finds == 2
+        assert cache.etag("item_units") != before
+        assert cache.last_modified("item_units", "gst_slabs") == db.system_meta.modified["item_units"]
+
+    def test_other_worker_sees_bump(self, monkeypatch):
+        monkeypatch.setattr(catalog_module, "POLL_SECONDS", 0)
+        meta = FakeMeta()
+        writer, reader = FakeDatabase(meta), FakeDatabase(meta)
+        worker = Catalog()
+
+        async def flow():
+            await worker.table(reader, "item_units")
+            await Catalog().bump(writer, "item_units")
+            reader.item_units.rows.append({"id": "u3", "name": "Box", "created_at": "2024-03-01"})
+            return await worker.table(reader, "item_units")
+
+        table = asyncio.run(flow())
+        assert "u3" in table.by_id
@@ -0,0 +1,102 @@
+"""
+Test cases for the sync change log (no database needed)
+"""
+import sys
+import asyncio
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bson import ObjectId
+
+from utils import change_log
+from utils.change_log import CREATED, DELETED, RESET, UPDATED, collapse
+
+
+def log(collection, op, doc_id=None):
+    return {"collection": collection, "op": op, "doc_id": doc_id}
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda d: d[field])
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length):
+        return list(self.docs)
+
+
+class FakeCollection:
+    def __init__(self, docs=None, id_field="id"):
+        self.docs = docs or []
+        self.id_field = id_field
+
+    async def insert_many(self, docs, ordered=True, session=None):
+        self.docs.extend(docs)
+
+    def find(self, query, projection=None):
+        if "_id" in query:
+            return FakeCursor([d for d in self.docs if query["_id"]["$gt"] < d["_id"] < query["_id"]["$lt"]
+                               and d["collection"] in query["collection"]["$in"]])
+        wanted = query[self.id_field]["$in"]
+        return FakeCursor([d for d in self.docs if d[self.id_field] in wanted])
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.change_log = FakeCollection()
+        self.patients = FakeCollection([{"id": "p1", "name": "Asha"}, {"id": "p2", "name": "Ravi"}])
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+
+class TestCollapse:
+    """Test the net effect of several entries for one document"""
+
+    def test_net_operations(self):
+        net = collapse([
+            log("patients", CREATED, "a"), log("patients", UPDATED, "a"),
+            log("patients", UPDATED, "b"), log("patients", DELETED, "b"),
+            log("patients", CREATED, "c"), log("patients", DELETED, "c"),
+        ])
+        assert net == {"patients": {"a": CREATED, "b": DELETED}}
+
+    def test_reset_clears_earlier_entries(self):
+        net = collapse([log("stock_levels", UPDATED, "k1"), log("stock_levels", RESET), log("stock_levels", UPDATED, "k2")])
+        assert net == {"stock_levels": {None: RESET, "k2": UPDATED}}
+
+
+class TestChanges:
+    """Test pulls against the settle window and cursor expiry"""
+
+    def test_pull_returns_settled_changes(self, monkeypatch):
+        db = FakeDatabase()
+        start = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(seconds=60))
+
+        async def flow():
+            await change_log.record(db, "patients", CREATED, ["p1"])
+            await change_log.record(db, "patients", UPDATED, ["p2", "gone"])
+            # Move the settle horizon past the entries just written
+            monkeypatch.setattr(change_log, "SETTLE_SECONDS", -2)
+            return await change_log.changes(db, str(start), ["patients"])
+
+        result = asyncio.run(flow())
+        changes = result["changes"]["patients"]
+        assert [doc["id"] for doc in changes["created"]] == ["p1"]
+        assert [doc["id"] for doc in changes["updated"]] == ["p2"]
+        assert changes["deleted"] == ["gone"]
+        assert not result["has_more"] and ObjectId(result["cursor"]) > start
+
+    def test_expired_cursor_asks_for_resync(self):
+        old = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(days=change_log.RETENTION_DAYS + 1))
+        result = asyncio.run(change_log.changes(FakeDatabase(), str(old), ["patients"]))
+        assert result["resync"] is True
@@ -0,0 +1,44 @@
+"""
+Test cases for conditional GET helpers (no database needed)
+"""
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.conditional import changed_since, http_date, is_fresh, make_etag
+
+MODIFIED = "2025-01-10T09:30:15.250000+00:00"
+OTHER_ETAG = 'W/"x"'
+
+
+class TestFreshness:
+    """Test If-None-Match / If-Modified-Since handling"""
+
+    def test_etag_match(self):
+        etag = make_etag("branches.3", "user-1?")
+        assert is_fresh({"if-none-match": etag}, etag, MODIFIED)
+        # Weak/strong forms and lists compare equal
+        assert is_fresh({"if-none-match": f'"other", {etag.removeprefix("W/")}'}, etag, MODIFIED)
+        assert is_fresh({"if-none-match": "*"}, etag, MODIFIED)
+        assert not is_fresh({"if-none-match": make_etag("branches.4", "user-1?")}, etag, MODIFIED)
+
+    def test_etag_varies_with_request(self):
+        assert make_etag("doctors.1", "user-1?branch_id=b1") != make_etag("doctors.1", "user-2?branch_id=b1")
+
+    def test_if_modified_since(self):
+        assert http_date(MODIFIED) == "Fri, 10 Jan 2025 09:30:15 GMT"
+        assert is_fresh({"if-modified-since": http_date(MODIFIED)}, OTHER_ETAG, MODIFIED)
+        assert not is_fresh({"if-modified-since": "Fri, 10 Jan 2025 09:30:14 GMT"}, OTHER_ETAG, MODIFIED)
+        # If-None-Match wins when both are sent
+        assert not is_fresh({"if-none-match": 'W/"old"', "if-modified-since": http_date(MODIFIED)}, OTHER_ETAG, MODIFIED)
+        assert not is_fresh({"if-modified-since": "garbage"}, OTHER_ETAG, MODIFIED)
+        assert not is_fresh({}, OTHER_ETAG, MODIFIED)
+
+    def test_changed_since(self):
+        since = datetime(2025, 1, 10, tzinfo=timezone.utc)
+        assert changed_since({"created_at": "2025-01-01T00:00:00+00:00", "updated_at": "2025-01-11T00:00:00+00:00"}, since)
+        assert not changed_since({"created_at": "2025-01-01T00:00:00+00:00"}, since)
+        # Rows without timestamps are always sent
+        assert changed_since({}, since)
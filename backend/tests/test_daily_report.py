@@ -0,0 +1,93 @@
+"""
+Test cases for the daily report pipeline and summary (no database needed)
+"""
+import sys
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import reports
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.pipeline = None
+
+    def aggregate(self, pipeline, **kwargs):
+        self.pipeline = pipeline
+        return FakeCursor(self.docs)
+
+    def find(self, query, projection=None):
+        return FakeCursor(self.docs)
+
+
+def patient(pid, treatment=0, pharmacy=0, cash=0, upi=0):
+    paid = cash + upi
+    return {"patient_id": pid, "treatment_amount": treatment, "pharmacy_amount": pharmacy, "total_amount": treatment + pharmacy,
+            "paid_amount": paid, "balance_amount": treatment + pharmacy - paid, "collections": [],
+            "cash": cash, "upi": upi, "card": 0, "netbanking": 0, "other": 0}
+
+
+class TestDailyReportPipeline:
+    """Test pipeline shape and summary totals"""
+
+    def test_sources_are_unioned_without_limits(self):
+        query = {"created_at": {"$gte": "2025-01-01T00:00:00", "$lt": "2025-01-01T12:00:00"}, "branch_id": "b1"}
+        walkin_query = {"paid_at": query["created_at"], "branch_id": "b1", "status": "completed"}
+        pipeline = reports.daily_report_pipeline(query, walkin_query)
+        unions = [stage["$unionWith"]["coll"] for stage in pipeline if "$unionWith" in stage]
+        assert unions == ["pharmacy_sales", "bank_transactions", "walkins"]
+        assert not any("$limit" in stage for stage in pipeline)
+        walkin_match = pipeline[4]["$unionWith"]["pipeline"][0]["$match"]
+        assert walkin_match == {**walkin_query, "payment_mode": "cash"}
+        # Literal zeros, never a bare 0 (which $project reads as an exclusion)
+        bill_row = pipeline[1]["$project"]
+        assert bill_row["pharmacy_amount"] == {"$literal": 0}
+
+    def test_branch_scoped_bank_credit(self):
+        """A UPI credit logged for the shift's branch is in the handover; other branches' are not"""
+        window = {"$gte": "2025-01-01T09:00:00", "$lt": "2025-01-01T17:00:00"}
+        query = {"created_at": window, "branch_id": "b1"}
+        pipeline = reports.daily_report_pipeline(query, {"paid_at": window, "branch_id": "b1"})
+        bank_match = pipeline[3]["$unionWith"]["pipeline"][0]["$match"]
+
+        def matches(doc):
+            for field, cond in bank_match.items():
+                value = doc.get(field)
+                if isinstance(cond, dict):
+                    if value is None or not cond["$gte"] <= value < cond["$lt"]:
+                        return False
+                elif value != cond:
+                    return False
+            return True
+
+        # As written by log_bank_transaction for a branch's sale
+        credit = {"transaction_type": "credit", "payment_mode": "upi", "amount": 250,
+                  "created_at": "2025-01-01T10:30:00+00:00", "branch_id": "b1"}
+        assert matches(credit)
+        assert not matches({**credit, "branch_id": "b2"})
+        assert not matches({**credit, "transaction_type": "debit"})
+        assert not matches({**credit, "created_at": "2025-01-01T18:00:00+00:00"})
+
+    def test_summary_from_patient_rows(self):
+        class FakeDatabase:
+            bills = FakeCollection([patient("p1", treatment=500, cash=300), patient("walk-in", pharmacy=120, upi=120)])
+            expenses = FakeCollection([{"amount": 50}, {"amount": 25}])
+
+        report = asyncio.run(reports.daily_report(FakeDatabase(), {}, {}))
+        summary = report["summary"]
+        assert summary["total_amount"] == 620
+        assert summary["total_collected"] == 420
+        assert summary["total_balance"] == 200
+        assert summary["net_collection"] == 345
+        assert summary["payment_modes"] == {"cash": 300, "card": 0, "upi": 120, "netbanking": 0, "other": 0}
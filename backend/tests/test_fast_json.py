@@ -0,0 +1,80 @@
+"""
+Test cases for the trusted orjson response path (no database needed)
+"""
+import sys
+import json
+import asyncio
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+from fastapi import Response
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from pydantic import BaseModel, ConfigDict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+pytest.importorskip("orjson")
+
+from utils import fast_json
+
+
+class Sale(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    items: List[dict]
+    total_amount: float
+    discount: float = 0
+    branch_name: Optional[str] = None
+
+
+ROWS = [
+    {"id": "s1", "items": [{"name": "Paracetamol", "qty": 2}], "total_amount": 40, "discount": 5, "branch_name": "Main",
+     "upi_id": "x@upi"},
+    # Older document: no discount/branch_name stored
+    {"id": "s2", "items": [], "total_amount": 12.5},
+]
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(fast_json, "ENABLED", True)
+
+
+def fastapi_body(rows):
+    field = create_response_field(name="Response_list", type_=List[Sale])
+    return json.loads(json.dumps(asyncio.run(serialize_response(field=field, response_content=rows))))
+
+
+class TestTrusted:
+    """Test that the trusted path sends what response_model validation would"""
+
+    def test_matches_validated_output(self, enabled):
+        result = fast_json.trusted(ROWS, Response(), Sale)
+        assert isinstance(result, fast_json.FastJSONResponse)
+        assert json.loads(result.body) == fastapi_body(ROWS)
+        assert "upi_id" not in json.loads(result.body)[0]
+
+    def test_headers_carried_over(self, enabled):
+        response = Response()
+        response.headers["X-Next-Cursor"] = "abc"
+        response.headers["ETag"] = 'W/"1"'
+        result = fast_json.trusted(ROWS, response, Sale)
+        assert result.headers["x-next-cursor"] == "abc"
+        assert result.headers["etag"] == 'W/"1"'
+        assert result.headers["content-type"] == "application/json"
+
+    def test_passthrough(self, monkeypatch):
+        # Streams and 304s are left alone
+        not_modified = Response(status_code=304)
+        monkeypatch.setattr(fast_json, "ENABLED", True)
+        assert fast_json.trusted(not_modified, Response(), Sale) is not_modified
+        # Disabled: rows go through FastAPI's response_model handling as before
+        monkeypatch.setattr(fast_json, "ENABLED", False)
+        assert fast_json.trusted(ROWS, Response(), Sale) is ROWS
+
+    def test_render_unknown_types(self):
+        from bson import ObjectId
+        oid = ObjectId()
+        assert json.loads(fast_json.FastJSONResponse({"_id": oid, 1: "a"}).body) == {"_id": str(oid), "1": "a"}
@@ -0,0 +1,203 @@
+"""
+Test cases for FEFO planning, guarded decrements and re-planning (no database needed)
+"""
+import sys
+import asyncio
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import fefo
+from utils.fefo import plan_allocation, InsufficientStockError, StockConflictError
+
+
+def batch(id, name, qty, expiry="", created_at="2024-01-01", batch_number=None):
+    return {
+        "id": id, "name": name, "stock_quantity": qty, "expiry_date": expiry,
+        "created_at": created_at, "batch_number": batch_number or id, "mrp": 10.0
+    }
+
+
+class TestPlanAllocation:
+    """Test FEFO planning across multiple sale lines"""
+
+    def test_earliest_expiry_first_and_missing_expiry_last(self):
+        """Batches are consumed by expiry, undated batches last"""
+        batches = [
+            batch("b-none", "Para", 10),
+            batch("b-late", "Para", 5, expiry="2026-06-01"),
+            batch("b-early", "Para", 3, expiry="2025-01-01"),
+        ]
+        plan = plan_allocation(batches, [{"name": "Para", "quantity": 10}])
+        assert [(d["medicine_id"], d["quantity"]) for d in plan[0]] == [
+            ("b-early", 3), ("b-late", 5), ("b-none", 2)
+        ]
+
+    def test_repeated_item_lines_share_the_pool(self):
+        """Two lines of the same item cannot allocate the same units twice"""
+        batches = [batch("b1", "Para", 4, expiry="2025-01-01"), batch("b2", "Para", 4, expiry="2025-02-01")]
+        plan = plan_allocation(batches, [{"name": "Para", "quantity": 3}, {"name": "Para", "quantity": 3}])
+        assert [(d["medicine_id"], d["quantity"]) for d in plan[1]] == [("b1", 1), ("b2", 2)]
+
+        with pytest.raises(InsufficientStockError) as exc:
+            plan_allocation(batches, [{"name": "Para", "quantity": 5}, {"name": "Para", "quantity": 4}])
+        assert exc.value.available == 3
+
+    def test_batch_number_restricts_candidates(self):
+        """A requested batch number only draws from that batch"""
+        batches = [batch("b1", "Amox", 5, expiry="2025-01-01"), batch("b2", "Amox", 5, expiry="2025-06-01")]
+        plan = plan_allocation(batches, [{"name": "Amox", "quantity": 2, "batch_number": "b2"}])
+        assert [(d["medicine_id"], d["quantity"]) for d in plan[0]] == [("b2", 2)]
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class WriteResult:
+    def __init__(self, modified_count):
+        self.modified_count = modified_count
+
+
+class FakeMedicines:
+    """Applies the guarded $inc/$push/$pull updates FEFO issues.
+
+    ``before_write`` runs before each bulk write, standing in for a
+    concurrent sale taking stock between planning and applying.
+    """
+
+    def __init__(self, batches):
+        self.docs = {b["id"]: {**b, "recent_deductions": []} for b in batches}
+        self.writes = []
+        self.before_write = None
+
+    def find(self, query, projection=None, session=None):
+        names = query["name"]["$in"]
+        return FakeCursor([
+            {k: v for k, v in doc.items() if k != "recent_deductions"}
+            for doc in self.docs.values() if doc["name"] in names and doc["stock_quantity"] > 0
+        ])
+
+    def _matches(self, doc, query):
+        if "stock_quantity" in query and doc["stock_quantity"] < query["stock_quantity"]["$gte"]:
+            return False
+        if "recent_deductions.ref" in query:
+            return any(d["ref"] == query["recent_deductions.ref"] for d in doc["recent_deductions"])
+        return True
+
+    async def bulk_write(self, ops, ordered=True, session=None):
+        if self.before_write:
+            self.before_write(len(self.writes))
+        self.writes.append(ops)
+        modified = 0
+        for op in ops:
+            doc = self.docs.get(op._filter["id"])
+            if not doc or not self._matches(doc, op._filter):
+                continue
+            doc["stock_quantity"] += op._doc["$inc"]["stock_quantity"]
+            if "$push" in op._doc:
+                doc["recent_deductions"].extend(op._doc["$push"]["recent_deductions"]["$each"])
+            if "$pull" in op._doc:
+                ref = op._doc["$pull"]["recent_deductions"]["ref"]
+                doc["recent_deductions"] = [d for d in doc["recent_deductions"] if d["ref"] != ref]
+            modified += 1
+        return WriteResult(modified)
+
+
+class FakeDatabase:
+    def __init__(self, batches):
+        self.medicines = FakeMedicines(batches)
+
+
+def stock(db):
+    return {medicine_id: doc["stock_quantity"] for medicine_id, doc in db.medicines.docs.items()}
+
+
+def concurrent_sale(db, medicine_id, quantity, on_write=0):
+    """A competing counter takes ``quantity`` from a batch just before write number ``on_write``."""
+    def take(write_number):
+        if write_number == on_write:
+            db.medicines.docs[medicine_id]["stock_quantity"] -= quantity
+    return take
+
+
+class TestApplyAllocation:
+    """Test the guarded bulk decrement and its rollback"""
+
+    def test_conflict_rolls_back_the_batches_that_applied(self):
+        """A plan matching fewer batches than planned is undone exactly"""
+        db = FakeDatabase([batch("b1", "Para", 5, expiry="2025-01-01"), batch("b2", "Para", 5, expiry="2025-02-01"),
+                           batch("b3", "Amox", 4, expiry="2025-03-01")])
+        plan = plan_allocation(list(db.medicines.docs.values()), [{"name": "Para", "quantity": 8}, {"name": "Amox", "quantity": 2}])
+        db.medicines.before_write = concurrent_sale(db, "b2", 4)
+
+        with pytest.raises(StockConflictError):
+            asyncio.run(fefo.apply_allocation(db, "sale-1", plan))
+        decrements, rollback = db.medicines.writes
+        assert len(decrements) == 3
+        # The rollback targets every planned batch but only matches the ones carrying this sale's marker
+        assert {op._filter["id"] for op in rollback} == {"b1", "b2", "b3"}
+        assert stock(db) == {"b1": 5, "b2": 1, "b3": 4}
+        assert all(doc["recent_deductions"] == [] for doc in db.medicines.docs.values())
+
+    def test_rollback_only_touches_batches_carrying_the_marker(self):
+        """rollback_allocation after a partial write restores marked batches and leaves the rest"""
+        db = FakeDatabase([batch("b1", "Para", 5), batch("b2", "Para", 5)])
+        db.medicines.docs["b1"]["stock_quantity"] = 2
+        db.medicines.docs["b1"]["recent_deductions"] = [{"ref": "other", "quantity": 1}, {"ref": "sale-1", "quantity": 3}]
+
+        asyncio.run(fefo.rollback_allocation(db, "sale-1", {"b1": 3, "b2": 4}))
+        assert stock(db) == {"b1": 5, "b2": 5}
+        assert db.medicines.docs["b1"]["recent_deductions"] == [{"ref": "other", "quantity": 1}]
+
+
+class TestAllocate:
+    """Test re-planning after a conflict and the contention counters"""
+
+    @pytest.fixture(autouse=True)
+    def fresh_stats(self, monkeypatch):
+        monkeypatch.setattr(fefo, "RETRY_BACKOFF_SECONDS", 0)
+        monkeypatch.setattr(fefo, "stats", {k: 0 for k in fefo.stats})
+
+    def test_conflict_is_replanned_on_fresh_stock(self):
+        """The retry re-reads the batches and draws the shortfall from the next expiry"""
+        db = FakeDatabase([batch("b1", "Para", 5, expiry="2025-01-01"), batch("b2", "Para", 5, expiry="2025-02-01")])
+        db.medicines.before_write = concurrent_sale(db, "b1", 3)
+
+        plan, _ = asyncio.run(fefo.allocate(db, "sale-1", [{"name": "Para", "quantity": 4}], branch_id="br"))
+        assert [(d["medicine_id"], d["quantity"]) for d in plan[0]] == [("b1", 2), ("b2", 2)]
+        assert stock(db) == {"b1": 0, "b2": 3}
+        assert {k: fefo.stats[k] for k in ("conflicts", "retries", "retry_successes", "allocations", "batch_updates")} == {
+            "conflicts": 1, "retries": 1, "retry_successes": 1, "allocations": 1, "batch_updates": 2
+        }
+
+    def test_gives_up_after_max_retries(self):
+        """Every attempt losing the race ends in StockConflictError with stock untouched"""
+        db = FakeDatabase([batch("b1", "Para", 50)])
+
+        def competing_counter(write_number):
+            # Holds all but 9 units during each of our decrements (even writes), releases them before our rollback
+            db.medicines.docs["b1"]["stock_quantity"] = 9 if write_number % 2 == 0 else 50
+        db.medicines.before_write = competing_counter
+
+        with pytest.raises(StockConflictError):
+            asyncio.run(fefo.allocate(db, "sale-1", [{"name": "Para", "quantity": 10}], branch_id="br", max_retries=2))
+        assert fefo.stats["conflicts"] == 3
+        assert fefo.stats["retries"] == 2
+        assert fefo.stats["failed_after_retries"] == 1
+        assert fefo.stats["allocations"] == 0
+        assert stock(db) == {"b1": 50}
+        assert db.medicines.docs["b1"]["recent_deductions"] == []
+
+    def test_insufficient_stock_is_not_retried(self):
+        db = FakeDatabase([batch("b1", "Para", 3)])
+        with pytest.raises(InsufficientStockError):
+            asyncio.run(fefo.allocate(db, "sale-1", [{"name": "Para", "quantity": 4}], branch_id="br"))
+        assert fefo.stats["insufficient_stock"] == 1
+        assert db.medicines.writes == []
@@ -0,0 +1,64 @@
+"""
+Test cases for the index registry: every hot query must be served by an index.
+Needs a reachable MongoDB (MONGO_URL); skipped otherwise.
+"""
+import os
+import sys
+import uuid
+import asyncio
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from utils import indexes
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+
+
+async def _explain_hot_queries():
+    client = AsyncIOMotorClient(MONGO_URL, serverSelectionTimeoutMS=1500)
+    try:
+        await client.admin.command("ping")
+    except Exception:
+        client.close()
+        return None
+
+    db = client[f"index_plan_test_{uuid.uuid4().hex[:8]}"]
+    try:
+        # Collections must exist for the planner to consider their indexes
+        for collection in indexes.INDEXES:
+            await db[collection].insert_one({"_seed": True})
+        summary = await indexes.ensure_indexes(db)
+        plans = await indexes.check_query_plans(db)
+        report = await indexes.index_report(db)
+        return summary, plans, report
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+@pytest.fixture(scope="module")
+def results():
+    results = asyncio.run(_explain_hot_queries())
+    if results is None:
+        pytest.skip("MongoDB not reachable")
+    return results
+
+
+class TestIndexPlans:
+    """Test the declarative index registry against a live MongoDB"""
+
+    def test_registry_creates_all_indexes(self, results):
+        """Every registered index is created and none are reported missing"""
+        summary, _, report = results
+        assert summary["failed"] == []
+        assert report["missing"] == []
+
+    def test_no_hot_query_uses_collscan(self, results):
+        """Hot endpoint queries are planned as index scans"""
+        _, plans, _ = results
+        collscans = [p["name"] for p in plans if p["collscan"]]
+        assert collscans == []
@@ -0,0 +1,88 @@
+"""
+Test cases for maintenance job routines (no database needed)
+"""
+import sys
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.maintenance import backfill_bank_branches, duplicate_item_ids
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeCollection:
+    """Rows by "id"; find understands the filters the backfill issues."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        if "id" in query:
+            return FakeCursor([d for d in self.docs if d["id"] in query["id"]["$in"]])
+        return FakeCursor([d for d in self.docs if "branch_id" not in d and d["reference_type"] in query["reference_type"]["$in"]])
+
+    async def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            next(d for d in self.docs if d["_id"] == op._filter["_id"]).update(op._doc["$set"])
+        return SimpleNamespace(modified_count=len(ops))
+
+    async def delete_many(self, query):
+        return SimpleNamespace(deleted_count=0)
+
+
+class TestDuplicateItems:
+    """Test which item_master rows the dedupe job removes"""
+
+    def test_keeps_newest_per_name(self):
+        """Case/whitespace variants collapse onto the most recently created item"""
+        items = [
+            {"_id": 1, "name": "Paracetamol", "created_at": "2024-01-01"},
+            {"_id": 2, "name": " paracetamol ", "created_at": "2024-06-01"},
+            {"_id": 3, "name": "Ibuprofen", "created_at": "2024-02-01"},
+        ]
+        assert duplicate_item_ids(items) == [1]
+
+    def test_blank_names_removed(self):
+        items = [{"_id": 1, "name": ""}, {"_id": 2, "name": None}, {"_id": 3, "name": "Gauze"}]
+        assert sorted(duplicate_item_ids(items)) == [1, 2]
+
+
+class FakeDatabase:
+    def __init__(self, **collections):
+        self.collections = collections
+        self.bank_transactions = collections["bank_transactions"]
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, FakeCollection([]))
+
+
+class TestBankBranchBackfill:
+    """Test that legacy bank transactions get the branch of what they record"""
+
+    def test_branch_from_source_document(self):
+        bank = FakeCollection([
+            {"_id": 1, "reference_type": "pharmacy_sale", "reference_id": "s1"},
+            {"_id": 2, "reference_type": "bill", "reference_id": "bl1"},
+            {"_id": 3, "reference_type": "bill", "reference_id": "gone"},
+            {"_id": 4, "reference_type": "manual", "reference_id": "m1"},
+            {"_id": 5, "reference_type": "bill", "reference_id": "bl1", "branch_id": "b9"},
+        ])
+        db = FakeDatabase(
+            bank_transactions=bank,
+            pharmacy_sales=FakeCollection([{"id": "s1", "branch_id": "b1"}]),
+            bills=FakeCollection([{"id": "bl1", "branch_id": "b2"}]),
+        )
+        summary = asyncio.run(backfill_bank_branches(db))
+        assert summary == {"transactions": 3, "updated": 3}
+        assert [d.get("branch_id", "unset") for d in bank.docs] == ["b1", "b2", None, "unset", "b9"]
+        # Stamped rows (even with no branch) are not picked up again
+        assert asyncio.run(backfill_bank_branches(db)) == {"transactions": 0, "updated": 0}
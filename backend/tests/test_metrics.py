@@ -0,0 +1,81 @@
+"""
+Test cases for route metrics and Mongo command attribution (no database needed)
+"""
+import sys
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI
+from utils.metrics import Histogram, MetricsMiddleware, MetricsRegistry, MongoCommandListener
+from utils import metrics
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/api/patients/{patient_id}")
+    async def get_patient(patient_id: str):
+        # Stand-in for two Mongo round trips made by the handler
+        MongoCommandListener._record("find", 2000, 1)
+        MongoCommandListener._record("find", 3000, 40)
+        return {"id": patient_id}
+
+    return app
+
+
+def get(app, path):
+    """Minimal ASGI GET request; returns the response status."""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+             "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"", "headers": [],
+             "client": ("test", 1), "server": ("test", 80)}
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"]
+
+
+class TestHistogram:
+    """Test bucket counting and quantile estimates"""
+
+    def test_quantiles_interpolate_within_bucket(self):
+        h = Histogram((0.1, 0.2, 0.4))
+        for value in (0.05, 0.05, 0.15, 0.3):
+            h.observe(value)
+        assert h.cumulative() == [("0.1", 2), ("0.2", 3), ("0.4", 4), ("+Inf", 4)]
+        assert h.quantile(0.5) == 0.1
+        assert h.quantile(0.99) > 0.2
+
+
+class TestMetricsMiddleware:
+    """Test per-route labels and command attribution"""
+
+    def test_route_template_and_mongo_usage(self, monkeypatch):
+        registry = MetricsRegistry()
+        monkeypatch.setattr(metrics, "registry", registry)
+        app = make_app()
+        for pid in ("a", "b"):
+            assert get(app, f"/api/patients/{pid}") == 200
+
+        text = registry.render()
+        assert 'http_requests_total{method="GET",route="/api/patients/{patient_id}",status="200"} 2' in text
+        assert 'mongo_commands_total{route="/api/patients/{patient_id}",command="find"} 4' in text
+        assert 'mongo_documents_returned_total{route="/api/patients/{patient_id}",command="find"} 82' in text
+
+        row, = registry.summary()
+        assert row["requests"] == 2
+        assert row["mongo_commands_per_request"] == 2
+
+    def test_commands_outside_requests_are_background(self, monkeypatch):
+        registry = MetricsRegistry()
+        monkeypatch.setattr(metrics, "registry", registry)
+        MongoCommandListener._record("aggregate", 1000, 5)
+        assert 'mongo_commands_total{route="background",command="aggregate"} 1' in registry.render()
@@ -0,0 +1,41 @@
+"""
+Test cases for keyset cursor encoding and filters (no database needed)
+"""
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.pagination import encode_cursor, decode_cursor, after_cursor
+
+
+class TestKeysetCursor:
+    """Test cursor round-trips and the next-page filter"""
+
+    def test_cursor_round_trip(self):
+        """A cursor carries the sort value and id of the last row"""
+        cursor = encode_cursor({"id": "abc", "created_at": "2025-01-02T10:00:00+00:00", "total": 5}, "created_at")
+        assert decode_cursor(cursor) == {"v": "2025-01-02T10:00:00+00:00", "id": "abc"}
+
+    def test_invalid_cursor_is_rejected(self):
+        """Garbage cursors return 400 instead of an empty page"""
+        with pytest.raises(HTTPException) as exc:
+            decode_cursor("not-a-cursor")
+        assert exc.value.status_code == 400
+
+    def test_descending_filter_includes_ties_and_missing_values(self):
+        """Rows with the same sort value continue by id; rows without a value come last"""
+        query = after_cursor("created_at", -1, "2025-01-02", "m")
+        assert query == {"$or": [
+            {"created_at": {"$lt": "2025-01-02"}},
+            {"created_at": "2025-01-02", "id": {"$lt": "m"}},
+            {"created_at": None}
+        ]}
+
+    def test_ascending_filter_after_missing_value(self):
+        """Ascending pages move from missing values on to every set value"""
+        query = after_cursor("due_date", 1, None, "m")
+        assert query == {"$or": [{"due_date": None, "id": {"$gt": "m"}}, {"due_date": {"$ne": None}}]}
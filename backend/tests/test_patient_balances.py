@@ -0,0 +1,133 @@
+"""
+Test cases for reading precomputed patient balances (no database needed)
+"""
+import sys
+import asyncio
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import patient_balances
+from utils.patient_balances import snapshot, entry_delta, fold
+
+
+class TestPatientBalanceSnapshot:
+    """Test previous/today split of the running balance documents"""
+
+    def test_today_bucket_counts_as_pending(self):
+        """Amounts on today's bucket are pending, the rest is previous balance"""
+        doc = {"total_treatment": 500, "total_pharmacy": 120, "today": "2025-03-10",
+               "today_treatment": 200, "today_pharmacy": 20, "today_doctor_name": "Dr. Rao"}
+        result = snapshot([doc], today="2025-03-10")
+        assert result == {
+            "previous_balance": 400,
+            "treatment_fees_pending": 200,
+            "pharmacy_fees_pending": 20,
+            "current_balance": 620,
+            "doctor_name": "Dr. Rao"
+        }
+
+    def test_stale_day_rolls_into_previous_balance(self):
+        """A bucket from an earlier day is read as previous balance"""
+        doc = {"total_treatment": 500, "today": "2025-03-09", "today_treatment": 200, "today_doctor_name": "Dr. Rao"}
+        result = snapshot([doc], today="2025-03-10")
+        assert result["previous_balance"] == 500
+        assert result["treatment_fees_pending"] == 0
+        assert result["doctor_name"] is None
+
+    def test_internal_and_external_ids_are_summed(self):
+        """Balances kept under the UUID and the external patient number add up"""
+        docs = [{"total_pharmacy": 50}, {"total_treatment": 70, "today": "2025-03-10", "today_treatment": 70}]
+        result = snapshot(docs, today="2025-03-10")
+        assert result["previous_balance"] == 50
+        assert result["current_balance"] == 120
+
+    def test_entry_delta_uses_outstanding_amount_and_utc_day(self):
+        """Deltas carry total minus paid on the UTC creation day"""
+        bill = {"patient_id": "P-1", "total_amount": 300, "paid_amount": 100,
+                "created_at": "2025-03-10T23:30:00-02:00", "doctor_name": "Dr. Rao"}
+        delta = entry_delta("bills", bill, -1)
+        assert delta["amount"] == -200
+        assert delta["day"] == "2025-03-11"
+        assert delta["doctor_name"] is None
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda d: d[field])
+        return self
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeCollection:
+    def __init__(self, docs=None):
+        self.docs = docs or []
+
+    def find(self, query, projection=None):
+        return FakeCursor(list(self.docs))
+
+
+class FakeMeta:
+    def __init__(self):
+        self.doc = {"id": patient_balances.META_ID, "status": "ready"}
+
+    async def update_one(self, query, update, upsert=False):
+        self.doc.update(update["$set"])
+
+
+class FakeDatabase:
+    def __init__(self, bills, sales, balances):
+        self.bills = FakeCollection(bills)
+        self.pharmacy_sales = FakeCollection(sales)
+        self.patient_balances = FakeCollection(balances)
+        self.system_meta = FakeMeta()
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+
+def today_at(hour):
+    return datetime.now(timezone.utc).replace(hour=hour, minute=0, second=0, microsecond=0).isoformat()
+
+
+class TestRebuildVerification:
+    """Test that a rebuild which missed a write is caught and retired"""
+
+    def test_fold_rolls_the_day_like_the_pipeline(self):
+        doc = fold({}, {"kind": "treatment", "day": "2025-03-09", "amount": 100, "doctor_name": "Dr. Rao"})
+        doc = fold(doc, {"kind": "pharmacy", "day": "2025-03-10", "amount": 30, "doctor_name": None})
+        doc = fold(doc, {"kind": "treatment", "day": "2025-03-10", "amount": 50, "doctor_name": "Dr. Sen"})
+        doc = fold(doc, {"kind": "treatment", "day": "2025-03-08", "amount": 5, "doctor_name": "Dr. Old"})
+        assert doc == {"total_treatment": 155, "total_pharmacy": 30, "today": "2025-03-10",
+                       "today_treatment": 50, "today_pharmacy": 30, "today_doctor_name": "Dr. Sen"}
+
+    def test_missed_write_marks_balances_stale(self):
+        bills = [{"patient_id": "P-1", "total_amount": 300, "paid_amount": 100, "created_at": today_at(9), "doctor_name": "Dr. Rao"}]
+        sales = [{"patient_id": "P-1", "total_amount": 80, "paid_amount": 0, "created_at": today_at(10)}]
+        balances = [{"patient_key": "P-1"}]
+        for d in (entry_delta("bills", bills[0]), entry_delta("pharmacy_sales", sales[0])):
+            balances[0] = fold(balances[0], d)
+        db = FakeDatabase(bills, sales, balances)
+        assert asyncio.run(patient_balances.check_rebuild(db))["matches"]
+
+        # A sale written while the rebuild was reading, missing from the balances
+        sales.append({"patient_id": "P-1", "total_amount": 40, "paid_amount": 0, "created_at": today_at(11)})
+        with pytest.raises(patient_balances.BalanceDriftError):
+            asyncio.run(patient_balances.check_rebuild(db))
+        assert db.system_meta.doc["status"] == "stale"
+        report = asyncio.run(patient_balances.verify(db))
+        assert report["mismatched"][0]["expected"]["pharmacy_fees_pending"] == 120
+        assert report["mismatched"][0]["actual"]["pharmacy_fees_pending"] == 80
+        patient_balances._ready_cache["value"] = None
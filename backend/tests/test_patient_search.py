@@ -0,0 +1,116 @@
+"""
+Test cases for patient search fields, queries and ranking (no database needed)
+"""
+import sys
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import patient_search
+from utils.patient_search import search_fields, build_queries, score
+
+
+PATIENTS = [
+    {"id": "1", "name": "Ramesh Kumar", "patient_id": "PT-0042", "phone": "98450 12345"},
+    {"id": "2", "name": "Rama Devi", "patient_id": "PT-0043", "phone": "9000011111"},
+    {"id": "3", "name": "Suresh Rao", "patient_id": "PT-1000", "phone": "9845099999"},
+]
+
+
+def rank(q):
+    docs = [{**p, "search": search_fields(p)} for p in PATIENTS]
+    scored = sorted(((score(d, q), d["id"]) for d in docs), reverse=True)
+    return [pid for points, pid in scored if points > 0]
+
+
+class TestSearchFields:
+    """Test the stored search sub-document"""
+
+    def test_fields_are_normalized(self):
+        """Name words lower-cased, phone digits reversed"""
+        fields = search_fields(PATIENTS[0])
+        assert fields["tokens"] == ["ramesh", "kumar"]
+        assert fields["pid"] == "pt-0042"
+        assert fields["phone_rev"] == ["5432105489"]
+        assert " ra" in fields["grams"]
+
+    def test_queries_are_anchored(self):
+        """Every candidate query uses a ^prefix regex so it can use an index"""
+        for query in build_queries("98450"):
+            for condition in query.values():
+                regexes = condition.get("$all", [condition])
+                assert all(r["$regex"].startswith("^") for r in regexes)
+
+
+class TestSearchRanking:
+    """Test ranking of prefix, suffix and fuzzy matches"""
+
+    def test_exact_patient_id_first(self):
+        assert rank("PT-0042")[0] == "1"
+
+    def test_name_prefix(self):
+        """A name prefix matches both Ramesh and Rama, not Suresh"""
+        assert set(rank("ram")) == {"1", "2"}
+
+    def test_phone_suffix(self):
+        """Last digits of a phone number find the patient"""
+        assert rank("12345")[0] == "1"
+
+    def test_typo_tolerant(self):
+        """A misspelt name still ranks the intended patient first"""
+        assert rank("rmesh kumar")[0] == "1"
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def limit(self, n):
+        return FakeCursor(self.docs[:n])
+
+    async def to_list(self, length):
+        return self.docs[:length] if length else self.docs
+
+
+class FakePatients:
+    """Prefix queries return ``prefix_hits``; the trigram pipeline returns ``fuzzy_hits``."""
+
+    def __init__(self, prefix_hits, fuzzy_hits):
+        self.docs = {p["id"]: {**p, "search": search_fields(p)} for p in PATIENTS}
+        self.prefix_hits = prefix_hits
+        self.fuzzy_hits = fuzzy_hits
+        self.pipelines = []
+
+    def find(self, query, projection=None):
+        if "id" in query:
+            return FakeCursor([{k: v for k, v in self.docs[i].items() if k != "search"} for i in query["id"]["$in"]])
+        return FakeCursor([self.docs[i] for i in self.prefix_hits])
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        return FakeCursor([self.docs[i] for i in self.fuzzy_hits])
+
+
+class TestSearch:
+    """Test when the trigram fallback runs and what it reads"""
+
+    def run(self, db, q):
+        return asyncio.run(patient_search.search(type("Db", (), {"patients": db})(), q))
+
+    def test_prefix_hits_skip_fallback(self):
+        db = FakePatients(prefix_hits=["1", "2", "3"], fuzzy_hits=[])
+        results = self.run(db, "ram")
+        assert db.pipelines == []
+        assert [p["id"] for p in results] == ["2", "1"]
+        assert all("search" not in p for p in results)
+
+    def test_typo_ranked_by_shared_grams(self):
+        db = FakePatients(prefix_hits=[], fuzzy_hits=["3", "1"])
+        results = self.run(db, "rmesh")
+        assert results[0]["id"] == "1"
+        pipeline = db.pipelines[0]
+        # Ranked and cut in MongoDB, reading only what score() needs
+        assert {"$sort": {"shared": -1, "id": 1}} in pipeline
+        assert {"$limit": patient_search.FUZZY_CANDIDATES} in pipeline
+        assert "phone" not in pipeline[1]["$project"] and "search.grams" not in pipeline[1]["$project"]
@@ -0,0 +1,96 @@
+"""
+Test cases for slow-request profiling and explain summaries (no database needed)
+"""
+import sys
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import profiler
+from utils.profiler import ProfileCommandListener, ProfilingMiddleware, explain_command, summarize_explain
+
+
+class FakeCollection:
+    def __init__(self, doc=None):
+        self.doc = doc
+        self.inserted = []
+
+    async def find_one(self, query, projection=None):
+        return self.doc
+
+    async def insert_one(self, doc):
+        self.inserted.append(doc)
+
+
+class FakeDatabase:
+    def __init__(self, settings):
+        self.system_meta = FakeCollection(settings)
+        self.profiles = FakeCollection()
+        self.explained = []
+        self.client = {"clinic": self}
+
+    def __getitem__(self, name):
+        return self.profiles
+
+    async def command(self, command):
+        self.explained.append(command)
+        return {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "bill_branch_created_idx"}}},
+                "executionStats": {"totalDocsExamined": 12, "totalKeysExamined": 12, "nReturned": 12, "executionTimeMillis": 1}}
+
+
+def command_event(request_id, name, command=None):
+    return SimpleNamespace(request_id=request_id, command_name=name, database_name="clinic",
+                           command=command or {}, duration_micros=1500, reply={"cursor": {"firstBatch": [{}, {}]}})
+
+
+class TestExplainHelpers:
+    """Test explain command construction and plan summaries"""
+
+    def test_driver_fields_and_bulk_statements_trimmed(self):
+        assert explain_command({"delete": "bills", "deletes": [{"q": {}}, {"q": {}}]}) == {"delete": "bills", "deletes": [{"q": {}}]}
+        assert explain_command({"aggregate": "bills", "pipeline": [{"$merge": {"into": "x"}}]}) is None
+
+    def test_aggregate_cursor_stage(self):
+        """Plans nested under $cursor (unpushed aggregations) are found"""
+        result = {"stages": [{"$cursor": {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}},
+                                          "executionStats": {"totalDocsExamined": 5000}}}, {"$group": {}}]}
+        summary = summarize_explain(result)
+        assert summary["collscan"] is True
+        assert summary["docs_examined"] == 5000
+
+
+class TestProfilingMiddleware:
+    """Test that a header-triggered request is profiled with its queries explained"""
+
+    def test_header_request_saved_with_plans(self, monkeypatch):
+        monkeypatch.setattr(profiler, "_settings_cache", {"value": None, "checked_at": 0.0})
+        db = FakeDatabase({"enabled": False, "threshold_ms": 1000, "allow_header": True})
+        listener = ProfileCommandListener()
+
+        async def app(scope, receive, send):
+            find = {"find": "bills", "filter": {"branch_id": "b"}, "lsid": {"id": 1}, "$db": "clinic"}
+            listener.started(command_event(1, "find", find))
+            listener.succeeded(command_event(1, "find"))
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"[]"})
+
+        async def run():
+            async def receive():
+                return {"type": "http.request", "body": b""}
+
+            async def send(message):
+                pass
+
+            scope = {"type": "http", "method": "GET", "path": "/api/bills", "query_string": b"", "headers": [(b"x-profile", b"1")]}
+            await ProfilingMiddleware(app, db)(scope, receive, send)
+            await asyncio.gather(*profiler._pending_saves)
+
+        asyncio.run(run())
+        saved, = db.profiles.inserted
+        assert saved["trigger"] == "header"
+        query, = saved["queries"]
+        assert query["docs_returned"] == 2
+        assert query["plan"]["index_names"] == ["bill_branch_created_idx"]
+        assert "lsid" not in db.explained[0]["explain"]
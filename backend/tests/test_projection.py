@@ -0,0 +1,81 @@
+"""
+Test cases for fields= / view= selection on list endpoints (no database needed)
+"""
+import sys
+import json
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+from fastapi import HTTPException, Response
+from pydantic import BaseModel, create_model
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import projection
+from utils.projection import FieldSelection, mongo_projection, normalize
+
+
+class Sale(BaseModel):
+    id: str
+    patient_name: str
+    items: List[dict]
+    total_amount: float
+    branch_name: Optional[str] = None
+    created_at: str
+
+
+def resolve(fields=None, view="full"):
+    return FieldSelection(fields, view).resolve("pharmacy_sales", Sale, "id", "created_at")
+
+
+class TestResolve:
+    """Test selection parsing and validation"""
+
+    def test_full_documents_by_default(self):
+        assert resolve() is None
+        assert mongo_projection(None) == {"_id": 0}
+
+    def test_fields_always_include_cursor_fields(self):
+        paths = resolve("patient_name, total_amount,items.name")
+        assert sorted(paths) == ["created_at", "id", "items.name", "patient_name", "total_amount"]
+        assert mongo_projection(paths)["items.name"] == 1
+        assert mongo_projection(paths)["_id"] == 0
+
+    def test_summary_view(self):
+        columns = projection.SUMMARY_VIEWS["pharmacy_sales"]
+        row = create_model("SaleRow", items=(List[dict], []), **{name: (Optional[str], None) for name in columns})
+        assert sorted(FieldSelection(None, "summary").resolve("pharmacy_sales", row)) == sorted(columns)
+        assert set(projection.SUMMARY_VIEWS) == {"pharmacy_sales", "bills", "purchase_entries", "stock_transfers"}
+
+    def test_rejects_unknown_and_operator_paths(self):
+        for fields in ("search", "items.$", "$where", "total_amount,upi_id"):
+            with pytest.raises(HTTPException) as exc:
+                resolve(fields)
+            assert exc.value.status_code == 400
+        with pytest.raises(HTTPException):
+            resolve("id", view="summary")
+
+    def test_overlapping_paths_collapse(self):
+        # MongoDB rejects {"items": 1, "items.name": 1}
+        assert sorted(normalize(["items.name", "items", "id", "id"])) == ["id", "items"]
+
+
+class TestRespond:
+    """Test that projected rows skip model validation"""
+
+    def test_projected_rows_sent_as_is(self):
+        rows = [{"id": "s1", "total_amount": 10}]
+        response = Response()
+        response.headers["X-Next-Cursor"] = "abc"
+        sent = projection.respond(rows, response, Sale, ["id", "total_amount"])
+        assert json.loads(sent.body) == rows
+        assert sent.headers["x-next-cursor"] == "abc"
+
+    def test_full_documents_and_streams_unchanged(self, monkeypatch):
+        from utils import fast_json
+        monkeypatch.setattr(fast_json, "ENABLED", False)
+        rows = [{"id": "s1"}]
+        assert projection.respond(rows, Response(), Sale, None) is rows
+        stream = Response(media_type="application/x-ndjson")
+        assert projection.respond(stream, Response(), Sale, ["id"]) is stream
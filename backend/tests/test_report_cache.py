@@ -0,0 +1,146 @@
+"""
+Test cases for the closed-range report cache and its invalidation (no database needed)
+"""
+import sys
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import report_cache
+from utils.report_cache import MARK, cache_key
+
+
+class FakeCollection:
+    """Entries and marks keyed by "key"; understands the filters report_cache issues."""
+
+    def __init__(self):
+        self.docs = {}
+
+    def _matches(self, doc, query):
+        if query.get("kind") == MARK:
+            return (doc.get("kind") == MARK and doc["collection"] in query["collection"]["$in"]
+                    and query["day"]["$gte"] <= doc["day"] <= query["day"]["$lte"] and doc["at"] >= query["at"]["$gte"])
+        if "key" in query:
+            return doc.get("key") == query["key"]
+        if doc.get("kind") != query["kind"] or query["collections"] not in doc["collections"]:
+            return False
+        return any(
+            doc["date_from"] <= cond["date_from"]["$lte"] and doc["date_to"] >= cond["date_to"]["$gte"]
+            and self._in_scope(doc, cond)
+            for cond in query["$or"]
+        )
+
+    def _in_scope(self, doc, cond):
+        field = next((key for key in cond if key.startswith("branch_scope.")), None)
+        if field is None:
+            return True
+        scope = doc.get("branch_scope", {}).get(field.split(".", 1)[1])
+        return scope is None or cond[field]["$in"][1] in scope
+
+    async def find_one(self, query, projection=None):
+        return next((doc for doc in self.docs.values() if self._matches(doc, query)), None)
+
+    async def update_one(self, query, update, upsert=False):
+        self.docs.setdefault(query["key"], {"key": query["key"]}).update(update["$set"])
+
+    async def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            await self.update_one(op._filter, op._doc, upsert=True)
+
+    async def delete_many(self, query):
+        doomed = [key for key, doc in self.docs.items() if self._matches(doc, query)]
+        for key in doomed:
+            del self.docs[key]
+        return SimpleNamespace(deleted_count=len(doomed))
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.cache = FakeCollection()
+
+    def __getitem__(self, name):
+        return self.cache
+
+
+def run_report(db, calls, branch_ids=None, date_to="2020-01-31", collections=("bills", "pharmacy_sales"), all_branches=()):
+    async def compute():
+        calls.append(1)
+        return {"total": len(calls)}
+
+    return asyncio.run(report_cache.cached(
+        db, "advanced", {"start_date": "2020-01-01", "end_date": date_to}, {"branch_id": None},
+        "2020-01-01", date_to, collections, compute, branch_ids=branch_ids, all_branches=all_branches))
+
+
+class TestKeys:
+    """Test filter normalization"""
+
+    def test_equivalent_filters_share_a_key(self):
+        a = cache_key("daily_report", {"date": "2020-01-05 ", "branch_id": {"$in": ["b2", "b1"]}, "doctor_id": None}, {})
+        b = cache_key("daily_report", {"branch_id": {"$in": ["b1", "b2"]}, "date": "2020-01-05"}, {})
+        assert a == b
+        assert a != cache_key("daily_report", {"date": "2020-01-05"}, {"created_by": "u1"})
+
+
+class TestCachedReports:
+    """Test hits, bypass of open ranges and precise invalidation"""
+
+    def test_closed_range_hit_and_open_range_bypass(self):
+        db, calls = FakeDatabase(), []
+        assert run_report(db, calls) == {"total": 1}
+        assert run_report(db, calls) == {"total": 1}
+        assert len(calls) == 1
+        # A range reaching today is always recomputed
+        run_report(db, calls, date_to="2999-01-01")
+        run_report(db, calls, date_to="2999-01-01")
+        assert len(calls) == 3
+
+    def test_invalidation_matches_day_and_branch(self):
+        db, calls = FakeDatabase(), []
+        run_report(db, calls, branch_ids=["b1"])
+
+        async def write(doc):
+            await report_cache.invalidate(db, "bills", None, doc)
+
+        # Other branch, other day, other collection: entry survives
+        asyncio.run(write({"branch_id": "b2", "created_at": "2020-01-10T10:00:00+00:00"}))
+        asyncio.run(write({"branch_id": "b1", "created_at": "2020-02-10T10:00:00+00:00"}))
+        asyncio.run(report_cache.invalidate(db, "expenses", {"branch_id": "b1", "created_at": "2020-01-10T10:00:00+00:00"}, None))
+        run_report(db, calls, branch_ids=["b1"])
+        assert len(calls) == 1
+
+        asyncio.run(write({"branch_id": "b1", "created_at": "2020-01-10T10:00:00+00:00"}))
+        run_report(db, calls, branch_ids=["b1"])
+        assert len(calls) == 2
+
+    def test_unscoped_collection_invalidated_by_any_branch(self):
+        # The comprehensive report filters bills by branch but totals every branch's purchases
+        db, calls = FakeDatabase(), []
+        collections = ("bills", "purchase_entries")
+        run_report(db, calls, branch_ids=["b1"], collections=collections, all_branches=("purchase_entries",))
+
+        # A past purchase entry edited at another branch
+        asyncio.run(report_cache.invalidate(
+            db, "purchase_entries",
+            {"branch_id": "b2", "created_at": "2020-01-10T10:00:00+00:00", "total_amount": 100},
+            {"branch_id": "b2", "created_at": "2020-01-10T10:00:00+00:00", "total_amount": 150}))
+        run_report(db, calls, branch_ids=["b1"], collections=collections, all_branches=("purchase_entries",))
+        assert len(calls) == 2
+
+        # Bills stay scoped to the report's branch
+        asyncio.run(report_cache.invalidate(db, "bills", None, {"branch_id": "b2", "created_at": "2020-01-10T10:00:00+00:00"}))
+        run_report(db, calls, branch_ids=["b1"], collections=collections, all_branches=("purchase_entries",))
+        assert len(calls) == 2
+
+    def test_write_during_compute_is_not_cached(self):
+        db = FakeDatabase()
+
+        async def compute():
+            # A past-day write lands while the report is being built
+            await report_cache.invalidate(db, "bills", None, {"branch_id": "b1", "created_at": "2020-01-10T10:00:00+00:00"})
+            return {"total": 1}
+
+        asyncio.run(report_cache.cached(db, "advanced", {}, {}, "2020-01-01", "2020-01-31", ("bills",), compute))
+        assert not [doc for doc in db.cache.docs.values() if doc.get("kind") == "entry"]
@@ -0,0 +1,238 @@
+"""
+Test cases for daily rollups: backfill and incremental updates agree, drift after a backfill is caught (no database needed)
+"""
+import sys
+import asyncio
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import rollups
+from utils.rollups import mode_field, mode_field_expr
+
+MODES = ["cash", "", None, "upi", "card.visa", "$weird", "$", "netbanking"]
+
+
+def evaluate(expr, doc, variables=None):
+    """The subset of aggregation expressions the rollup pipeline uses."""
+    variables = variables or {}
+    if isinstance(expr, str):
+        if expr.startswith("$$"):
+            return variables[expr[2:]]
+        if expr.startswith("$"):
+            return doc.get(expr[1:])
+        return expr
+    if isinstance(expr, list):
+        return [evaluate(e, doc, variables) for e in expr]
+    if not isinstance(expr, dict):
+        return expr
+    (op, arg), = expr.items()
+    if op == "$let":
+        scope = {**variables, **{k: evaluate(v, doc, variables) for k, v in arg["vars"].items()}}
+        return evaluate(arg["in"], doc, scope)
+    if op == "$cond":
+        return evaluate(arg[1] if evaluate(arg[0], doc, variables) else arg[2], doc, variables)
+    if op == "$ifNull":
+        value = evaluate(arg[0], doc, variables)
+        return evaluate(arg[1], doc, variables) if value is None else value
+    if op == "$in":
+        value, options = evaluate(arg, doc, variables)
+        # BSON comparison: types must match (false is not 0)
+        return any(type(value) is type(o) and value == o for o in options)
+    if op == "$eq":
+        a, b = evaluate(arg, doc, variables)
+        return a == b
+    if op == "$toString":
+        return str(evaluate(arg, doc, variables))
+    if op == "$replaceAll":
+        return evaluate(arg["input"], doc, variables).replace(arg["find"], arg["replacement"])
+    if op == "$ltrim":
+        return evaluate(arg["input"], doc, variables).lstrip(arg["chars"])
+    if op == "$substrCP":
+        value = evaluate(arg[0], doc, variables)
+        return value[arg[1]:arg[1] + arg[2]]
+    raise NotImplementedError(op)
+
+
+def backfilled(collection, docs):
+    """Rollup documents as the backfill pipeline's $group/$project stages build them."""
+    pipeline = rollups._group_pipeline(collection)
+    group_id = pipeline[1]["$group"]["_id"]
+    amount_field, revenue_field, count_field, payment_field = rollups.SOURCES[collection]
+    out = {}
+    for doc in docs:
+        branch_id, date, mode = (evaluate(group_id[k], doc) for k in ("branch_id", "date", "mode"))
+        row = out.setdefault(f"{branch_id or ''}|{date}", {
+            "key": f"{branch_id or ''}|{date}", "branch_id": branch_id, "date": date, revenue_field: 0, count_field: 0,
+            **({payment_field: {}} if payment_field else {}),
+        })
+        row[revenue_field] += doc[amount_field]
+        row[count_field] += 1
+        if payment_field:
+            row[payment_field][mode] = row[payment_field].get(mode, 0) + doc[amount_field]
+    return out
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return [dict(doc) for doc in self.docs]
+
+
+class FakeSource:
+    """A bill/sale/expense collection; ``aggregate`` runs the rollup pipeline in memory."""
+
+    def __init__(self, db, name, docs=None):
+        self.db, self.name, self.docs = db, name, docs or []
+
+    def aggregate(self, pipeline):
+        rows = backfilled(self.name, self.docs)
+        if "$merge" in pipeline[-1]:
+            target = self.db[pipeline[-1]["$merge"]["into"]]
+            for key, row in rows.items():
+                # whenMatched: merge (top-level fields)
+                target.docs[key] = {**target.docs.get(key, {}), **row}
+            return FakeCursor([])
+        return FakeCursor(list(rows.values()))
+
+
+class FakeRollups:
+    """Applies the UpdateOne($inc/$setOnInsert) ops apply_change issues."""
+
+    def __init__(self, db=None, name=rollups.COLLECTION):
+        self.db, self.name = db, name
+        self.docs = {}
+
+    async def bulk_write(self, ops, ordered=True, session=None):
+        for op in ops:
+            key = op._filter["key"]
+            doc = self.docs.setdefault(key, {"key": key, **op._doc["$setOnInsert"]})
+            for path, value in op._doc["$inc"].items():
+                target = doc
+                *parents, leaf = path.split(".")
+                for part in parents:
+                    target = target.setdefault(part, {})
+                target[leaf] = target.get(leaf, 0) + value
+
+    def find(self, query, projection=None):
+        return FakeCursor(list(self.docs.values()))
+
+    async def drop(self):
+        self.docs = {}
+
+    async def create_index(self, keys, **options):
+        pass
+
+    async def count_documents(self, query):
+        return len(self.docs)
+
+    async def delete_many(self, query):
+        self.docs = {}
+
+    async def rename(self, name, dropTarget=False):
+        self.db.collections[name] = self
+        self.db.collections[self.name] = FakeRollups(self.db, self.name)
+        self.name = name
+
+
+class FakeMeta:
+    def __init__(self):
+        self.doc = {"id": rollups.META_ID}
+
+    async def find_one(self, query, projection=None):
+        return self.doc
+
+    async def update_one(self, query, update, upsert=False):
+        self.doc.update(update["$set"])
+
+
+class FakeDatabase:
+    def __init__(self, bills=(), sales=(), expenses=()):
+        self.system_meta = FakeMeta()
+        self.collections = {
+            "bills": FakeSource(self, "bills", list(bills)),
+            "pharmacy_sales": FakeSource(self, "pharmacy_sales", list(sales)),
+            "expenses": FakeSource(self, "expenses", list(expenses)),
+            rollups.COLLECTION: FakeRollups(self),
+            rollups.REBUILD_COLLECTION: FakeRollups(self, rollups.REBUILD_COLLECTION),
+        }
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+
+class TestModeKeys:
+    """Test that the pipeline expression and mode_field agree"""
+
+    def test_expression_matches_python(self):
+        for mode in MODES:
+            assert evaluate(mode_field_expr("$payment_mode"), {"payment_mode": mode}) == mode_field(mode)
+        assert evaluate(mode_field_expr("$payment_mode"), {}) == "cash"
+
+    def test_backfill_and_incremental_documents_identical(self):
+        sales = [
+            {"branch_id": "b1", "created_at": f"2025-01-0{1 + i % 2}T10:00:00", "total_amount": 10 * (i + 1), "payment_mode": mode}
+            for i, mode in enumerate(MODES)
+        ] + [{"branch_id": "b1", "created_at": "2025-01-01T11:00:00", "total_amount": 7}]
+
+        db = FakeDatabase()
+        for sale in sales:
+            asyncio.run(rollups.apply_change(db, "pharmacy_sales", None, sale))
+        incremental = db[rollups.COLLECTION].docs
+        assert incremental == backfilled("pharmacy_sales", sales)
+        # None, "$" and missing modes land in the same "cash" bucket as "cash"
+        assert incremental["b1|2025-01-01"]["pharmacy_by_payment"]["cash"] == 10 + 30 + 70 + 7
+        assert "card_visa" in incremental["b1|2025-01-01"]["pharmacy_by_payment"]
+
+
+def bill(amount, created_at="2025-01-01T10:00:00", mode="cash"):
+    return {"branch_id": "b1", "created_at": created_at, "total_amount": amount, "payment_mode": mode}
+
+
+class TestBackfillVerification:
+    """Test that a backfill which lost a concurrent write is caught and retired"""
+
+    @pytest.fixture(autouse=True)
+    def fresh_ready_cache(self):
+        rollups._ready_cache["value"] = None
+        yield
+        rollups._ready_cache["value"] = None
+
+    def test_quiet_backfill_verifies(self):
+        db = FakeDatabase(bills=[bill(100), bill(50, mode="upi")],
+                          expenses=[{"branch_id": "b1", "created_at": "2025-01-01T12:00:00", "amount": 30}])
+
+        async def flow():
+            await rollups.backfill(db)
+            return await rollups.check_backfill(db), await rollups.is_ready(db)
+
+        report, ready = asyncio.run(flow())
+        assert report["matches"] and report["days"] == 1
+        assert ready
+
+    def test_write_during_backfill_marks_rollups_stale(self):
+        db = FakeDatabase(bills=[bill(100)])
+
+        async def progress(done, total):
+            if done == 1:
+                # A bill saved after the bills were aggregated: its increment lands in
+                # the live collection, which the rename then replaces
+                new_bill = bill(40, created_at="2025-01-01T11:00:00")
+                db["bills"].docs.append(new_bill)
+                await rollups.apply_change(db, "bills", None, new_bill)
+
+        async def flow():
+            await rollups.backfill(db, progress=progress)
+            with pytest.raises(rollups.RollupDriftError):
+                await rollups.check_backfill(db)
+            return await rollups.is_ready(db), await rollups.verify(db)
+
+        ready, report = asyncio.run(flow())
+        assert not ready
+        assert db.system_meta.doc["status"] == "stale"
+        assert report["mismatched"][0]["expected"]["treatment_revenue"] == 140
+        assert report["mismatched"][0]["actual"]["treatment_revenue"] == 100
@@ -1,6 +1,6 @@
 """
 Test cases for Shift Management and Handover System
-Tests: /shifts/start, /shifts/end, /shifts/active, /shifts/my-active, /shifts/history
+Tests: /shifts/start, /shifts/end, /shifts/active, /shifts/my-active, /shifts/history, /shifts/{id}/report
 """
 import pytest
 import requests
@@ -210,6 +210,27 @@ class TestShiftManagement:
         data = response.json()
         assert isinstance(data, list), "Shift history should be a list"
         print(f"Found {len(data)} shifts in history")
+    
+    def test_10_shift_handover_report(self):
+        """Test the handover report covers exactly the shift window"""
+        token = self.get_auth_token(ADMIN_EMAIL, ADMIN_PASSWORD)
+        assert token, "Failed to get auth token"
+        
+        self.session.headers.update({"Authorization": f"Bearer {token}"})
+        shifts = self.session.get(f"{BASE_URL}/api/shifts/history").json()
+        if not shifts:
+            pytest.skip("No shifts to report on")
+        
+        shift = shifts[0]
+        response = self.session.get(f"{BASE_URL}/api/shifts/{shift['id']}/report")
+        assert response.status_code == 200, f"Get shift report failed: {response.text}"
+        data = response.json()
+        assert data["start_time"] == shift["start_time"]
+        if shift.get("end_time"):
+            assert data["end_time"] == shift["end_time"]
+        assert "payment_modes" in data["summary"]
+        assert isinstance(data["patients"], list)
+        print(f"Shift report: {len(data['patients'])} patients, collected {data['summary']['total_collected']}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,53 @@
+"""
+Test cases for retiring a drifted stock ledger (no database needed)
+"""
+import sys
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import stock_ledger
+
+
+class FakeMeta:
+    def __init__(self, doc=None):
+        self.doc = doc
+
+    async def find_one(self, query, projection=None):
+        return self.doc
+
+    async def update_one(self, query, update, upsert=False):
+        self.doc = {**(self.doc or {}), **query, **update["$set"]}
+
+
+class FakeDatabase:
+    def __init__(self, status):
+        self.system_meta = FakeMeta({"id": stock_ledger.META_ID, "status": status})
+
+
+def view(matches, missing=0, extra=0, mismatched=0):
+    return {"matches": matches, "missing_count": missing, "extra_count": extra, "mismatched_count": mismatched}
+
+
+class TestDrift:
+    """Test that drift after a rebuild stops reads from the ledger"""
+
+    def test_drift_counts_only_differing_views(self):
+        views = {"batch": view(True), "consolidated": view(False, missing=1, mismatched=2)}
+        assert stock_ledger.drift_counts(views) == {"consolidated": 3}
+
+    def test_stale_ledger_is_not_ready(self):
+        db = FakeDatabase("ready")
+
+        async def flow():
+            stock_ledger._ready_cache["value"] = None
+            before = await stock_ledger.is_ready(db)
+            await stock_ledger.mark_stale(db, {"consolidated": 3})
+            # mark_stale drops this process's cached answer
+            return before, await stock_ledger.is_ready(db)
+
+        assert asyncio.run(flow()) == (True, False)
+        assert db.system_meta.doc["status"] == "stale"
+        assert db.system_meta.doc["drift"] == {"consolidated": 3}
+        stock_ledger._ready_cache["value"] = None
@@ -0,0 +1,99 @@
+"""
+Test cases for the transactional unit of work (no database needed)
+"""
+import sys
+import asyncio
+from pathlib import Path
+
+import pytest
+from pymongo.errors import OperationFailure
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import unit_of_work
+
+
+class FakeSession:
+    def __init__(self):
+        self.in_transaction = False
+        self.commits = 0
+        self.aborts = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def start_transaction(self):
+        self.in_transaction = True
+
+    async def commit_transaction(self):
+        self.in_transaction = False
+        self.commits += 1
+
+    async def abort_transaction(self):
+        self.in_transaction = False
+        self.aborts += 1
+
+
+class FakeClient:
+    def __init__(self):
+        self.session = FakeSession()
+
+    async def start_session(self):
+        return self.session
+
+
+def transient_error():
+    return OperationFailure("WriteConflict", 112, {"errorLabels": ["TransientTransactionError"]})
+
+
+@pytest.fixture
+def transactions_on(monkeypatch):
+    monkeypatch.setattr(unit_of_work, "TRANSACTIONS_MODE", "on")
+    monkeypatch.setattr(unit_of_work, "RETRY_BACKOFF_SECONDS", 0)
+
+
+class TestUnitOfWork:
+    """Test commit, abort, retry and after-commit hooks"""
+
+    def test_transient_error_reruns_flow(self, transactions_on):
+        client, attempts, invalidated = FakeClient(), [], []
+
+        async def write(uow):
+            assert uow.session is client.session
+            uow.after_commit(lambda: asyncio.sleep(0, invalidated.append(len(attempts))))
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise transient_error()
+            return "sale"
+
+        assert asyncio.run(unit_of_work.run(client, write)) == "sale"
+        assert (client.session.aborts, client.session.commits) == (1, 1)
+        # Hooks of the aborted attempt are dropped
+        assert invalidated == [2]
+
+    def test_other_errors_abort_without_retry(self, transactions_on):
+        client, attempts = FakeClient(), []
+
+        async def write(uow):
+            attempts.append(1)
+            raise ValueError("insufficient stock")
+
+        with pytest.raises(ValueError):
+            asyncio.run(unit_of_work.run(client, write))
+        assert attempts == [1]
+        assert (client.session.aborts, client.session.commits) == (1, 0)
+
+    def test_standalone_runs_without_session(self, monkeypatch):
+        monkeypatch.setattr(unit_of_work, "TRANSACTIONS_MODE", "off")
+        hooks = []
+
+        async def write(uow):
+            assert uow.session is None
+            await unit_of_work.defer(uow, lambda: asyncio.sleep(0, hooks.append("after")))
+            hooks.append("write")
+
+        asyncio.run(unit_of_work.run(FakeClient(), write))
+        assert hooks == ["write", "after"]
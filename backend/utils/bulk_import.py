@@ -0,0 +1,104 @@
+"""Chunked bulk inserts for the CSV/Excel upload endpoints.
+
+``insert_rows`` takes prepared documents tagged with their 1-based upload
+row number and, per chunk of ``BULK_IMPORT_CHUNK_SIZE`` rows:
+
+- drops rows whose unique field already exists, with one ``$in`` query
+  (plus duplicates within the upload itself)
+- writes the rest with one ``insert_many(ordered=False)``, mapping any write
+  errors back to their row numbers
+
+Large uploads can run as background jobs (see ``utils.jobs``); their result
+keeps at most ``MAX_STORED_ERRORS`` row errors.
+"""
+import os
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+CHUNK_SIZE = int(os.environ.get("BULK_IMPORT_CHUNK_SIZE", "1000"))
+# Errors kept on a background job's result; the count is always exact
+MAX_STORED_ERRORS = 1000
+
+Progress = Callable[[int, int, int], Awaitable[None]]
+
+
+def _row_error(row: int, label_field: Optional[str], doc: dict, message: str) -> dict:
+    error = {"row": row}
+    if label_field:
+        error[label_field] = doc.get(label_field)
+    error["error"] = message
+    return error
+
+
+async def insert_rows(
+    collection,
+    rows: List[Tuple[int, dict]],
+    unique_field: Optional[str] = None,
+    label_field: Optional[str] = None,
+    duplicate_error: str = "Already exists",
+    chunk_size: int = CHUNK_SIZE,
+    after_chunk: Optional[Callable[[List[dict]], Awaitable[None]]] = None,
+    progress: Optional[Progress] = None,
+) -> dict:
+    """Insert ``(row_number, document)`` pairs; returns created count and row errors.
+
+    ``after_chunk`` receives the documents actually inserted by each chunk,
+    so derived data (e.g. the stock ledger) stays in step even if a later
+    chunk fails.
+    """
+    created = 0
+    errors: List[dict] = []
+    seen = set()
+    processed = 0
+
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        pending = chunk
+
+        if unique_field:
+            values = list({doc.get(unique_field) for _, doc in chunk} - seen)
+            existing = set()
+            if values:
+                cursor = collection.find({unique_field: {"$in": values}}, {"_id": 0, unique_field: 1})
+                existing = {doc.get(unique_field) for doc in await cursor.to_list(None)}
+            pending = []
+            for row, doc in chunk:
+                value = doc.get(unique_field)
+                if value in existing or value in seen:
+                    errors.append(_row_error(row, label_field, doc, duplicate_error))
+                    continue
+                seen.add(value)
+                pending.append((row, doc))
+
+        failed = set()
+        if pending:
+            try:
+                await collection.insert_many([doc for _, doc in pending], ordered=False)
+            except BulkWriteError as e:
+                for write_error in e.details.get("writeErrors", []):
+                    index = write_error["index"]
+                    failed.add(index)
+                    row, doc = pending[index]
+                    errors.append(_row_error(row, label_field, doc, write_error.get("errmsg", "Write failed")))
+
+        inserted = [doc for i, (_, doc) in enumerate(pending) if i not in failed]
+        created += len(inserted)
+        if after_chunk and inserted:
+            await after_chunk(inserted)
+
+        processed += len(chunk)
+        if progress:
+            await progress(processed, created, len(errors))
+
+    errors.sort(key=lambda e: e["row"])
+    return {"created": created, "errors": errors}
+
+
+def job_result(result: dict) -> dict:
+    """``insert_rows`` output trimmed for storing on a job document."""
+    return {
+        "created": result["created"],
+        "error_count": len(result["errors"]),
+        "errors": result["errors"][:MAX_STORED_ERRORS],
+    }
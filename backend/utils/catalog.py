@@ -0,0 +1,134 @@
+"""Process-local cache of the small master tables.
+
+``item_master``, ``item_units``, ``gst_slabs``, ``categories`` and
+``subcategories`` change a few times a day but are read by every Billing and
+Pharmacy screen and by the consolidated stock engine. ``catalog.table(db,
+name)`` returns the whole table from memory, indexed by id and by
+normalized name, ordered like the list endpoints (``created_at``, ``id``).
+
+Every write to one of these collections calls ``bump``, which increments
+that table's counter in ``system_meta`` (``catalog_versions``) and drops the
+local copy. Other workers read the counters at most every
+``CATALOG_POLL_SECONDS`` and reload a table whose counter moved; a table
+is also reloaded after ``CATALOG_MAX_AGE_SECONDS`` to pick up writes made
+outside the API (scripts, the mongo shell).
+
+The counters, and the time of each table's last write, also back the
+conditional GETs of the master endpoints (``utils/conditional.py``), so
+``VERSIONED`` covers a few collections that are not held in memory.
+``etag`` rolls over every ``CATALOG_MAX_AGE_SECONDS`` as well, for the same
+out-of-band writes.
+"""
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from utils.conditional import make_etag
+
+META_ID = "catalog_versions"
+TABLES = ("item_master", "item_units", "gst_slabs", "categories", "subcategories")
+VERSIONED = TABLES + ("branches", "doctors", "godowns", "suppliers", "settings", "bank_accounts")
+POLL_SECONDS = float(os.environ.get("CATALOG_POLL_SECONDS", "2"))
+MAX_AGE_SECONDS = float(os.environ.get("CATALOG_MAX_AGE_SECONDS", "300"))
+
+
+def normalize_name(name: Optional[str]) -> str:
+    return " ".join((name or "").split()).lower()
+
+
+def _sort_key(row: dict):
+    # MongoDB sorts missing/null first
+    created = row.get("created_at")
+    return (created is not None, str(created or ""), str(row.get("id") or ""))
+
+
+class Table:
+    def __init__(self, name: str, version: int, rows: List[dict]):
+        self.name = name
+        self.version = version
+        self.rows = sorted(rows, key=_sort_key)
+        self.by_id: Dict[str, dict] = {row["id"]: row for row in self.rows if row.get("id")}
+        self.by_name: Dict[str, dict] = {}
+        for row in self.rows:
+            key = normalize_name(row.get("name"))
+            # Newest row wins for duplicate names
+            if key:
+                self.by_name[key] = row
+        self.loaded_at = time.monotonic()
+        # Values derived from this version of the table (e.g. the stock engine's lookup map)
+        self.memo: Dict[Any, Any] = {}
+
+
+class Catalog:
+    def __init__(self):
+        self._tables: Dict[str, Table] = {}
+        self._versions: Dict[str, int] = {}
+        self._modified: Dict[str, str] = {}
+        self._checked_at = 0.0
+        self.stats = {"hits": 0, "loads": 0, "bumps": 0}
+
+    async def sync(self, db):
+        """Refresh the version counters if they were last read over POLL_SECONDS ago."""
+        now = time.monotonic()
+        if now - self._checked_at < POLL_SECONDS:
+            return
+        # Mark as checked before awaiting so concurrent requests don't all poll
+        self._checked_at = now
+        meta = await db.system_meta.find_one({"id": META_ID}, {"_id": 0, "versions": 1, "modified": 1}) or {}
+        self._versions = meta.get("versions", {})
+        self._modified = meta.get("modified", {})
+
+    def version(self, name: str) -> int:
+        return self._versions.get(name, 0)
+
+    def last_modified(self, *names: str) -> Optional[str]:
+        stamps = [self._modified[name] for name in names if name in self._modified]
+        return max(stamps) if stamps else None
+
+    async def table(self, db, name: str) -> Table:
+        if name not in TABLES:
+            raise KeyError(name)
+        await self.sync(db)
+        version = self.version(name)
+        table = self._tables.get(name)
+        if table and table.version == version and time.monotonic() - table.loaded_at < MAX_AGE_SECONDS:
+            self.stats["hits"] += 1
+            return table
+        # Version read before the rows: a write landing mid-load moves it and forces another load
+        rows = await db[name].find({}, {"_id": 0}).to_list(None)
+        table = self._tables[name] = Table(name, version, rows)
+        self.stats["loads"] += 1
+        return table
+
+    async def bump(self, db, *names: str):
+        """Record a write to these collections for every worker."""
+        now = datetime.now(timezone.utc).isoformat()
+        meta = await db.system_meta.find_one_and_update(
+            {"id": META_ID},
+            {"$inc": {f"versions.{name}": 1 for name in names},
+             "$set": {f"modified.{name}": now for name in names}},
+            upsert=True,
+            projection={"_id": 0, "versions": 1, "modified": 1},
+            return_document=True
+        ) or {}
+        self._versions.update(meta.get("versions", {}))
+        self._modified.update(meta.get("modified", {}))
+        for name in names:
+            self._tables.pop(name, None)
+        self.stats["bumps"] += 1
+
+    def etag(self, *names: str, vary: str = "") -> str:
+        """ETag for a response built from ``names``; ``vary`` holds whatever else it depends on."""
+        epoch = int(time.time() // MAX_AGE_SECONDS)
+        return make_etag("-".join(f"{name}.{self.version(name)}" for name in names), f"{vary}|{epoch}")
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "versions": dict(self._versions),
+            "tables": {name: {"rows": len(t.rows), "version": t.version} for name, t in self._tables.items()},
+        }
+
+
+catalog = Catalog()
@@ -0,0 +1,143 @@
+"""Append-only change log behind ``GET /api/sync``.
+
+Writes to the collections in ``SYNCED`` append one entry per changed
+document: ``{collection, op, doc_id, branch_id, at}`` with ``op`` one of
+``created``, ``updated``, ``deleted`` or ``reset`` (the whole collection was
+rebuilt; clients reload it). Entries are written with the same session as
+the data, so inside a unit of work they commit together.
+
+Entries are ordered by ``_id``. ObjectIds are generated by each writer, so
+an entry can become visible after one with a larger ``_id``; readers only
+consume entries older than ``CHANGE_LOG_SETTLE_SECONDS``, and the cursor
+never moves past that horizon. This is a window, not a guarantee: an entry
+whose write (or unit of work) commits more than ``CHANGE_LOG_SETTLE_SECONDS``
+after its ``_id`` was generated can land behind a cursor that has already
+moved on, and that client misses it until its next resync. Keep the setting
+above the longest expected write/transaction latency. Entries expire after
+``CHANGE_LOG_RETENTION_DAYS`` (TTL index on ``at``); a cursor older than
+that gets ``resync: true``.
+
+A change stream would avoid the extra insert per write but needs a replica
+set; the log works on a standalone mongod too.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+
+COLLECTION = "change_log"
+# Synced collection -> field identifying its documents
+SYNCED = {"patients": "id", "stock_levels": "key"}
+
+CREATED, UPDATED, DELETED, RESET = "created", "updated", "deleted", "reset"
+
+SETTLE_SECONDS = float(os.environ.get("CHANGE_LOG_SETTLE_SECONDS", "2"))
+RETENTION_DAYS = int(os.environ.get("CHANGE_LOG_RETENTION_DAYS", "7"))
+MAX_PAGE_SIZE = 5000
+
+stats = {"recorded": 0, "pulls": 0, "resyncs": 0}
+
+
+def entry(collection: str, op: str, doc_id: Optional[str] = None, branch_id: Optional[str] = None) -> dict:
+    return {
+        "_id": ObjectId(),
+        "collection": collection,
+        "op": op,
+        "doc_id": doc_id,
+        "branch_id": branch_id,
+        "at": datetime.now(timezone.utc),
+    }
+
+
+async def record(db, collection: str, op: str, doc_ids: Iterable[str], branch_ids: Optional[Dict[str, Optional[str]]] = None, session=None):
+    """Append one ``op`` entry per id; ``branch_ids`` maps ids to the branch they belong to."""
+    branch_ids = branch_ids or {}
+    entries = [entry(collection, op, doc_id, branch_ids.get(doc_id)) for doc_id in doc_ids if doc_id]
+    if entries:
+        await db[COLLECTION].insert_many(entries, ordered=False, session=session)
+        stats["recorded"] += len(entries)
+
+
+async def reset(db, collection: str):
+    await db[COLLECTION].insert_one(entry(collection, RESET))
+    stats["recorded"] += 1
+
+
+def _horizon() -> ObjectId:
+    return ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(seconds=SETTLE_SECONDS))
+
+
+def start_cursor() -> str:
+    """Cursor for a client about to load full lists (take it before loading)."""
+    return str(_horizon())
+
+
+def decode_cursor(cursor: str) -> ObjectId:
+    try:
+        return ObjectId(cursor)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid sync cursor")
+
+
+def collapse(entries: List[dict]) -> Dict[str, Dict[str, str]]:
+    """Net effect per collection and document: {collection: {doc_id: op}}; a reset clears the slate."""
+    net: Dict[str, Dict[str, str]] = {}
+    for e in entries:
+        docs = net.setdefault(e["collection"], {})
+        if e["op"] == RESET:
+            docs.clear()
+            docs[None] = RESET
+            continue
+        previous = docs.get(e["doc_id"])
+        if previous == CREATED and e["op"] == DELETED:
+            # Never seen by the client
+            docs.pop(e["doc_id"])
+        elif previous == CREATED:
+            continue
+        else:
+            docs[e["doc_id"]] = e["op"]
+    return net
+
+
+async def changes(db, cursor: str, collections: List[str], limit: int = 1000, branch_id: Optional[str] = None) -> dict:
+    """Created/updated documents and deleted ids per collection since ``cursor``."""
+    stats["pulls"] += 1
+    after = decode_cursor(cursor)
+    if after.generation_time < datetime.now(timezone.utc) - timedelta(days=RETENTION_DAYS):
+        stats["resyncs"] += 1
+        return {"cursor": start_cursor(), "has_more": False, "resync": True, "changes": {}}
+
+    horizon = _horizon()
+    query = {"_id": {"$gt": after, "$lt": horizon}, "collection": {"$in": collections}}
+    if branch_id:
+        # Rows without a branch (patients, godown stock) go to everyone
+        query["branch_id"] = {"$in": [branch_id, None]}
+    entries = await db[COLLECTION].find(query).sort("_id", 1).limit(limit + 1).to_list(limit + 1)
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    next_cursor = str(entries[-1]["_id"]) if has_more else str(max(horizon, after))
+
+    result = {}
+    for collection, docs in collapse(entries).items():
+        id_field = SYNCED[collection]
+        reset_all = docs.pop(None, None) == RESET
+        wanted = [doc_id for doc_id, op in docs.items() if op != DELETED]
+        found = []
+        if wanted:
+            found = await db[collection].find({id_field: {"$in": wanted}}, {"_id": 0, "search": 0}).to_list(None)
+        present = {doc[id_field] for doc in found}
+        result[collection] = {
+            "reset": reset_all,
+            "created": [doc for doc in found if docs[doc[id_field]] == CREATED],
+            "updated": [doc for doc in found if docs[doc[id_field]] == UPDATED],
+            # Includes rows written and then removed before this pull
+            "deleted": [doc_id for doc_id, op in docs.items() if op == DELETED or doc_id not in present],
+        }
+    return {"cursor": next_cursor, "has_more": has_more, "resync": False, "changes": result}
+
+
+def get_stats() -> dict:
+    return {**stats, "settle_seconds": SETTLE_SECONDS, "retention_days": RETENTION_DAYS}
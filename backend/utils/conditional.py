@@ -0,0 +1,71 @@
+"""Conditional GET for master-data lists.
+
+List endpoints for master collections send an ``ETag`` built from the
+collections' change versions (``catalog.versions``) plus what makes the
+response differ between requests (user, query string), and a
+``Last-Modified`` from the time of the last write. A request whose
+``If-None-Match`` (or, without it, ``If-Modified-Since``) still matches
+gets a bodyless 304.
+
+The larger lists also take ``since`` (an ISO timestamp, typically the
+previous ``Last-Modified``) and then return only rows created or updated
+after it; ``X-Total-Count`` carries the size of the full list so a client
+can tell that rows were deleted and refetch everything.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Mapping, Optional
+
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+def make_etag(versions: str, vary: str = "") -> str:
+    digest = hashlib.sha1(vary.encode()).hexdigest()[:10]
+    return f'W/"{versions}-{digest}"'
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """An ISO timestamp as an aware UTC datetime (naive values are taken as UTC)."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def http_date(value: str) -> str:
+    return format_datetime(parse_timestamp(value).astimezone(timezone.utc), usegmt=True)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison: proxies may strip or add the W/ prefix
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in header.split(","))
+
+
+def is_fresh(headers: Mapping[str, str], etag: str, last_modified: Optional[str]) -> bool:
+    """Whether the client's copy is current; If-None-Match wins over If-Modified-Since."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = headers.get("if-modified-since")
+    if not if_modified_since or not last_modified:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have whole seconds
+    return parse_timestamp(last_modified).replace(microsecond=0) <= since
+
+
+def changed_since(row: dict, since: datetime) -> bool:
+    stamp = parse_timestamp(row.get("updated_at") or row.get("created_at"))
+    return stamp is None or stamp > since
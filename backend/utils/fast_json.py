@@ -0,0 +1,93 @@
+"""Opt-in fast JSON responses (``FAST_JSON=on``).
+
+By default FastAPI validates every returned row against the route's
+``response_model``, runs the result through ``jsonable_encoder`` and encodes
+it with the stdlib ``json`` module. For list endpoints returning up to a
+thousand sales or bills (each with a nested ``items`` list) that is most of
+the request's CPU time. With ``FAST_JSON=on``:
+
+- ``FastJSONResponse`` (orjson) is the app's default response class, so
+  every JSON body is encoded by orjson instead of ``json.dumps``.
+- Trusted list routes return ``trusted(rows, response, Model)``: rows read
+  straight from MongoDB, which were written through ``Model``, are cut down
+  to the model's fields and given its defaults for missing fields, then
+  encoded as they are. Values are not validated or coerced (an ``int``
+  stored in a ``float`` field is sent as ``5``, not ``5.0``), and a row
+  missing a required field is sent without it instead of failing the
+  request.
+
+Without orjson installed, or with the flag off, both fall back to the
+regular FastAPI path. ``benchmarks/bench_serialization.py`` compares the
+paths per route.
+"""
+import os
+from functools import lru_cache
+from typing import Any, Dict, Tuple, Type
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ENABLED = os.environ.get("FAST_JSON", "off").lower() in ("1", "on", "true") and orjson is not None
+
+stats = {"trusted_responses": 0, "trusted_rows": 0}
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson; unknown types (ObjectId, Decimal128) become strings."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+def response_class():
+    return FastJSONResponse if ENABLED else JSONResponse
+
+
+@lru_cache(maxsize=None)
+def model_shape(model: Type[BaseModel]) -> Tuple[Tuple[str, ...], Dict[str, Any]]:
+    """The names ``model`` serializes and the defaults of its optional fields."""
+    names = tuple(field.alias or name for name, field in model.model_fields.items())
+    defaults = {
+        field.alias or name: field.get_default(call_default_factory=True)
+        for name, field in model.model_fields.items() if not field.is_required()
+    }
+    return names, defaults
+
+
+def shape_row(row: dict, names: Tuple[str, ...], defaults: Dict[str, Any]) -> dict:
+    return {name: row[name] if name in row else defaults[name] for name in names if name in row or name in defaults}
+
+
+def trusted(content, response: Response, model: Type[BaseModel]):
+    """Rows of ``model`` as an orjson response that skips response_model validation.
+
+    Anything that is already a Response (a 304, an NDJSON stream) and every
+    call with the fast path disabled is returned unchanged.
+    """
+    if not ENABLED or isinstance(content, Response):
+        return content
+    names, defaults = model_shape(model)
+    rows = [shape_row(row, names, defaults) for row in content]
+    stats["trusted_responses"] += 1
+    stats["trusted_rows"] += len(rows)
+    return send(rows, response)
+
+
+def send(content, response: Response) -> JSONResponse:
+    """``content`` as-is in the app's response class, with the injected response's status and headers."""
+    sent = response_class()(content, status_code=response.status_code or 200)
+    # Returning a Response bypasses the injected one, so carry its headers over
+    sent.raw_headers.extend(
+        (name, value) for name, value in response.raw_headers if name not in (b"content-length", b"content-type")
+    )
+    return sent
+
+
+def get_stats() -> dict:
+    return {**stats, "enabled": ENABLED, "encoder": "orjson" if ENABLED else "json"}
@@ -0,0 +1,214 @@
+"""Batched FEFO (First Expiry First Out) stock allocation.
+
+A sale is handled in three steps:
+
+1. ``load_candidate_batches``: one ``$in`` query for every line's batches
+2. ``plan_allocation``: pure in-memory FEFO plan across all lines
+3. ``apply_allocation``: one ``bulk_write`` of guarded decrements
+
+Each decrement only matches while ``stock_quantity >= n``, so two counters
+selling the last units of a batch cannot both succeed. Applied decrements
+leave a short marker in ``recent_deductions`` which lets a partially applied
+plan be rolled back exactly.
+
+``allocate`` wraps the three steps and re-plans on a conflict a bounded
+number of times, counting contention in ``stats``.
+"""
+import asyncio
+import os
+import random
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+# How many deduction markers to keep per batch document
+RECENT_DEDUCTIONS_KEPT = 20
+
+BATCH_PROJECTION = {"_id": 0, "recent_deductions": 0}
+
+# Re-plan attempts after a guarded decrement misses because of a concurrent sale
+MAX_RETRIES = int(os.environ.get("STOCK_DEDUCTION_MAX_RETRIES", "3"))
+RETRY_BACKOFF_SECONDS = 0.02
+
+stats = {
+    "allocations": 0,
+    "batch_updates": 0,
+    "conflicts": 0,
+    "retries": 0,
+    "retry_successes": 0,
+    "failed_after_retries": 0,
+    "insufficient_stock": 0,
+}
+
+
+class InsufficientStockError(Exception):
+    def __init__(self, name: str, requested: float, available: float):
+        self.name = name
+        self.requested = requested
+        self.available = available
+        super().__init__(f"Insufficient stock for {name}. Requested: {requested}, Available: {available}")
+
+
+class StockConflictError(Exception):
+    """Raised when stock changed between planning and applying an allocation."""
+
+
+def fefo_sort_key(batch: dict):
+    # Items without expiry go last, then oldest purchase first
+    expiry = batch.get("expiry_date")
+    expiry_val = expiry if expiry and expiry.strip() else "9999-12-31"
+    return (expiry_val, batch.get("created_at", ""))
+
+
+def plan_allocation(batches: List[dict], lines: List[dict]) -> List[List[dict]]:
+    """Allocate each line's quantity across batches in FEFO order.
+
+    ``lines`` are dicts with ``name``, ``quantity`` and an optional
+    ``batch_number``. Lines for the same item draw from the same pool, so a
+    prescription listing one medicine twice cannot over-allocate. Returns one
+    list of deductions per line, in line order.
+    """
+    by_name: Dict[str, List[dict]] = {}
+    for b in batches:
+        by_name.setdefault(b.get("name"), []).append(b)
+    for group in by_name.values():
+        group.sort(key=fefo_sort_key)
+
+    remaining = {b["id"]: b.get("stock_quantity", 0) for b in batches}
+    plan = []
+    for line in lines:
+        name = line["name"]
+        quantity = line["quantity"]
+        candidates = [
+            b for b in by_name.get(name, [])
+            if not line.get("batch_number") or b.get("batch_number") == line["batch_number"]
+        ]
+        available = sum(max(remaining[b["id"]], 0) for b in candidates)
+        if available < quantity:
+            raise InsufficientStockError(name, quantity, available)
+
+        to_deduct = quantity
+        deductions = []
+        for batch in candidates:
+            if to_deduct <= 0:
+                break
+            batch_qty = remaining[batch["id"]]
+            if batch_qty <= 0:
+                continue
+            deduct_now = min(batch_qty, to_deduct)
+            remaining[batch["id"]] -= deduct_now
+            to_deduct -= deduct_now
+            deductions.append({
+                "batch_number": batch.get("batch_number"),
+                "expiry_date": batch.get("expiry_date"),
+                "mrp": batch.get("mrp"),
+                "quantity": deduct_now,
+                "medicine_id": batch["id"]
+            })
+        plan.append(deductions)
+    return plan
+
+
+def location_query(branch_id: Optional[str] = None, godown_id: Optional[str] = None) -> dict:
+    if branch_id:
+        return {"branch_id": branch_id}
+    if godown_id:
+        return {"godown_id": godown_id}
+    raise ValueError("Location ID (branch or godown) is required for stock deduction")
+
+
+async def load_candidate_batches(db, names: List[str], branch_id: Optional[str] = None, godown_id: Optional[str] = None, session=None) -> List[dict]:
+    query = {
+        "name": {"$in": list(set(names))},
+        "stock_quantity": {"$gt": 0},
+        "purpose": "for_sale",
+        **location_query(branch_id, godown_id)
+    }
+    return await db.medicines.find(query, BATCH_PROJECTION, session=session).to_list(None)
+
+
+def _batch_totals(plan: List[List[dict]]) -> Dict[str, float]:
+    totals: Dict[str, float] = {}
+    for deductions in plan:
+        for d in deductions:
+            totals[d["medicine_id"]] = totals.get(d["medicine_id"], 0) + d["quantity"]
+    return totals
+
+
+async def apply_allocation(db, ref: str, plan: List[List[dict]], session=None):
+    """Apply a plan as one bulk write of guarded decrements.
+
+    If any batch no longer has enough stock, the decrements that did apply are
+    reversed and ``StockConflictError`` is raised.
+    """
+    totals = _batch_totals(plan)
+    if not totals:
+        return
+    ops = [
+        UpdateOne(
+            {"id": medicine_id, "stock_quantity": {"$gte": qty}},
+            {
+                "$inc": {"stock_quantity": -qty},
+                "$push": {"recent_deductions": {"$each": [{"ref": ref, "quantity": qty}], "$slice": -RECENT_DEDUCTIONS_KEPT}}
+            }
+        )
+        for medicine_id, qty in totals.items()
+    ]
+    result = await db.medicines.bulk_write(ops, ordered=False, session=session)
+    if result.modified_count == len(ops):
+        return
+
+    await rollback_allocation(db, ref, totals, session=session)
+    raise StockConflictError(f"Stock changed while allocating {ref}")
+
+
+async def rollback_allocation(db, ref: str, totals: Dict[str, float], session=None):
+    ops = [
+        UpdateOne(
+            {"id": medicine_id, "recent_deductions.ref": ref},
+            {"$inc": {"stock_quantity": qty}, "$pull": {"recent_deductions": {"ref": ref}}}
+        )
+        for medicine_id, qty in totals.items()
+    ]
+    if ops:
+        await db.medicines.bulk_write(ops, ordered=False, session=session)
+
+
+async def allocate(db, ref: str, lines: List[dict], branch_id: Optional[str] = None, godown_id: Optional[str] = None, max_retries: Optional[int] = None, session=None):
+    """Load, plan and apply an allocation, re-planning on conflicts.
+
+    Returns ``(plan, batches)``. Raises ``InsufficientStockError`` when stock
+    really is short and ``StockConflictError`` once retries are exhausted.
+    """
+    retries = MAX_RETRIES if max_retries is None else max_retries
+    attempt = 0
+    while True:
+        batches = await load_candidate_batches(db, [l["name"] for l in lines], branch_id=branch_id, godown_id=godown_id, session=session)
+        try:
+            plan = plan_allocation(batches, lines)
+        except InsufficientStockError:
+            stats["insufficient_stock"] += 1
+            raise
+
+        try:
+            await apply_allocation(db, ref, plan, session=session)
+        except StockConflictError:
+            stats["conflicts"] += 1
+            if attempt >= retries:
+                stats["failed_after_retries"] += 1
+                raise
+            attempt += 1
+            stats["retries"] += 1
+            # Jittered backoff so competing counters do not retry in lockstep
+            await asyncio.sleep(RETRY_BACKOFF_SECONDS * attempt * (1 + random.random()))
+            continue
+
+        stats["allocations"] += 1
+        stats["batch_updates"] += len(_batch_totals(plan))
+        if attempt:
+            stats["retry_successes"] += 1
+        return plan, batches
+
+
+def get_stats() -> dict:
+    return {**stats, "max_retries": MAX_RETRIES}
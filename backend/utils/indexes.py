@@ -0,0 +1,273 @@
+"""Declarative MongoDB index registry.
+
+``INDEXES`` lists every index the application relies on, per collection.
+``ensure_indexes`` runs at startup and creates whatever is missing; an index
+whose keys already exist under another name is left alone. ``index_report``
+lists missing, unregistered and unused indexes, and ``HOT_QUERIES`` holds
+representative filters of the main endpoints so ``check_query_plans`` can
+flag any that fall back to a collection scan.
+"""
+import logging
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+
+from utils import change_log
+
+logger = logging.getLogger(__name__)
+
+
+def idx(keys, name: str, **options) -> dict:
+    if isinstance(keys, str):
+        keys = [(keys, 1)]
+    return {"keys": list(keys), "name": name, **options}
+
+
+INDEXES: Dict[str, List[dict]] = {
+    "users": [
+        idx("id", "user_id_idx"),
+        idx("email", "user_email_idx"),
+    ],
+    "patients": [
+        idx("phone", "patient_phone_idx"),
+        idx("patient_id", "patient_id_idx"),
+        idx("id", "patient_doc_id_idx"),
+        idx("search.tokens", "patient_search_tokens_idx"),
+        idx("search.pid", "patient_search_pid_idx"),
+        idx("search.phone_rev", "patient_search_phone_rev_idx"),
+        idx("search.grams", "patient_search_grams_idx"),
+        # /patients pages in (created_at, id) order
+        idx([("created_at", 1), ("id", 1)], "patient_created_idx"),
+    ],
+    "item_master": [
+        # /item-master pages (cursor or NDJSON) in (created_at, id) order
+        idx([("created_at", 1), ("id", 1)], "item_master_created_idx"),
+    ],
+    # Names match the ones created before the registry existed
+    "walkins": [
+        idx("id", "id_1", unique=True),
+        idx([("branch_id", 1), ("status", 1)], "branch_id_1_status_1"),
+        idx([("patient_id", 1), ("status", 1)], "patient_id_1_status_1"),
+        idx([("status", 1), ("paid_at", 1)], "walkin_status_paid_idx"),
+    ],
+    "medicines": [
+        idx("id", "medicine_id_idx"),
+        idx([("name", 1), ("branch_id", 1), ("purpose", 1), ("stock_quantity", 1)], "medicine_branch_stock_idx"),
+        idx([("name", 1), ("godown_id", 1), ("purpose", 1), ("stock_quantity", 1)], "medicine_godown_stock_idx"),
+        idx([("branch_id", 1), ("purpose", 1)], "medicine_branch_purpose_idx"),
+        idx([("godown_id", 1), ("purpose", 1)], "medicine_godown_purpose_idx"),
+    ],
+    "bills": [
+        idx("id", "bill_id_idx"),
+        idx([("created_at", -1), ("id", -1)], "bill_created_idx"),
+        idx([("branch_id", 1), ("created_at", -1), ("id", -1)], "bill_branch_created_idx"),
+        idx("patient_id", "bill_patient_idx"),
+        idx([("created_by", 1), ("created_at", -1)], "bill_creator_created_idx"),
+    ],
+    "pharmacy_sales": [
+        idx("id", "sale_id_idx"),
+        idx([("created_at", -1), ("id", -1)], "sale_created_idx"),
+        idx([("branch_id", 1), ("created_at", -1), ("id", -1)], "sale_branch_created_idx"),
+        idx("patient_id", "sale_patient_idx"),
+        idx([("created_by", 1), ("created_at", -1)], "sale_creator_created_idx"),
+    ],
+    "expenses": [
+        idx([("branch_id", 1), ("created_at", -1)], "expense_branch_created_idx"),
+        idx([("branch_id", 1), ("date", -1), ("id", -1)], "expense_branch_date_idx"),
+    ],
+    "bank_transactions": [
+        idx("transaction_date", "bank_txn_date_idx"),
+        idx([("bank_account_id", 1), ("transaction_date", 1)], "bank_txn_account_date_idx"),
+        idx([("created_at", -1), ("id", -1)], "bank_txn_created_idx"),
+        # Bank credits of a branch's daily/shift report
+        idx([("branch_id", 1), ("created_at", 1)], "bank_txn_branch_created_idx"),
+    ],
+    "purchase_entries": [
+        idx("id", "purchase_id_idx"),
+        idx("items_received_date", "purchase_received_idx"),
+        idx([("branch_id", 1), ("invoice_date", -1)], "purchase_branch_invoice_idx"),
+    ],
+    "serial_numbers": [
+        idx([("branch_id", 1), ("document_type", 1), ("financial_year", 1)], "serial_branch_doc_fy_idx", unique=True),
+    ],
+    "shifts": [
+        idx([("user_id", 1), ("status", 1)], "shift_user_status_idx"),
+        idx("id", "shift_id_idx"),
+    ],
+    "stock_transfers": [
+        idx("id", "transfer_id_idx"),
+        idx([("created_at", -1), ("id", -1)], "transfer_created_idx"),
+    ],
+    "lab_orders": [
+        idx("id", "lab_order_id_idx"),
+        idx([("created_at", -1), ("id", -1)], "lab_order_created_idx"),
+    ],
+    "appointments": [
+        idx([("branch_id", 1), ("appointment_date", -1), ("id", -1)], "appointment_branch_date_idx"),
+    ],
+    "stock_levels": [
+        idx("key", "stock_level_key_idx", unique=True),
+        idx([("branch_id", 1), ("godown_id", 1)], "stock_level_location_idx"),
+    ],
+    "patient_balances": [
+        idx("patient_key", "patient_balance_key_idx", unique=True),
+    ],
+    "daily_rollups": [
+        idx("key", "rollup_key_idx", unique=True),
+        idx([("branch_id", 1), ("date", 1)], "rollup_branch_date_idx"),
+    ],
+    "jobs": [
+        idx("id", "job_id_idx", unique=True),
+        idx([("status", 1), ("created_at", 1)], "job_status_created_idx"),
+        idx([("created_by", 1), ("created_at", -1)], "job_owner_created_idx"),
+    ],
+    "report_cache": [
+        idx("key", "report_cache_key_idx", unique=True),
+        idx([("kind", 1), ("collections", 1), ("date_from", 1), ("date_to", 1)], "report_cache_range_idx"),
+        idx([("kind", 1), ("collection", 1), ("day", 1), ("at", 1)], "report_cache_mark_idx"),
+        idx("expires_at", "report_cache_ttl_idx", expireAfterSeconds=0),
+    ],
+    "change_log": [
+        idx([("collection", 1), ("_id", 1)], "change_log_collection_idx"),
+        idx("at", "change_log_ttl_idx", expireAfterSeconds=change_log.RETENTION_DAYS * 24 * 3600),
+    ],
+    "system_meta": [
+        idx("id", "system_meta_id_idx", unique=True),
+    ],
+}
+
+# Representative filters of the hottest endpoint queries
+HOT_QUERIES: List[dict] = [
+    {"name": "sale FEFO batches (branch)", "collection": "medicines",
+     "filter": {"name": {"$in": ["x"]}, "stock_quantity": {"$gt": 0}, "purpose": "for_sale", "branch_id": "b"}},
+    {"name": "transfer FEFO batches (godown)", "collection": "medicines",
+     "filter": {"name": {"$in": ["x"]}, "stock_quantity": {"$gt": 0}, "purpose": "for_sale", "godown_id": "g"}},
+    {"name": "consolidated stock scan", "collection": "medicines",
+     "filter": {"purpose": {"$in": ["for_sale", None, ""]}, "branch_id": "b"}},
+    {"name": "medicine by id", "collection": "medicines", "filter": {"id": "m"}},
+    {"name": "bills list (branch)", "collection": "bills", "filter": {"branch_id": "b"}, "sort": {"created_at": -1, "id": -1}},
+    {"name": "bills list (all)", "collection": "bills", "filter": {}, "sort": {"created_at": -1, "id": -1}},
+    {"name": "bills by patient", "collection": "bills", "filter": {"patient_id": {"$in": ["p"]}}},
+    {"name": "bills after handover", "collection": "bills", "filter": {"created_by": "u", "created_at": {"$gt": "2024-01-01"}}},
+    {"name": "sales list (branch)", "collection": "pharmacy_sales", "filter": {"branch_id": "b"}, "sort": {"created_at": -1, "id": -1}},
+    {"name": "sales by patient", "collection": "pharmacy_sales", "filter": {"patient_id": {"$in": ["p"]}}},
+    {"name": "sales after handover", "collection": "pharmacy_sales", "filter": {"created_by": "u", "created_at": {"$gt": "2024-01-01"}}},
+    {"name": "bank transactions by date", "collection": "bank_transactions",
+     "filter": {"transaction_date": {"$gte": "2024-01-01", "$lte": "2024-01-31"}}},
+    {"name": "pending purchase entries", "collection": "purchase_entries", "filter": {"items_received_date": None}},
+    {"name": "purchase entries list (branch)", "collection": "purchase_entries", "filter": {"branch_id": "b"}, "sort": {"invoice_date": -1}},
+    {"name": "serial number config", "collection": "serial_numbers",
+     "filter": {"branch_id": "b", "document_type": "bill", "financial_year": "2024-2025"}},
+    {"name": "current user", "collection": "users", "filter": {"id": "u"}},
+    {"name": "login", "collection": "users", "filter": {"email": "a@b.c"}},
+    {"name": "active shift", "collection": "shifts", "filter": {"user_id": "u", "status": "active"}},
+    {"name": "patients list page", "collection": "patients",
+     "filter": {"$or": [{"created_at": {"$gt": "2024-01-01"}}, {"created_at": "2024-01-01", "id": {"$gt": "p"}}]},
+     "sort": {"created_at": 1, "id": 1}},
+    {"name": "item master list page", "collection": "item_master", "filter": {}, "sort": {"created_at": 1, "id": 1}},
+    {"name": "patient search (name prefix)", "collection": "patients", "filter": {"search.tokens": {"$all": [{"$regex": "^ram"}]}}},
+    {"name": "patient search (phone suffix)", "collection": "patients", "filter": {"search.phone_rev": {"$regex": "^4321"}}},
+    {"name": "walk-in queue balances", "collection": "patient_balances", "filter": {"patient_key": {"$in": ["p"]}}},
+    {"name": "dashboard rollups", "collection": "daily_rollups", "filter": {"branch_id": "b", "date": {"$gte": "2024-01-01", "$lt": "2024-02-01"}}},
+    {"name": "report cache lookup", "collection": "report_cache", "filter": {"key": "k"}},
+    {"name": "sync pull", "collection": "change_log",
+     "filter": {"collection": {"$in": ["patients"]}, "_id": {"$gt": ObjectId("0" * 24)}}, "sort": {"_id": 1}},
+    {"name": "stock ledger location", "collection": "stock_levels", "filter": {"branch_id": "b", "godown_id": None}},
+    {"name": "stock ledger list", "collection": "stock_levels",
+     "filter": {"branch_id": {"$in": ["b", None]}, "key": {"$gt": "k"}}, "sort": {"key": 1}},
+]
+
+
+def _key_tuple(keys) -> tuple:
+    return tuple((k, int(v) if isinstance(v, (int, float)) else v) for k, v in keys)
+
+
+async def ensure_indexes(db, registry: Optional[Dict[str, List[dict]]] = None) -> dict:
+    """Create registry indexes that do not exist yet.
+
+    Failures (e.g. a unique index over duplicate data) are logged and reported
+    instead of stopping startup.
+    """
+    registry = registry or INDEXES
+    summary = {"created": [], "existing": [], "failed": []}
+    for collection, specs in registry.items():
+        existing = await db[collection].index_information()
+        existing_keys = {_key_tuple(info["key"]): name for name, info in existing.items()}
+        for spec in specs:
+            label = f"{collection}.{spec['name']}"
+            if spec["name"] in existing or _key_tuple(spec["keys"]) in existing_keys:
+                summary["existing"].append(label)
+                continue
+            options = {k: v for k, v in spec.items() if k != "keys"}
+            try:
+                await db[collection].create_index(spec["keys"], **options)
+                summary["created"].append(label)
+            except Exception as e:
+                logger.warning(f"Could not create index {label}: {e}")
+                summary["failed"].append({"index": label, "error": str(e)})
+    return summary
+
+
+async def index_report(db, registry: Optional[Dict[str, List[dict]]] = None) -> dict:
+    """Missing and unregistered indexes, plus registered ones with no recorded use.
+
+    Usage comes from ``$indexStats`` and resets when mongod restarts.
+    """
+    registry = registry or INDEXES
+    existing_collections = set(await db.list_collection_names())
+    report = {"missing": [], "unregistered": [], "unused": []}
+    for collection, specs in registry.items():
+        if collection not in existing_collections:
+            report["missing"].extend(f"{collection}.{s['name']}" for s in specs)
+            continue
+
+        existing = await db[collection].index_information()
+        registered_keys = {_key_tuple(s["keys"]) for s in specs}
+        existing_keys = {_key_tuple(info["key"]) for info in existing.values()}
+        for spec in specs:
+            if spec["name"] not in existing and _key_tuple(spec["keys"]) not in existing_keys:
+                report["missing"].append(f"{collection}.{spec['name']}")
+        for name, info in existing.items():
+            if name != "_id_" and _key_tuple(info["key"]) not in registered_keys:
+                report["unregistered"].append(f"{collection}.{name}")
+
+        try:
+            usage = await db[collection].aggregate([{"$indexStats": {}}]).to_list(None)
+        except Exception:
+            continue
+        for u in usage:
+            if u["name"] != "_id_" and u.get("accesses", {}).get("ops", 0) == 0:
+                report["unused"].append(f"{collection}.{u['name']}")
+    return report
+
+
+def plan_stages(plan: dict) -> List[str]:
+    """All stage names in an explain plan tree."""
+    stages = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        if "stage" in node:
+            stages.append(node["stage"])
+        for key in ("inputStage", "queryPlan"):
+            if key in node:
+                stack.append(node[key])
+        stack.extend(node.get("inputStages", []))
+    return stages
+
+
+async def explain_query(db, query: dict) -> dict:
+    command = {"find": query["collection"], "filter": query["filter"]}
+    if query.get("sort"):
+        command["sort"] = query["sort"]
+    result = await db.command({"explain": command, "verbosity": "queryPlanner"})
+    winning = result.get("queryPlanner", {}).get("winningPlan", {})
+    stages = plan_stages(winning)
+    return {"name": query["name"], "collection": query["collection"], "stages": stages, "collscan": "COLLSCAN" in stages}
+
+
+async def check_query_plans(db, queries: Optional[List[dict]] = None) -> List[dict]:
+    """Explain every hot query; entries with ``collscan`` set need an index."""
+    return [await explain_query(db, q) for q in (queries or HOT_QUERIES)]
@@ -0,0 +1,310 @@
+"""In-process background jobs with state persisted in ``jobs``.
+
+Long operations (imports, migrations, rebuilds) are registered as handlers
+and submitted as jobs instead of running inside the request:
+
+    @job_runner.handler("patient_search.backfill")
+    async def backfill(ctx):
+        ...
+        await ctx.progress(done, total, checkpoint=last_id)
+        return {"updated": done}
+
+Each API worker runs a ``JobRunner`` that claims queued jobs atomically, so
+a job runs in exactly one process. The runner enforces a global and a
+per-kind concurrency limit (per process), heartbeats running jobs and stops
+them when a cancel is requested. ``ctx.progress`` persists progress and an
+optional checkpoint; a job that was interrupted (worker restart, crash) is
+re-queued and its handler sees the last checkpoint in ``ctx.checkpoint``.
+
+Jobs submitted with an in-memory ``payload`` (e.g. uploaded rows) can only
+run in the submitting process and are not resumable.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "jobs"
+MAX_CONCURRENCY = int(os.environ.get("JOBS_MAX_CONCURRENCY", "2"))
+POLL_SECONDS = float(os.environ.get("JOBS_POLL_SECONDS", "2"))
+HEARTBEAT_SECONDS = float(os.environ.get("JOBS_HEARTBEAT_SECONDS", "5"))
+# A running job whose heartbeat is older than this is considered orphaned
+STALE_SECONDS = float(os.environ.get("JOBS_STALE_SECONDS", "60"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+ACTIVE_STATUSES = ["queued", "running"]
+FINISHED_STATUSES = ["completed", "failed", "cancelled"]
+
+_UNSET = object()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _ago(seconds: float) -> str:
+    return (datetime.now(timezone.utc) - timedelta(seconds=seconds)).isoformat()
+
+
+class JobContext:
+    """What a handler sees: its params, payload, last checkpoint and a progress hook."""
+
+    def __init__(self, runner: "JobRunner", job: dict, payload: Any = None):
+        self.runner = runner
+        self.db = runner.db
+        self.job = job
+        self.id = job["id"]
+        self.params = job.get("params") or {}
+        self.checkpoint = job.get("checkpoint")
+        self.payload = payload
+
+    async def progress(self, done: int, total: Optional[int] = None, message: Optional[str] = None, checkpoint: Any = _UNSET):
+        """Persist progress (and a checkpoint to resume from); raises JobCancelled if cancel was requested."""
+        update = {"progress.done": done, "heartbeat_at": _now()}
+        if total is not None:
+            update["progress.total"] = total
+        if message is not None:
+            update["progress.message"] = message
+        if checkpoint is not _UNSET:
+            update["checkpoint"] = checkpoint
+            self.checkpoint = checkpoint
+        job = await self.db[COLLECTION].find_one_and_update(
+            {"id": self.id}, {"$set": update}, projection={"_id": 0, "cancel_requested": 1}
+        )
+        if job and job.get("cancel_requested"):
+            raise JobCancelled()
+
+
+class JobRunner:
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY):
+        self.db = None
+        self.max_concurrency = max_concurrency
+        self.handlers: Dict[str, Callable[[JobContext], Awaitable[Optional[dict]]]] = {}
+        self.limits: Dict[str, int] = {}
+        self.resumable: Dict[str, bool] = {}
+        self.needs_payload: Dict[str, bool] = {}
+        self._payloads: Dict[str, Any] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._running_kinds: Dict[str, str] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def handler(self, kind: str, concurrency: int = 1, resumable: bool = True, payload: bool = False):
+        """Register ``func(ctx) -> result dict`` as the handler for ``kind``.
+
+        ``payload=True`` marks kinds that need in-memory input at submit time.
+        """
+        def decorator(func):
+            self.handlers[kind] = func
+            self.limits[kind] = concurrency
+            self.resumable[kind] = resumable and not payload
+            self.needs_payload[kind] = payload
+            return func
+        return decorator
+
+    async def start(self, db):
+        self.db = db
+        self._stopping = False
+        self._wake = asyncio.Event()
+        await self.recover()
+        self._loop_task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Stop claiming jobs and hand running ones back to the queue (or fail them if not resumable)."""
+        self._stopping = True
+        if self._loop_task:
+            self._loop_task.cancel()
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def submit(self, kind: str, params: Optional[dict] = None, user_id: Optional[str] = None, payload: Any = None) -> dict:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self.needs_payload[kind] and payload is None:
+            raise ValueError(f"Job kind {kind} cannot be submitted without its input")
+        now = _now()
+        job = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "params": params or {},
+            "status": "queued",
+            "progress": {"done": 0, "total": None, "message": None},
+            "checkpoint": None,
+            "result": None,
+            "error": None,
+            "cancel_requested": False,
+            "resumable": self.resumable[kind],
+            # Jobs with an in-memory payload must run where it lives
+            "worker": WORKER_ID if payload is not None else None,
+            "attempts": 0,
+            "created_by": user_id,
+            "created_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "heartbeat_at": now,
+        }
+        if payload is not None:
+            self._payloads[job["id"]] = payload
+        await self.db[COLLECTION].insert_one(dict(job))
+        self._notify()
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.db[COLLECTION].find_one({"id": job_id}, {"_id": 0})
+
+    async def list(self, query: dict, limit: int = 100) -> List[dict]:
+        return await self.db[COLLECTION].find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
+
+    async def cancel(self, job_id: str) -> Optional[dict]:
+        """Cancel a queued job now, or ask a running one to stop at its next heartbeat/progress."""
+        await self.db[COLLECTION].update_one(
+            {"id": job_id, "status": "queued"},
+            {"$set": {"status": "cancelled", "cancel_requested": True, "finished_at": _now()}}
+        )
+        await self.db[COLLECTION].update_one({"id": job_id, "status": "running"}, {"$set": {"cancel_requested": True}})
+        task = self._running.get(job_id)
+        if task:
+            task.cancel()
+        else:
+            self._payloads.pop(job_id, None)
+        return await self.get(job_id)
+
+    async def resume(self, job_id: str) -> Optional[dict]:
+        """Re-queue a failed or cancelled resumable job; it continues from its checkpoint."""
+        await self.db[COLLECTION].update_one(
+            {"id": job_id, "status": {"$in": ["failed", "cancelled"]}, "resumable": True},
+            {"$set": {"status": "queued", "cancel_requested": False, "error": None, "finished_at": None, "worker": None}}
+        )
+        self._notify()
+        return await self.get(job_id)
+
+    async def recover(self):
+        """Re-queue orphaned resumable jobs and fail orphaned ones that cannot resume."""
+        stale = {"status": {"$in": ACTIVE_STATUSES}, "heartbeat_at": {"$lt": _ago(STALE_SECONDS)}}
+        await self.db[COLLECTION].update_many(
+            {**stale, "status": "running", "resumable": True},
+            {"$set": {"status": "queued", "worker": None}}
+        )
+        await self.db[COLLECTION].update_many(
+            {**stale, "resumable": False},
+            {"$set": {"status": "failed", "error": "Interrupted before completion (worker restarted)", "finished_at": _now()}}
+        )
+
+    def get_stats(self) -> dict:
+        return {
+            "worker": WORKER_ID,
+            "max_concurrency": self.max_concurrency,
+            "kinds": sorted(self.handlers),
+            "running": dict(self._running_kinds),
+        }
+
+    def _notify(self):
+        if self._wake:
+            self._wake.set()
+
+    async def _loop(self):
+        last_recover = 0.0
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            try:
+                await self._fill()
+                if self._payloads:
+                    # Keep our queued payload jobs from looking orphaned
+                    await self.db[COLLECTION].update_many(
+                        {"status": "queued", "worker": WORKER_ID}, {"$set": {"heartbeat_at": _now()}}
+                    )
+                if loop.time() - last_recover > STALE_SECONDS:
+                    await self.recover()
+                    last_recover = loop.time()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job runner loop failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _fill(self):
+        while len(self._running) < self.max_concurrency:
+            busy = [k for k in self.handlers if list(self._running_kinds.values()).count(k) >= self.limits[k]]
+            kinds = [k for k in self.handlers if k not in busy]
+            if not kinds:
+                return
+            now = _now()
+            job = await self.db[COLLECTION].find_one_and_update(
+                {"status": "queued", "kind": {"$in": kinds}, "$or": [{"worker": None}, {"worker": WORKER_ID}]},
+                {"$set": {"status": "running", "worker": WORKER_ID, "heartbeat_at": now}, "$inc": {"attempts": 1}},
+                projection={"_id": 0},
+                sort=[("created_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if not job:
+                return
+            if not job.get("started_at"):
+                await self.db[COLLECTION].update_one({"id": job["id"]}, {"$set": {"started_at": now}})
+            self._running_kinds[job["id"]] = job["kind"]
+            self._running[job["id"]] = asyncio.create_task(self._run(job))
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            job = await self.db[COLLECTION].find_one_and_update(
+                {"id": job_id}, {"$set": {"heartbeat_at": _now()}}, projection={"_id": 0, "cancel_requested": 1}
+            )
+            if job and job.get("cancel_requested"):
+                task = self._running.get(job_id)
+                if task:
+                    task.cancel()
+                return
+
+    async def _run(self, job: dict):
+        job_id = job["id"]
+        payload = self._payloads.get(job_id)
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        update: Dict[str, Any]
+        try:
+            if payload is None and self.needs_payload[job["kind"]]:
+                raise RuntimeError("Job input is no longer available")
+            result = await self.handlers[job["kind"]](JobContext(self, job, payload))
+            update = {"status": "completed", "result": result}
+        except (JobCancelled, asyncio.CancelledError):
+            if self._stopping and job.get("resumable", True):
+                update = {"status": "queued", "worker": None}
+            elif self._stopping:
+                update = {"status": "failed", "error": "Interrupted before completion (worker stopped)"}
+            else:
+                update = {"status": "cancelled"}
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job_id, job["kind"])
+            update = {"status": "failed", "error": str(e)}
+        finally:
+            heartbeat.cancel()
+            self._running.pop(job_id, None)
+            self._running_kinds.pop(job_id, None)
+
+        if update["status"] != "queued":
+            update["finished_at"] = _now()
+            self._payloads.pop(job_id, None)
+        await self.db[COLLECTION].update_one({"id": job_id}, {"$set": update})
+        self._notify()
+
+
+job_runner = JobRunner()
@@ -0,0 +1,167 @@
+"""One-off data maintenance tasks, runnable as background jobs.
+
+Each task takes the database and an optional ``progress(done, total)``
+coroutine and returns a summary dict. They are idempotent, so an
+interrupted run can simply be started again.
+"""
+from datetime import datetime, timezone
+from typing import List
+
+from pymongo import UpdateOne
+
+from utils import report_cache
+from utils.catalog import catalog
+
+DELETE_CHUNK_SIZE = 1000
+BACKFILL_CHUNK_SIZE = 1000
+# Bank transaction reference_type -> collection of the document it records
+BANK_REFERENCES = {"bill": "bills", "pharmacy_sale": "pharmacy_sales", "purchase_entry": "purchase_entries"}
+
+
+async def migrate_treatments(db, progress=None) -> dict:
+    """Copy legacy treatments and their categories into item_master."""
+    stages = 4
+
+    # 1. Ensure "Treatment" Item Type exists
+    item_type = await db.item_types.find_one({"name": "Treatment"})
+    if not item_type:
+        item_type_id = "treatment_type" # Fixed ID for convenience
+        item_type = {
+            "id": item_type_id,
+            "name": "Treatment",
+            "description": "Clinical treatments and procedures",
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        await db.item_types.insert_one(item_type)
+    else:
+        item_type_id = item_type["id"]
+    if progress:
+        await progress(1, stages)
+
+    # 2. Migrate Treatment Categories
+    old_categories = await db.treatment_categories.find({}, {"_id": 0}).to_list(1000)
+    migrated_count = 0
+    for old_cat in old_categories:
+        # Check if already migrated
+        exists = await db.categories.find_one({"name": old_cat["name"], "item_type_id": item_type_id})
+        if not exists:
+            new_cat = {
+                "id": old_cat["id"], # Keep ID to maintain subcategory links
+                "name": old_cat["name"],
+                "description": old_cat.get("description"),
+                "item_type_id": item_type_id,
+                "created_at": old_cat.get("created_at") or datetime.now(timezone.utc).isoformat()
+            }
+            await db.categories.insert_one(new_cat)
+            migrated_count += 1
+    if progress:
+        await progress(2, stages)
+
+    # 3. Migrate Treatment Subcategories
+    old_subcategories = await db.treatment_subcategories.find({}, {"_id": 0}).to_list(1000)
+    for old_sub in old_subcategories:
+        exists = await db.subcategories.find_one({"name": old_sub["name"], "category_id": old_sub["category_id"]})
+        if not exists:
+            new_sub = {
+                "id": old_sub["id"],
+                "category_id": old_sub["category_id"],
+                "name": old_sub["name"],
+                "description": old_sub.get("description"),
+                "created_at": old_sub.get("created_at") or datetime.now(timezone.utc).isoformat()
+            }
+            await db.subcategories.insert_one(new_sub)
+    if progress:
+        await progress(3, stages)
+
+    # 4. Migrate Treatments to Item Master
+    old_treatments = await db.treatments.find({}, {"_id": 0}).to_list(1000)
+    for old_t in old_treatments:
+        exists = await db.item_master.find_one({"name": old_t["name"], "item_type_id": item_type_id})
+        if not exists:
+            new_item = {
+                "id": old_t["id"],
+                "name": old_t["name"],
+                "item_type_id": item_type_id,
+                "category_id": old_t.get("category_id"),
+                "subcategory_id": old_t.get("subcategory_id"),
+                "charges": old_t.get("charges", 0),
+                "mrp": old_t.get("charges", 0), # Mirror charges to MRP
+                "duration_minutes": old_t.get("duration_minutes"),
+                "gst_applicable": old_t.get("gst_applicable", False),
+                "gst_percentage": old_t.get("gst_percentage", 0),
+                "description": old_t.get("description"),
+                "created_at": old_t.get("created_at") or datetime.now(timezone.utc).isoformat(),
+                "purpose": "for_sale",
+                "item_status": "ACTIVE" # Default status for migrated treatments
+            }
+            await db.item_master.insert_one(new_item)
+    if progress:
+        await progress(4, stages)
+
+    await catalog.bump(db, "item_master", "categories", "subcategories")
+    return {"message": "Migration completed successfully", "categories_migrated": migrated_count}
+
+
+def duplicate_item_ids(items: List[dict]) -> list:
+    """``_id``s of item_master rows to drop: blank names, and all but the newest per name."""
+    keep = set()
+    to_delete = []
+    # Newest first so the most recent item of each name is kept
+    for item in sorted(items, key=lambda x: x.get("created_at") or "", reverse=True):
+        name = (item.get("name") or "").strip().lower()
+        if not name or name in keep:
+            to_delete.append(item["_id"])
+        else:
+            keep.add(name)
+    return to_delete
+
+
+async def deduplicate_items(db, progress=None) -> dict:
+    """Delete item_master rows whose name (case-insensitive) repeats a newer one."""
+    items = await db.item_master.find({}, {"_id": 1, "name": 1, "created_at": 1}).to_list(None)
+    to_delete = duplicate_item_ids(items)
+
+    deleted = 0
+    for start in range(0, len(to_delete), DELETE_CHUNK_SIZE):
+        chunk = to_delete[start:start + DELETE_CHUNK_SIZE]
+        deleted += (await db.item_master.delete_many({"_id": {"$in": chunk}})).deleted_count
+        if progress:
+            await progress(start + len(chunk), len(to_delete))
+
+    if deleted:
+        await catalog.bump(db, "item_master")
+    return {"items": len(items), "unique": len(items) - len(to_delete), "deleted": deleted}
+
+
+async def backfill_bank_branches(db, progress=None) -> dict:
+    """Stamp ``branch_id`` on bank transactions logged before they carried one.
+
+    The branch comes from the bill, sale or purchase entry the transaction
+    records (None when that is gone, so the row is not looked at again).
+    Cached reports are cleared since their bank collections change.
+    """
+    pending = await db.bank_transactions.find(
+        {"branch_id": {"$exists": False}, "reference_type": {"$in": list(BANK_REFERENCES)}},
+        {"_id": 1, "reference_type": 1, "reference_id": 1}
+    ).to_list(None)
+
+    updated = 0
+    for start in range(0, len(pending), BACKFILL_CHUNK_SIZE):
+        chunk = pending[start:start + BACKFILL_CHUNK_SIZE]
+        branches = {}
+        for reference_type, collection in BANK_REFERENCES.items():
+            ids = [txn["reference_id"] for txn in chunk if txn["reference_type"] == reference_type]
+            if ids:
+                sources = await db[collection].find({"id": {"$in": ids}}, {"_id": 0, "id": 1, "branch_id": 1}).to_list(None)
+                branches.update({(reference_type, src["id"]): src.get("branch_id") for src in sources})
+        result = await db.bank_transactions.bulk_write([
+            UpdateOne({"_id": txn["_id"]}, {"$set": {"branch_id": branches.get((txn["reference_type"], txn["reference_id"]))}})
+            for txn in chunk
+        ], ordered=False)
+        updated += result.modified_count
+        if progress:
+            await progress(start + len(chunk), len(pending))
+
+    if pending:
+        await report_cache.clear(db)
+    return {"transactions": len(pending), "updated": updated}
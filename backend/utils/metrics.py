@@ -0,0 +1,273 @@
+"""Per-route request and MongoDB command metrics in Prometheus text format.
+
+- ``MetricsMiddleware`` (pure ASGI) times every HTTP request and counts
+  request/response body bytes, labelled by the matched route template
+  (``/api/patients/{patient_id}``), never the raw path.
+- ``MongoCommandListener`` is registered on the Motor client. Motor runs
+  pymongo calls with a copy of the caller's context, so the listener finds
+  the request's ``RequestMetrics`` through a contextvar and charges the
+  command count, duration and documents returned to that route. Commands
+  issued outside a request (startup, background jobs) are labelled
+  ``background``.
+
+``registry.render()`` produces the Prometheus exposition served by
+``/api/metrics``; ``registry.summary()`` estimates p50/p95/p99 per route from
+the histogram buckets. Metrics are per process: with several workers,
+scrape each one or aggregate in Prometheus.
+"""
+import contextvars
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500)
+
+BACKGROUND = "background"
+UNMATCHED = "unmatched"
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        out, running = [], 0
+        for bound, n in zip(self.buckets, self.counts):
+            running += n
+            out.append((_fmt(bound), running))
+        out.append(("+Inf", self.count))
+        return out
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside its bucket."""
+        if not self.count:
+            return None
+        target = q * self.count
+        running, lower = 0, 0.0
+        for bound, n in zip(self.buckets, self.counts):
+            if n and running + n >= target:
+                return lower + (bound - lower) * (target - running) / n
+            running += n
+            lower = bound
+        return self.buckets[-1]
+
+
+class RequestMetrics:
+    """Mongo usage of one request, filled in by the command listener."""
+    __slots__ = ("commands",)
+
+    def __init__(self):
+        # command name -> [count, seconds, documents]
+        self.commands: Dict[str, list] = {}
+
+    def add(self, command: str, seconds: float, documents: int):
+        entry = self.commands.setdefault(command, [0, 0.0, 0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] += documents
+
+
+current_request: contextvars.ContextVar[Optional[RequestMetrics]] = contextvars.ContextVar("current_request", default=None)
+
+
+def _fmt(value: float) -> str:
+    return repr(float(value))
+
+
+def _labels(**labels) -> str:
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.response_size: Dict[Tuple[str, str], Histogram] = {}
+        self.mongo_per_request: Dict[Tuple[str, str], Histogram] = {}
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.request_bytes: Dict[Tuple[str, str], int] = {}
+        # (route, command) -> [count, seconds, documents]
+        self.mongo: Dict[Tuple[str, str], list] = {}
+        self.mongo_latency: Dict[Tuple[str, str], Histogram] = {}
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float,
+                        request_bytes: int, response_bytes: int, request_metrics: RequestMetrics):
+        key = (method, route)
+        with self._lock:
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.response_size.setdefault(key, Histogram(SIZE_BUCKETS)).observe(response_bytes)
+            self.requests[(method, route, status)] = self.requests.get((method, route, status), 0) + 1
+            self.request_bytes[key] = self.request_bytes.get(key, 0) + request_bytes
+            commands = 0
+            for command, (count, secs, docs) in request_metrics.commands.items():
+                self._add_mongo(route, command, count, secs, docs)
+                commands += count
+            self.mongo_per_request.setdefault(key, Histogram(COUNT_BUCKETS)).observe(commands)
+
+    def observe_background_command(self, command: str, seconds: float, documents: int):
+        with self._lock:
+            self._add_mongo(BACKGROUND, command, 1, seconds, documents)
+
+    def _add_mongo(self, route: str, command: str, count: int, seconds: float, documents: int):
+        entry = self.mongo.setdefault((route, command), [0, 0.0, 0])
+        entry[0] += count
+        entry[1] += seconds
+        entry[2] += documents
+        # Per-request totals are pre-summed, so this tracks per-request command time
+        self.mongo_latency.setdefault((route, command), Histogram(LATENCY_BUCKETS)).observe(seconds)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            def histogram(name: str, help_text: str, series: Dict[tuple, Histogram], label_names: Sequence[str]):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in sorted(series.items()):
+                    labels = dict(zip(label_names, key))
+                    for le, n in h.cumulative():
+                        lines.append(f"{name}_bucket{_labels(**labels, le=le)} {n}")
+                    lines.append(f"{name}_sum{_labels(**labels)} {h.sum}")
+                    lines.append(f"{name}_count{_labels(**labels)} {h.count}")
+
+            def counter(name: str, help_text: str, series: Dict[tuple, float], label_names: Sequence[str]):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_labels(**dict(zip(label_names, key)))} {value}")
+
+            histogram("http_request_duration_seconds", "Request latency by route.", self.latency, ("method", "route"))
+            counter("http_requests_total", "Requests by route and status.", self.requests, ("method", "route", "status"))
+            counter("http_request_bytes_total", "Request body bytes by route.", self.request_bytes, ("method", "route"))
+            histogram("http_response_size_bytes", "Response body size by route.", self.response_size, ("method", "route"))
+            histogram("http_request_mongo_commands", "MongoDB commands issued per request.", self.mongo_per_request, ("method", "route"))
+            counter("mongo_commands_total", "MongoDB commands by originating route.",
+                    {k: v[0] for k, v in self.mongo.items()}, ("route", "command"))
+            counter("mongo_command_seconds_total", "MongoDB command time by originating route.",
+                    {k: v[1] for k, v in self.mongo.items()}, ("route", "command"))
+            counter("mongo_documents_returned_total", "Documents returned by MongoDB by originating route.",
+                    {k: v[2] for k, v in self.mongo.items()}, ("route", "command"))
+            histogram("mongo_command_duration_seconds", "MongoDB command time per request (or per command in background).",
+                      self.mongo_latency, ("route", "command"))
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> List[dict]:
+        """Per-route request count, p50/p95/p99 latency and Mongo usage, slowest p95 first."""
+        with self._lock:
+            rows = []
+            for (method, route), h in self.latency.items():
+                mongo = {c: v for (r, c), v in self.mongo.items() if r == route}
+                per_request = self.mongo_per_request.get((method, route))
+                rows.append({
+                    "method": method,
+                    "route": route,
+                    "requests": h.count,
+                    "p50_ms": _ms(h.quantile(0.5)),
+                    "p95_ms": _ms(h.quantile(0.95)),
+                    "p99_ms": _ms(h.quantile(0.99)),
+                    "avg_response_bytes": round(self.response_size[(method, route)].sum / h.count) if h.count else 0,
+                    "mongo_commands_per_request": round(per_request.sum / per_request.count, 2) if per_request and per_request.count else 0,
+                    "mongo_documents_returned": sum(v[2] for v in mongo.values()),
+                })
+        return sorted(rows, key=lambda r: -(r["p95_ms"] or 0))
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+registry = MetricsRegistry()
+
+
+def documents_returned(reply) -> int:
+    if not isinstance(reply, dict):
+        return 0
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+        return len(batch) if isinstance(batch, list) else 0
+    if "value" in reply:  # findAndModify
+        return 1 if reply.get("value") else 0
+    return 0
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event.command_name, event.duration_micros, documents_returned(event.reply))
+
+    def failed(self, event):
+        self._record(event.command_name, event.duration_micros, 0)
+
+    @staticmethod
+    def _record(command: str, micros: int, documents: int):
+        seconds = micros / 1_000_000
+        request = current_request.get()
+        if request is not None:
+            request.add(command, seconds, documents)
+        else:
+            registry.observe_background_command(command, seconds, documents)
+
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_metrics = RequestMetrics()
+        token = current_request.set(request_metrics)
+        sizes = {"request": 0, "response": 0}
+        status = {"code": 500}
+        started = time.perf_counter()
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                sizes["request"] += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body":
+                sizes["response"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            current_request.reset(token)
+            registry.observe_request(
+                scope["method"], route_label(scope), status["code"], time.perf_counter() - started,
+                sizes["request"], sizes["response"], request_metrics
+            )
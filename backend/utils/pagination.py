@@ -0,0 +1,103 @@
+"""Keyset pagination and NDJSON streaming for list endpoints.
+
+List endpoints take ``limit``, ``cursor`` and ``format`` query parameters
+(via the ``page_params`` dependency) and hand their query to ``paginate``:
+
+- JSON (default): returns at most ``limit`` documents. When more rows exist,
+  the ``X-Next-Cursor`` response header carries an opaque cursor for the
+  next page. The default page size is the endpoint's previous hard cap, so
+  existing clients keep getting the same first page.
+- ``format=ndjson``: streams every matching document (or ``limit`` of them)
+  straight from the Motor cursor, one JSON object per line.
+
+Cursors encode the sort value and ``id`` of the last row sent, so pages
+stay stable while new documents are inserted.
+"""
+import base64
+import json
+from typing import Any, Optional
+
+from fastapi import HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+
+MAX_PAGE_SIZE = 10000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+STREAM_BATCH_SIZE = 500
+
+
+class PageParams:
+    def __init__(self, limit: Optional[int], cursor: Optional[str], format: str):
+        self.limit = limit
+        self.cursor = cursor
+        self.format = format
+
+
+def page_params(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size (defaults to the endpoint's usual cap)"),
+    cursor: Optional[str] = Query(None, description="Value of the X-Next-Cursor header from the previous page"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson streams the rows instead")
+) -> PageParams:
+    return PageParams(limit, cursor, format)
+
+
+def encode_cursor(doc: dict, sort_field: str) -> str:
+    raw = json.dumps({"v": doc.get(sort_field), "id": doc.get("id")}, default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if "v" not in data or "id" not in data:
+            raise ValueError
+        return data
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after_cursor(sort_field: str, direction: int, value: Any, last_id: str) -> dict:
+    """Filter for rows that come after (value, id) in (sort_field, id) order.
+
+    MongoDB sorts missing/null values first, so they come last when descending.
+    """
+    if direction < 0:
+        if value is None:
+            return {sort_field: None, "id": {"$lt": last_id}}
+        return {"$or": [
+            {sort_field: {"$lt": value}},
+            {sort_field: value, "id": {"$lt": last_id}},
+            {sort_field: None}
+        ]}
+    if value is None:
+        return {"$or": [{sort_field: None, "id": {"$gt": last_id}}, {sort_field: {"$ne": None}}]}
+    return {"$or": [{sort_field: {"$gt": value}}, {sort_field: value, "id": {"$gt": last_id}}]}
+
+
+def _ndjson(cursor):
+    async def lines():
+        async for doc in cursor:
+            yield json.dumps(doc, default=str) + "\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def paginate(collection, query: dict, sort_field: str, direction: int, page: PageParams, response: Response, default_limit: int = 1000, projection: Optional[dict] = None):
+    """Run ``query`` sorted by (sort_field, id) and return one page or a stream."""
+    if page.cursor:
+        last = decode_cursor(page.cursor)
+        keyset = after_cursor(sort_field, direction, last["v"], last["id"])
+        query = {"$and": [query, keyset]} if query else keyset
+
+    cursor = collection.find(query, projection or {"_id": 0}).sort([(sort_field, direction), ("id", direction)])
+
+    if page.format == "ndjson":
+        if page.limit:
+            cursor = cursor.limit(page.limit)
+        return _ndjson(cursor.batch_size(STREAM_BATCH_SIZE))
+
+    limit = page.limit or default_limit
+    docs = await cursor.limit(limit + 1).to_list(limit + 1)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(docs[-1], sort_field)
+    return docs
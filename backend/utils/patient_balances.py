@@ -0,0 +1,275 @@
+"""Running per-patient balances for the reception queue.
+
+``patient_balances`` holds one document per ``patient_id`` value found on
+bills and pharmacy sales (internal UUID or external patient number):
+
+- ``total_treatment`` / ``total_pharmacy``: sum of ``total_amount - paid_amount``
+- ``today`` plus ``today_treatment`` / ``today_pharmacy``: the part of those
+  totals created on the latest UTC day seen, and that day's first doctor
+
+Bill and sale writes call ``apply_change`` with the document before and after
+the write. Each patient is updated with a single pipeline update, so the
+totals and the day rollover change atomically. A day that is no longer
+today simply counts as previous balance when read.
+"""
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+COLLECTION = "patient_balances"
+REBUILD_COLLECTION = "patient_balances_rebuild"
+META_ID = "patient_balances"
+
+KINDS = {"bills": "treatment", "pharmacy_sales": "pharmacy"}
+
+READY_CACHE_SECONDS = 5
+_ready_cache = {"value": None, "checked_at": 0.0}
+
+SOURCE_PROJECTION = {"_id": 0, "patient_id": 1, "total_amount": 1, "paid_amount": 1, "created_at": 1, "doctor_name": 1}
+
+
+class BalanceDriftError(Exception):
+    """The balances no longer match a recomputation from bills and pharmacy sales."""
+
+
+def utc_day(created_at) -> Optional[str]:
+    """UTC date of an ISO timestamp, or None when it cannot be parsed."""
+    try:
+        return datetime.fromisoformat(created_at.replace('Z', '+00:00')).astimezone(timezone.utc).date().isoformat()
+    except Exception:
+        return None
+
+
+def outstanding(doc: dict) -> float:
+    return doc.get("total_amount", 0) - (doc.get("paid_amount") or 0)
+
+
+def entry_delta(collection: str, doc: Optional[dict], sign: int = 1) -> Optional[dict]:
+    if not doc or not doc.get("patient_id"):
+        return None
+    return {
+        "patient_key": doc["patient_id"],
+        "kind": KINDS[collection],
+        "day": utc_day(doc.get("created_at", "")),
+        "amount": sign * outstanding(doc),
+        "doctor_name": doc.get("doctor_name") if sign > 0 and collection == "bills" else None
+    }
+
+
+def _update_pipeline(delta: dict) -> List[dict]:
+    kind = delta["kind"]
+    other = "pharmacy" if kind == "treatment" else "treatment"
+    amount = delta["amount"]
+    total = f"total_{kind}"
+    update = {total: {"$add": [{"$ifNull": [f"${total}", 0]}, amount]}}
+
+    day = delta["day"]
+    if day:
+        stored_day = {"$ifNull": ["$today", ""]}
+        same_day = {"$eq": [stored_day, day]}
+        new_day = {"$gt": [day, stored_day]}
+        today_field = f"today_{kind}"
+        other_field = f"today_{other}"
+        update[today_field] = {"$cond": [
+            same_day, {"$add": [{"$ifNull": [f"${today_field}", 0]}, amount]},
+            {"$cond": [new_day, amount, {"$ifNull": [f"${today_field}", 0]}]}
+        ]}
+        update[other_field] = {"$cond": [new_day, 0, {"$ifNull": [f"${other_field}", 0]}]}
+        doctor = {"$literal": delta["doctor_name"]}
+        update["today_doctor_name"] = {"$cond": [
+            new_day, doctor,
+            {"$cond": [same_day, {"$ifNull": ["$today_doctor_name", doctor]}, {"$ifNull": ["$today_doctor_name", None]}]}
+        ]}
+        update["today"] = {"$cond": [new_day, day, "$today"]}
+
+    update["updated_at"] = datetime.now(timezone.utc).isoformat()
+    return [{"$set": update}]
+
+
+def fold(doc: dict, delta: dict) -> dict:
+    """``_update_pipeline`` applied in memory: the balance document after ``delta``."""
+    kind = delta["kind"]
+    other = "pharmacy" if kind == "treatment" else "treatment"
+    amount = delta["amount"]
+    updated = {**doc, f"total_{kind}": doc.get(f"total_{kind}", 0) + amount}
+    day = delta["day"]
+    if day:
+        stored_day = doc.get("today") or ""
+        same_day, new_day = stored_day == day, day > stored_day
+        today_amount = doc.get(f"today_{kind}", 0)
+        updated[f"today_{kind}"] = today_amount + amount if same_day else amount if new_day else today_amount
+        updated[f"today_{other}"] = 0 if new_day else doc.get(f"today_{other}", 0)
+        stored_doctor = doc.get("today_doctor_name")
+        updated["today_doctor_name"] = delta["doctor_name"] if new_day or (same_day and stored_doctor is None) else stored_doctor
+        updated["today"] = day if new_day else doc.get("today")
+    return updated
+
+
+def _ops(deltas: Iterable[Optional[dict]]) -> List[UpdateOne]:
+    return [
+        UpdateOne({"patient_key": d["patient_key"]}, _update_pipeline(d), upsert=True)
+        for d in deltas if d and (d["amount"] or d["doctor_name"])
+    ]
+
+
+async def apply_change(db, collection: str, before: Optional[dict], after: Optional[dict], collection_name: str = COLLECTION, session=None):
+    """Move a bill/sale's outstanding amount from its old to its new state."""
+    if collection not in KINDS:
+        return None
+    ops = _ops([entry_delta(collection, before, -1), entry_delta(collection, after, 1)])
+    if not ops:
+        return None
+    # Ordered: the removal of the old state must land before the new one
+    return await db[collection_name].bulk_write(ops, ordered=True, session=session)
+
+
+def snapshot(docs: Iterable[dict], today: Optional[str] = None) -> dict:
+    """Reception-queue balance fields summed over a patient's balance documents."""
+    today = today or datetime.now(timezone.utc).date().isoformat()
+    totals = {"treatment": 0, "pharmacy": 0}
+    pending = {"treatment": 0, "pharmacy": 0}
+    doctor_name = None
+    for doc in docs:
+        for kind in totals:
+            totals[kind] += doc.get(f"total_{kind}", 0)
+        if doc.get("today") == today:
+            for kind in pending:
+                pending[kind] += doc.get(f"today_{kind}", 0)
+            doctor_name = doctor_name or doc.get("today_doctor_name")
+
+    previous = (totals["treatment"] - pending["treatment"]) + (totals["pharmacy"] - pending["pharmacy"])
+    return {
+        "previous_balance": previous,
+        "treatment_fees_pending": pending["treatment"],
+        "pharmacy_fees_pending": pending["pharmacy"],
+        "current_balance": previous + pending["treatment"] + pending["pharmacy"],
+        "doctor_name": doctor_name
+    }
+
+
+async def load(db, patient_keys: Iterable[str]) -> Dict[str, dict]:
+    keys = [k for k in set(patient_keys) if k]
+    if not keys:
+        return {}
+    docs = await db[COLLECTION].find({"patient_key": {"$in": keys}}, {"_id": 0}).to_list(None)
+    return {d["patient_key"]: d for d in docs}
+
+
+async def is_ready(db) -> bool:
+    """Whether balances have been built and can serve reads (cached briefly per process)."""
+    now = time.monotonic()
+    if _ready_cache["value"] is not None and now - _ready_cache["checked_at"] < READY_CACHE_SECONDS:
+        return _ready_cache["value"]
+    meta = await db.system_meta.find_one({"id": META_ID}, {"_id": 0, "status": 1})
+    _ready_cache["value"] = bool(meta and meta.get("status") == "ready")
+    _ready_cache["checked_at"] = now
+    return _ready_cache["value"]
+
+
+async def _source_deltas(db, collection: str):
+    # Oldest first so the first doctor of the day wins, as in the full scan
+    async for doc in db[collection].find({"patient_id": {"$nin": [None, ""]}}, SOURCE_PROJECTION).sort("created_at", 1):
+        yield entry_delta(collection, doc)
+
+
+async def rebuild(db, chunk_size: int = 1000, progress=None) -> dict:
+    """Recreate ``patient_balances`` from all bills and pharmacy sales.
+
+    Built in a scratch collection and swapped in with a rename. Writes landing
+    while a rebuild runs may not be reflected; ``check_rebuild`` catches that.
+    ``progress(done)`` is awaited with the number of source documents read
+    after each chunk.
+    """
+    started = datetime.now(timezone.utc).isoformat()
+    await db.system_meta.update_one({"id": META_ID}, {"$set": {"status": "rebuilding", "rebuild_started_at": started}}, upsert=True)
+    _ready_cache["value"] = None
+
+    await db[REBUILD_COLLECTION].drop()
+    await db[REBUILD_COLLECTION].create_index("patient_key", unique=True, name="patient_balance_key_idx")
+
+    async def flush(batch):
+        ops = _ops(batch)
+        if ops:
+            await db[REBUILD_COLLECTION].bulk_write(ops, ordered=True)
+        batch.clear()
+        if progress:
+            await progress(sum(counts.values()))
+
+    counts = {}
+    for collection in KINDS:
+        counts[collection] = 0
+        batch = []
+        async for delta in _source_deltas(db, collection):
+            batch.append(delta)
+            counts[collection] += 1
+            if len(batch) >= chunk_size:
+                await flush(batch)
+        await flush(batch)
+
+    rows = await db[REBUILD_COLLECTION].count_documents({})
+    if rows:
+        await db[REBUILD_COLLECTION].rename(COLLECTION, dropTarget=True)
+    else:
+        await db[COLLECTION].delete_many({})
+
+    finished = datetime.now(timezone.utc).isoformat()
+    await db.system_meta.update_one(
+        {"id": META_ID},
+        {"$set": {"status": "ready", "rebuilt_at": finished, "rows": rows, "sources": counts}},
+        upsert=True
+    )
+    _ready_cache["value"] = None
+    return {"rows": rows, "sources": counts, "started_at": started, "finished_at": finished}
+
+
+async def verify(db, limit: int = 50) -> dict:
+    """Compare what the queue reads from ``patient_balances`` with a recomputation.
+
+    Balances are recomputed in memory from bills and pharmacy sales and both
+    sides go through ``snapshot`` for today, so only differences the
+    reception queue would show count.
+    """
+    expected: Dict[str, dict] = {}
+    for collection in KINDS:
+        async for delta in _source_deltas(db, collection):
+            if delta["amount"] or delta["doctor_name"]:
+                expected[delta["patient_key"]] = fold(expected.get(delta["patient_key"], {}), delta)
+    actual = {doc["patient_key"]: doc async for doc in db[COLLECTION].find({}, {"_id": 0})}
+
+    today = datetime.now(timezone.utc).date().isoformat()
+    mismatched = []
+    for key in expected.keys() | actual.keys():
+        want = snapshot([expected[key]] if key in expected else [], today)
+        have = snapshot([actual[key]] if key in actual else [], today)
+        if any(abs(want[f] - have[f]) > 0.005 for f in want if f != "doctor_name") or want["doctor_name"] != have["doctor_name"]:
+            mismatched.append({"patient_key": key, "expected": want, "actual": have})
+    return {
+        "matches": not mismatched,
+        "patients": len(expected),
+        "mismatched": mismatched[:limit],
+        "mismatched_count": len(mismatched)
+    }
+
+
+async def mark_stale(db, mismatched_count: int):
+    """Stop serving reads from the balances until the next rebuild; the queue falls back to the full scan."""
+    await db.system_meta.update_one(
+        {"id": META_ID},
+        {"$set": {"status": "stale", "stale_at": datetime.now(timezone.utc).isoformat(), "mismatched": mismatched_count}},
+        upsert=True
+    )
+    _ready_cache["value"] = None
+
+
+async def check_rebuild(db) -> dict:
+    """Verify a fresh rebuild; on drift mark the balances stale and raise ``BalanceDriftError``."""
+    report = await verify(db)
+    if not report["matches"]:
+        await mark_stale(db, report["mismatched_count"])
+        raise BalanceDriftError(
+            f"Rebuilt patient balances differ from bills and sales for {report['mismatched_count']} patients; "
+            "the queue uses the full scan until they are rebuilt again"
+        )
+    return report
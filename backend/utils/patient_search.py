@@ -0,0 +1,237 @@
+"""Indexed patient search for the Reception screen.
+
+Each patient document carries a ``search`` sub-document maintained on
+create, update and bulk upload:
+
+- ``tokens``: lower-cased, punctuation-free name words
+- ``pid``: lower-cased patient_id
+- ``phone_rev``: phone numbers with digits reversed, so "ends with" becomes
+  an index-friendly prefix match
+- ``grams``: character trigrams of the name words, for typo-tolerant matches
+
+``search`` turns the query into anchored (``^prefix``) regexes on those
+multikey-indexed fields and ranks the combined candidates. Only when prefix
+matching finds (almost) nothing, i.e. the name is probably misspelt, does it
+fall back to trigrams: an aggregation ranks the names sharing trigrams with
+the query by the number they share and returns the ids of the best
+``FUZZY_CANDIDATES``, which are then scored like the prefix hits.
+"""
+import asyncio
+import re
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+META_ID = "patient_search"
+# Excluded from every patient payload returned to clients
+PROJECTION = {"_id": 0, "search": 0}
+
+MIN_FUZZY_TOKEN = 3
+# Trigram Jaccard similarity below which a name word does not count as a typo
+MIN_FUZZY_SIMILARITY = 0.3
+# Prefix hits below which the trigram fallback runs
+FUZZY_FALLBACK_BELOW = 3
+# Trigrams a name must share with a query word to be a fuzzy candidate
+MIN_SHARED_GRAMS = 2
+FUZZY_CANDIDATES = 200
+# What score() reads; full documents are fetched for the results only
+RANKING_PROJECTION = {"_id": 0, "id": 1, "name": 1, "search.tokens": 1, "search.pid": 1, "search.phone_rev": 1}
+
+stats = {"searches": 0, "fuzzy_fallbacks": 0}
+
+READY_CACHE_SECONDS = 5
+_ready_cache = {"value": None, "checked_at": 0.0}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_words(text: Optional[str]) -> List[str]:
+    return _WORD_RE.findall((text or "").lower())
+
+
+def digits(text: Optional[str]) -> str:
+    return "".join(ch for ch in (text or "") if ch.isdigit())
+
+
+def trigrams(word: str) -> List[str]:
+    padded = f" {word} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def search_fields(patient: dict) -> dict:
+    """The ``search`` sub-document for a patient."""
+    tokens = normalize_words(patient.get("name"))
+    grams = sorted({g for t in tokens for g in trigrams(t)})
+    phones = [digits(patient.get("phone")), digits(patient.get("alternate_phone"))]
+    return {
+        "tokens": tokens,
+        "pid": (patient.get("patient_id") or "").strip().lower(),
+        "phone_rev": [p[::-1] for p in phones if p],
+        "grams": grams,
+    }
+
+
+def _prefix(value: str) -> dict:
+    return {"$regex": "^" + re.escape(value)}
+
+
+def build_queries(q: str) -> List[dict]:
+    """Index-friendly candidate queries for the search text."""
+    q_lower = q.strip().lower()
+    words = normalize_words(q_lower)
+    queries = []
+    if q_lower:
+        queries.append({"search.pid": _prefix(q_lower)})
+    q_digits = digits(q)
+    if q_digits and len(q_digits) == len(re.sub(r"[\s+\-()]", "", q)):
+        queries.append({"phone": _prefix(q.strip())})
+        queries.append({"search.phone_rev": _prefix(q_digits[::-1])})
+    if words:
+        queries.append({"search.tokens": {"$all": [_prefix(w) for w in words]}})
+    return queries
+
+
+def fuzzy_pipeline(words: List[str]) -> List[dict]:
+    """Names sharing the most trigrams with ``words`` first, as ranking fields only."""
+    grams = sorted({g for w in words for g in trigrams(w)})
+    return [
+        {"$match": {"search.grams": {"$in": grams}}},
+        {"$project": {
+            **RANKING_PROJECTION,
+            "shared": {"$size": {"$setIntersection": [{"$ifNull": ["$search.grams", []]}, grams]}},
+        }},
+        {"$match": {"shared": {"$gte": MIN_SHARED_GRAMS}}},
+        {"$sort": {"shared": -1, "id": 1}},
+        {"$limit": FUZZY_CANDIDATES},
+        {"$project": {"shared": 0}},
+    ]
+
+
+def score(patient: dict, q: str) -> float:
+    """Higher is better: exact id/phone, then prefixes, then fuzzy name overlap."""
+    search = patient.get("search") or search_fields(patient)
+    q_lower = q.strip().lower()
+    q_digits = digits(q)
+    words = normalize_words(q_lower)
+    points = 0.0
+
+    if search["pid"] == q_lower:
+        points += 100
+    elif q_lower and search["pid"].startswith(q_lower):
+        points += 80
+
+    if q_digits:
+        for rev in search["phone_rev"]:
+            number = rev[::-1]
+            if number == q_digits:
+                points += 90
+            elif number.endswith(q_digits) or number.startswith(q_digits):
+                points += 60
+
+    tokens = search["tokens"]
+    for w in words:
+        if w in tokens:
+            points += 50
+        elif any(t.startswith(w) for t in tokens):
+            points += 40
+        elif len(w) >= MIN_FUZZY_TOKEN:
+            wanted = set(trigrams(w))
+            best = max((len(wanted & set(trigrams(t))) / len(wanted | set(trigrams(t))) for t in tokens), default=0)
+            if best >= MIN_FUZZY_SIMILARITY:
+                points += 30 * best
+    return points
+
+
+async def search(db, q: str, limit: int = 100) -> List[dict]:
+    """Ranked patients matching ``q`` by name, phone or patient_id."""
+    q = (q or "").strip()
+    if not q:
+        return []
+    stats["searches"] += 1
+
+    queries = build_queries(q)
+    results = await asyncio.gather(*(
+        db.patients.find(query, RANKING_PROJECTION).limit(limit).to_list(limit) for query in queries
+    ))
+    candidates: Dict[str, dict] = {}
+    for docs in results:
+        for doc in docs:
+            candidates[doc["id"]] = doc
+
+    # (Almost) no prefix hits: probably a typo, rank names by shared trigrams
+    words = [w for w in normalize_words(q) if len(w) >= MIN_FUZZY_TOKEN and not w.isdigit()]
+    if len(candidates) < FUZZY_FALLBACK_BELOW and words:
+        stats["fuzzy_fallbacks"] += 1
+        fuzzy = await db.patients.aggregate(fuzzy_pipeline(words)).to_list(FUZZY_CANDIDATES)
+        for doc in fuzzy:
+            candidates.setdefault(doc["id"], doc)
+
+    ranked = sorted(
+        ((score(doc, q), doc) for doc in candidates.values()),
+        key=lambda item: (-item[0], item[1].get("name", ""))
+    )
+    ids = [doc["id"] for points, doc in ranked if points > 0][:limit]
+    if not ids:
+        return []
+    docs = {doc["id"]: doc for doc in await db.patients.find({"id": {"$in": ids}}, PROJECTION).to_list(len(ids))}
+    return [docs[pid] for pid in ids if pid in docs]
+
+
+def get_stats() -> dict:
+    return {**stats, "fallback_below": FUZZY_FALLBACK_BELOW, "fuzzy_candidates": FUZZY_CANDIDATES}
+
+
+async def is_ready(db) -> bool:
+    """Whether every patient has search fields (cached briefly per process)."""
+    now = time.monotonic()
+    if _ready_cache["value"] is not None and now - _ready_cache["checked_at"] < READY_CACHE_SECONDS:
+        return _ready_cache["value"]
+    meta = await db.system_meta.find_one({"id": META_ID}, {"_id": 0, "status": 1})
+    _ready_cache["value"] = bool(meta and meta.get("status") == "ready")
+    _ready_cache["checked_at"] = now
+    return _ready_cache["value"]
+
+
+async def backfill(db, chunk_size: int = 1000, only_missing: bool = False, after_id: Optional[str] = None, progress=None) -> dict:
+    """(Re)compute ``search`` fields for existing patients.
+
+    Patients are walked in ``id`` order; ``progress(done, total, checkpoint=last_id)``
+    is awaited after each chunk, and ``after_id`` resumes from such a checkpoint.
+    """
+    started = datetime.now(timezone.utc).isoformat()
+    query = {"search": {"$exists": False}} if only_missing else {}
+    if after_id:
+        query["id"] = {"$gt": after_id}
+    total = await db.patients.count_documents(query) if progress else None
+    projection = {"_id": 0, "id": 1, "name": 1, "patient_id": 1, "phone": 1, "alternate_phone": 1}
+    updated = 0
+    done = 0
+    ops = []
+
+    async def flush(last_id):
+        nonlocal updated, done
+        updated += (await db.patients.bulk_write(ops, ordered=False)).modified_count
+        done += len(ops)
+        ops.clear()
+        if progress:
+            await progress(done, total, checkpoint=last_id)
+
+    last_id = after_id
+    async for patient in db.patients.find(query, projection).sort("id", 1):
+        ops.append(UpdateOne({"id": patient["id"]}, {"$set": {"search": search_fields(patient)}}))
+        last_id = patient["id"]
+        if len(ops) >= chunk_size:
+            await flush(last_id)
+    if ops:
+        await flush(last_id)
+
+    finished = datetime.now(timezone.utc).isoformat()
+    await db.system_meta.update_one(
+        {"id": META_ID},
+        {"$set": {"status": "ready", "rebuilt_at": finished, "updated": updated}},
+        upsert=True
+    )
+    _ready_cache["value"] = None
+    return {"updated": updated, "started_at": started, "finished_at": finished}
@@ -0,0 +1,312 @@
+"""Opt-in profiling of slow requests, with the query plans they used.
+
+When profiling is enabled (``PUT /api/admin/profiling``), or a request sends
+``X-Profile: 1`` and header opt-in is allowed, ``ProfilingMiddleware`` runs
+the request under cProfile and ``ProfileCommandListener`` records every
+MongoDB command it issues. Requests slower than ``threshold_ms`` (or any
+header-triggered one) are saved: after the response has been sent, each
+distinct read command is re-run through ``explain`` (executionStats) to
+capture the winning plan and documents/keys examined, and the profile is
+stored in the capped ``request_profiles`` collection (last ``PROFILE_KEEP``).
+
+cProfile hooks the whole event-loop thread, so only one request per worker
+is profiled at a time and its trace also shows other requests that ran
+concurrently on the loop. Stored commands include filter values and are
+only exposed to admins.
+"""
+import asyncio
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+from utils.metrics import documents_returned
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "request_profiles"
+META_ID = "profiling"
+
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "200"))
+PROFILE_STORE_BYTES = int(os.environ.get("PROFILE_STORE_BYTES", str(64 * 1024 * 1024)))
+DEFAULT_SETTINGS = {
+    "enabled": os.environ.get("PROFILING_ENABLED", "false").lower() == "true",
+    "threshold_ms": int(os.environ.get("PROFILE_THRESHOLD_MS", "1000")),
+    "allow_header": os.environ.get("PROFILING_ALLOW_HEADER", "false").lower() == "true",
+}
+PROFILE_HEADER = b"x-profile"
+
+SETTINGS_CACHE_SECONDS = 5
+MAX_QUERIES = 200
+MAX_EXPLAINS = 20
+MAX_COMMAND_CHARS = 2000
+TOP_FUNCTIONS = 30
+
+# Commands explain() accepts; writes are explained without being applied
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+# Command fields added by the driver that explain() must not see
+DRIVER_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern", "$clusterTime", "$db", "$readPreference"}
+
+_settings_cache = {"value": None, "checked_at": 0.0}
+_state = {"busy": False}
+_pending_saves = set()
+stats = {"profiled": 0, "saved": 0, "skipped_busy": 0}
+
+
+class ProfileCapture:
+    """Mongo commands issued by one profiled request."""
+
+    def __init__(self):
+        self.queries: List[dict] = []
+        self._by_request_id: Dict[int, dict] = {}
+
+    def started(self, event):
+        if len(self.queries) >= MAX_QUERIES:
+            return
+        entry = {"command_name": event.command_name, "database": event.database_name, "duration_ms": None, "docs_returned": 0}
+        if event.command_name in EXPLAINABLE:
+            command = {k: v for k, v in event.command.items() if k not in DRIVER_FIELDS}
+            entry["collection"] = command.get(event.command_name)
+            entry["_command"] = command
+        self.queries.append(entry)
+        self._by_request_id[event.request_id] = entry
+
+    def finished(self, event, reply=None, error: Optional[str] = None):
+        entry = self._by_request_id.pop(event.request_id, None)
+        if entry is None:
+            return
+        entry["duration_ms"] = round(event.duration_micros / 1000, 3)
+        entry["docs_returned"] = documents_returned(reply)
+        if error:
+            entry["error"] = error
+
+
+current_profile: contextvars.ContextVar[Optional[ProfileCapture]] = contextvars.ContextVar("current_profile", default=None)
+
+
+class ProfileCommandListener(monitoring.CommandListener):
+    def started(self, event):
+        capture = current_profile.get()
+        if capture is not None:
+            capture.started(event)
+
+    def succeeded(self, event):
+        capture = current_profile.get()
+        if capture is not None:
+            capture.finished(event, reply=event.reply)
+
+    def failed(self, event):
+        capture = current_profile.get()
+        if capture is not None:
+            capture.finished(event, error=str(event.failure))
+
+
+async def ensure_collection(db):
+    if COLLECTION not in await db.list_collection_names():
+        await db.create_collection(COLLECTION, capped=True, size=PROFILE_STORE_BYTES, max=PROFILE_KEEP)
+
+
+async def get_settings(db) -> dict:
+    now = time.monotonic()
+    if _settings_cache["value"] is not None and now - _settings_cache["checked_at"] < SETTINGS_CACHE_SECONDS:
+        return _settings_cache["value"]
+    _settings_cache["checked_at"] = now
+    meta = await db.system_meta.find_one({"id": META_ID}, {"_id": 0, "id": 0})
+    _settings_cache["value"] = {**DEFAULT_SETTINGS, **(meta or {})}
+    return _settings_cache["value"]
+
+
+async def update_settings(db, changes: dict) -> dict:
+    await db.system_meta.update_one({"id": META_ID}, {"$set": changes}, upsert=True)
+    _settings_cache["value"] = None
+    return await get_settings(db)
+
+
+def explain_command(command: dict) -> Optional[dict]:
+    """The command to pass to explain(), or None if it cannot be explained safely."""
+    name = next(iter(command))
+    body = dict(command)
+    if name == "aggregate":
+        if any(("$out" in stage or "$merge" in stage) for stage in body.get("pipeline", [])):
+            return None
+    elif name in ("update", "delete"):
+        # explain() takes a single statement
+        statements = body.get(f"{name}s") or []
+        if not statements:
+            return None
+        body[f"{name}s"] = statements[:1]
+    return body
+
+
+def summarize_explain(result: dict) -> dict:
+    """Winning plan stages and examined counts from an executionStats explain."""
+    planner = result.get("queryPlanner")
+    execution = result.get("executionStats")
+    if planner is None:
+        # Aggregations whose first stage was not pushed into the query layer
+        for stage in result.get("stages", []):
+            cursor = stage.get("$cursor")
+            if cursor:
+                planner = cursor.get("queryPlanner")
+                execution = cursor.get("executionStats")
+                break
+    winning = (planner or {}).get("winningPlan", {})
+    nodes = _plan_nodes(winning)
+    stages = [n["stage"] for n in nodes if "stage" in n]
+    execution = execution or {}
+    return {
+        "stages": stages,
+        "collscan": "COLLSCAN" in stages,
+        "index_names": sorted({n["indexName"] for n in nodes if n.get("indexName")}),
+        "docs_examined": execution.get("totalDocsExamined"),
+        "keys_examined": execution.get("totalKeysExamined"),
+        "n_returned": execution.get("nReturned"),
+        "execution_ms": execution.get("executionTimeMillis"),
+    }
+
+
+def _plan_nodes(plan: dict) -> List[dict]:
+    """Every node of an explain plan tree (same walk as ``indexes.plan_stages``)."""
+    nodes, stack = [], [plan]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        nodes.append(node)
+        for key in ("inputStage", "queryPlan"):
+            if key in node:
+                stack.append(node[key])
+        stack.extend(node.get("inputStages", []))
+    return nodes
+
+
+def top_functions(profile: cProfile.Profile, limit: int = TOP_FUNCTIONS) -> Tuple[List[dict], str]:
+    out = io.StringIO()
+    ps = pstats.Stats(profile, stream=out).sort_stats("cumulative")
+    ps.print_stats(limit)
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _) in sorted(ps.stats.items(), key=lambda kv: -kv[1][3])[:limit]:
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{line}({func})",
+            "calls": nc,
+            "total_ms": round(tt * 1000, 3),
+            "cumulative_ms": round(ct * 1000, 3),
+        })
+    return rows, out.getvalue()
+
+
+async def _explain_queries(db, queries: List[dict]) -> List[dict]:
+    explained: Dict[str, dict] = {}
+    out = []
+    for entry in queries:
+        command = entry.pop("_command", None)
+        if command is not None:
+            entry["command"] = json.dumps(command, default=str)[:MAX_COMMAND_CHARS]
+            shape = entry["command"]
+            if shape not in explained and len(explained) < MAX_EXPLAINS:
+                body = explain_command(command)
+                if body is None:
+                    explained[shape] = {"skipped": "not explainable"}
+                else:
+                    try:
+                        result = await db.client[entry["database"]].command({"explain": body, "verbosity": "executionStats"})
+                        explained[shape] = summarize_explain(result)
+                    except Exception as e:
+                        explained[shape] = {"error": str(e)}
+            if shape in explained:
+                entry["plan"] = explained[shape]
+        out.append(entry)
+    return out
+
+
+async def save_profile(db, profile: dict, capture: ProfileCapture, cprofile: cProfile.Profile):
+    try:
+        profile["top_functions"], profile["stats_text"] = top_functions(cprofile)
+        profile["queries"] = await _explain_queries(db, capture.queries)
+        profile["query_count"] = len(capture.queries)
+        await db[COLLECTION].insert_one(profile)
+        stats["saved"] += 1
+    except Exception:
+        logger.exception("Saving request profile failed")
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, db):
+        self.app = app
+        self.db = db
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api"):
+            return await self.app(scope, receive, send)
+
+        settings = await get_settings(self.db)
+        header = settings["allow_header"] and dict(scope.get("headers") or []).get(PROFILE_HEADER, b"").lower() in (b"1", b"true")
+        if not (settings["enabled"] or header):
+            return await self.app(scope, receive, send)
+        if _state["busy"]:
+            stats["skipped_busy"] += 1
+            return await self.app(scope, receive, send)
+
+        _state["busy"] = True
+        capture = ProfileCapture()
+        token = current_profile.set(capture)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        cprofile = cProfile.Profile()
+        started = time.perf_counter()
+        cprofile.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            cprofile.disable()
+            duration_ms = (time.perf_counter() - started) * 1000
+            current_profile.reset(token)
+            _state["busy"] = False
+            stats["profiled"] += 1
+
+            if header or duration_ms >= settings["threshold_ms"]:
+                route = scope.get("route")
+                profile = {
+                    "id": str(uuid.uuid4()),
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": getattr(route, "path", None),
+                    "query_string": scope.get("query_string", b"").decode("latin-1"),
+                    "status": status["code"],
+                    "duration_ms": round(duration_ms, 2),
+                    "trigger": "header" if header else "threshold",
+                    "pid": os.getpid(),
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                }
+                # Explains run after the response so they don't add to its latency, and
+                # in a fresh context so metrics count them as background commands
+                task = contextvars.Context().run(asyncio.create_task, save_profile(self.db, profile, capture, cprofile))
+                _pending_saves.add(task)
+                task.add_done_callback(_pending_saves.discard)
+
+
+def get_stats() -> dict:
+    return dict(stats)
+
+
+async def list_profiles(db, query: dict, limit: int) -> List[dict]:
+    projection = {"_id": 0, "stats_text": 0, "top_functions": 0, "queries": 0}
+    return await db[COLLECTION].find(query, projection).sort("$natural", -1).limit(limit).to_list(limit)
+
+
+async def get_profile(db, profile_id: str) -> Optional[dict]:
+    return await db[COLLECTION].find_one({"id": profile_id}, {"_id": 0})
@@ -0,0 +1,94 @@
+"""Field selection for the heavy list endpoints.
+
+``/pharmacy-sales``, ``/bills``, ``/purchase-entries`` and
+``/stock-transfers`` return whole documents by default, nested
+``items``/``services`` (and each sale item's FEFO ``deductions``)
+included. Table screens only need the header columns, so these endpoints
+take (via the ``field_params`` dependency):
+
+- ``view=summary``: the named header columns in ``SUMMARY_VIEWS``.
+- ``fields=id,patient_name,total_amount``: any of the model's fields;
+  a dotted path selects part of a nested list (``items.name``).
+
+The selection becomes the MongoDB projection, so unused fields are never
+read or sent. ``id`` and the endpoint's sort field are always included
+(pagination cursors are built from them). The rows are sent without
+``response_model`` validation since they no longer carry every required
+field.
+"""
+import re
+from typing import List, Optional, Type
+
+from fastapi import HTTPException, Query, Response
+from pydantic import BaseModel
+
+from utils import fast_json
+
+SUMMARY_VIEWS = {
+    "pharmacy_sales": ("id", "patient_id", "patient_name", "total_amount", "paid_amount", "balance_amount",
+                       "payment_mode", "branch_id", "branch_name", "created_at"),
+    "bills": ("id", "patient_id", "patient_name", "total_amount", "paid_amount", "balance_amount", "payment_mode",
+              "payment_status", "branch_id", "branch_name", "doctor_name", "is_temporary", "created_at"),
+    "purchase_entries": ("id", "supplier_id", "supplier_name", "invoice_number", "invoice_date", "items_received_date",
+                         "total_amount", "paid_amount", "pending_amount", "payment_status", "branch_id", "godown_id",
+                         "created_at"),
+    "stock_transfers": ("id", "transfer_number", "transfer_date", "transfer_type", "from_type", "from_id", "from_name",
+                        "to_type", "to_id", "to_name", "created_at"),
+}
+MAX_FIELDS = 50
+
+_PATH = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+
+
+class FieldSelection:
+    def __init__(self, fields: Optional[str], view: str):
+        self.fields = fields
+        self.view = view
+
+    def resolve(self, collection: str, model: Type[BaseModel], *required: str) -> Optional[List[str]]:
+        """The selected paths, ``required`` included, or None for whole documents."""
+        if self.fields and self.view != "full":
+            raise HTTPException(status_code=400, detail="Use either fields or view, not both")
+        if self.view == "summary":
+            requested = list(SUMMARY_VIEWS[collection])
+        elif self.fields:
+            requested = [name.strip() for name in self.fields.split(",") if name.strip()]
+        else:
+            return None
+        if len(requested) > MAX_FIELDS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_FIELDS} fields can be selected")
+        unknown = [path for path in requested if not _PATH.match(path) or path.split(".")[0] not in model.model_fields]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        return normalize([*required, *requested])
+
+
+def field_params(
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (dotted paths select inside lists)"),
+    view: str = Query("full", pattern="^(full|summary)$", description="summary returns the table columns only")
+) -> FieldSelection:
+    return FieldSelection(fields, view)
+
+
+def normalize(paths: List[str]) -> List[str]:
+    """Drop duplicates and paths inside an already selected one (MongoDB rejects the overlap)."""
+    kept: List[str] = []
+    for path in sorted(set(paths), key=lambda p: (p.count("."), p)):
+        if not any(path.startswith(parent + ".") for parent in kept):
+            kept.append(path)
+    return kept
+
+
+def mongo_projection(paths: Optional[List[str]], default: Optional[dict] = None) -> dict:
+    if paths is None:
+        return default or {"_id": 0}
+    return {"_id": 0, **{path: 1 for path in paths}}
+
+
+def respond(content, response: Response, model: Type[BaseModel], paths: Optional[List[str]]):
+    """Projected rows as they are; whole documents go through ``fast_json.trusted``."""
+    if isinstance(content, Response):
+        return content
+    if paths is None:
+        return fast_json.trusted(content, response, model)
+    return fast_json.send(content, response)
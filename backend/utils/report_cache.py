@@ -0,0 +1,225 @@
+"""Cached results of report endpoints for closed date ranges.
+
+Report endpoints call ``cached`` with the report name, its filters and the
+caller's scope (the branch/user restriction applied to the query); the three
+are normalized and hashed into the entry key. Only ranges that end before
+today (UTC) are cached: today's figures change with every sale, while closed
+periods are pulled again and again at month end and almost never change.
+Entries live in ``report_cache`` and expire through a TTL index on
+``expires_at`` (``REPORT_CACHE_TTL_SECONDS``).
+
+Each entry records the source collections, day range and, per collection,
+the branches it covers (a report may filter bills by branch but total
+purchases across all branches). Writes to those collections call ``invalidate`` with the document
+before and after the write, which deletes exactly the entries whose range
+and branches include it. Writes dated today never match a cached range, so
+the hot write path skips the database entirely. Past-day writes also leave a
+short-lived mark per (collection, day) so a report that was being computed
+while the write happened is not stored with the old figures.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from pymongo import UpdateOne
+
+COLLECTION = "report_cache"
+ENTRY = "entry"
+MARK = "mark"
+
+TTL_SECONDS = int(os.environ.get("REPORT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+MAX_ENTRY_BYTES = int(os.environ.get("REPORT_CACHE_MAX_ENTRY_BYTES", str(4 * 1024 * 1024)))
+# Longer than any report takes to compute
+MARK_SECONDS = 600
+
+# Date fields that place a document on a report day, per source collection
+DATE_FIELDS = {
+    "bank_transactions": ("transaction_date", "created_at"),
+    "appointments": ("appointment_date",),
+    "walkins": ("paid_at",),
+}
+DEFAULT_DATE_FIELDS = ("created_at",)
+
+stats = {"hits": 0, "misses": 0, "bypassed": 0, "stored": 0, "too_large": 0, "stale_skipped": 0, "invalidated": 0}
+report_stats: Dict[str, Dict[str, int]] = {}
+
+
+def normalize(value):
+    """Drop empty filters, strip strings and order lists so equivalent requests share a key."""
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            v = normalize(v)
+            if v is not None and v != "":
+                out[k] = v
+        return out
+    if isinstance(value, (list, tuple)):
+        items = [normalize(v) for v in value]
+        if all(isinstance(v, str) for v in items):
+            return sorted(items)
+        return items
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def cache_key(report: str, filters: dict, scope: dict) -> str:
+    raw = json.dumps([report, normalize(filters), normalize(scope)], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def is_closed(date_from: Optional[str], date_to: Optional[str]) -> bool:
+    """Whether a range has both ends and finishes before today (UTC)."""
+    return bool(date_from and date_to) and date_to[:10] < today()
+
+
+def document_days(collection: str, doc: Optional[dict]) -> List[str]:
+    if not doc:
+        return []
+    days = set()
+    for field in DATE_FIELDS.get(collection, DEFAULT_DATE_FIELDS):
+        value = doc.get(field)
+        if isinstance(value, str) and len(value) >= 10:
+            days.add(value[:10])
+    return sorted(days)
+
+
+def _count(report: str, field: str):
+    stats[field] += 1
+    counts = report_stats.setdefault(report, {"hits": 0, "misses": 0, "bypassed": 0})
+    if field in counts:
+        counts[field] += 1
+
+
+async def cached(
+    db,
+    report: str,
+    filters: dict,
+    scope: dict,
+    date_from: Optional[str],
+    date_to: Optional[str],
+    collections: Iterable[str],
+    compute: Callable[[], Awaitable],
+    branch_ids: Optional[List[str]] = None,
+    all_branches: Iterable[str] = (),
+):
+    """The cached result for a closed range, or ``compute()`` (stored when the range is closed).
+
+    ``branch_ids`` is the branch restriction of the report (None = all branches);
+    collections in ``all_branches`` are read without it.
+    """
+    if not is_closed(date_from, date_to):
+        _count(report, "bypassed")
+        return await compute()
+
+    key = cache_key(report, filters, scope)
+    entry = await db[COLLECTION].find_one({"key": key}, {"_id": 0, "result": 1})
+    if entry:
+        _count(report, "hits")
+        return json.loads(entry["result"])
+
+    _count(report, "misses")
+    started = datetime.now(timezone.utc)
+    result = jsonable_encoder(await compute())
+    collections = list(collections)
+    branch_scope = {
+        collection: sorted(branch_ids) if branch_ids and collection not in all_branches else None
+        for collection in collections
+    }
+    await _store(db, key, report, result, date_from[:10], date_to[:10], collections, branch_scope, started)
+    return result
+
+
+async def _store(db, key, report, result, date_from, date_to, collections, branch_scope, started):
+    body = json.dumps(result)
+    if len(body) > MAX_ENTRY_BYTES:
+        stats["too_large"] += 1
+        return
+    mark = await db[COLLECTION].find_one({
+        "kind": MARK,
+        "collection": {"$in": collections},
+        "day": {"$gte": date_from, "$lte": date_to},
+        "at": {"$gte": started},
+    }, {"_id": 1})
+    if mark:
+        # A write landed in this range while the report was being computed
+        stats["stale_skipped"] += 1
+        return
+    now = datetime.now(timezone.utc)
+    await db[COLLECTION].update_one({"key": key}, {"$set": {
+        "kind": ENTRY,
+        "report": report,
+        "collections": collections,
+        "date_from": date_from,
+        "date_to": date_to,
+        "branch_scope": branch_scope,
+        "result": body,
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=TTL_SECONDS),
+    }}, upsert=True)
+    stats["stored"] += 1
+
+
+async def invalidate(db, collection: str, before: Optional[dict], after: Optional[dict]):
+    """Drop cached reports covering either side of a write to ``collection``."""
+    current = today()
+    conditions = []
+    days = set()
+    for doc in (before, after):
+        for day in document_days(collection, doc):
+            if day >= current:
+                continue
+            condition = {"date_from": {"$lte": day}, "date_to": {"$gte": day}}
+            if doc.get("branch_id"):
+                # A missing scope (entries from before per-collection scopes) matches too
+                condition[f"branch_scope.{collection}"] = {"$in": [None, doc["branch_id"]]}
+            conditions.append(condition)
+            days.add(day)
+    if not conditions:
+        return
+
+    now = datetime.now(timezone.utc)
+    await db[COLLECTION].bulk_write([
+        UpdateOne(
+            {"key": f"{MARK}|{collection}|{day}"},
+            {"$set": {"kind": MARK, "collection": collection, "day": day, "at": now,
+                      "expires_at": now + timedelta(seconds=MARK_SECONDS)}},
+            upsert=True
+        )
+        for day in sorted(days)
+    ], ordered=False)
+    result = await db[COLLECTION].delete_many({"kind": ENTRY, "collections": collection, "$or": conditions})
+    stats["invalidated"] += result.deleted_count
+
+
+async def clear(db, report: Optional[str] = None) -> int:
+    query = {"kind": ENTRY}
+    if report:
+        query["report"] = report
+    result = await db[COLLECTION].delete_many(query)
+    stats["invalidated"] += result.deleted_count
+    return result.deleted_count
+
+
+async def entry_counts(db) -> Dict[str, int]:
+    rows = await db[COLLECTION].aggregate([
+        {"$match": {"kind": ENTRY}},
+        {"$group": {"_id": "$report", "count": {"$sum": 1}}},
+    ]).to_list(None)
+    return {row["_id"]: row["count"] for row in rows}
+
+
+def get_stats() -> dict:
+    lookups = stats["hits"] + stats["misses"]
+    return {
+        **stats,
+        "hit_rate": round(stats["hits"] / lookups, 3) if lookups else None,
+        "by_report": {name: dict(counts) for name, counts in report_stats.items()},
+    }
@@ -0,0 +1,273 @@
+"""Aggregation pipelines for report endpoints.
+
+Totals, breakdowns, daily series and top-N items are computed by MongoDB
+with ``$facet``/``$group`` so the work done in Python and the size of the
+response do not grow with the date range. Detail lists are fetched
+separately with an index-friendly sort + limit. All queries of a report run
+concurrently.
+"""
+import asyncio
+from typing import Dict, List
+
+DETAIL_LIMIT = 100
+
+PAYMENT_MODE = {"$ifNull": ["$payment_mode", "cash"]}
+CREATED_DAY = {"$substrCP": [{"$ifNull": ["$created_at", ""]}, 0, 10]}
+
+
+def count_and_sum(field: str) -> List[dict]:
+    return [{"$group": {"_id": None, "total": {"$sum": f"${field}"}, "count": {"$sum": 1}}}]
+
+
+def sum_by(key, field: str) -> List[dict]:
+    return [{"$group": {"_id": key, "total": {"$sum": f"${field}"}}}]
+
+
+def revenue_facets() -> dict:
+    """Totals, payment-mode split and daily series for bills or pharmacy sales."""
+    return {
+        "summary": count_and_sum("total_amount"),
+        "by_payment_mode": sum_by(PAYMENT_MODE, "total_amount"),
+        "daily": [{"$match": {"created_at": {"$nin": [None, ""]}}}] + sum_by(CREATED_DAY, "total_amount"),
+    }
+
+
+def top_items_pipeline(limit: int = 10) -> List[dict]:
+    return [
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": {"$ifNull": ["$items.name", "Unknown"]},
+            "quantity": {"$sum": "$items.quantity"},
+            "revenue": {"$sum": "$items.total"}
+        }},
+        {"$sort": {"revenue": -1}},
+        {"$limit": limit},
+    ]
+
+
+async def run_facets(db, collection: str, query: dict, facets: Dict[str, List[dict]]) -> dict:
+    pipeline = []
+    if query:
+        pipeline.append({"$match": query})
+    pipeline.append({"$facet": facets})
+    result = await db[collection].aggregate(pipeline).to_list(1)
+    return result[0] if result else {name: [] for name in facets}
+
+
+async def recent(db, collection: str, query: dict, limit: int = DETAIL_LIMIT, sort_field: str = "created_at") -> List[dict]:
+    """The latest ``limit`` documents, returned oldest first."""
+    docs = await db[collection].find(query, {"_id": 0}).sort(sort_field, -1).limit(limit).to_list(limit)
+    docs.reverse()
+    return docs
+
+
+async def _empty(value):
+    return value
+
+
+def _summary(facet: dict) -> dict:
+    rows = facet.get("summary") or []
+    return rows[0] if rows else {"total": 0, "count": 0}
+
+
+async def comprehensive_report(
+    db,
+    bill_query: dict,
+    sale_query: dict,
+    expense_query: dict,
+    purchase_query: dict,
+    bank_query: dict,
+    appointment_query: dict,
+    include_bills: bool = True,
+    include_sales: bool = True,
+    detail_limit: int = DETAIL_LIMIT,
+) -> dict:
+    """Aggregates and detail lists for /reports/comprehensive."""
+    empty_revenue = {"summary": [], "by_payment_mode": [], "daily": []}
+    tasks = [
+        run_facets(db, "bills", bill_query, revenue_facets()) if include_bills else _empty(empty_revenue),
+        run_facets(db, "pharmacy_sales", sale_query, {**revenue_facets(), "top_items": top_items_pipeline()}) if include_sales else _empty({**empty_revenue, "top_items": []}),
+        run_facets(db, "expenses", expense_query, {
+            "summary": count_and_sum("amount"),
+            "by_category": sum_by({"$ifNull": ["$category", "Other"]}, "amount"),
+        }),
+        run_facets(db, "purchase_entries", purchase_query, {"summary": count_and_sum("total_amount")}),
+        db.bank_transactions.count_documents(bank_query),
+        db.appointments.count_documents(appointment_query),
+        recent(db, "bills", bill_query, detail_limit) if include_bills else _empty([]),
+        recent(db, "pharmacy_sales", sale_query, detail_limit) if include_sales else _empty([]),
+        recent(db, "expenses", expense_query, detail_limit),
+        recent(db, "bank_transactions", bank_query, detail_limit),
+        recent(db, "appointments", appointment_query, detail_limit),
+    ]
+    (bill_facets, sale_facets, expense_facets, purchase_facets, bank_count, appointment_count,
+     bills, sales, expenses, bank_transactions, appointments) = await asyncio.gather(*tasks)
+
+    payment_breakdown: Dict[str, float] = {}
+    for row in bill_facets["by_payment_mode"] + sale_facets["by_payment_mode"]:
+        payment_breakdown[row["_id"]] = payment_breakdown.get(row["_id"], 0) + row["total"]
+
+    daily_revenue: Dict[str, dict] = {}
+    for kind, facet in (("treatment", bill_facets), ("pharmacy", sale_facets)):
+        for row in facet["daily"]:
+            day = daily_revenue.setdefault(row["_id"], {"treatment": 0, "pharmacy": 0})
+            day[kind] += row["total"]
+
+    bill_summary = _summary(bill_facets)
+    sale_summary = _summary(sale_facets)
+    expense_summary = _summary(expense_facets)
+    purchase_summary = _summary(purchase_facets)
+
+    return {
+        "treatment_revenue": bill_summary["total"],
+        "pharmacy_revenue": sale_summary["total"],
+        "total_expenses": expense_summary["total"],
+        "total_purchases": purchase_summary["total"],
+        "bills_count": bill_summary["count"],
+        "sales_count": sale_summary["count"],
+        "expenses_count": expense_summary["count"],
+        "purchases_count": purchase_summary["count"],
+        "appointments_count": appointment_count,
+        "bank_transactions_count": bank_count,
+        "payment_breakdown": payment_breakdown,
+        "expense_by_category": {row["_id"]: row["total"] for row in expense_facets["by_category"]},
+        "daily_revenue": dict(sorted(daily_revenue.items())),
+        "top_selling_items": [
+            {"name": row["_id"], "quantity": row["quantity"], "revenue": row["revenue"]}
+            for row in sale_facets["top_items"]
+        ],
+        "bills": bills,
+        "sales": sales,
+        "expenses": expenses,
+        "bank_transactions": bank_transactions,
+        "appointments": appointments,
+    }
+
+
+# ---- Daily / shift handover report ----
+
+DAILY_MODES = ("cash", "upi", "card", "netbanking")
+DAILY_AMOUNT_FIELDS = ("treatment_amount", "pharmacy_amount", "paid_amount") + DAILY_MODES + ("other",)
+# A bare 0 in $project would mean "exclude the field"
+ZERO = {"$literal": 0}
+
+
+def _or(field: str, default):
+    """``doc.get(field) or default`` as an expression."""
+    return {"$cond": [{"$in": [{"$ifNull": [field, ""]}, ["", False, 0]]}, default, field]}
+
+
+def _cash_paid() -> dict:
+    """paid_amount of a bill/sale paid in cash at the counter, else 0."""
+    paid = {"$ifNull": ["$paid_amount", 0]}
+    is_cash = {"$eq": [{"$toLower": PAYMENT_MODE}, "cash"]}
+    return {"$cond": [{"$and": [is_cash, {"$gt": [paid, 0]}]}, paid, 0]}
+
+
+def _daily_row(source: int, at: str, patient_id, patient_name, paid, modes: dict, collection,
+               treatment=ZERO, pharmacy=ZERO) -> dict:
+    row = {
+        "_id": 0,
+        "source": {"$literal": source},
+        "at": at,
+        "patient_id": patient_id,
+        "patient_name": patient_name,
+        "treatment_amount": treatment,
+        "pharmacy_amount": pharmacy,
+        "paid_amount": paid,
+    }
+    for mode in DAILY_MODES + ("other",):
+        row[mode] = modes.get(mode, ZERO)
+    row["collection"] = collection
+    return {"$project": row}
+
+
+def daily_report_pipeline(query: dict, walkin_query: dict) -> List[dict]:
+    """One row per patient with work done and money collected for the bills,
+    pharmacy sales, bank credits and cash walk-in checkouts matching the
+    queries. Names and row order follow the first document seen per patient
+    (bills, then sales, bank credits and walk-ins, each by time)."""
+    bill_cash = _cash_paid()
+    bills = _daily_row(
+        0, "$created_at", _or("$patient_id", "walk-in"), "$patient_name", bill_cash, {"cash": bill_cash},
+        {"$cond": [{"$gt": [bill_cash, 0]}, {"type": "Treatment", "bill_id": "$id", "amount": bill_cash,
+                                              "payment_mode": "cash", "description": "Cash payment at billing"}, None]},
+        treatment={"$ifNull": ["$total_amount", 0]},
+    )
+    sales = _daily_row(
+        1, "$created_at", _or("$patient_id", "walk-in"), "$patient_name", bill_cash, {"cash": bill_cash},
+        {"$cond": [{"$gt": [bill_cash, 0]}, {"type": "Pharmacy", "sale_id": "$id", "amount": bill_cash,
+                                              "payment_mode": "cash", "description": "Cash payment at pharmacy"}, None]},
+        pharmacy={"$ifNull": ["$total_amount", 0]},
+    )
+    amount = {"$ifNull": ["$amount", 0]}
+    mode = {"$toLower": _or("$payment_mode", "other")}
+    bank_modes = {m: {"$cond": [{"$eq": [mode, m]}, amount, 0]} for m in DAILY_MODES}
+    bank_modes["other"] = {"$cond": [{"$in": [mode, list(DAILY_MODES)]}, 0, amount]}
+    bank = _daily_row(
+        2, "$created_at", _or("$party_id", "walk-in"), "$party_name", amount, bank_modes,
+        {"type": _or("$reference_type", "Collection"), "amount": amount, "payment_mode": mode,
+         "upi_id": {"$ifNull": ["$upi_id", None]}, "bank_name": {"$ifNull": ["$bank_name", None]},
+         "reference_number": {"$ifNull": ["$reference_number", None]}, "description": {"$ifNull": ["$description", None]}},
+    )
+    walkin_amount = {"$ifNull": ["$paid_amount", 0]}
+    walkins = _daily_row(
+        3, "$paid_at", _or("$patient_id", "walk-in"), {"$ifNull": ["$name", "$patient_name"]}, walkin_amount, {"cash": walkin_amount},
+        {"type": "Treatment", "amount": walkin_amount, "payment_mode": "cash", "description": "Cash payment at checkout"},
+    )
+
+    group = {"_id": "$patient_id", "patient_name": {"$first": "$patient_name"},
+             "first_source": {"$first": "$source"}, "first_at": {"$first": "$at"}, "collections": {"$push": "$collection"}}
+    for field in DAILY_AMOUNT_FIELDS:
+        group[field] = {"$sum": f"${field}"}
+
+    total = {"$add": ["$treatment_amount", "$pharmacy_amount"]}
+    return [
+        {"$match": query},
+        bills,
+        {"$unionWith": {"coll": "pharmacy_sales", "pipeline": [{"$match": query}, sales]}},
+        {"$unionWith": {"coll": "bank_transactions", "pipeline": [{"$match": {**query, "transaction_type": "credit"}}, bank]}},
+        {"$unionWith": {"coll": "walkins", "pipeline": [{"$match": {**walkin_query, "payment_mode": "cash"}}, walkins]}},
+        {"$sort": {"source": 1, "at": 1}},
+        {"$group": group},
+        {"$sort": {"first_source": 1, "first_at": 1}},
+        {"$project": {
+            "_id": 0,
+            "patient_id": "$_id",
+            "patient_name": 1,
+            "treatment_amount": 1,
+            "pharmacy_amount": 1,
+            "total_amount": total,
+            "paid_amount": 1,
+            "balance_amount": {"$subtract": [total, "$paid_amount"]},
+            "collections": {"$filter": {"input": "$collections", "cond": {"$ne": ["$$this", None]}}},
+            **{m: 1 for m in DAILY_MODES + ("other",)},
+        }},
+    ]
+
+
+async def daily_report(db, query: dict, walkin_query: dict) -> dict:
+    """Patient-wise breakdown, payment-mode summary and expenses, without document caps."""
+    patients, expenses = await asyncio.gather(
+        db.bills.aggregate(daily_report_pipeline(query, walkin_query), allowDiskUse=True).to_list(None),
+        db.expenses.find(query, {"_id": 0}).to_list(None),
+    )
+    payment_modes = {mode: sum(p[mode] for p in patients) for mode in ("cash", "card", "upi", "netbanking", "other")}
+    total_treatment = sum(p["treatment_amount"] for p in patients)
+    total_pharmacy = sum(p["pharmacy_amount"] for p in patients)
+    total_collected = sum(p["paid_amount"] for p in patients)
+    total_expenses = sum(e.get("amount", 0) for e in expenses)
+    return {
+        "summary": {
+            "total_treatment_amount": total_treatment,
+            "total_pharmacy_amount": total_pharmacy,
+            "total_amount": total_treatment + total_pharmacy,
+            "total_collected": total_collected,
+            "total_balance": sum(p["balance_amount"] for p in patients),
+            "total_expenses": total_expenses,
+            "net_collection": total_collected - total_expenses,
+            "payment_modes": payment_modes,
+        },
+        "patients": patients,
+        "expenses": expenses,
+    }
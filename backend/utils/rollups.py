@@ -0,0 +1,254 @@
+"""Per-branch daily revenue rollups.
+
+``daily_rollups`` holds one document per (branch, date) where date is the
+``created_at[:10]`` of the source document:
+
+- ``treatment_revenue`` / ``bills_count`` and ``treatment_by_payment.<mode>``
+- ``pharmacy_revenue`` / ``sales_count`` and ``pharmacy_by_payment.<mode>``
+- ``expenses`` / ``expenses_count``
+
+Bill, sale and expense writes call ``apply_change`` with the document before
+and after the write; ``backfill`` recomputes the collection from history with
+``$merge``. Dashboards and range reports then sum a handful of rollup
+documents instead of scanning the transaction collections.
+"""
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+COLLECTION = "daily_rollups"
+REBUILD_COLLECTION = "daily_rollups_rebuild"
+META_ID = "daily_rollups"
+
+# source collection -> (amount field, revenue field, count field, payment split field)
+SOURCES = {
+    "bills": ("total_amount", "treatment_revenue", "bills_count", "treatment_by_payment"),
+    "pharmacy_sales": ("total_amount", "pharmacy_revenue", "sales_count", "pharmacy_by_payment"),
+    "expenses": ("amount", "expenses", "expenses_count", None),
+}
+
+READY_CACHE_SECONDS = 5
+_ready_cache = {"value": None, "checked_at": 0.0}
+
+
+class RollupDriftError(Exception):
+    """The rollups no longer match a re-aggregation of bills, sales and expenses."""
+
+
+def rollup_key(branch_id: Optional[str], date: str) -> str:
+    return f"{branch_id or ''}|{date}"
+
+
+def mode_field(mode) -> str:
+    # Payment modes become field names; keep them valid MongoDB keys
+    return str(mode or "cash").replace(".", "_").lstrip("$") or "cash"
+
+
+def mode_field_expr(value) -> dict:
+    """``mode_field`` as an aggregation expression (for string or missing modes), so
+    backfilled totals land under the same keys as later ``$inc`` updates."""
+    cleaned = {"$ltrim": {"input": {"$replaceAll": {"input": "$$mode", "find": ".", "replacement": "_"}}, "chars": "$"}}
+    return {"$let": {
+        "vars": {"mode": {"$cond": [{"$in": [{"$ifNull": [value, ""]}, ["", False, 0]]}, "cash", {"$toString": value}]}},
+        "in": {"$let": {"vars": {"cleaned": cleaned}, "in": {"$cond": [{"$eq": ["$$cleaned", ""]}, "cash", "$$cleaned"]}}},
+    }}
+
+
+def change_increments(collection: str, doc: Optional[dict], sign: int) -> Optional[tuple]:
+    """(key, branch_id, date, {field: increment}) for one side of a write."""
+    if not doc or collection not in SOURCES:
+        return None
+    date = (doc.get("created_at") or "")[:10]
+    if not date:
+        return None
+    amount_field, revenue_field, count_field, payment_field = SOURCES[collection]
+    amount = doc.get(amount_field) or 0
+    inc = {revenue_field: sign * amount, count_field: sign}
+    if payment_field:
+        inc[f"{payment_field}.{mode_field(doc.get('payment_mode'))}"] = sign * amount
+    return rollup_key(doc.get("branch_id"), date), doc.get("branch_id"), date, inc
+
+
+async def apply_change(db, collection: str, before: Optional[dict], after: Optional[dict], session=None):
+    merged: Dict[str, dict] = {}
+    for sign, doc in ((-1, before), (1, after)):
+        change = change_increments(collection, doc, sign)
+        if not change:
+            continue
+        key, branch_id, date, inc = change
+        entry = merged.setdefault(key, {"branch_id": branch_id, "date": date, "inc": {}})
+        for field, value in inc.items():
+            entry["inc"][field] = entry["inc"].get(field, 0) + value
+
+    now = datetime.now(timezone.utc).isoformat()
+    ops = [
+        UpdateOne(
+            {"key": key},
+            {"$inc": entry["inc"], "$setOnInsert": {"branch_id": entry["branch_id"], "date": entry["date"]}, "$set": {"updated_at": now}},
+            upsert=True
+        )
+        for key, entry in merged.items()
+    ]
+    if ops:
+        await db[COLLECTION].bulk_write(ops, ordered=False, session=session)
+
+
+async def is_ready(db) -> bool:
+    """Whether rollups have been backfilled and can serve reads (cached briefly per process)."""
+    now = time.monotonic()
+    if _ready_cache["value"] is not None and now - _ready_cache["checked_at"] < READY_CACHE_SECONDS:
+        return _ready_cache["value"]
+    meta = await db.system_meta.find_one({"id": META_ID}, {"_id": 0, "status": 1})
+    _ready_cache["value"] = bool(meta and meta.get("status") == "ready")
+    _ready_cache["checked_at"] = now
+    return _ready_cache["value"]
+
+
+def _group_pipeline(collection: str) -> List[dict]:
+    """Rollup documents of one source, grouped per (branch, date) server-side."""
+    amount_field, revenue_field, count_field, payment_field = SOURCES[collection]
+    date = {"$substrCP": ["$created_at", 0, 10]}
+    pipeline: List[dict] = [
+        {"$match": {"created_at": {"$nin": [None, ""]}}},
+        {"$group": {
+            "_id": {"branch_id": "$branch_id", "date": date, "mode": mode_field_expr("$payment_mode")},
+            "total": {"$sum": f"${amount_field}"},
+            "count": {"$sum": 1}
+        }},
+        {"$group": {
+            "_id": {"branch_id": "$_id.branch_id", "date": "$_id.date"},
+            "total": {"$sum": "$total"},
+            "count": {"$sum": "$count"},
+            "modes": {"$push": {"k": "$_id.mode", "v": "$total"}}
+        }},
+        {"$project": {
+            "_id": 0,
+            "key": {"$concat": [{"$ifNull": ["$_id.branch_id", ""]}, "|", "$_id.date"]},
+            "branch_id": "$_id.branch_id",
+            "date": "$_id.date",
+            revenue_field: "$total",
+            count_field: "$count",
+            **({payment_field: {"$arrayToObject": "$modes"}} if payment_field else {})
+        }},
+    ]
+    return pipeline
+
+
+def _backfill_pipeline(collection: str, target: str) -> List[dict]:
+    return _group_pipeline(collection) + [
+        {"$merge": {"into": target, "on": "key", "whenMatched": "merge", "whenNotMatched": "insert"}},
+    ]
+
+
+async def backfill(db, progress=None) -> dict:
+    """Recompute ``daily_rollups`` from bills, pharmacy sales and expenses.
+
+    Each source is grouped by (branch, date) server-side and ``$merge``d into a
+    scratch collection that is then renamed over the live one. Writes landing
+    while a backfill runs may not be reflected (the rename drops increments
+    made to the live collection meanwhile); ``check_backfill`` catches that.
+    ``progress(done, total)`` is awaited after each source collection.
+    """
+    started = datetime.now(timezone.utc).isoformat()
+    await db.system_meta.update_one({"id": META_ID}, {"$set": {"status": "rebuilding", "rebuild_started_at": started}}, upsert=True)
+    _ready_cache["value"] = None
+
+    await db[REBUILD_COLLECTION].drop()
+    await db[REBUILD_COLLECTION].create_index("key", unique=True, name="rollup_key_idx")
+    await db[REBUILD_COLLECTION].create_index([("branch_id", 1), ("date", 1)], name="rollup_branch_date_idx")
+    for done, collection in enumerate(SOURCES, start=1):
+        await db[collection].aggregate(_backfill_pipeline(collection, REBUILD_COLLECTION)).to_list(None)
+        if progress:
+            await progress(done, len(SOURCES))
+
+    rows = await db[REBUILD_COLLECTION].count_documents({})
+    if rows:
+        await db[REBUILD_COLLECTION].rename(COLLECTION, dropTarget=True)
+    else:
+        await db[COLLECTION].delete_many({})
+
+    finished = datetime.now(timezone.utc).isoformat()
+    await db.system_meta.update_one(
+        {"id": META_ID},
+        {"$set": {"status": "ready", "rebuilt_at": finished, "rows": rows}},
+        upsert=True
+    )
+    _ready_cache["value"] = None
+    return {"rows": rows, "started_at": started, "finished_at": finished}
+
+
+def _comparable(doc: dict) -> dict:
+    # Fields an edit can leave at zero count as missing
+    out = {}
+    for _, revenue_field, count_field, payment_field in SOURCES.values():
+        out[revenue_field] = round(doc.get(revenue_field) or 0, 2)
+        out[count_field] = doc.get(count_field) or 0
+        if payment_field:
+            modes = {mode: round(amount, 2) for mode, amount in (doc.get(payment_field) or {}).items()}
+            out[payment_field] = {mode: amount for mode, amount in modes.items() if amount}
+    return out
+
+
+async def verify(db, limit: int = 50) -> dict:
+    """Compare ``daily_rollups`` with a fresh per-(branch, date) aggregation of the sources."""
+    expected: Dict[str, dict] = {}
+    for collection in SOURCES:
+        for row in await db[collection].aggregate(_group_pipeline(collection)).to_list(None):
+            expected.setdefault(row["key"], {}).update(row)
+    actual = {doc["key"]: doc for doc in await db[COLLECTION].find({}, {"_id": 0}).to_list(None)}
+
+    mismatched = []
+    for key in sorted(expected.keys() | actual.keys()):
+        want, have = _comparable(expected.get(key, {})), _comparable(actual.get(key, {}))
+        if want != have:
+            mismatched.append({"key": key, "expected": want, "actual": have})
+    return {
+        "matches": not mismatched,
+        "days": len(expected),
+        "mismatched": mismatched[:limit],
+        "mismatched_count": len(mismatched)
+    }
+
+
+async def mark_stale(db, mismatched_count: int):
+    """Stop serving reads from the rollups until the next backfill; dashboards and reports fall back to the scan."""
+    await db.system_meta.update_one(
+        {"id": META_ID},
+        {"$set": {"status": "stale", "stale_at": datetime.now(timezone.utc).isoformat(), "mismatched": mismatched_count}},
+        upsert=True
+    )
+    _ready_cache["value"] = None
+
+
+async def check_backfill(db) -> dict:
+    """Verify a fresh backfill; on drift mark the rollups stale and raise ``RollupDriftError``."""
+    report = await verify(db)
+    if not report["matches"]:
+        await mark_stale(db, report["mismatched_count"])
+        raise RollupDriftError(
+            f"Backfilled rollups differ from bills, sales and expenses on {report['mismatched_count']} branch-days; "
+            "dashboards and reports scan the sources until they are backfilled again"
+        )
+    return report
+
+
+async def summarize(db, query: dict) -> dict:
+    """Sum rollup documents matching ``query`` (branch_id / date conditions)."""
+    docs = await db[COLLECTION].find(query, {"_id": 0}).to_list(None)
+    totals = {
+        "treatment_revenue": 0, "pharmacy_revenue": 0, "expenses": 0,
+        "bills_count": 0, "sales_count": 0, "expenses_count": 0,
+        "treatment_by_payment": {}, "pharmacy_by_payment": {}
+    }
+    for doc in docs:
+        for field in ("treatment_revenue", "pharmacy_revenue", "expenses", "bills_count", "sales_count", "expenses_count"):
+            totals[field] += doc.get(field, 0)
+        for field in ("treatment_by_payment", "pharmacy_by_payment"):
+            for mode, amount in (doc.get(field) or {}).items():
+                totals[field][mode] = totals[field].get(mode, 0) + amount
+    # Drop modes whose documents were all edited/deleted away
+    for field in ("treatment_by_payment", "pharmacy_by_payment"):
+        totals[field] = {m: a for m, a in totals[field].items() if a}
+    return totals
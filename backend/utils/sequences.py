@@ -0,0 +1,143 @@
+"""Document numbering from atomic counters in ``serial_numbers``.
+
+Each counter is the ``serial_numbers`` config for (branch_id, document_type,
+financial_year), the same documents managed under /serial-numbers;
+``current_number`` is the next number to issue. ``allocate`` reserves numbers
+with a single ``find_one_and_update`` ``$inc``, so concurrent creates never
+get the same number and the cost does not grow with the collection. A
+missing counter is created on first use, starting at ``start()`` when given
+(used to continue numbering of existing documents) or 1.
+
+Document types listed in ``SEQUENCE_BLOCK_SIZES`` (e.g. ``transfer=20``)
+reserve a block of numbers per worker and hand them out from memory, so
+most creates need no round trip. Numbers then stay unique but are not in
+creation order across workers, and the unused part of a block is skipped
+when the worker restarts.
+"""
+import asyncio
+import os
+import uuid
+from datetime import date, datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+COLLECTION = "serial_numbers"
+
+StartFn = Optional[Callable[[], Awaitable[int]]]
+
+
+def parse_block_sizes(raw: str) -> Dict[str, int]:
+    sizes = {}
+    for part in raw.split(","):
+        name, _, size = part.partition("=")
+        if name.strip() and size.strip().isdigit():
+            sizes[name.strip()] = int(size)
+    return sizes
+
+
+BLOCK_SIZES = parse_block_sizes(os.environ.get("SEQUENCE_BLOCK_SIZES", ""))
+
+stats = {"allocations": 0, "numbers": 0, "from_block": 0, "counters_created": 0}
+# (branch_id, document_type, financial_year) -> [next, end)
+_blocks: Dict[Tuple[str, str, str], list] = {}
+_locks: Dict[Tuple[str, str, str], asyncio.Lock] = {}
+
+
+def financial_year(now: Optional[datetime] = None) -> str:
+    """Indian financial year (April to March), e.g. "2025-2026"."""
+    now = now or datetime.now()
+    if now.month < 4:
+        return f"{now.year - 1}-{now.year}"
+    return f"{now.year}-{now.year + 1}"
+
+
+def financial_year_start(fy: str) -> date:
+    return date(int(fy[:4]), 4, 1)
+
+
+def financial_year_code(fy: str) -> str:
+    """Short form used in document numbers: "2025-2026" -> "2526"."""
+    return f"{fy[2:4]}{fy[7:9]}"
+
+
+async def allocate(db, document_type: str, count: int = 1, branch_id: str = "",
+                   fy: Optional[str] = None, start: StartFn = None, session=None) -> int:
+    """Reserve ``count`` consecutive numbers and return the first."""
+    fy = fy or financial_year()
+    query = {"branch_id": branch_id, "document_type": document_type, "financial_year": fy}
+    projection = {"_id": 0, "current_number": 1}
+    doc = await db[COLLECTION].find_one_and_update(
+        query, {"$inc": {"current_number": count}},
+        projection=projection, return_document=ReturnDocument.AFTER, session=session
+    )
+    if doc is None:
+        first = await start() if start else 1
+        now = datetime.now(timezone.utc).isoformat()
+        # $ifNull keeps whatever a concurrent first use already wrote
+        create = [{"$set": {
+            "id": {"$ifNull": ["$id", str(uuid.uuid4())]},
+            "godown_id": {"$ifNull": ["$godown_id", ""]},
+            "prefix": {"$ifNull": ["$prefix", ""]},
+            "starting_number": {"$ifNull": ["$starting_number", first]},
+            "created_at": {"$ifNull": ["$created_at", now]},
+            "current_number": {"$add": [{"$ifNull": ["$current_number", first]}, count]},
+        }}]
+        try:
+            doc = await db[COLLECTION].find_one_and_update(
+                query, create, projection=projection, upsert=True,
+                return_document=ReturnDocument.AFTER, session=session
+            )
+        except DuplicateKeyError:
+            # Lost the race to create the counter; it exists now
+            doc = await db[COLLECTION].find_one_and_update(
+                query, {"$inc": {"current_number": count}},
+                projection=projection, return_document=ReturnDocument.AFTER, session=session
+            )
+        stats["counters_created"] += 1
+    stats["allocations"] += 1
+    stats["numbers"] += count
+    return doc["current_number"] - count
+
+
+async def next_number(db, document_type: str, branch_id: str = "",
+                      fy: Optional[str] = None, start: StartFn = None) -> int:
+    """The next number for a document, from this worker's block when one is configured."""
+    fy = fy or financial_year()
+    size = BLOCK_SIZES.get(document_type, 1)
+    if size <= 1:
+        return await allocate(db, document_type, 1, branch_id, fy, start)
+
+    key = (branch_id, document_type, fy)
+    async with _locks.setdefault(key, asyncio.Lock()):
+        block = _blocks.get(key)
+        if not block or block[0] >= block[1]:
+            first = await allocate(db, document_type, size, branch_id, fy, start)
+            block = _blocks[key] = [first, first + size]
+        else:
+            stats["from_block"] += 1
+        number = block[0]
+        block[0] += 1
+    return number
+
+
+async def peek(db, document_type: str, branch_id: str = "",
+               fy: Optional[str] = None, start: StartFn = None) -> int:
+    """The number the next create would most likely get, without reserving it."""
+    fy = fy or financial_year()
+    block = _blocks.get((branch_id, document_type, fy))
+    if block and block[0] < block[1]:
+        return block[0]
+    doc = await db[COLLECTION].find_one(
+        {"branch_id": branch_id, "document_type": document_type, "financial_year": fy},
+        {"_id": 0, "current_number": 1}
+    )
+    if doc:
+        return doc["current_number"]
+    return await start() if start else 1
+
+
+def get_stats() -> dict:
+    return {**stats, "block_sizes": dict(BLOCK_SIZES),
+            "blocks_held": {"|".join(key): end - nxt for key, (nxt, end) in _blocks.items()}}
@@ -0,0 +1,321 @@
+"""Materialized per-location stock ledger.
+
+The ``stock_levels`` collection keeps one document per
+(item name, batch, MRP, branch, godown) combination with two running totals:
+
+- ``stock_quantity``: sum of ``medicines.stock_quantity`` for that key
+- ``pending_quantity``: quantity (incl. free) on purchase entries whose
+  items have not been received yet
+
+Every write that changes medicine stock or pending purchase items calls
+``apply_deltas`` so stock screens can read this snapshot instead of
+re-aggregating ``medicines`` and ``purchase_entries`` on every request.
+``rebuild`` recreates the collection from the raw data.
+"""
+import time
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from utils import change_log
+
+STOCK_LEVELS = "stock_levels"
+REBUILD_COLLECTION = "stock_levels_rebuild"
+META_ID = "stock_levels"
+
+# Purposes counted as saleable stock (same filter as the consolidated stock view)
+STOCK_PURPOSES = ["for_sale", None, ""]
+
+# Medicine fields copied onto a ledger row the first time the key is seen
+_MEDICINE_META_FIELDS = [
+    "expiry_date", "manufacturer", "gst_percentage", "item_status",
+    "discontinued_reason", "min_stock_level", "unit", "unit_id", "created_at"
+]
+
+READY_CACHE_SECONDS = 5
+_ready_cache = {"value": None, "checked_at": 0.0}
+
+
+class LedgerDriftError(Exception):
+    """The ledger no longer matches a full rescan of the raw collections."""
+
+
+def safe_float(val, default=0.0):
+    try:
+        if val is None or val == "": return default
+        return float(val)
+    except (ValueError, TypeError):
+        return default
+
+
+def safe_int(val, default=0):
+    try:
+        if val is None or val == "": return default
+        return int(float(val))
+    except (ValueError, TypeError):
+        return default
+
+
+def level_key(name: str, batch: str, mrp: float, branch_id: Optional[str], godown_id: Optional[str]) -> str:
+    return f"{name}|{batch}|{mrp:.2f}|{branch_id or ''}|{godown_id or ''}"
+
+
+def counts_as_stock(med: dict) -> bool:
+    return med.get("purpose") in STOCK_PURPOSES
+
+
+def medicine_delta(med: dict, quantity) -> Optional[dict]:
+    """Ledger delta for a change of ``quantity`` on a medicines document.
+
+    Returns None for documents that are not part of saleable stock.
+    """
+    if not med or not counts_as_stock(med):
+        return None
+
+    name = str(med.get("name", "")).strip()
+    batch = str(med.get("batch_number", "")).strip()
+    mrp = round(safe_float(med.get("mrp") or med.get("unit_price"), 0), 2)
+    branch_id = med.get("branch_id")
+    godown_id = med.get("godown_id")
+
+    meta = {f: med.get(f) for f in _MEDICINE_META_FIELDS if med.get(f) not in (None, "")}
+    meta["medicine_id"] = med.get("id")
+    meta["sales_price"] = med.get("unit_price", mrp)
+
+    return {
+        "key": level_key(name, batch, mrp, branch_id, godown_id),
+        "fields": {"name": name, "batch_number": batch, "mrp": mrp, "branch_id": branch_id, "godown_id": godown_id},
+        "meta": meta,
+        "stock": safe_int(quantity, 0),
+        "pending": 0,
+        "has_medicine": True
+    }
+
+
+def purchase_pending_deltas(purchase: dict, sign: int = 1) -> List[dict]:
+    """Ledger deltas for the pending (not yet received) items of a purchase entry."""
+    if not purchase or purchase.get("items_received_date"):
+        return []
+
+    deltas = []
+    branch_id = purchase.get("branch_id")
+    godown_id = purchase.get("godown_id")
+    for item in purchase.get("items", []):
+        purpose = item.get("item_purpose") or item.get("purpose") or "for_sale"
+        if purpose != "for_sale":
+            continue
+
+        name = str(item.get("medicine_name", "")).strip()
+        batch = str(item.get("batch_number", "")).strip()
+        mrp = round(safe_float(item.get("mrp"), 0), 2)
+        qty = safe_int(item.get("quantity"), 0) + safe_int(item.get("free_quantity", 0))
+
+        meta = {}
+        if item.get("expiry_date"):
+            meta["expiry_date"] = item["expiry_date"]
+        if item.get("manufacturer"):
+            meta["manufacturer"] = item["manufacturer"]
+
+        deltas.append({
+            "key": level_key(name, batch, mrp, branch_id, godown_id),
+            "fields": {"name": name, "batch_number": batch, "mrp": mrp, "branch_id": branch_id, "godown_id": godown_id},
+            "meta": meta,
+            "stock": 0,
+            "pending": sign * qty,
+            "has_medicine": False
+        })
+    return deltas
+
+
+def _merge_deltas(deltas: Iterable[Optional[dict]]) -> List[dict]:
+    merged = {}
+    for d in deltas:
+        if not d:
+            continue
+        existing = merged.get(d["key"])
+        if existing is None:
+            merged[d["key"]] = {**d, "meta": dict(d["meta"])}
+            continue
+        existing["stock"] += d["stock"]
+        existing["pending"] += d["pending"]
+        existing["has_medicine"] = existing["has_medicine"] or d["has_medicine"]
+        for k, v in d["meta"].items():
+            existing["meta"].setdefault(k, v)
+    return list(merged.values())
+
+
+def _delta_ops(merged: List[dict]) -> List[UpdateOne]:
+    now = datetime.now(timezone.utc).isoformat()
+    ops = []
+    for d in merged:
+        update = {
+            "$inc": {"stock_quantity": d["stock"], "pending_quantity": d["pending"]},
+            "$setOnInsert": {"key": d["key"], **d["fields"], **d["meta"], "created_on": now},
+            "$set": {"updated_at": now}
+        }
+        if d["has_medicine"]:
+            update["$set"]["has_medicine"] = True
+        ops.append(UpdateOne({"key": d["key"]}, update, upsert=True))
+    return ops
+
+
+async def apply_deltas(db, deltas: Iterable[Optional[dict]], collection: str = STOCK_LEVELS, session=None):
+    """Apply ledger deltas in a single unordered bulk write (logged for /api/sync)."""
+    merged = _merge_deltas(deltas)
+    if not merged:
+        return None
+    result = await db[collection].bulk_write(_delta_ops(merged), ordered=False, session=session)
+    if collection == STOCK_LEVELS:
+        created = {merged[i]["key"] for i in result.upserted_ids}
+        branches = {d["key"]: d["fields"]["branch_id"] for d in merged}
+        await change_log.record(db, STOCK_LEVELS, change_log.CREATED, [k for k in branches if k in created], branches, session=session)
+        await change_log.record(db, STOCK_LEVELS, change_log.UPDATED, [k for k in branches if k not in created], branches, session=session)
+    return result
+
+
+async def is_ready(db) -> bool:
+    """Whether the ledger has been built and can serve reads (cached briefly per process)."""
+    now = time.monotonic()
+    if _ready_cache["value"] is not None and now - _ready_cache["checked_at"] < READY_CACHE_SECONDS:
+        return _ready_cache["value"]
+    meta = await db.system_meta.find_one({"id": META_ID}, {"_id": 0, "status": 1})
+    _ready_cache["value"] = bool(meta and meta.get("status") == "ready")
+    _ready_cache["checked_at"] = now
+    return _ready_cache["value"]
+
+
+def _location_filter(branch_id, godown_id) -> dict:
+    query = {}
+    if branch_id:
+        query["branch_id"] = {"$in": branch_id} if isinstance(branch_id, list) else branch_id
+    if godown_id:
+        query["godown_id"] = {"$in": godown_id} if isinstance(godown_id, list) else godown_id
+    return query
+
+
+async def load_levels(db, branch_id=None, godown_id=None, include_pending: bool = True) -> List[dict]:
+    """Ledger rows for the given locations, shaped like medicines documents.
+
+    ``stock_quantity`` on the returned rows already includes pending purchase
+    quantity when ``include_pending`` is set.
+    """
+    query = _location_filter(branch_id, godown_id)
+    if include_pending:
+        query["$or"] = [{"has_medicine": True}, {"pending_quantity": {"$ne": 0}}]
+    else:
+        query["has_medicine"] = True
+
+    rows = await db[STOCK_LEVELS].find(query, {"_id": 0}).to_list(None)
+    for row in rows:
+        qty = row.get("stock_quantity", 0)
+        if include_pending:
+            qty += row.get("pending_quantity", 0)
+        row["stock_quantity"] = qty
+        row["id"] = row.get("medicine_id") or row["key"]
+        row["unit_price"] = row.get("sales_price", row.get("mrp"))
+    return rows
+
+
+async def rebuild(db, chunk_size: int = 1000, progress=None) -> dict:
+    """Recreate ``stock_levels`` from medicines and pending purchase entries.
+
+    Rows are built in a scratch collection and swapped in with a rename, so
+    readers never observe a half-built ledger. Writes landing while a rebuild
+    is running may not be reflected, so callers verify the result and
+    ``mark_stale`` the ledger on drift. ``progress(done)`` is awaited with the
+    number of source documents read after each chunk.
+    """
+    started = datetime.now(timezone.utc).isoformat()
+    await db.system_meta.update_one(
+        {"id": META_ID},
+        {"$set": {"status": "rebuilding", "rebuild_started_at": started}},
+        upsert=True
+    )
+    _ready_cache["value"] = None
+
+    await db[REBUILD_COLLECTION].drop()
+    await db[REBUILD_COLLECTION].create_index("key", unique=True, name="stock_level_key_idx")
+    await db[REBUILD_COLLECTION].create_index([("branch_id", 1), ("godown_id", 1)], name="stock_level_location_idx")
+
+    counts = {"medicines": 0, "purchase_entries": 0}
+    batch = []
+
+    async def flush():
+        if batch:
+            await apply_deltas(db, batch, collection=REBUILD_COLLECTION)
+            batch.clear()
+        if progress:
+            await progress(sum(counts.values()))
+
+    # Medicines first so their metadata (id, sales price, GST) wins over purchase items
+    async for med in db.medicines.find({"purpose": {"$in": STOCK_PURPOSES}}, {"_id": 0}):
+        batch.append(medicine_delta(med, med.get("stock_quantity")))
+        counts["medicines"] += 1
+        if len(batch) >= chunk_size:
+            await flush()
+    await flush()
+
+    async for purchase in db.purchase_entries.find({"items_received_date": None}, {"_id": 0}):
+        batch.extend(purchase_pending_deltas(purchase))
+        counts["purchase_entries"] += 1
+        if len(batch) >= chunk_size:
+            await flush()
+    await flush()
+
+    rows = await db[REBUILD_COLLECTION].count_documents({})
+    if rows:
+        await db[REBUILD_COLLECTION].rename(STOCK_LEVELS, dropTarget=True)
+    else:
+        await db[STOCK_LEVELS].delete_many({})
+        await db[STOCK_LEVELS].create_index("key", unique=True, name="stock_level_key_idx")
+
+    finished = datetime.now(timezone.utc).isoformat()
+    await db.system_meta.update_one(
+        {"id": META_ID},
+        {"$set": {"status": "ready", "rebuilt_at": finished, "rows": rows, "sources": counts}},
+        upsert=True
+    )
+    await change_log.reset(db, STOCK_LEVELS)
+    _ready_cache["value"] = None
+    return {"rows": rows, "sources": counts, "started_at": started, "finished_at": finished}
+
+
+def drift_counts(views: dict) -> dict:
+    """Differing entries per view of a ``verify_stock_levels`` report, for the views that differ."""
+    return {
+        view: result["missing_count"] + result["extra_count"] + result["mismatched_count"]
+        for view, result in views.items() if not result["matches"]
+    }
+
+
+async def mark_stale(db, drift: dict):
+    """Stop serving reads from the ledger until the next rebuild; stock endpoints fall back to the rescan."""
+    await db.system_meta.update_one(
+        {"id": META_ID},
+        {"$set": {"status": "stale", "stale_at": datetime.now(timezone.utc).isoformat(), "drift": drift}},
+        upsert=True
+    )
+    _ready_cache["value"] = None
+
+
+def diff_stock_maps(expected: dict, actual: dict, limit: int = 50) -> dict:
+    """Compare two consolidated stock maps by key and quantity."""
+    missing = [k for k in expected if k not in actual]
+    extra = [k for k in actual if k not in expected]
+    mismatched = [
+        {"key": k, "expected": expected[k]["stock_quantity"], "actual": actual[k]["stock_quantity"]}
+        for k in expected
+        if k in actual and expected[k]["stock_quantity"] != actual[k]["stock_quantity"]
+    ]
+    return {
+        "matches": not (missing or extra or mismatched),
+        "expected_entries": len(expected),
+        "actual_entries": len(actual),
+        "missing": missing[:limit],
+        "extra": extra[:limit],
+        "mismatched": mismatched[:limit],
+        "missing_count": len(missing),
+        "extra_count": len(extra),
+        "mismatched_count": len(mismatched)
+    }
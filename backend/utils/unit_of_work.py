@@ -0,0 +1,136 @@
+"""Unit of work: run a multi-document write flow in one MongoDB transaction.
+
+``run(client, fn)`` opens a session, starts a transaction and awaits
+``fn(uow)``; every write of the flow passes ``session=uow.session``. The
+transaction commits when ``fn`` returns and aborts when it raises (including
+``HTTPException``), so a failure midway leaves nothing behind. Errors
+labelled ``TransientTransactionError`` (write conflicts with a concurrent
+flow, primary step-downs) re-run ``fn`` from the start with a fresh unit of
+work, up to ``UOW_MAX_RETRIES`` times; an ``UnknownTransactionCommitResult``
+retries just the commit.
+
+Work that must only happen once the writes are visible (cache invalidation)
+is registered with ``uow.after_commit``; helpers that may run with or
+without a unit of work use ``defer``.
+
+Transactions need a replica set or sharded cluster. On a standalone mongod
+(``hello`` has no ``setName``) ``fn`` runs with ``session=None``, i.e. the
+old write-by-write behaviour. ``MONGO_TRANSACTIONS=on|off`` overrides the
+detection.
+"""
+import asyncio
+import logging
+import os
+import random
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRIES = int(os.environ.get("UOW_MAX_RETRIES", "3"))
+MAX_COMMIT_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 0.01
+TRANSACTIONS_MODE = os.environ.get("MONGO_TRANSACTIONS", "auto").lower()
+
+stats = {"committed": 0, "aborted": 0, "retries": 0, "commit_retries": 0, "failed_after_retries": 0, "without_transaction": 0}
+_support = {"value": None}
+
+
+class UnitOfWork:
+    def __init__(self, session=None):
+        self.session = session
+        self._after_commit: List[Tuple[Callable[..., Awaitable], tuple]] = []
+
+    @property
+    def transactional(self) -> bool:
+        return self.session is not None
+
+    def after_commit(self, fn: Callable[..., Awaitable], *args):
+        """Await ``fn(*args)`` once the flow's writes are committed."""
+        self._after_commit.append((fn, args))
+
+    async def _run_after_commit(self):
+        for fn, args in self._after_commit:
+            try:
+                await fn(*args)
+            except Exception:
+                # The writes are already durable; a failed follow-up must not fail the request
+                logger.exception("after_commit hook failed")
+
+
+async def defer(uow: Optional[UnitOfWork], fn: Callable[..., Awaitable], *args):
+    """Run ``fn(*args)`` after ``uow`` commits, or right away without one."""
+    if uow is None:
+        await fn(*args)
+    else:
+        uow.after_commit(fn, *args)
+
+
+async def supports_transactions(client) -> bool:
+    if TRANSACTIONS_MODE in ("on", "off"):
+        return TRANSACTIONS_MODE == "on"
+    if _support["value"] is None:
+        hello = await client.admin.command("hello")
+        _support["value"] = bool(hello.get("setName") or hello.get("msg") == "isdbgrid")
+        logger.info(f"MongoDB transactions {'enabled' if _support['value'] else 'unavailable (standalone server)'}")
+    return _support["value"]
+
+
+def _has_label(error: Exception, label: str) -> bool:
+    return isinstance(error, PyMongoError) and error.has_error_label(label)
+
+
+async def _commit(session):
+    attempt = 0
+    while True:
+        try:
+            await session.commit_transaction()
+            return
+        except PyMongoError as e:
+            if not _has_label(e, "UnknownTransactionCommitResult") or attempt >= MAX_COMMIT_RETRIES:
+                raise
+            attempt += 1
+            stats["commit_retries"] += 1
+
+
+async def run(client, fn: Callable[[UnitOfWork], Awaitable], max_retries: Optional[int] = None):
+    """Run ``fn(uow)`` in a transaction (or plainly on a standalone server) and return its result."""
+    if not await supports_transactions(client):
+        uow = UnitOfWork()
+        result = await fn(uow)
+        stats["without_transaction"] += 1
+        await uow._run_after_commit()
+        return result
+
+    retries = MAX_RETRIES if max_retries is None else max_retries
+    attempt = 0
+    async with await client.start_session() as session:
+        while True:
+            uow = UnitOfWork(session)
+            session.start_transaction()
+            try:
+                result = await fn(uow)
+                await _commit(session)
+            except BaseException as e:
+                if session.in_transaction:
+                    try:
+                        await session.abort_transaction()
+                    except PyMongoError:
+                        logger.warning("abort_transaction failed", exc_info=True)
+                stats["aborted"] += 1
+                if _has_label(e, "TransientTransactionError") and attempt < retries:
+                    attempt += 1
+                    stats["retries"] += 1
+                    await asyncio.sleep(RETRY_BACKOFF_SECONDS * attempt * (1 + random.random()))
+                    continue
+                if _has_label(e, "TransientTransactionError"):
+                    stats["failed_after_retries"] += 1
+                raise
+            stats["committed"] += 1
+            await uow._run_after_commit()
+            return result
+
+
+def get_stats() -> dict:
+    return {**stats, "transactions": _support["value"] if TRANSACTIONS_MODE == "auto" else TRANSACTIONS_MODE == "on"}
@@ -0,0 +1,101 @@
+"""In-process cache of authenticated users for ``get_current_user``.
+
+Entries are keyed by user id and expire after ``USER_CACHE_TTL_SECONDS``;
+the least recently used entry is evicted once ``USER_CACHE_MAX_SIZE`` is
+reached. Writes to a user call ``invalidate``, which drops the local entry
+and bumps a shared epoch in ``system_meta``. Other workers check that epoch
+at most every ``EPOCH_POLL_SECONDS`` and clear their cache when it moves, so
+a deactivated user is locked out everywhere within a few seconds.
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+META_ID = "user_cache"
+EPOCH_POLL_SECONDS = 2
+
+USER_PROJECTION = {"_id": 0, "hashed_password": 0}
+
+
+class UserCache:
+    def __init__(self, ttl_seconds: float = 60, max_size: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._epoch = None
+        self._epoch_checked_at = 0.0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "epoch_resets": 0}
+
+    async def _sync_epoch(self, db):
+        now = time.monotonic()
+        if now - self._epoch_checked_at < EPOCH_POLL_SECONDS:
+            return
+        # Mark as checked before awaiting so concurrent requests don't all poll
+        self._epoch_checked_at = now
+        meta = await db.system_meta.find_one({"id": META_ID}, {"_id": 0, "epoch": 1})
+        epoch = meta.get("epoch", 0) if meta else 0
+        if self._epoch is not None and epoch != self._epoch:
+            self._entries.clear()
+            self.stats["epoch_resets"] += 1
+        self._epoch = epoch
+
+    async def get(self, db, user_id: str) -> Optional[dict]:
+        """Return the user document, loading it from MongoDB on a miss."""
+        if self.ttl_seconds <= 0:
+            return await db.users.find_one({"id": user_id}, USER_PROJECTION)
+
+        await self._sync_epoch(db)
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry and entry[0] > now:
+            self._entries.move_to_end(user_id)
+            self.stats["hits"] += 1
+            return dict(entry[1])
+
+        self.stats["misses"] += 1
+        user = await db.users.find_one({"id": user_id}, USER_PROJECTION)
+        if user is None:
+            self._entries.pop(user_id, None)
+            return None
+
+        self._entries[user_id] = (now + self.ttl_seconds, user)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+        return dict(user)
+
+    async def invalidate(self, db, user_id: str):
+        """Drop a user locally and signal other workers to drop their copies."""
+        self._entries.pop(user_id, None)
+        self.stats["invalidations"] += 1
+        meta = await db.system_meta.find_one_and_update(
+            {"id": META_ID},
+            {"$inc": {"epoch": 1}},
+            upsert=True,
+            projection={"_id": 0, "epoch": 1},
+            return_document=True
+        )
+        epoch = meta.get("epoch") if meta else None
+        # Another worker bumped the epoch since our last check; clear as they asked
+        if self._epoch is None or epoch != self._epoch + 1:
+            self._entries.clear()
+            self.stats["epoch_resets"] += 1
+        self._epoch = epoch
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hit_ratio": round(self.stats["hits"] / lookups, 4) if lookups else None
+        }
+
+
+user_cache = UserCache(
+    ttl_seconds=float(os.environ.get("USER_CACHE_TTL_SECONDS", "60")),
+    max_size=int(os.environ.get("USER_CACHE_MAX_SIZE", "1000"))
+)
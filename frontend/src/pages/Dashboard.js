@@ -71,7 +71,7 @@ const Dashboard = ({ user }) => {
 
       // Get recent bills for limited roles
       if (isLimitedRole) {
-        requests.push(axios.get(`${API}/bills`));
+        requests.push(axios.get(`${API}/bills?view=summary`));
       } else {
         requests.push(Promise.resolve({ data: [] }));
       }